@@ -80,6 +80,14 @@ def q_exec(sql: str, args: tuple = ()) -> None:
         cur.execute(sql, args)
         con.commit()   # ensure persistence
 
+def _invalidate_snapshot(tg_id: int) -> None:
+    """Drop the bot's cached user snapshot after an admin write."""
+    try:
+        from registration import invalidate_user_snapshot
+        invalidate_user_snapshot(tg_id)
+    except Exception:
+        pass
+
 # --- Core admin actions ---
 def db_stats() -> dict:
     row = q_one("""SELECT
@@ -127,6 +135,7 @@ def set_premium(tg_id: int, value: bool) -> None:
             SET is_premium = FALSE,
                 premium_until = NULL;
         """, (tg_id,))
+    _invalidate_snapshot(tg_id)
 
 def user_info(tg_id: int) -> Optional[dict]:
     row = q_one("""SELECT tg_user_id, gender, age, country, city, language,
@@ -166,6 +175,7 @@ def reset_user_metrics(tg_id: int) -> None:
         DELETE FROM user_interests
         WHERE user_id = (SELECT id FROM users WHERE tg_user_id=%s);
     """, (tg_id,))
+    _invalidate_snapshot(tg_id)
 
     # wipe ratings and reports logs
     q_exec("DELETE FROM chat_ratings WHERE rated_user_id=%s OR rater_user_id=%s;", (tg_id, tg_id))
@@ -221,8 +231,16 @@ def approve_vault_content(content_id: int) -> bool:
             
         submitter_id = result[0]
         
-        # Approve the content
-        q_exec("UPDATE vault_content SET approval_status = 'approved' WHERE id = %s", (content_id,))
+        # Approve the content; the category's approved_count moves with it
+        q_exec("""
+            WITH upd AS (
+                UPDATE vault_content SET approval_status = 'approved'
+                 WHERE id = %s AND approval_status IS DISTINCT FROM 'approved'
+                RETURNING category_id
+            )
+            UPDATE vault_categories c SET approved_count = c.approved_count + 1
+              FROM upd WHERE c.id = upd.category_id
+        """, (content_id,))
         
         # Award coin for approved submission
         from handlers.blur_vault import award_submission_coin
@@ -261,7 +279,17 @@ def approve_vault_content(content_id: int) -> bool:
 def delete_vault_content(content_id: int) -> bool:
     """Delete/reject vault content submission"""
     try:
-        q_exec("DELETE FROM vault_content WHERE id = %s", (content_id,))
+        q_exec("""
+            WITH del AS (
+                DELETE FROM vault_content WHERE id = %s
+                RETURNING category_id, approval_status
+            )
+            UPDATE vault_categories c SET approved_count = GREATEST(c.approved_count - 1, 0)
+              FROM del WHERE c.id = del.category_id AND del.approval_status = 'approved'
+        """, (content_id,))
+        # cached revealed tallies may count the deleted item
+        from utils import vault_index
+        vault_index.REVEALED.invalidate_all()
         return True
     except Exception as e:
         log.error(f"Error deleting content {content_id}: {e}")
@@ -8,13 +8,11 @@ import json
 import hashlib
 import hmac
 import base64
-import time
 from datetime import datetime, timedelta
 from urllib.parse import unquote
 from typing import Optional, Dict, Any, List
-from collections import defaultdict, deque
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Header
 from fastapi.security import HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -22,6 +20,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import registration as reg
+from utils.rate_limiter import RateLimitMiddleware
+from utils import db_migration
 
 
 # Initialize FastAPI app
@@ -60,34 +60,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting storage (use Redis in production)
-rate_limit_storage = defaultdict(lambda: deque())
-
-# Rate limiting middleware
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    """Simple rate limiting: 60 requests per minute per IP"""
-    client_ip = request.client.host if request.client else "unknown"
-    current_time = time.time()
-    
-    # Clean old requests (older than 1 minute)
-    user_requests = rate_limit_storage[client_ip]
-    while user_requests and user_requests[0] < current_time - 60:
-        user_requests.popleft()
-    
-    # Check rate limit for write operations
-    if request.method in ["POST", "PUT", "DELETE"]:
-        if len(user_requests) >= 30:  # 30 writes per minute
-            raise HTTPException(status_code=429, detail="Rate limit exceeded - too many requests")
-        user_requests.append(current_time)
-    elif len(user_requests) >= 60:  # 60 total requests per minute
-        raise HTTPException(status_code=429, detail="Rate limit exceeded - too many requests")
-        
-    if request.method == "GET":
-        user_requests.append(current_time)
-    
-    response = await call_next(request)
-    return response
+# Rate limiting: 60 requests/minute per IP, writes capped at 30/minute
+# (bounded per-IP buckets shared with the rest of the process)
+app.add_middleware(
+    RateLimitMiddleware,
+    rate=1.0, burst=60,
+    write_rate=0.5, write_burst=30,
+    prefix="miniapp",
+)
 
 # Security
 security = HTTPBearer()
@@ -235,141 +215,14 @@ def get_current_user(
     )
 
 
-def ensure_miniapp_tables():
-    """Create mini app specific database tables with production-ready constraints and indexes"""
+@app.on_event("startup")
+def _apply_migrations():
+    """Bring the schema up to date (mini app tables: backend/migrations/V20261017.3__miniapp_tables.sql)"""
     try:
-        with reg._conn() as con, con.cursor() as cur:
-            # Mini app posts table with proper constraints
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_posts (
-                    id BIGSERIAL PRIMARY KEY,
-                    author_id BIGINT NOT NULL,
-                    type TEXT NOT NULL DEFAULT 'text' CHECK (type IN ('text', 'photo', 'video')),
-                    caption TEXT CHECK (LENGTH(caption) <= 2000),
-                    media_url TEXT,
-                    media_type TEXT,
-                    visibility TEXT NOT NULL DEFAULT 'public' CHECK (visibility IN ('public', 'followers', 'private')),
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    CONSTRAINT valid_media CHECK (
-                        (type = 'text' AND media_url IS NULL) OR 
-                        (type IN ('photo', 'video') AND media_url IS NOT NULL)
-                    )
-                );
-            """)
-            
-            # Likes table with conflict prevention
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_likes (
-                    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
-                    user_id BIGINT NOT NULL,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    PRIMARY KEY (post_id, user_id)
-                );
-            """)
-            
-            # Comments table with text length limits
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_comments (
-                    id BIGSERIAL PRIMARY KEY,
-                    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
-                    author_id BIGINT NOT NULL,
-                    text TEXT NOT NULL CHECK (LENGTH(text) >= 1 AND LENGTH(text) <= 500),
-                    parent_id BIGINT REFERENCES miniapp_comments(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                );
-            """)
-            
-            # Saves table with TTL enforcement
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_saves (
-                    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
-                    user_id BIGINT NOT NULL,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    expires_at TIMESTAMPTZ NOT NULL DEFAULT NOW() + INTERVAL '72 hours',
-                    PRIMARY KEY (post_id, user_id),
-                    CHECK (expires_at > created_at)
-                );
-            """)
-            
-            # Follows table with self-follow prevention
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_follows (
-                    follower_id BIGINT NOT NULL,
-                    followee_id BIGINT NOT NULL,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    status TEXT NOT NULL DEFAULT 'approved' CHECK (status IN ('approved', 'pending')),
-                    PRIMARY KEY (follower_id, followee_id),
-                    CHECK (follower_id != followee_id)
-                );
-            """)
-            
-            # Post views for hide-seen functionality with unique constraint
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_post_views (
-                    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
-                    user_id BIGINT NOT NULL,
-                    viewed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    PRIMARY KEY (post_id, user_id)
-                );
-            """)
-            
-            # User profiles with username constraints
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS miniapp_profiles (
-                    user_id BIGINT PRIMARY KEY,
-                    username TEXT UNIQUE CHECK (username IS NULL OR (LENGTH(username) >= 3 AND LENGTH(username) <= 30)),
-                    display_name TEXT CHECK (display_name IS NULL OR LENGTH(display_name) <= 100),
-                    bio TEXT CHECK (bio IS NULL OR LENGTH(bio) <= 500),
-                    avatar_url TEXT,
-                    is_private BOOLEAN NOT NULL DEFAULT FALSE,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                );
-            """)
-            
-            # CRITICAL: Production-ready composite indexes for cursor pagination and performance
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_posts_created_id ON miniapp_posts(created_at DESC, id DESC);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_posts_author_created_id ON miniapp_posts(author_id, created_at DESC, id DESC);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_posts_visibility_created ON miniapp_posts(visibility, created_at DESC) WHERE visibility = 'public';")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_posts_ttl ON miniapp_posts(created_at);")
-            
-            # Likes optimization
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_likes_post_created ON miniapp_likes(post_id, created_at DESC);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_likes_user ON miniapp_likes(user_id, created_at DESC);")
-            
-            # Comments optimization
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_comments_post_created ON miniapp_comments(post_id, created_at DESC);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_comments_author ON miniapp_comments(author_id, created_at DESC);")
-            
-            # Follows optimization for feed queries
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_follows_follower_status ON miniapp_follows(follower_id, status) WHERE status = 'approved';")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_follows_followee_status ON miniapp_follows(followee_id, status) WHERE status = 'approved';")
-            
-            # Saves optimization with TTL cleanup
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_saves_user_expires ON miniapp_saves(user_id, expires_at DESC);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_saves_expires ON miniapp_saves(expires_at);")
-            
-            # Post views optimization for hide-seen queries
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_post_views_user_viewed ON miniapp_post_views(user_id, viewed_at DESC);")
-            
-            # Profile optimization
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_miniapp_profiles_username ON miniapp_profiles(username) WHERE username IS NOT NULL;")
-            
-            # TTL cleanup function for expired saves
-            cur.execute("""
-                CREATE OR REPLACE FUNCTION cleanup_expired_saves() RETURNS void AS $$
-                BEGIN
-                    DELETE FROM miniapp_saves WHERE expires_at <= NOW();
-                END;
-                $$ LANGUAGE plpgsql;
-            """)
-            
-            con.commit()
-            print("✅ Mini app database tables created with production-ready constraints and indexes")
-            
+        for line in db_migration.migrate():
+            print(f"[migrate] {line}")
     except Exception as e:
-        print(f"❌ Failed to create mini app tables: {e}")
+        print(f"❌ Schema migrations failed: {e}")
 
 
 def get_user_profile(user_id: int) -> Dict:
@@ -500,9 +353,6 @@ def calculate_ttl_hours(created_at: datetime) -> Optional[int]:
         return None
 
 
-# Initialize tables on startup
-ensure_miniapp_tables()
-
 # =============================================================================
 # API ROUTES
 # =============================================================================
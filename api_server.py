@@ -2,19 +2,25 @@ import os, hmac, hashlib, time, json
 from urllib.parse import parse_qsl
 from typing import Optional
 
-import aiohttp, httpx, uvicorn, psycopg2
+import aiohttp, uvicorn, psycopg2
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Path, Query, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 
 import registration as reg  # provides _conn() pooled connection (present in your repo)
+from utils import feed
+from utils import db_migration
+from utils import story_tray
+from utils import media_proxy
+from utils.metrics_registry import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # ---------- ENV ----------
 BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
 EXTERNAL_URL = (os.environ.get("EXTERNAL_URL") or "").rstrip("/")
 MEDIA_SINK_CHAT_ID = int(os.environ.get("MEDIA_SINK_CHAT_ID", "0"))
-PUBLIC_TTL_HOURS = int(os.environ.get("FEED_PUBLIC_TTL_HOURS", "72"))
+PUBLIC_TTL_HOURS = feed.TTL_HOURS
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # bearer token for /metrics; unset = local scrapes only
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN not set")
@@ -40,6 +46,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def _ensure_schema():
+    """Apply pending schema migrations (one query when current)."""
+    try:
+        for line in db_migration.migrate():
+            print(f"[migrate] {line}")
+        with reg._conn() as con:
+            get_or_create_official_story(con)
+    except Exception as e:
+        print(f"WARNING: schema check skipped: {e}")
+
 # Preflight ok for all API paths
 @app.options("/{rest_of_path:path}")
 async def options_ok(rest_of_path: str):
@@ -141,10 +158,7 @@ def ensure_user(conn, tg_user: dict):
     uname = tg_user.get("username") or f"user{uid}"
     with conn.cursor() as cur:
         # Skip table creation - rely on existing unified users table from bot database
-        # Ensure is_onboarded column exists in existing tables
-        cur.execute("""
-            ALTER TABLE users ADD COLUMN IF NOT EXISTS is_onboarded BOOLEAN NOT NULL DEFAULT FALSE
-        """)
+        # (is_onboarded column comes from the schema migrations, see utils/db_migration.py)
         # Only insert if user doesn't exist, don't update existing data
         cur.execute("""
             INSERT INTO users (tg_user_id, display_name, username)
@@ -167,32 +181,6 @@ def get_or_create_user_id(conn, tg_user: dict) -> int:
     return int(row[0])
 
 # ---------- Profiles helpers ----------
-def ensure_profiles_table(conn):
-    """
-    Create the profiles table and active_profile_id column on users if not present.
-    Each profile belongs to a Telegram user (via users.id).  A user can have
-    multiple profiles with unique usernames.  One profile per user may be marked as active.
-    NOTE: active_profile_id is a plain BIGINT (no FK) to avoid undefined-column errors.
-    """
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS profiles (
-                id BIGSERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                profile_name TEXT NOT NULL,
-                username TEXT UNIQUE NOT NULL,
-                bio TEXT,
-                avatar_url TEXT,
-                is_active BOOLEAN DEFAULT FALSE
-            )
-            """
-        )
-        cur.execute(
-            "ALTER TABLE users ADD COLUMN IF NOT EXISTS active_profile_id BIGINT"
-        )
-        conn.commit()
-
 def get_active_profile(conn, user_id: int):
     """
     Return the active profile (id, profile_name, username, bio, avatar_url, is_active)
@@ -210,8 +198,8 @@ def get_active_profile(conn, user_id: int):
 def create_notification(con, user_id: int, from_user_id: int, notif_type: str,
                         post_id: Optional[int] = None, comment_id: Optional[int] = None) -> None:
     """
-    Persist a notification record for the given recipient.  This helper ensures
-    the `notifications` table exists and inserts a new row.  A notification
+    Persist a notification record for the given recipient (the
+    `notifications` table is created by the schema migrations).  A notification
     describes an action (e.g. "follow", "post_like", "comment_like", "comment")
     performed by `from_user_id` on behalf of `user_id`.  Optionally include
     `post_id` and/or `comment_id` for context.  The `read` flag defaults to
@@ -223,24 +211,6 @@ def create_notification(con, user_id: int, from_user_id: int, notif_type: str,
                 f"DEBUG: Creating notification - user_id={user_id}, from_user_id={from_user_id}, "
                 f"type={notif_type}, post_id={post_id}, comment_id={comment_id}"
             )
-            # Ensure notifications table exists
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id BIGSERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    actor BIGINT REFERENCES users(id),
-                    ntype TEXT NOT NULL,
-                    post_id BIGINT REFERENCES feed_posts(id) ON DELETE CASCADE,
-                    comment_id BIGINT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    "read" BOOLEAN DEFAULT FALSE
-                )
-                """
-            )
-            # Add comment_id column if missing (legacy table migration)
-            cur.execute("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS comment_id BIGINT")
-            print("DEBUG: Notifications table created/verified")
             # Insert notification with comment_id included (may be NULL)
             cur.execute(
                 "INSERT INTO notifications (user_id, actor, ntype, post_id, comment_id) VALUES (%s, %s, %s, %s, %s)",
@@ -284,71 +254,110 @@ async def tg_upload_to_sink(file_bytes: bytes, filename: str, mime: str, caption
             data = json.loads(txt)
             return data["result"]["document"]["file_id"]
 
+MEDIA = media_proxy.TelegramMediaProxy(BOT_TOKEN)
+
+@app.on_event("shutdown")
+async def _close_media_client():
+    await MEDIA.aclose()
+
+@app.on_event("shutdown")
+def _flush_story_views():
+    story_tray.VIEWS.close()
+
 @app.get("/api/telefile/{file_id}")
-async def telefile(file_id: str):
+async def telefile(file_id: str, request: Request):
     """
-    Resolve a Telegram file by file_id and return its bytes.  A short timeout is
-    enforced to avoid long hangs.  Demo placeholder IDs such as "demo_avatar…"
-    return 404 so the client can show a local default avatar.  Network errors
-    are caught and logged.
+    Resolve a Telegram file by file_id and stream its bytes from the local
+    media cache (see utils/media_proxy.py).  Supports Range and
+    If-None-Match.  Demo placeholder IDs such as "demo_avatar…" return 404
+    so the client can show a local default avatar; upstream failures are
+    also reported as 404.
     """
     # Early exit for demo/placeholder avatars used during onboarding. These IDs
     # are not real Telegram file IDs and would cause external calls to time out.
     if file_id.startswith("demo_avatar"):
         raise HTTPException(404, "file not found")
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            # Request file metadata from Telegram
-            r = await client.get(
-                f"https://api.telegram.org/bot{BOT_TOKEN}/getFile",
-                params={"file_id": file_id},
-            )
-            if r.status_code != 200:
-                raise HTTPException(404, "file not found")
-            data = r.json()
-            if not data.get("ok"):
-                raise HTTPException(404, "file not found")
-            fp = data.get("result", {}).get("file_path")
-            if not fp:
-                raise HTTPException(404, "file not found")
-            # Download the actual file
-            fr = await client.get(f"https://api.telegram.org/file/bot{BOT_TOKEN}/{fp}")
-            if fr.status_code != 200:
-                raise HTTPException(404, "file stream error")
-            return Response(
-                content=fr.content,
-                media_type=fr.headers.get("content-type", "application/octet-stream"),
-                headers={"Cache-Control": "public, max-age=604800"},
-            )
-    except httpx.RequestError as exc:
-        # Log the network error and return 404 so clients show a fallback
-        print(f"telefile request error: {exc}")
+    for _ in range(2):
+        try:
+            entry = await MEDIA.get(file_id)
+        except media_proxy.MediaNotFound:
+            raise HTTPException(404, "file not found")
+        try:
+            f = open(entry.path, "rb")  # evicted between fetch and open: fetch again
+            break
+        except FileNotFoundError:
+            continue
+    else:
         raise HTTPException(404, "file not found")
 
+    headers = {
+        "Cache-Control": "public, max-age=604800",
+        "ETag": entry.etag,
+        "Accept-Ranges": "bytes",
+    }
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or entry.etag in [t.strip().removeprefix("W/") for t in inm.split(",")]):
+        f.close()
+        return Response(status_code=304, headers=headers)
+    try:
+        rng = media_proxy.parse_range(request.headers.get("range"), entry.size)
+    except ValueError:
+        f.close()
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{entry.size}"})
+    start, end = rng if rng else (0, entry.size - 1)
+    if rng:
+        headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        media_proxy.iter_file(f, start, end - start + 1),
+        status_code=206 if rng else 200,
+        media_type=entry.content_type,
+        headers=headers,
+    )
+
 # ---------- Basic ----------
 @app.get("/api/health")
 async def health(): return {"ok": True}
 
+# ---------- Metrics ----------
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "API requests", ["route", "method", "status"])
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_ms", "API request latency", ["route", "method"])
+
+@app.middleware("http")
+async def _record_request(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.labels(path, request.method, status).inc()
+        HTTP_LATENCY.labels(path, request.method).observe((time.perf_counter() - t0) * 1000)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition of utils.metrics_registry.REGISTRY."""
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            raise HTTPException(401, "unauthorized")
+    else:
+        # no token: only a scraper on this host (a proxied request carries X-Forwarded-For)
+        host = request.client.host if request.client else ""
+        if host not in ("127.0.0.1", "::1") or "x-forwarded-for" in request.headers:
+            raise HTTPException(403, "set METRICS_TOKEN to scrape /metrics remotely")
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # ---------- Me & Onboarding ----------
 @app.get("/api/me")
 async def me(user=Depends(get_user)):
     with reg._conn() as con:
         # Don't call ensure_user to avoid overwriting existing data
         with con.cursor() as cur:
-            # Ensure user_follows table exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_follows (
-                    follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (follower_id, followee_id)
-                )
-            """)
-
-            # Ensure newer optional columns exist before selecting them.  These
-            # columns may be added lazily by other endpoints (e.g. profile update).
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT")
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS gender TEXT")
             # Select the logged‑in user's record.  Include bio and gender so the
             # front‑end can show updated profile information after editing.  We
             # coalesce bio to an empty string to avoid returning null in JSON.
@@ -468,16 +477,6 @@ async def get_user_profile(user_id: int, _=Depends(get_user)):
     """
     current_user = _
     with reg._conn() as con, con.cursor() as cur:
-        # Ensure user_follows table exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_follows (
-                follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                PRIMARY KEY (follower_id, followee_id)
-            )
-        """)
-
         # Try internal ID first, then try Telegram user ID if not found
         cur.execute("SELECT id, display_name, username, avatar_url, COALESCE(age,0), COALESCE(bio,'') FROM users WHERE id=%s OR tg_user_id=%s", (user_id, user_id))
         r = cur.fetchone()
@@ -569,12 +568,6 @@ async def get_user_posts(
         # Identify the caller (current user) from the dependency
         current_user_id = get_or_create_user_id(con, _) if _ else None
 
-        # Ensure the feed_posts.profile_id column exists (for legacy DBs)
-        with con.cursor() as cur:
-            cur.execute(
-                "ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT"
-            )
-
         # If the caller is requesting their own posts and has an active profile,
         # serve posts for that active profile rather than base posts.
         active_profile_id = None
@@ -667,7 +660,6 @@ async def create_post(
     media_type: str = Form("auto")
 ):
     with reg._conn() as con:
-        ensure_profiles_table(con)
         internal_uid = get_or_create_user_id(con, user)
 
         # Get active profile ID if any - this determines which profile created the post
@@ -694,23 +686,6 @@ async def create_post(
                 ctype = media_type
 
         with con.cursor() as cur:
-            # ensure posts table with profile_id column
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS feed_posts (
-                  id BIGSERIAL PRIMARY KEY,
-                  author_id BIGINT NOT NULL,
-                  profile_id BIGINT,
-                  created_at TIMESTAMPTZ DEFAULT NOW(),
-                  content_type TEXT,
-                  file_id TEXT,
-                  text TEXT,
-                  reaction_count INT DEFAULT 0,
-                  comment_count INT DEFAULT 0
-                )
-            """)
-            # Add profile_id column if it doesn't exist
-            cur.execute("ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT")
-
             # Insert post with the profile that created it
             cur.execute("""
                 INSERT INTO feed_posts (author_id, profile_id, content_type, file_id, text)
@@ -718,6 +693,8 @@ async def create_post(
                 RETURNING id, created_at
             """, (author_id, active_profile_id, ctype, file_id, caption))
             row = cur.fetchone()
+            feed.record_engagement(cur, row[0], feed.W_POST, engaged=False)
+            feed.fan_out_post(cur, row[0], author_id, row[1])
             con.commit()
 
     post = {
@@ -847,7 +824,6 @@ async def delete_post(post_id: int, request: Request):
     user = await get_user(request)
     with reg._conn() as con:
         uid = get_or_create_user_id(con, user)
-        ensure_profiles_table(con)
         with con.cursor() as cur:
             # Fetch the post's author_id and profile_id to determine ownership
             cur.execute("SELECT author_id, profile_id FROM feed_posts WHERE id=%s", (post_id,))
@@ -882,7 +858,6 @@ async def update_post_caption(post_id: int, request: Request, caption: str = For
     user = await get_user(request)
     with reg._conn() as con:
         uid = get_or_create_user_id(con, user)
-        ensure_profiles_table(con)
         with con.cursor() as cur:
             # Fetch the post's author_id and profile_id to determine ownership
             cur.execute("SELECT author_id, profile_id FROM feed_posts WHERE id=%s", (post_id,))
@@ -915,32 +890,28 @@ async def like_post(post_id: int, request: Request, action: str = Form("add")):
     with reg._conn() as con:
         uid = get_or_create_user_id(con, user)
         with con.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS post_likes (
-                  post_id BIGINT REFERENCES feed_posts(id) ON DELETE CASCADE,
-                  user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
-                  created_at TIMESTAMPTZ DEFAULT NOW(),
-                  PRIMARY KEY (post_id, user_id)
-                )
-            """)
             if action == "remove":
-                cur.execute("DELETE FROM post_likes WHERE post_id=%s AND user_id=%s", (post_id, uid))
+                cur.execute("DELETE FROM post_likes WHERE post_id=%s AND user_id=%s RETURNING created_at", (post_id, uid))
+                unliked = cur.fetchone()
                 liked_action = False
             else:
                 cur.execute("INSERT INTO post_likes (post_id, user_id) VALUES (%s,%s) ON CONFLICT DO NOTHING", (post_id, uid))
+                unliked = None
                 liked_action = cur.rowcount > 0
-                print(f"DEBUG: INSERT like - post_id={post_id}, uid={uid}, rowcount={cur.rowcount}, liked_action={liked_action}")
             cur.execute("UPDATE feed_posts SET reaction_count=(SELECT COUNT(*) FROM post_likes WHERE post_id=%s) WHERE id=%s", (post_id, post_id))
+            if liked_action:
+                feed.record_engagement(cur, post_id, feed.W_LIKE)
+            elif unliked and unliked[0] is not None:
+                # take back exactly what the like added, so like/unlike can't pump waves
+                feed.retract_engagement(cur, post_id, feed.W_LIKE, unliked[0])
             # Determine post owner
             post_owner_id = None
             cur.execute("SELECT author_id FROM feed_posts WHERE id=%s", (post_id,))
             post_row = cur.fetchone()
             if post_row:
                 post_owner_id = post_row[0]
-            print(f"DEBUG: Post owner check - post_id={post_id}, post_owner_id={post_owner_id}, uid={uid}")
             con.commit()
             # Notify the post owner if a new like (and liker isn't the owner)
-            print(f"DEBUG: Notification condition check - liked_action={liked_action}, post_owner_id={post_owner_id}, same_user={post_owner_id == uid}")
             if liked_action and post_owner_id and post_owner_id != uid:
                 try:
                     create_notification(con, post_owner_id, uid, "post_like", post_id=post_id, comment_id=None)
@@ -957,16 +928,6 @@ async def report_post(post_id: int, reason: str = Form(...), user=Depends(get_us
     to the reporting user's internal ID but is otherwise not surfaced publicly.
     """
     with reg._conn() as con, con.cursor() as cur:
-        # Ensure the reports table exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS post_reports (
-                id         BIGSERIAL PRIMARY KEY,
-                post_id    BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
-                user_id    BIGINT NOT NULL REFERENCES users(id)     ON DELETE CASCADE,
-                reason     TEXT NOT NULL,
-                created_at TIMESTAMPTZ DEFAULT NOW()
-            )
-        """)
         # Persist the report
         reporter_id = get_or_create_user_id(con, user)
         cur.execute(
@@ -981,28 +942,6 @@ async def report_post(post_id: int, reason: str = Form(...), user=Depends(get_us
 async def get_comments(post_id: int, _=Depends(get_user), limit: int = Query(20, ge=1, le=50), cursor: Optional[str] = Query(None)):
     """Get comments for a post with pagination"""
     with reg._conn() as con, con.cursor() as cur:
-        # Ensure comments table exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS comments (
-                id BIGSERIAL PRIMARY KEY,
-                post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
-                user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                text TEXT NOT NULL,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                is_pinned BOOLEAN DEFAULT FALSE,
-                like_count INT DEFAULT 0,
-                profile_id BIGINT
-            )
-        """)
-        # Ensure created_at column is timezone-aware for existing tables
-        cur.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW()")
-        # Ensure the is_pinned column exists for legacy schemas that used `pinned`
-        cur.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS is_pinned BOOLEAN DEFAULT FALSE")
-        # Ensure the like_count column exists; some legacy schemas may miss it
-        cur.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS like_count INT DEFAULT 0")
-        # Add profile_id column if it doesn't exist (migration)
-        cur.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS profile_id BIGINT")
-
         # Build cursor condition
         cursor_condition = ""
         params = [post_id, limit]
@@ -1090,28 +1029,11 @@ async def add_comment(post_id: int, request: Request, text: str = Form(...)):
         uid = get_or_create_user_id(con, user)
 
         # Use active sub-profile if available
-        ensure_profiles_table(con)
         active_profile = get_active_profile(con, uid)
         comment_author_id = uid  # always base user
         comment_profile_id = active_profile[0] if active_profile else None
 
         with con.cursor() as cur:
-            # Ensure comments table exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS comments (
-                    id BIGSERIAL PRIMARY KEY,
-                    post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
-                    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    text TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    is_pinned BOOLEAN DEFAULT FALSE,
-                    like_count INT DEFAULT 0,
-                    profile_id BIGINT
-                )
-            """)
-            # Add profile_id column if it doesn't exist (migration)
-            cur.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS profile_id BIGINT")
-
             # Insert comment
             cur.execute(
                 """
@@ -1125,6 +1047,7 @@ async def add_comment(post_id: int, request: Request, text: str = Form(...)):
 
             # Update comment count on post
             cur.execute("UPDATE feed_posts SET comment_count=(SELECT COUNT(*) FROM comments WHERE post_id=%s) WHERE id=%s", (post_id, post_id))
+            feed.record_engagement(cur, post_id, feed.W_COMMENT)
 
             # Get post owner for notification
             cur.execute("SELECT author_id FROM feed_posts WHERE id=%s", (post_id,))
@@ -1164,17 +1087,6 @@ async def like_comment(comment_id: int, request: Request, action: str = Form("ad
     with reg._conn() as con:
         uid = get_or_create_user_id(con, user)
         with con.cursor() as cur:
-            # Ensure comment_likes table exists
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS comment_likes (
-                    comment_id BIGINT REFERENCES comments(id) ON DELETE CASCADE,
-                    user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (comment_id, user_id)
-                )
-                """
-            )
             # Toggle like/unlike
             if action == "remove":
                 cur.execute("DELETE FROM comment_likes WHERE comment_id=%s AND user_id=%s", (comment_id, uid))
@@ -1190,6 +1102,8 @@ async def like_comment(comment_id: int, request: Request, action: str = Form("ad
                 "UPDATE comments SET like_count=(SELECT COUNT(*) FROM comment_likes WHERE comment_id=%s) WHERE id=%s",
                 (comment_id, comment_id)
             )
+            if liked:
+                feed.record_comment_engagement(cur, comment_id, feed.W_COMMENT_LIKE)
             # Fetch comment owner to notify (if liker is different)
             cur.execute("SELECT user_id FROM comments WHERE id=%s", (comment_id,))
             row = cur.fetchone()
@@ -1223,205 +1137,43 @@ async def get_feed(
     - fresh: Latest posts from others (default)
     - waves: Posts with recent engagement/activity
     - following: Posts from users the current user follows
-    """
-    hours = PUBLIC_TTL_HOURS
 
-    with reg._conn() as con, con.cursor() as cur:
-        if tab == "waves":
-            # WAVES: Posts with recent engagement (comments/likes in last 24h)
-            # Focus on posts that have community interaction
-            cur.execute(f"""
-              SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
-                     p.reaction_count, p.comment_count,
-                     GREATEST(
-                       p.created_at,
-                       COALESCE(MAX(c.created_at), p.created_at),
-                       COALESCE(MAX(pl.created_at), p.created_at)
-                     ) AS last_engaged_at
-                FROM feed_posts p
-                LEFT JOIN comments c ON c.post_id = p.id AND c.created_at > NOW() - INTERVAL '24 hours'
-                LEFT JOIN post_likes pl ON pl.post_id = p.id AND pl.created_at > NOW() - INTERVAL '24 hours'
-               WHERE p.created_at > NOW() - INTERVAL '{hours} hours'
-                 AND (
-                       c.id IS NOT NULL
-                    OR pl.post_id IS NOT NULL
-                    OR p.reaction_count > 0
-                    OR p.comment_count > 0
-                 )
-               GROUP BY p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text, p.reaction_count, p.comment_count
-               ORDER BY last_engaged_at DESC
-               LIMIT %s
-            """, (limit,))
-        elif tab == "following":
-            # FOLLOWING: Posts from users the current user follows
-            current_user_id = get_or_create_user_id(con, user)
-            cur.execute(f"""
-              SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
-                     p.reaction_count, p.comment_count
-                FROM feed_posts p
-                JOIN user_follows uf ON p.author_id = uf.followee_id
-               WHERE uf.follower_id = %s
-                 AND p.created_at > NOW() - INTERVAL '{hours} hours'
-               ORDER BY p.created_at DESC
-               LIMIT %s
-            """, (current_user_id, limit))
-        else:  # fresh (default)
-            # FRESH: Latest posts from OTHERS (exclude your own posts)
-            current_user_id = get_or_create_user_id(con, user)
-            cur.execute(f"""
-              SELECT id, author_id, profile_id, created_at, content_type, file_id, text, reaction_count, comment_count
-                FROM feed_posts
-               WHERE created_at > NOW() - INTERVAL '{hours} hours'
-                 AND author_id != %s
-               ORDER BY created_at DESC LIMIT %s
-            """, (current_user_id, limit))
-        rows = cur.fetchall()
-
-        # Determine the current user's internal ID.
-        current_user_id = get_or_create_user_id(con, user)
-
-        # Compute which of these posts the current user has liked.
-        post_ids = [r[0] for r in rows]
-        liked_set = set()
-        if post_ids:
-            cur.execute(
-                "SELECT post_id FROM post_likes "
-                "WHERE user_id = %s AND post_id = ANY(%s)",
-                (current_user_id, post_ids)
-            )
-            liked_set = {pid for (pid,) in cur.fetchall()}
-
-        # Ensure profile_id column exists for all queries
-        cur.execute("ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT")
-
-        # Re-fetch rows with profile_id included if tab is 'waves'
-        if tab == "waves":
-            cur.execute(f"""
-              SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
-                     p.reaction_count, p.comment_count,
-                     GREATEST(
-                       p.created_at,
-                       COALESCE(MAX(c.created_at), p.created_at),
-                       COALESCE(MAX(pl.created_at), p.created_at)
-                     ) AS last_engaged_at
-                FROM feed_posts p
-                LEFT JOIN comments c ON c.post_id = p.id AND c.created_at > NOW() - INTERVAL '24 hours'
-                LEFT JOIN post_likes pl ON pl.post_id = p.id AND pl.created_at > NOW() - INTERVAL '24 hours'
-               WHERE p.created_at > NOW() - INTERVAL '{hours} hours'
-                 AND (
-                       c.id IS NOT NULL
-                    OR pl.post_id IS NOT NULL
-                    OR p.reaction_count > 0
-                    OR p.comment_count > 0
-                 )
-               GROUP BY p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text, p.reaction_count, p.comment_count
-               ORDER BY last_engaged_at DESC
-               LIMIT %s
-            """, (limit,))
-        else:  # fresh or following
-            cur.execute(f"""
-              SELECT id, author_id, profile_id, created_at, content_type, file_id, text, reaction_count, comment_count
-                FROM feed_posts
-               WHERE created_at > NOW() - INTERVAL '{hours} hours'
-                 AND author_id != %s
-               ORDER BY created_at DESC LIMIT %s
-            """, (current_user_id, limit))
-        rows = cur.fetchall()
-
-        # Fetch author details for both users and profiles
-        author_ids = list({r[1] for r in rows})  # author_id
-        profile_ids = list({r[2] for r in rows if r[2] is not None})  # profile_id
-        authors: dict[int, dict] = {}
-
-        if author_ids:
-            # Fetch base user names
-            cur.execute(
-                """
-                SELECT id, tg_user_id,
-                       COALESCE(
-                           NULLIF(display_name, ''),
-                           NULLIF(username, ''),
-                           NULLIF(feed_username, ''),
-                           'User' || tg_user_id
-                       ) AS name
-                  FROM users
-                 WHERE id = ANY(%s)
-                """,
-                (author_ids,),
-            )
-            for (rid, tgid, name) in cur.fetchall():
-                authors[rid] = {"name": name, "tg_user_id": tgid}
-
-        # Fetch profile names and map to their owners' tg_user_id
-        profile_authors: dict[int, dict] = {}
-        if profile_ids:
-            cur.execute(
-                """
-                SELECT p.id, u.tg_user_id,
-                       COALESCE(
-                           NULLIF(p.profile_name, ''),
-                           NULLIF(p.username, ''),
-                           'Profile' || p.id
-                       ) AS name
-                  FROM profiles p
-                  JOIN users u ON p.user_id = u.id
-                 WHERE p.id = ANY(%s)
-                """,
-                (profile_ids,),
+    One ranked query per request (see utils/feed.py); pass the returned
+    next_cursor back as ?cursor= to get the following page.
+    """
+    if tab not in feed.TABS:
+        tab = "fresh"
+    try:
+        with reg._conn() as con, con.cursor() as cur:
+            rows, next_cursor = feed.fetch_feed_page(
+                cur, int(user["id"]), tab, limit, cursor, PUBLIC_TTL_HOURS
             )
-            for (pid, tgid, name) in cur.fetchall():
-                profile_authors[pid] = {"name": name, "tg_user_id": tgid}
-
-        # Local helper for media URLs—falls back if media_proxy_url is undefined
-        def _media_proxy(file_id: str | None) -> str | None:
-            if not file_id:
-                return None
-            try:
-                return media_proxy_url(file_id)
-            except Exception:
-                base = EXTERNAL_URL or ""
-                return f"{base}/api/telefile/{file_id}"
-
-        items = []
-        for r in rows:
-            post_id, author_id, profile_id = r[0], r[1], r[2]
-            liked_flag = post_id in liked_set
-
-            # Determine author name: use profile name if profile_id exists, otherwise base user name
-            author_name = "Anonymous"
-            tg_uid = None
-
-            if profile_id and profile_id in profile_authors:
-                # Post was made by a sub-profile
-                profile_info = profile_authors[profile_id]
-                author_name = profile_info.get("name", "Anonymous")
-                # Get the tg_user_id from the base user who owns this profile
-                base_user_info = authors.get(author_id)
-                tg_uid = base_user_info.get("tg_user_id") if base_user_info else None
-            elif author_id in authors:
-                # Post was made by base user
-                author_info = authors[author_id]
-                author_name = author_info.get("name", "Anonymous")
-                tg_uid = author_info.get("tg_user_id")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
-            items.append({
-                "id": post_id,
-                "author_id": author_id,
-                "profile_id": profile_id,
-                "created_at": r[3].isoformat(),
-                "type": r[4] or "text",
-                "media_url": _media_proxy(r[5]),
-                "caption": r[6] or "",
-                "counts": {"likes": r[7] or 0, "comments": r[8] or 0},
-                "liked": liked_flag,
-                "author_name": author_name,
-                "author": {
-                    "name": author_name,
-                    "tg_user_id": tg_uid
-                }
-            })
+    items = []
+    for (post_id, author_id, profile_id, created_at, ctype, file_id, text,
+         likes, comments, _rank, author_name, tg_uid, profile_name, liked) in rows:
+        # Sub-profile posts show the profile name; the tg id is always the owner's
+        name = profile_name or author_name or "Anonymous"
+        items.append({
+            "id": post_id,
+            "author_id": author_id,
+            "profile_id": profile_id,
+            "created_at": created_at.isoformat(),
+            "type": ctype or "text",
+            "media_url": _media_proxy(file_id),
+            "caption": text or "",
+            "counts": {"likes": likes or 0, "comments": comments or 0},
+            "liked": bool(liked),
+            "author_name": name,
+            "author": {
+                "name": name,
+                "tg_user_id": tg_uid
+            }
+        })
 
-    return {"ok": True, "items": items}
+    return {"ok": True, "items": items, "next_cursor": next_cursor}
 
 # ---------- Follow / Unfollow ----------
 @app.post("/api/follow/{user_id}")
@@ -1442,26 +1194,21 @@ async def toggle_follow(user_id: int, request: Request):
             followee_id = row[0]
             if followee_id == follower_id:
                 raise HTTPException(status_code=400, detail="Cannot follow yourself")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_follows (
-                    follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (follower_id, followee_id)
-                )
-            """)
             cur.execute("SELECT 1 FROM user_follows WHERE follower_id=%s AND followee_id=%s",
                         (follower_id, followee_id))
             is_following = bool(cur.fetchone())
             if is_following:
                 cur.execute("DELETE FROM user_follows WHERE follower_id=%s AND followee_id=%s", (follower_id, followee_id))
+                feed.prune_timeline(cur, follower_id, followee_id)
                 action = "unfollowed"
                 following = False
             else:
                 cur.execute("INSERT INTO user_follows (follower_id, followee_id) VALUES (%s,%s) ON CONFLICT DO NOTHING", (follower_id, followee_id))
+                feed.backfill_timeline(cur, follower_id, followee_id, PUBLIC_TTL_HOURS)
                 action = "followed"
                 following = True
             con.commit()
+            story_tray.invalidate_viewer(int(current_user["id"]))
             # Notify the followee when a new follow occurs
             if not is_following and following and followee_id != follower_id:
                 try:
@@ -1489,14 +1236,6 @@ async def toggle_mute(user_id: int, request: Request):
             muted_id = row[0]
             if muted_id == muter_id:
                 raise HTTPException(status_code=400, detail="Cannot mute yourself")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_mutes (
-                    muter_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    muted_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (muter_id, muted_id)
-                )
-            """)
             cur.execute("SELECT 1 FROM user_mutes WHERE muter_id=%s AND muted_id=%s", (muter_id, muted_id))
             is_muted = bool(cur.fetchone())
             if is_muted:
@@ -1529,14 +1268,6 @@ async def toggle_block(user_id: int, request: Request):
             blocked_id = row[0]
             if blocked_id == blocker_id:
                 raise HTTPException(status_code=400, detail="Cannot block yourself")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_blocks (
-                    blocker_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    blocked_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (blocker_id, blocked_id)
-                )
-            """)
             cur.execute("SELECT 1 FROM user_blocks WHERE blocker_id=%s AND blocked_id=%s", (blocker_id, blocked_id))
             is_blocked = bool(cur.fetchone())
             if is_blocked:
@@ -1551,9 +1282,13 @@ async def toggle_block(user_id: int, request: Request):
                     WHERE (follower_id=%s AND followee_id=%s)
                        OR (follower_id=%s AND followee_id=%s)
                 """, (blocker_id, blocked_id, blocked_id, blocker_id))
+                feed.prune_timeline(cur, blocker_id, blocked_id)
+                feed.prune_timeline(cur, blocked_id, blocker_id)
                 action = "blocked"
                 blocked = True
             con.commit()
+            story_tray.invalidate_viewer(int(current_user["id"]))
+            story_tray.invalidate_author(blocker_id)
     return {"ok": True, "action": action, "blocked": blocked}
 
 # ---------- Report User ----------
@@ -1576,15 +1311,6 @@ async def report_user(user_id: int, request: Request, reason: str = Form(...)):
             reported_id = row[0]
             if reported_id == reporter_id:
                 raise HTTPException(status_code=400, detail="Cannot report yourself")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_reports (
-                    id BIGSERIAL PRIMARY KEY,
-                    reporter_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    reported_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    reason TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                )
-            """)
             cur.execute("INSERT INTO user_reports (reporter_id, reported_id, reason) VALUES (%s,%s,%s)",
                         (reporter_id, reported_id, reason.strip()))
             con.commit()
@@ -1615,7 +1341,6 @@ async def update_avatar(
     with reg._conn() as con:
         uid = get_or_create_user_id(con, current_user)
         with con.cursor() as cur:
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT")
             cur.execute("UPDATE users SET avatar_url=%s WHERE id=%s", (avatar_url, uid))
             con.commit()
     return {"ok": True, "avatar_url": avatar_url}
@@ -1635,15 +1360,6 @@ async def get_user_followers(
         if not row:
             raise HTTPException(status_code=404, detail="User not found")
         target_id = row[0]
-        # Ensure the follows table exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_follows (
-                follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                PRIMARY KEY (follower_id, followee_id)
-            )
-        """)
         # Get the current logged in user
         current_user_internal_id = get_or_create_user_id(con, user)
         # Pagination: filter by cursor if supplied
@@ -1701,14 +1417,6 @@ async def get_user_following(
         if not row:
             raise HTTPException(status_code=404, detail="User not found")
         target_id = row[0]
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_follows (
-                follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                PRIMARY KEY (follower_id, followee_id)
-            )
-        """)
         current_user_internal_id = get_or_create_user_id(con, user)
         if cursor:
             cur.execute(
@@ -1781,10 +1489,6 @@ async def update_profile(
     with reg._conn() as con:
         uid = get_or_create_user_id(con, current_user)
         with con.cursor() as cur:
-            # Ensure optional columns exist
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT")
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS gender TEXT")
-
             # Prevent collisions with other users
             cur.execute("SELECT id FROM users WHERE username=%s AND id<>%s", (username, uid))
             if cur.fetchone():
@@ -1828,7 +1532,6 @@ async def update_subprofile(
 
     current_user = await get_user(request)
     with reg._conn() as con:
-        ensure_profiles_table(con)
         uid = get_or_create_user_id(con, current_user)
         with con.cursor() as cur:
             # Verify profile exists and belongs to this user
@@ -1866,15 +1569,8 @@ async def list_profiles(user=Depends(get_user)):
     Return all sub‑profiles AND the base user.  The base user appears with id=0.
     """
     with reg._conn() as con:
-        ensure_profiles_table(con)
         uid = get_or_create_user_id(con, user)
         with con.cursor() as cur:
-            # Ensure optional columns exist on the users table.  Without
-            # pre‑creating the bio column, selecting it below would result in an
-            # undefined‑column error on fresh databases.  These migrations are
-            # idempotent so calling them repeatedly is safe.
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT")
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS gender TEXT")
             # fetch sub-profiles
             cur.execute(
                 "SELECT id, profile_name, username, bio, avatar_url, is_active "
@@ -1927,7 +1623,6 @@ async def create_profile(request: Request, user=Depends(get_user)):
         raise HTTPException(400, "profile_name and username are required")
     avatar_url = media_proxy_url(avatar_file_id) if avatar_file_id else None
     with reg._conn() as con:
-        ensure_profiles_table(con)
         uid = get_or_create_user_id(con, user)
         with con.cursor() as cur:
             # Enforce unique usernames across profiles
@@ -1971,7 +1666,6 @@ async def switch_profile(request: Request, user=Depends(get_user)):
     except Exception:
         raise HTTPException(400, "Invalid profile_id")
     with reg._conn() as con:
-        ensure_profiles_table(con)
         uid = get_or_create_user_id(con, user)
         with con.cursor() as cur:
             if profile_id == 0:
@@ -1999,7 +1693,6 @@ async def get_profile(profile_id: int, user=Depends(get_user)):
     Return a single sub‑profile's details with follow status.
     """
     with reg._conn() as con:
-        ensure_profiles_table(con)
         follower_id = get_or_create_user_id(con, user)
         with con.cursor() as cur:
             cur.execute(
@@ -2081,16 +1774,12 @@ async def get_profile_posts(
     Return posts created by a specific sub-profile.
     """
     with reg._conn() as con:
-        ensure_profiles_table(con)
         with con.cursor() as cur:
             # Verify profile exists
             cur.execute("SELECT user_id FROM profiles WHERE id=%s", (profile_id,))
             if not cur.fetchone():
                 raise HTTPException(404, "Profile not found")
 
-            # Ensure profile_id column exists
-            cur.execute("ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT")
-
             # Build cursor-based pagination query
             cursor_condition = ""
             params = [profile_id, limit]
@@ -2217,52 +1906,6 @@ async def get_notifications(
 
 
 
-# --- Story Tables ------------------------------------------------------------------
-
-def ensure_stories_tables(con):
-    """
-    Ensure the tables needed for stories exist and match your current DB schema.
-    Uses 'kind' and 'author_id' (not 'type' or 'profile_id') to avoid UndefinedColumn errors.
-    """
-    with con.cursor() as cur:
-        # stories table based on your dump
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS stories (
-                id BIGSERIAL PRIMARY KEY,
-                author_id BIGINT,
-                kind TEXT NOT NULL,
-                text TEXT,
-                media_id TEXT,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                expires_at TIMESTAMPTZ DEFAULT NOW() + INTERVAL '24 hours'
-            )
-        """)
-        # story_segments table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS story_segments (
-                id BIGSERIAL PRIMARY KEY,
-                story_id BIGINT NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
-                segment_type TEXT,
-                content_type TEXT,
-                file_id TEXT,
-                text TEXT,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                user_id BIGINT,
-                profile_id BIGINT
-            )
-        """)
-        # story_views table (must contain user_id)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS story_views (
-                id BIGSERIAL PRIMARY KEY,
-                story_id BIGINT NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
-                user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                viewed_at TIMESTAMPTZ DEFAULT NOW(),
-                CONSTRAINT unique_story_view UNIQUE (story_id, user_id)
-            )
-        """)
-    con.commit()
-
 def get_or_create_user_story(con, user_id):
     """
     Return the active 'user' story id for this user, or create one if none exists.
@@ -2293,7 +1936,6 @@ def get_or_create_official_story(con) -> int:
     Returns the official story ID, creating it if missing.
     Uses the 'kind' column to identify official vs. user stories.
     """
-    ensure_stories_tables(con)
     with con.cursor() as cur:
         cur.execute("SELECT id FROM stories WHERE kind = 'official' LIMIT 1")
         row = cur.fetchone()
@@ -2323,7 +1965,6 @@ async def create_official_story_content(
     Admin-only: Update the LuvHive Official story content.
     """
     with reg._conn() as con:
-        ensure_stories_tables(con)
         story_id = get_or_create_official_story(con)
 
         file_id = None
@@ -2346,6 +1987,7 @@ async def create_official_story_content(
             created = cur.fetchone()[0]
 
         con.commit()
+        story_tray.invalidate_all()
         return {
             "ok": True,
             "story_id": story_id,
@@ -2372,7 +2014,6 @@ async def create_user_story(
     Reuses existing story within 24h or creates a new one.
     """
     with reg._conn() as con:
-        ensure_stories_tables(con)
         uid = get_or_create_user_id(con, user)
 
         # Upload file if present
@@ -2407,6 +2048,7 @@ async def create_user_story(
             segment_id, created = cur.fetchone()
 
         con.commit()
+        story_tray.invalidate_author(uid)
         return {
             "ok": True,
             "story_id": story_id,
@@ -2425,122 +2067,20 @@ async def list_stories(current=Depends(get_user)):
     Return all story circles visible to the current user:
     - The official LuvHive story (if any recent content)
     - Stories from users you follow or own (last 24h)
+    Batched in utils/story_tray.py and cached briefly per viewer.
     """
+    viewer_tg = int(current["id"])
+    cached = story_tray.cached_tray(viewer_tg)
+    if cached is not None:
+        return {"ok": True, "stories": cached}
+
     with reg._conn() as con:
-        ensure_stories_tables(con)
         uid = get_or_create_user_id(con, current)
-        results = []
-
         with con.cursor() as cur:
-            # Ensure user_follows table exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS user_follows (
-                    follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (follower_id, followee_id)
-                )
-            """)
+            results, authors = story_tray.build_tray(cur, uid, media_proxy_url)
 
-            # Get official story
-            official_id = get_or_create_official_story(con)
-
-            # Check if user has seen official story
-            seen_official = False
-            try:
-                cur.execute("SELECT 1 FROM story_views WHERE story_id=%s AND user_id=%s", (official_id, uid))
-                seen_official = bool(cur.fetchone())
-            except Exception:
-                con.rollback()
-                seen_official = False
-
-            # Get official story content (if any)
-            cur.execute("""
-                SELECT text, media_id, created_at FROM stories WHERE id=%s
-            """, (official_id,))
-            official_data = cur.fetchone()
-
-            if official_data and (official_data[0] or official_data[1]):  # Has content
-                results.append({
-                    "id": official_id, 
-                    "kind": "official", 
-                    "author_id": None,  # Official stories have NULL author_id
-                    "name": "LuvHive✨", 
-                    "avatar_url": "official_default",
-                    "text": official_data[0] or "",
-                    "media_url": media_proxy_url(official_data[1]) if official_data[1] else None,
-                    "created_at": official_data[2].isoformat() if official_data[2] else None,
-                    "seen": seen_official
-                })
-
-            # Get user stories from followed users and self
-            try:
-                cur.execute("SELECT followee_id FROM user_follows WHERE follower_id=%s", (uid,))
-                followed_user_ids = [r[0] for r in cur.fetchall()]
-                followed_user_ids.append(uid)  # Include own stories
-            except Exception:
-                con.rollback()
-                followed_user_ids = [uid]  # fallback to just current user
-
-            if followed_user_ids:
-                # Get recent user stories
-                cur.execute("""
-                    SELECT id, author_id, kind, text, media_id, created_at
-                    FROM stories
-                    WHERE kind='user' AND author_id = ANY(%s) AND expires_at > NOW()
-                    ORDER BY created_at DESC
-                """, (followed_user_ids,))
-
-                user_stories = cur.fetchall()
-
-                for story_id, author_id, kind, text, media_id, created_at in user_stories:
-                    # Check if current user has viewed this story
-                    viewed = False
-                    try:
-                        cur.execute("SELECT 1 FROM story_views WHERE story_id=%s AND user_id=%s", (story_id, uid))
-                        viewed = bool(cur.fetchone())
-                    except Exception:
-                        con.rollback()
-                        viewed = False
-
-                    # Get segments for this story
-                    cur.execute("""
-                        SELECT id, segment_type, content_type, file_id, text, created_at
-                        FROM story_segments
-                        WHERE story_id = %s
-                        ORDER BY created_at ASC
-                    """, (story_id,))
-                    segment_rows = cur.fetchall()
-
-                    segments = []
-                    for seg_row in segment_rows:
-                        seg_id, seg_type, content_type, file_id, seg_text, seg_created = seg_row
-                        segments.append({
-                            "id": seg_id,
-                            "segment_type": seg_type,
-                            "content_type": content_type,
-                            "media_url": media_proxy_url(file_id) if file_id else None,
-                            "text": seg_text or "",
-                            "created_at": seg_created.isoformat() if seg_created else None
-                        })
-
-                    # Get author name
-                    author_name = get_profile_name(author_id, con) if author_id else "Anonymous"
-
-                    results.append({
-                        "id": story_id,
-                        "kind": kind,
-                        "author_id": author_id,
-                        "name": author_name,
-                        "avatar_url": None,
-                        "text": text or "",
-                        "media_url": media_proxy_url(media_id) if media_id else None,
-                        "created_at": created_at.isoformat() if created_at else None,
-                        "seen": viewed,
-                        "segments": segments
-                    })
-
-        return {"ok": True, "stories": results}
+    story_tray.store_tray(viewer_tg, authors, results)
+    return {"ok": True, "stories": results}
 
 @app.get("/api/stories/{story_id}")
 async def get_story_details(story_id: int, user=Depends(get_user)):
@@ -2548,7 +2088,6 @@ async def get_story_details(story_id: int, user=Depends(get_user)):
     Fetch a story's details with segments and mark it as viewed by the current user.
     """
     with reg._conn() as con:
-        ensure_stories_tables(con)
         uid = get_or_create_user_id(con, user)
 
         with con.cursor() as cur:
@@ -2580,17 +2119,8 @@ async def get_story_details(story_id: int, user=Depends(get_user)):
                     "created_at": seg_created.isoformat() if seg_created else None
                 })
 
-            # Record view
-            try:
-                cur.execute("""
-                    INSERT INTO story_views (story_id, user_id)
-                    VALUES (%s, %s)
-                    ON CONFLICT (story_id, user_id) DO NOTHING
-                """, (story_id, uid))
-            except Exception:
-                con.rollback()
-
-        con.commit()
+        # Record view (batched, see utils/story_tray.py)
+        story_tray.record_view(story_id, uid, int(user["id"]))
         return {
             "ok": True, 
             "story": {
@@ -2611,24 +2141,10 @@ async def mark_story_viewed(story_id: int, user=Depends(get_user)):
     Record that the user has viewed the given story. Safe to call multiple times.
     """
     with reg._conn() as con:
-        ensure_stories_tables(con)
         uid = get_or_create_user_id(con, user)
-        with con.cursor() as cur:
-            try:
-                cur.execute("""
-                    INSERT INTO story_views (story_id, user_id)
-                    VALUES (%s, %s)
-                    ON CONFLICT (story_id, user_id) DO NOTHING
-                """, (story_id, uid))
-            except Exception:
-                # Fallback if constraint doesn't exist
-                con.rollback()
-                cur.execute("""
-                    INSERT INTO story_views (story_id, user_id)
-                    VALUES (%s, %s)
-                """, (story_id, uid))
-        con.commit()
-        return {"ok": True}
+    # Queued and written in batches with the other story views (utils/story_tray.py)
+    story_tray.record_view(story_id, uid, int(user["id"]))
+    return {"ok": True}
 
 
 
@@ -2648,7 +2164,6 @@ async def create_official_story_segment(
     if seg_type not in {"confession", "dare", "poll", "spotlight"}:
         raise HTTPException(400, "Invalid official segment type")
     with reg._conn() as con:
-        ensure_stories_tables(con)
         story_id = get_or_create_official_story(con)
         ctype = "text"
         file_id = None
@@ -2674,6 +2189,7 @@ async def create_official_story_segment(
             """, (story_id, seg_type, ctype, file_id, text or None, get_or_create_user_id(con, user)))
             seg_id, created = cur.fetchone()
         con.commit()
+        story_tray.invalidate_all()
         return {
             "ok": True,
             "story_id": story_id,
@@ -0,0 +1,89 @@
+# backend/migrations/V20261017.1__bot_baseline.py - Schema from the old ensure_*() calls
+"""
+Baseline for the tables the bot used to (re)create on every boot, in
+handler registration and on first use of a command. Each step is one of
+the existing ensure functions, all IF NOT EXISTS, so this is a no-op on a
+database that has been running the bot and builds a fresh one from
+scratch.
+
+The ensure functions stay in their modules as the definition of those
+tables, but nothing calls them outside this file any more; schema changes
+go in a new migration.
+
+Steps that fail are reported together and the migration is not recorded,
+so the whole baseline is retried on the next start.
+"""
+import registration as reg
+
+
+def _steps():
+    import chat
+    import profile as prof
+    from profile_metrics import ensure_metric_columns
+    from muc_schema import ensure_muc_tables
+    from handlers import (
+        posts_handlers, qa_handlers, poll_handlers, confession_roulette,
+        fantasy_match, fantasy_board, fantasy_requests, fantasy_relay,
+        fantasy_powerups, advanced_dare, naughty_wyr, blur_vault,
+        sensual_stories, after_dark,
+    )
+    from utils import broadcast
+    from utils.admin_audit import admin_audit
+    from utils.db_integrity import apply_missing_constraints
+
+    return [
+        reg.init_db,
+        reg.ensure_verification_columns,
+        reg.ensure_reports_table,
+        reg.ensure_ban_columns,
+        reg.ensure_feature_columns,
+        reg.ensure_questions_table,
+        reg.ensure_friend_requests_table,
+        reg.ensure_leaderboard_columns,
+        reg.ensure_profile_upgrade_columns,
+        reg.ensure_public_feed_columns,
+        reg.ensure_social_tables,
+        reg.ensure_secret_crush_table,
+        reg.ensure_blocked_users_table,
+        reg.ensure_age_pref_columns,
+        reg.ensure_forward_column,
+        posts_handlers.ensure_feed_posts_table,
+        reg.ensure_story_tables,
+        reg.ensure_confessions_table,
+        confession_roulette.ensure_confessions_table,
+        confession_roulette._ensure_conf_round_lock,
+        qa_handlers.ensure_qa_tables,
+        poll_handlers.ensure_poll_tables,
+        chat.init_db,
+        prof.init_profile_db,
+        ensure_metric_columns,
+        fantasy_match.ensure_fantasy_tables,
+        fantasy_board.ensure_fantasy_board_tables,
+        fantasy_requests.ensure_match_request_table,
+        fantasy_relay._ensure_relay_table,
+        fantasy_powerups.ensure_powerup_tables,
+        advanced_dare._ensure_dare_schema,
+        naughty_wyr._ensure_schema,
+        blur_vault.ensure_vault_tables,
+        sensual_stories.ensure_sensual_table,
+        after_dark.ensure_ad_tables,
+        ensure_muc_tables,
+        apply_missing_constraints,
+        broadcast.ensure_schema,
+        admin_audit._init_audit_table,
+    ]
+
+
+def migrate(con):
+    from utils import feed
+
+    failed = []
+    for step in _steps():
+        try:
+            step()
+        except Exception as e:
+            failed.append(f"{step.__module__}.{step.__name__}: {e}")
+    # feed tables and indexes (previously applied by the API at startup)
+    failed.extend(feed.ensure_feed_schema(con))
+    if failed:
+        raise RuntimeError(f"baseline steps failed: {failed}")
@@ -0,0 +1,216 @@
+-- Tables that used to be created (or altered) inside request handlers:
+-- api_server.py endpoints, moderation logging, confession mutes, payments,
+-- user deletion and maintenance. Everything is IF NOT EXISTS so this is a
+-- no-op on databases where those handlers already ran.
+
+-- Profiles (api_server ensure_profiles_table)
+CREATE TABLE IF NOT EXISTS profiles (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    profile_name TEXT NOT NULL,
+    username TEXT UNIQUE NOT NULL,
+    bio TEXT,
+    avatar_url TEXT,
+    is_active BOOLEAN DEFAULT FALSE
+);
+-- plain BIGINT (no FK) to avoid undefined-column errors
+ALTER TABLE users ADD COLUMN IF NOT EXISTS active_profile_id BIGINT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS gender TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT;
+
+-- Posts
+CREATE TABLE IF NOT EXISTS feed_posts (
+    id BIGSERIAL PRIMARY KEY,
+    author_id BIGINT NOT NULL,
+    profile_id BIGINT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    content_type TEXT,
+    file_id TEXT,
+    text TEXT,
+    reaction_count INT DEFAULT 0,
+    comment_count INT DEFAULT 0
+);
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT;
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS content_type TEXT;
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS file_id TEXT;
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS reaction_count INT DEFAULT 0;
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS comment_count INT DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS post_likes (
+    post_id BIGINT REFERENCES feed_posts(id) ON DELETE CASCADE,
+    user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (post_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS post_reports (
+    id BIGSERIAL PRIMARY KEY,
+    post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    reason TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Comments
+CREATE TABLE IF NOT EXISTS comments (
+    id BIGSERIAL PRIMARY KEY,
+    post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    text TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    is_pinned BOOLEAN DEFAULT FALSE,
+    like_count INT DEFAULT 0,
+    profile_id BIGINT
+);
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS is_pinned BOOLEAN DEFAULT FALSE;
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS like_count INT DEFAULT 0;
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS profile_id BIGINT;
+
+CREATE TABLE IF NOT EXISTS comment_likes (
+    comment_id BIGINT NOT NULL REFERENCES comments(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (comment_id, user_id)
+);
+
+-- Notifications
+CREATE TABLE IF NOT EXISTS notifications (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
+    actor BIGINT REFERENCES users(id),
+    ntype TEXT NOT NULL,
+    post_id BIGINT REFERENCES feed_posts(id) ON DELETE CASCADE,
+    comment_id BIGINT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    "read" BOOLEAN DEFAULT FALSE
+);
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS comment_id BIGINT NULL;
+
+-- Follow / mute / block / report
+CREATE TABLE IF NOT EXISTS user_follows (
+    follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (follower_id, followee_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_mutes (
+    muter_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    muted_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (muter_id, muted_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_blocks (
+    blocker_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    blocked_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (blocker_id, blocked_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_reports (
+    id BIGSERIAL PRIMARY KEY,
+    reporter_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    reported_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    reason TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Stories (api_server ensure_stories_tables): 'kind' and 'author_id',
+-- not 'type' or 'profile_id'
+CREATE TABLE IF NOT EXISTS stories (
+    id BIGSERIAL PRIMARY KEY,
+    author_id BIGINT,
+    kind TEXT NOT NULL,
+    text TEXT,
+    media_id TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ DEFAULT NOW() + INTERVAL '24 hours'
+);
+
+CREATE TABLE IF NOT EXISTS story_segments (
+    id BIGSERIAL PRIMARY KEY,
+    story_id BIGINT NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
+    segment_type TEXT,
+    content_type TEXT,
+    file_id TEXT,
+    text TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    user_id BIGINT,
+    profile_id BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS story_views (
+    id BIGSERIAL PRIMARY KEY,
+    story_id BIGINT NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    viewed_at TIMESTAMPTZ DEFAULT NOW(),
+    CONSTRAINT unique_story_view UNIQUE (story_id, user_id)
+);
+
+-- Moderation log (content_moderation._log_moderation_event)
+CREATE TABLE IF NOT EXISTS moderation_events (
+    id BIGSERIAL PRIMARY KEY,
+    tg_user_id BIGINT,
+    kind TEXT NOT NULL,
+    token TEXT NOT NULL,
+    sample TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Confession mutes (confession_roulette.conf_mute)
+CREATE TABLE IF NOT EXISTS confession_mutes (
+    user_id BIGINT NOT NULL,
+    confession_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, confession_id)
+);
+
+-- User deletion queue (user_deletion.schedule_user_deletion)
+CREATE TABLE IF NOT EXISTS user_deletion_queue (
+    id BIGSERIAL PRIMARY KEY,
+    tg_user_id BIGINT NOT NULL,
+    scheduled_by BIGINT,  -- Admin ID who scheduled
+    reason TEXT,
+    scheduled_at TIMESTAMPTZ DEFAULT NOW(),
+    deletion_date TIMESTAMPTZ DEFAULT NOW() + INTERVAL '7 days',
+    status TEXT DEFAULT 'scheduled',  -- scheduled, cancelled, completed
+    metadata JSONB
+);
+
+-- Payments (payment_safety.create_payment_record). The indexes used to be
+-- built CONCURRENTLY per payment; here they run once, inside the migration.
+CREATE TABLE IF NOT EXISTS payments (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    amount INTEGER NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'XTR',
+    telegram_charge_id TEXT UNIQUE NOT NULL,
+    payment_type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    processed_at TIMESTAMPTZ,
+    metadata JSONB,
+
+    CONSTRAINT chk_payment_amount CHECK (amount > 0),
+    CONSTRAINT chk_payment_status CHECK (status IN ('pending', 'processing', 'succeeded', 'failed', 'refunded', 'disputed'))
+);
+CREATE INDEX IF NOT EXISTS idx_payments_user_status ON payments(user_id, status);
+CREATE INDEX IF NOT EXISTS idx_payments_telegram_charge ON payments(telegram_charge_id);
+
+-- Maintenance (maintenance.setup_automated_maintenance, run_data_retention_cleanup)
+CREATE TABLE IF NOT EXISTS maintenance_log (
+    id BIGSERIAL PRIMARY KEY,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL,
+    details JSONB,
+    duration_seconds REAL,
+    executed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS payments_archive (
+    LIKE payments INCLUDING ALL
+);
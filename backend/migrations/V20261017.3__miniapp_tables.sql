@@ -0,0 +1,112 @@
+-- Mini app tables (moved out of api/miniapp_handlers.py, which created
+-- them at import time).
+
+-- Mini app posts table with proper constraints
+CREATE TABLE IF NOT EXISTS miniapp_posts (
+    id BIGSERIAL PRIMARY KEY,
+    author_id BIGINT NOT NULL,
+    type TEXT NOT NULL DEFAULT 'text' CHECK (type IN ('text', 'photo', 'video')),
+    caption TEXT CHECK (LENGTH(caption) <= 2000),
+    media_url TEXT,
+    media_type TEXT,
+    visibility TEXT NOT NULL DEFAULT 'public' CHECK (visibility IN ('public', 'followers', 'private')),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    CONSTRAINT valid_media CHECK (
+        (type = 'text' AND media_url IS NULL) OR 
+        (type IN ('photo', 'video') AND media_url IS NOT NULL)
+    )
+);
+
+-- Likes table with conflict prevention
+CREATE TABLE IF NOT EXISTS miniapp_likes (
+    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (post_id, user_id)
+);
+
+-- Comments table with text length limits
+CREATE TABLE IF NOT EXISTS miniapp_comments (
+    id BIGSERIAL PRIMARY KEY,
+    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
+    author_id BIGINT NOT NULL,
+    text TEXT NOT NULL CHECK (LENGTH(text) >= 1 AND LENGTH(text) <= 500),
+    parent_id BIGINT REFERENCES miniapp_comments(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Saves table with TTL enforcement
+CREATE TABLE IF NOT EXISTS miniapp_saves (
+    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL DEFAULT NOW() + INTERVAL '72 hours',
+    PRIMARY KEY (post_id, user_id),
+    CHECK (expires_at > created_at)
+);
+
+-- Follows table with self-follow prevention
+CREATE TABLE IF NOT EXISTS miniapp_follows (
+    follower_id BIGINT NOT NULL,
+    followee_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    status TEXT NOT NULL DEFAULT 'approved' CHECK (status IN ('approved', 'pending')),
+    PRIMARY KEY (follower_id, followee_id),
+    CHECK (follower_id != followee_id)
+);
+
+-- Post views for hide-seen functionality with unique constraint
+CREATE TABLE IF NOT EXISTS miniapp_post_views (
+    post_id BIGINT NOT NULL REFERENCES miniapp_posts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    viewed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (post_id, user_id)
+);
+
+-- User profiles with username constraints
+CREATE TABLE IF NOT EXISTS miniapp_profiles (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT UNIQUE CHECK (username IS NULL OR (LENGTH(username) >= 3 AND LENGTH(username) <= 30)),
+    display_name TEXT CHECK (display_name IS NULL OR LENGTH(display_name) <= 100),
+    bio TEXT CHECK (bio IS NULL OR LENGTH(bio) <= 500),
+    avatar_url TEXT,
+    is_private BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- CRITICAL: Production-ready composite indexes for cursor pagination and performance
+CREATE INDEX IF NOT EXISTS idx_miniapp_posts_created_id ON miniapp_posts(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_miniapp_posts_author_created_id ON miniapp_posts(author_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_miniapp_posts_visibility_created ON miniapp_posts(visibility, created_at DESC) WHERE visibility = 'public';
+CREATE INDEX IF NOT EXISTS idx_miniapp_posts_ttl ON miniapp_posts(created_at);
+
+-- Likes optimization
+CREATE INDEX IF NOT EXISTS idx_miniapp_likes_post_created ON miniapp_likes(post_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_miniapp_likes_user ON miniapp_likes(user_id, created_at DESC);
+
+-- Comments optimization
+CREATE INDEX IF NOT EXISTS idx_miniapp_comments_post_created ON miniapp_comments(post_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_miniapp_comments_author ON miniapp_comments(author_id, created_at DESC);
+
+-- Follows optimization for feed queries
+CREATE INDEX IF NOT EXISTS idx_miniapp_follows_follower_status ON miniapp_follows(follower_id, status) WHERE status = 'approved';
+CREATE INDEX IF NOT EXISTS idx_miniapp_follows_followee_status ON miniapp_follows(followee_id, status) WHERE status = 'approved';
+
+-- Saves optimization with TTL cleanup
+CREATE INDEX IF NOT EXISTS idx_miniapp_saves_user_expires ON miniapp_saves(user_id, expires_at DESC);
+CREATE INDEX IF NOT EXISTS idx_miniapp_saves_expires ON miniapp_saves(expires_at);
+
+-- Post views optimization for hide-seen queries
+CREATE INDEX IF NOT EXISTS idx_miniapp_post_views_user_viewed ON miniapp_post_views(user_id, viewed_at DESC);
+
+-- Profile optimization
+CREATE INDEX IF NOT EXISTS idx_miniapp_profiles_username ON miniapp_profiles(username) WHERE username IS NOT NULL;
+
+-- TTL cleanup function for expired saves
+CREATE OR REPLACE FUNCTION cleanup_expired_saves() RETURNS void AS $$
+BEGIN
+    DELETE FROM miniapp_saves WHERE expires_at <= NOW();
+END;
+$$ LANGUAGE plpgsql;
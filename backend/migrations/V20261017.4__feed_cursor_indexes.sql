@@ -0,0 +1,5 @@
+-- Indexes for the bot feed's keyset cursors and one-query post hydration
+-- (utils/feed_cursor.py). Paging already uses idx_feed_posts_created_id and
+-- idx_feed_posts_author_created; hydration counts comments per post, which
+-- had no index on post_id.
+CREATE INDEX IF NOT EXISTS idx_feed_comments_post ON feed_comments (post_id, created_at);
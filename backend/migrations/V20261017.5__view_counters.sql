@@ -0,0 +1,16 @@
+-- View counters kept by the batched view writers (utils/impressions.py):
+-- each flush bumps these by the rows it actually inserted, so captions read
+-- a column instead of COUNT(*) over feed_views / story_views. Backfilled
+-- from the existing view rows.
+ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS view_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS view_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE feed_posts fp
+   SET view_count = v.n
+  FROM (SELECT post_id, COUNT(*) AS n FROM feed_views GROUP BY post_id) v
+ WHERE fp.id = v.post_id;
+
+UPDATE stories s
+   SET view_count = v.n
+  FROM (SELECT story_id, COUNT(*) AS n FROM story_views GROUP BY story_id) v
+ WHERE s.id = v.story_id;
@@ -0,0 +1,20 @@
+-- Blur Vault browsing without COUNT(*) / NOT IN / OFFSET (utils/vault_index.py).
+-- approved_count is kept by admin approve/delete; backfilled here once.
+
+ALTER TABLE vault_categories ADD COLUMN IF NOT EXISTS approved_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE vault_categories c
+   SET approved_count = n.n
+  FROM (SELECT category_id, COUNT(*) AS n
+          FROM vault_content
+         WHERE approval_status = 'approved'
+         GROUP BY 1) n
+ WHERE c.id = n.category_id;
+
+-- keyset pages: newest approved items of one category
+CREATE INDEX IF NOT EXISTS idx_vault_content_cat_created
+    ON vault_content (category_id, created_at DESC, id DESC)
+ WHERE approval_status = 'approved';
+
+-- revealed sets are read through UNIQUE (user_id, content_id, action)
+-- on vault_interactions; no extra index needed.
@@ -0,0 +1,19 @@
+# backend/migrations/V20261017.7__feed_seed.py - One-off feed data seed
+"""
+Seeds the materialised feed state once, instead of on every API boot:
+
+- post_engagement for posts inside the feed window, from their existing
+  likes and comments (rows that already exist are left alone);
+- feed_timeline rows for follows that predate fan-out on write.
+
+Also indexes feed_timeline.created_at for the periodic window expiry
+(feed.expire_timelines, run by the bot's cleanup loop).
+"""
+from utils import feed
+
+
+def migrate(con):
+    with con.cursor() as cur:
+        feed.backfill_engagement(cur, feed.TTL_HOURS)
+        feed.seed_timelines(cur, feed.TTL_HOURS)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_feed_timeline_created ON feed_timeline (created_at)")
@@ -0,0 +1,28 @@
+-- story_views is keyed by users.id in a user_id column (V20261017.2, and
+-- production). Databases built by the bot's old ensure functions got
+-- (story_id, viewer_id) holding Telegram ids instead, which made the
+-- V20261017.2 table a no-op there: map those rows to users.id, drop views
+-- by users that no longer exist, switch the key over and recount.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'story_views' AND column_name = 'viewer_id')
+       AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                          AND table_name = 'story_views' AND column_name = 'user_id')
+    THEN
+        ALTER TABLE story_views ADD COLUMN user_id BIGINT;
+        UPDATE story_views v SET user_id = u.id FROM users u WHERE u.tg_user_id = v.viewer_id;
+        DELETE FROM story_views WHERE user_id IS NULL;
+        -- also drops the (story_id, viewer_id) primary key
+        ALTER TABLE story_views DROP COLUMN viewer_id;
+        ALTER TABLE story_views ALTER COLUMN user_id SET NOT NULL;
+        ALTER TABLE story_views ADD CONSTRAINT unique_story_view UNIQUE (story_id, user_id);
+        ALTER TABLE story_views ADD CONSTRAINT story_views_user_id_fkey
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+        UPDATE stories s
+           SET view_count = (SELECT COUNT(*) FROM story_views v WHERE v.story_id = s.id);
+    END IF;
+END $$;
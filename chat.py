@@ -11,11 +11,8 @@ import asyncio
 import logging
 import random
 import re
-from collections import deque
 from typing import Set
 
-import psycopg2
-from psycopg2.pool import SimpleConnectionPool
 
 from telegram import (
     Update,
@@ -41,9 +38,19 @@ from utils.display import safe_display_name
 from utils.cb import cb_match, CBError
 from utils.input_validation import validate_and_sanitize_input
 from handlers.text_framework import FEATURE_KEY, MODE_KEY
+from utils.matchmaking import MatchQueue, SearchTicket
+from utils import db_async as adb
+from utils import db_pool
+from utils.counter_buffer import CounterBuffer
+from utils.metrics_registry import REGISTRY
 
 log = logging.getLogger("luvbot.chat")
 
+# relay instrumentation: handles bound once, lock-free on the hot path
+_RELAYED = REGISTRY.counter("relay_messages_total", "Messages relayed to a chat partner", ["kind"])
+_RELAY_MS = REGISTRY.histogram("relay_duration_ms", "Relay latency, partner found to message delivered")
+_RELAY_FAILED = REGISTRY.counter("relay_failures_total", "Relays that raised")
+
 # Enhanced send wrapper with rate limiting and network resilience  
 async def send_safe(bot, *args, **kwargs):
     from telegram.error import TimedOut, NetworkError, RetryAfter
@@ -103,7 +110,7 @@ FAST_INTRO = os.getenv("FAST_INTRO", "0") == "1"  # set FAST_INTRO=1 for instant
 # Runtime state (search queue + active pairs)
 # ------------------------------------------------------------------------------
 
-queue: deque[int] = deque()
+queue = MatchQueue()  # indexed waiting room (see utils/matchmaking.py)
 queue_lock = asyncio.Lock()
 peers: dict[int, int] = {}
 
@@ -200,37 +207,6 @@ def _secret_partner(uid: int) -> int | None:
     s = secret_sessions.get(uid)
     return s["partner"] if s else None
 
-# ------------------------------------------------------------------------------
-# Small Postgres connection pool (kills connect latency on Replit)
-# ------------------------------------------------------------------------------
-
-DB_POOL: SimpleConnectionPool | None = None
-if DATABASE_URL:
-    try:
-        DB_POOL = SimpleConnectionPool(1, 5, dsn=DATABASE_URL, connect_timeout=3)
-    except Exception as e:
-        DB_POOL = None
-        log.warning(f"DB pool not created: {e}")
-
-def _exec_noresult(sql: str, params: tuple):
-    """Execute a write query fast via pool (ignore result)."""
-    if not DATABASE_URL:
-        return
-    conn = None
-    try:
-        conn = DB_POOL.getconn() if DB_POOL else psycopg2.connect(DATABASE_URL, connect_timeout=3)
-        conn.autocommit = True
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-    finally:
-        try:
-            if DB_POOL and conn:
-                DB_POOL.putconn(conn)
-            elif conn:
-                conn.close()
-        except Exception as e:
-            log.warning(f"Failed to close DB connection: {e}")
-
 # ------------------------------------------------------------------------------
 # DB setup for ratings/reports (safe if already exists)
 # ------------------------------------------------------------------------------
@@ -240,75 +216,78 @@ def init_db():
         log.warning("No DATABASE_URL; ratings/reports tables skipped")
         return
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS chat_ratings (
-            id SERIAL PRIMARY KEY,
-            rater_id  BIGINT NOT NULL,
-            ratee_id  BIGINT NOT NULL,
-            value     SMALLINT NOT NULL,      -- +1 / -1
-            reason    TEXT,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            id BIGSERIAL PRIMARY KEY,
-            reporter BIGINT NOT NULL,
-            target   BIGINT NOT NULL,
-            reason   TEXT NOT NULL,
-            created_at TIMESTAMPTZ DEFAULT NOW()
-        );
-        """)
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_pool.connection("chat.init") as conn, conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS chat_ratings (
+                id SERIAL PRIMARY KEY,
+                rater_id  BIGINT NOT NULL,
+                ratee_id  BIGINT NOT NULL,
+                value     SMALLINT NOT NULL,      -- +1 / -1
+                reason    TEXT,
+                created_at TIMESTAMP DEFAULT NOW()
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id BIGSERIAL PRIMARY KEY,
+                reporter BIGINT NOT NULL,
+                target   BIGINT NOT NULL,
+                reason   TEXT NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT NOW()
+            );
+            """)
+            conn.commit()
         log.info("✅ chat_ratings and reports tables ensured")
     except Exception as e:
         log.error(f"❌ DB tables error: {e}")
 
 # ------------------------------------------------------------------------------
-# Metrics helpers (pooled; never block user-visible sends)
+# Metrics helpers (write-behind; never block user-visible sends)
 # ------------------------------------------------------------------------------
+# Deltas are coalesced per user in memory and written back as one
+# UPDATE ... FROM (VALUES ...) every COUNTER_FLUSH_MS or COUNTER_FLUSH_EVENTS,
+# see utils/counter_buffer.py. main._on_shutdown calls flush_counters().
+
+COUNTER_FLUSH_MS = int(os.environ.get("COUNTER_FLUSH_MS", "2000"))
+COUNTER_FLUSH_EVENTS = int(os.environ.get("COUNTER_FLUSH_EVENTS", "5000"))
+
+USER_COUNTERS = CounterBuffer(
+    table="users",
+    key="tg_user_id",
+    columns=("messages_sent", "messages_recv", "dialogs_total", "dialogs_today",
+             "rating_up", "rating_down", "report_count"),
+    tag="chat.counters",
+    flush_ms=COUNTER_FLUSH_MS,
+    flush_events=COUNTER_FLUSH_EVENTS,
+)
+
+def _bump(user_id: int, **deltas: int):
+    if DATABASE_URL:
+        USER_COUNTERS.add(int(user_id), **deltas)
+
+def flush_counters():
+    """Write pending counter deltas now and stop buffering (shutdown)."""
+    if DATABASE_URL:
+        USER_COUNTERS.close()
 
 def increment_sent(user_id: int):
-    _exec_noresult(
-        "UPDATE users SET messages_sent = COALESCE(messages_sent,0)+1 WHERE tg_user_id=%s",
-        (user_id,),
-    )
+    _bump(user_id, messages_sent=1)
 
 def increment_received(user_id: int):
-    _exec_noresult(
-        "UPDATE users SET messages_recv = COALESCE(messages_recv,0)+1 WHERE tg_user_id=%s",
-        (user_id,),
-    )
+    _bump(user_id, messages_recv=1)
 
 def increment_dialogs(user_id: int):
-    _exec_noresult(
-        "UPDATE users "
-        "SET dialogs_total = COALESCE(dialogs_total,0)+1, dialogs_today = COALESCE(dialogs_today,0)+1 "
-        "WHERE tg_user_id=%s",
-        (user_id,),
-    )
+    _bump(user_id, dialogs_total=1, dialogs_today=1)
 
 def bump_rating_counters(ratee_id: int, value: int):
     up = 1 if value > 0 else 0
     down = 1 if value < 0 else 0
     if not up and not down:
         return
-    _exec_noresult(
-        "UPDATE users "
-        "SET rating_up = COALESCE(rating_up,0)+%s, rating_down = COALESCE(rating_down,0)+%s "
-        "WHERE tg_user_id=%s",
-        (up, down, ratee_id),
-    )
+    _bump(ratee_id, rating_up=up, rating_down=down)
 
 def bump_report_counter(target_id: int):
-    _exec_noresult(
-        "UPDATE users SET report_count = COALESCE(report_count,0)+1 WHERE tg_user_id=%s",
-        (target_id,),
-    )
+    _bump(target_id, report_count=1)
 
 # ------------------------------------------------------------------------------
 # Menu deduplication helper
@@ -364,11 +343,8 @@ def _is_menu_text(s: str) -> bool:
 def save_rating(rater: int, ratee: int, value: int, reason: str | None = None):
     if not DATABASE_URL:
         return
-    conn = None
     try:
-        conn = DB_POOL.getconn() if DB_POOL else psycopg2.connect(DATABASE_URL, connect_timeout=3)
-        conn.autocommit = True
-        with conn.cursor() as cur:
+        with db_pool.connection("chat.ratings", autocommit=True) as conn, conn.cursor() as cur:
             cur.execute(
                 "INSERT INTO chat_ratings (rater_id, ratee_id, value, reason) VALUES (%s,%s,%s,%s)",
                 (rater, ratee, value, reason),
@@ -376,23 +352,12 @@ def save_rating(rater: int, ratee: int, value: int, reason: str | None = None):
         bump_rating_counters(ratee, value)
     except Exception as e:
         log.error(f"rating save failed: {e}")
-    finally:
-        try:
-            if DB_POOL and conn:
-                DB_POOL.putconn(conn)
-            elif conn:
-                conn.close()
-        except Exception as e:
-            log.warning(f"Failed to close DB connection: {e}")
 
 def save_report(reporter: int, target: int, reason: str):
     if not DATABASE_URL:
         return
-    conn = None
     try:
-        conn = DB_POOL.getconn() if DB_POOL else psycopg2.connect(DATABASE_URL, connect_timeout=3)
-        conn.autocommit = True
-        with conn.cursor() as cur:
+        with db_pool.connection("chat.reports", autocommit=True) as conn, conn.cursor() as cur:
             cur.execute(
                 "INSERT INTO reports (reporter, target, reason) VALUES (%s,%s,%s)",
                 (reporter, target, reason),
@@ -400,14 +365,6 @@ def save_report(reporter: int, target: int, reason: str):
         bump_report_counter(target)
     except Exception as e:
         log.error(f"report save failed: {e}")
-    finally:
-        try:
-            if DB_POOL and conn:
-                DB_POOL.putconn(conn)
-            elif conn:
-                conn.close()
-        except Exception as e:
-            log.warning(f"Failed to close DB connection: {e}")
 
 # ------------------------------------------------------------------------------
 # Keyboards
@@ -434,10 +391,8 @@ def _rating_counts_for(user_id: int) -> tuple[int, int]:
     """Count +1 / -1 from chat_ratings quickly via pool."""
     if not DATABASE_URL:
         return (0, 0)
-    conn = None
     try:
-        conn = DB_POOL.getconn() if DB_POOL else psycopg2.connect(DATABASE_URL, connect_timeout=3)
-        with conn.cursor() as cur:
+        with db_pool.connection("chat.ratings") as conn, conn.cursor() as cur:
             cur.execute(
                 "SELECT "
                 "COALESCE(SUM(CASE WHEN value=1 THEN 1 ELSE 0 END),0), "
@@ -449,14 +404,6 @@ def _rating_counts_for(user_id: int) -> tuple[int, int]:
             return int(row[0] or 0), int(row[1] or 0)
     except Exception:
         return (0, 0)
-    finally:
-        try:
-            if DB_POOL and conn:
-                DB_POOL.putconn(conn)
-            elif conn:
-                conn.close()
-        except Exception as e:
-            log.warning(f"Failed to close DB connection: {e}")
 
 def _shared_interests_text(viewer_id: int, partner_id: int) -> str:
     try:
@@ -536,15 +483,33 @@ def _intro_text_quick(viewer_id: int, partner_id: int, ice: str) -> str:
         "🔮 /stop - End this magical moment"
     )
 
+async def _arating_counts_for(user_id: int) -> tuple[int, int]:
+    """Awaitable _rating_counts_for() on the async pool."""
+    if not DATABASE_URL:
+        return (0, 0)
+    try:
+        row = await adb.fetchrow(
+            "SELECT "
+            "COALESCE(SUM(CASE WHEN value=1 THEN 1 ELSE 0 END),0), "
+            "COALESCE(SUM(CASE WHEN value=-1 THEN 1 ELSE 0 END),0) "
+            "FROM chat_ratings WHERE ratee_id=$1",
+            user_id,
+        )
+        return (int(row[0] or 0), int(row[1] or 0)) if row else (0, 0)
+    except Exception:
+        return (0, 0)
+
 async def _send_details_async(viewer_id: int, partner_id: int, context: ContextTypes.DEFAULT_TYPE):
     """Post rich details AFTER the quick intro without blocking the first message."""
     try:
-        p = reg.get_profile(partner_id) or {}
+        v, p = await asyncio.gather(reg.aget_profile(viewer_id), reg.aget_profile(partner_id))
         gender = (p.get("gender") or "—").capitalize()
         age = p.get("age") or "—"
         verified = "Yes" if p.get("is_verified") else "No"
-        up, down = _rating_counts_for(partner_id)
-        shared = _shared_interests_text(viewer_id, partner_id)
+        up, down = await _arating_counts_for(partner_id)
+        shared_keys = set(v.get("interests") or ()) & set(p.get("interests") or ())
+        label_map = {k: f"{e} {n}" for (k, n, e, _prem) in getattr(reg, "INTERESTS", [])}
+        shared = ", ".join([label_map.get(k, k) for k in shared_keys][:6]) or "—"
         txt = (
             f"ℹ️ Details:\n"
             f"Info: {gender}, {age}\n"
@@ -561,10 +526,7 @@ async def _send_details_async(viewer_id: int, partner_id: int, context: ContextT
 # ------------------------------------------------------------------------------
 
 async def _remove_from_queue(uid: int):
-    try:
-        queue.remove(uid)
-    except ValueError:
-        pass
+    queue.discard(uid)
 
 async def _end_pair(uid: int, context: ContextTypes.DEFAULT_TYPE, notify_partner=True):
     async with queue_lock:
@@ -596,68 +558,58 @@ def _user_mode(uid: int) -> str:
 
 def _gender_of(uid: int) -> str:
     try:
-        p = reg.get_profile(uid) or {}
-        g = (p.get("gender") or "").strip().lower()
-        return g[:1] if g else ""
+        return reg.get_user_snapshot(uid).gender_key
     except Exception:
         return ""
 
 def _candidate_verified(uid: int) -> bool:
     try:
-        p = reg.get_profile(uid) or {}
-        return bool(p.get("is_verified"))
+        return reg.get_user_snapshot(uid).is_verified
     except Exception:
         return False
 
 def _viewer_wants_verified_only(uid: int) -> bool:
     try:
-        return reg.get_match_verified_only(uid)
+        return reg.get_user_snapshot(uid).match_verified_only
     except Exception:
         return False
 
 def _age_pref(uid: int) -> tuple[int, int]:
     try:
-        return reg.get_age_pref(uid)
+        return reg.get_user_snapshot(uid).age_pref
     except Exception:
         return (18, 99)
 
+def _search_ticket(uid: int, snap: "reg.UserSnapshot | None" = None) -> SearchTicket:
+    """Capture a user's match filters once (mode + cached snapshot) for the queue index."""
+    snap = snap or reg.get_user_snapshot(uid)
+    mode = _user_mode(uid)
+    want = "f" if mode == MODE_GIRLS else "m" if mode == MODE_BOYS else None
+    # age window only applies to premium viewers with a non-default range
+    window = snap.age_pref if snap.has_premium() and snap.age_pref != (18, 99) else None
+    return SearchTicket(
+        uid,
+        gender=snap.gender_key,
+        want=want,
+        age=snap.age,
+        window=window,
+        verified=snap.is_verified,
+        verified_only=snap.match_verified_only,
+    )
+
 def _allows(viewer_id: int, cand_id: int) -> bool:
     """
     Does *viewer* accept *candidate* based on viewer's mode and (if premium) age window?
+    Reads cached user snapshots only; no DB round-trips when both are warm.
     """
     # sticky re-match bypass — if both want each other, bypass filters
     if REMATCH_TARGET.get(viewer_id) == cand_id and REMATCH_TARGET.get(cand_id) == viewer_id:
         return True
-
-    mode = _user_mode(viewer_id)
-
-    # gender filter from viewer mode (STRICT)
-    if mode in (MODE_GIRLS, MODE_BOYS):
-        need = "f" if mode == MODE_GIRLS else "m"
-        g = (reg.get_profile(cand_id) or {}).get("gender", "")
-        gkey = (g or "").strip().lower()[:1]
-        if gkey != need:
-            return False
-
-    # premium viewer age window
     try:
-        if reg.has_active_premium(viewer_id):
-            lo, hi = _age_pref(viewer_id)
-            if (lo, hi) != (18, 99):
-                cp = reg.get_profile(cand_id) or {}
-                a = cp.get("age")
-                if a is None or not (int(lo) <= int(a) <= int(hi)):
-                    return False
+        return _search_ticket(viewer_id).accepts(_search_ticket(cand_id))
     except Exception:
-        # fail open if profile lookup fails
-        pass
-
-    # Viewer wants only verified?
-    if _viewer_wants_verified_only(viewer_id) and not _candidate_verified(cand_id):
         return False
 
-    return True
-
 def _mutual_ok(a: int, b: int) -> bool:
     """Both sides accept each other."""
     return _allows(a, b) and _allows(b, a)
@@ -674,30 +626,12 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
         _last_mode[uid] = mode
     mode = _last_mode.get(uid, MODE_RANDOM)
 
-    is_premium = reg.has_active_premium(uid)
-
-    # Viewer age window 
-    min_age, max_age = reg.get_age_pref(uid)
-    has_custom_age = (min_age, max_age) != (18, 99)
-
-    def _ok(cand_id: int) -> bool:
-        """Whether candidate satisfies viewer filters."""
-        if mode == MODE_RANDOM:
-            return True
-        try:
-            cp = reg.get_profile(cand_id) or {}
-            g = (cp.get("gender") or "").strip().lower()
-            gkey = g[0] if g else ""
-            need = "f" if mode == MODE_GIRLS else "m"
-            if gkey != need:
-                return False
-            if is_premium and has_custom_age:
-                a = cp.get("age")
-                if a is None or not (min_age <= int(a) <= max_age):
-                    return False
-        except Exception:
-            return False
-        return True
+    # Filters are captured once here; nothing under queue_lock touches the DB
+    try:
+        me = _search_ticket(uid, await reg.aget_user_snapshot(uid))
+    except Exception:
+        log.exception(f"start_search: snapshot load failed for {uid}")
+        me = SearchTicket(uid, want="f" if mode == MODE_GIRLS else "m" if mode == MODE_BOYS else None)
 
     async with queue_lock:
         # Priority to sticky re-match target
@@ -705,7 +639,8 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
         if target:
             if target in queue and not in_chat(target):
                 # Directly match with the sticky target
-                queue.remove(target)
+                queue.discard(target)
+                queue.discard(uid)
                 candidate_id = target
                 # Remove sticky mapping
                 REMATCH_TARGET.pop(uid, None)
@@ -741,11 +676,8 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
                 log.info(f"Intro sent in {time.time() - t0:.3f}s")
                 log.info(f"Matched {uid} <-> {partner} (sticky re-match)")
 
-                async def _bump_dialogs_async(a: int, b: int):
-                    loop = asyncio.get_running_loop()
-                    await loop.run_in_executor(None, increment_dialogs, a)
-                    await loop.run_in_executor(None, increment_dialogs, b)
-                asyncio.create_task(_bump_dialogs_async(uid, partner))
+                increment_dialogs(uid)
+                increment_dialogs(partner)
                 return # Early return after sticky match
 
 
@@ -754,19 +686,10 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
             await send_safe(context.bot, chat_id=uid, text="🔎 Still searching…")
             return
 
-        partner = None
-        qn = len(queue)
-        for _ in range(qn):
-            cand = queue.popleft()
-            if cand == uid or cand in peers:
-                continue
-            if _mutual_ok(uid, cand):
-                partner = cand
-                break
-            queue.append(cand)
+        partner = queue.pop_partner(me)
 
         if partner is None:
-            queue.append(uid)
+            queue.enqueue(me)
             if mode == MODE_GIRLS:
                 msg = "🔎 Finding a girl partner soon...\nIf the search takes too long, try changing your settings (/settings)."
             elif mode == MODE_BOYS:
@@ -774,7 +697,7 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
             else:
                 msg = "💫🔮 Seeking your mysterious soulmate... 🔮💫"
             await send_safe(context.bot, chat_id=uid, text=msg)
-            log.info(f"{uid} queued (mode={mode}, age={min_age}-{max_age})")
+            log.info(f"{uid} queued (mode={mode}, age_window={me.window})")
             return
 
         peers[uid] = partner
@@ -825,35 +748,32 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, mode:
     log.info(f"Matched {uid} <-> {partner} (mode={mode})")
 
     # Bump dialog counters AFTER sending (non-blocking)
-    async def _bump_dialogs_async(a: int, b: int):
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, increment_dialogs, a)
-        await loop.run_in_executor(None, increment_dialogs, b)
-    asyncio.create_task(_bump_dialogs_async(uid, partner))
+    increment_dialogs(uid)
+    increment_dialogs(partner)
 
 # ------------------------------------------------------------------------------
 # Commands
 # ------------------------------------------------------------------------------
 
 async def cmd_find(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
     await start_search(update, context, mode=MODE_RANDOM)
 
 async def cmd_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
     await start_search(update, context, mode=MODE_RANDOM)
 
 async def cmd_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
@@ -863,8 +783,8 @@ async def cmd_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.info(f"{uid} ran /next")
 
 async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
@@ -899,8 +819,8 @@ async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """End friend chat specifically"""
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
@@ -938,8 +858,8 @@ async def cmd_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # /secret — start chooser (ONLY inviter must be Premium)
 async def cmd_secret(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
@@ -968,8 +888,8 @@ async def cmd_secret(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # /endsecret — manual end
 async def cmd_endsecret(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if reg.is_banned(update.effective_user.id):
-        until, reason, _ = reg.get_ban_info(update.effective_user.id)
+    if (await reg.aget_user_snapshot(update.effective_user.id)).is_banned():
+        until, reason, _ = await reg.aget_ban_info(update.effective_user.id)
         pretty = "lifetime" if until.year >= 9999 else until.strftime("%Y-%m-%d %H:%M UTC")
         await update.message.reply_text(f"🚫 You are banned till {pretty}.\nReason: {reason or '—'}")
         return
@@ -996,12 +916,9 @@ async def cmd_boost(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("⏳ Please wait a few minutes before boosting again.")
 
     # put at front of queue
+    ticket = _search_ticket(uid, await reg.aget_user_snapshot(uid))
     async with queue_lock:
-        try:
-            queue.remove(uid)
-        except ValueError:
-            pass
-        queue.appendleft(uid)
+        queue.enqueue(ticket, front=True)
     _last_boost_at[uid] = now
     await update.message.reply_text("🚀 Boost activated! You have been moved to the front of the queue.")
 
@@ -1382,9 +1299,10 @@ async def start_search_for_uid(uid: int, context: ContextTypes.DEFAULT_TYPE):
 
     # If not paired instantly, normal queue flow
     if not in_chat(uid):
+        ticket = _search_ticket(uid, await reg.aget_user_snapshot(uid))
         async with queue_lock:
             if uid not in queue:
-                queue.append(uid)
+                queue.enqueue(ticket)
         try:
             await context.bot.send_message(chat_id=uid, text="💫🔮 Seeking your mysterious soulmate... 🔮💫")
         except Exception:
@@ -1399,14 +1317,8 @@ async def _try_pair_instant(uid: int, context: ContextTypes.DEFAULT_TYPE):
     async with queue_lock:
         if target in queue and not in_chat(target) and not in_chat(uid):
             # Remove both from queue
-            try:
-                queue.remove(uid)
-            except Exception:
-                pass
-            try:
-                queue.remove(target)
-            except Exception:
-                pass
+            queue.discard(uid)
+            queue.discard(target)
 
             # Create the pair
             peers[uid] = target
@@ -1449,11 +1361,8 @@ async def _try_pair_instant(uid: int, context: ContextTypes.DEFAULT_TYPE):
             log.info(f"Matched {uid} <-> {target} (auto re-match)")
 
             # Bump dialog counters
-            async def _bump_dialogs_async(a: int, b: int):
-                loop = asyncio.get_running_loop()
-                await loop.run_in_executor(None, increment_dialogs, a)
-                await loop.run_in_executor(None, increment_dialogs, b)
-            asyncio.create_task(_bump_dialogs_async(uid, target))
+            increment_dialogs(uid)
+            increment_dialogs(target)
 
 async def on_rm_ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
@@ -1507,17 +1416,10 @@ async def on_rm_decide(update: Update, context: ContextTypes.DEFAULT_TYPE):
     REMATCH_TARGET[other] = me
 
     # 2) Put both at front of queue
+    tickets = [_search_ticket(u, await reg.aget_user_snapshot(u)) for u in (me, other)]
     async with queue_lock:
-        try:
-            queue.remove(me)
-        except Exception:
-            pass
-        try:
-            queue.remove(other)
-        except Exception:
-            pass
-        queue.appendleft(me)
-        queue.appendleft(other)
+        for t in tickets:
+            queue.enqueue(t, front=True)
 
     # 3) Auto-trigger search for both users
     try:
@@ -1922,12 +1824,19 @@ async def relay(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if pstate.startswith("poll:"):
         return
 
+    # One cached snapshot covers registration, ban, forward and premium checks
+    try:
+        me = await reg.aget_user_snapshot(uid)
+    except Exception:
+        log.exception("relay: snapshot load failed")
+        return
+
     # Registration check - let registration handlers process text first
-    if not reg.is_registered(uid):
+    if not me.registered:
         return
 
     # Ban gate - silent drop for banned users
-    if reg.is_banned(uid):
+    if me.is_banned():
         try:
             await update.message.reply_text("🚫 You are banned. Chat disabled.")
         except Exception:
@@ -1939,6 +1848,7 @@ async def relay(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
+        t_relay = time.perf_counter()
         msg = update.message
 
         # --- Secret Chat hook ---
@@ -1964,13 +1874,13 @@ async def relay(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await update.message.reply_text("⛔ Forwarding is disabled in Secret Chat.")
 
         # Check user's forwarding preference for normal chat
-        allow_forward = reg.get_allow_forward(uid)  # DB truth
+        allow_forward = me.allow_forward  # snapshot, invalidated by set_allow_forward
         if is_fwd and not allow_forward and not secret_mode:
             return await update.message.reply_text("⛔ Forwarding is disabled by your settings.")
 
         # Media rule (applies in Secret AND normal): only premium sender may send media
         is_media = any([msg.photo, msg.video, msg.animation, msg.document, msg.voice, msg.sticker])
-        if is_media and not reg.has_active_premium(uid):
+        if is_media and not me.has_premium():
             # offer Ask-for-Premium
             from telegram import InlineKeyboardMarkup, InlineKeyboardButton
             kb = InlineKeyboardMarkup([[
@@ -2072,6 +1982,9 @@ async def relay(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 pass
 
+        _RELAY_MS.observe((time.perf_counter() - t_relay) * 1000)
+        _RELAYED.labels("secret" if secret_mode else "media" if is_media else "text").inc()
+
         try:
             increment_sent(uid)
             increment_received(partner)
@@ -2092,6 +2005,7 @@ async def relay(update: Update, context: ContextTypes.DEFAULT_TYPE):
             log.warning(f"badge check failed: {e}")
             
     except Exception as e:
+        _RELAY_FAILED.inc()
         log.error(f"Relay failed: {e}")
         await update.message.reply_text("⚠️ Failed to send message.")
 
@@ -2,18 +2,7 @@
 Production Database Indexes for High-Scale Performance
 Add indexes on frequently queried columns
 """
-import os
-import psycopg2
-
-def _dsn():
-    dsn = os.getenv("DATABASE_URL")
-    if not dsn:
-        raise RuntimeError("DATABASE_URL missing")
-    # Disable SSL for localhost
-    if "localhost" in dsn or "127.0.0.1" in dsn:
-        if "sslmode=" not in dsn:
-            dsn += "?sslmode=disable" if "?" not in dsn else "&sslmode=disable"
-    return dsn
+from utils import db_pool
 
 def create_production_indexes():
     """
@@ -55,7 +44,7 @@ def create_production_indexes():
     ]
     
     try:
-        with psycopg2.connect(_dsn()) as conn:
+        with db_pool.connection("create_indexes") as conn:
             with conn.cursor() as cur:
                 for idx_sql in indexes:
                     try:
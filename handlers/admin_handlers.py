@@ -30,6 +30,8 @@ from admin import (
 import registration as reg
 from utils.db_migration import run_all_migrations
 from utils.cb import cb_match, CBError
+from utils import broadcast
+from utils.broadcast import ENGINE as BROADCAST
 
 UD_MODE = "ad:mode"   # "gp" | "rp" | "info" | "reset" | "bcast"
 
@@ -303,15 +305,12 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if mode == "bcast":
         ids = [row[0] for row in q_all("SELECT tg_user_id FROM users;")]
-        sent = 0
-        for uid in ids:
-            try:
-                await context.bot.send_message(uid, text, disable_web_page_preview=True)
-                sent += 1
-                await asyncio.sleep(0.06)  # ~16 msgs/sec
-            except Exception:
-                pass
-        await update.effective_message.reply_text(f"📣 Broadcast sent to {sent} users.")
+        job_id = await BROADCAST.submit(context.bot, "admin", text, ids,
+                                        notify_chat_id=update.effective_chat.id)
+        await update.effective_message.reply_text(
+            f"📣 Broadcast queued as job #{job_id} for {len(ids)} users.\n"
+            f"You'll get a summary when it finishes. Progress: /bcaststatus {job_id}"
+        )
         context.user_data.pop(UD_MODE, None)
         await open_admin(update, context)
 
@@ -334,6 +333,54 @@ async def cmd_unprem(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = int(context.args[0]); set_premium(uid, False)
     await update.effective_message.reply_text(f"✅ Premium removed from {uid}.")
 
+async def cmd_bcaststatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update): return
+    job_id = int(context.args[0]) if context.args and context.args[0].isdigit() else None
+    job = await asyncio.to_thread(broadcast.job_status, job_id)
+    if not job:
+        return await update.effective_message.reply_text("No broadcast jobs yet.")
+    done = job["sent"] + job["failed"] + job["blocked"]
+    pct = int(100 * done / job["total"]) if job["total"] else 100
+    await update.effective_message.reply_text(
+        f"📣 Job #{job['id']} ({job['kind']}) — {job['status']}\n"
+        f"Progress: {done}/{job['total']} ({pct}%)\n"
+        f"Sent: {job['sent']} · Failed: {job['failed']} · Blocked bot: {job['blocked']}"
+    )
+
+async def cmd_bcastcancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update): return
+    if not context.args or not context.args[0].isdigit():
+        await update.effective_message.reply_text(
+            "Use command:\n<b>/bcastcancel &lt;job_id&gt;</b>", parse_mode=ParseMode.HTML
+        ); return
+    job_id = int(context.args[0])
+    ok = await asyncio.to_thread(broadcast.cancel_job, job_id)
+    await update.effective_message.reply_text(
+        f"🛑 Job #{job_id} cancelled." if ok else f"Job #{job_id} is not pending or running."
+    )
+
+async def cmd_handlerstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update): return
+    from utils import tracing
+    rows = tracing.handler_stats()[:12]
+    if not rows:
+        return await update.effective_message.reply_text("No traced handler runs yet.")
+    lines = ["⏱ Handlers by p95 (ms) — p50 / p95 / p99 · DB p95 · queries avg/max"]
+    for r in rows:
+        lines.append(
+            f"• {'.'.join(r['handler'].split('.')[-2:])}: "
+            f"{r['p50']:.0f} / {r['p95']:.0f} / {r['p99']:.0f} · {r['db_p95']:.0f} · "
+            f"{r['queries_avg']:.1f}/{r['queries_max']} ({r['runs']} runs, {r['errors']} err)"
+        )
+    flagged = tracing.flagged_updates(5)
+    if flagged:
+        lines.append(f"\n🚩 Over {tracing.QUERY_LIMIT} queries or {tracing.SLOW_MS:.0f}ms:")
+        for f in flagged:
+            worst = max(f["handlers"], key=lambda h: h[3], default=("-", 0, 0, 0, ""))
+            lines.append(f"• {f['type']}: {f['queries']}q, {f['db_ms']:.0f}ms DB, "
+                         f"{f['wall_ms']:.0f}ms — {worst[0].rsplit('.', 1)[-1]}")
+    await update.effective_message.reply_text("\n".join(lines))
+
 async def cmd_resetuser(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _is_admin(update): return
     if not context.args or not context.args[0].isdigit():
@@ -443,6 +490,7 @@ async def cmd_verify_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
              WHERE tg_user_id = %s
         """, (uid,))
         con.commit()
+    reg.invalidate_user_snapshot(uid)
     await update.effective_message.reply_text(f"✅ Verification reset for {uid}. They can try again now.")
 
 async def cmd_pendingvault(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -896,6 +944,7 @@ async def on_verify_decision(update: Update, context: ContextTypes.DEFAULT_TYPE)
              WHERE tg_user_id = %s
         """, (status == "approved", status, uid))
         con.commit()
+    reg.invalidate_user_snapshot(uid)
 
     await q.answer("Done.")
 
@@ -936,6 +985,9 @@ def register(app):
     app.add_handler(CommandHandler("unprem",    cmd_unprem))
     app.add_handler(CommandHandler("resetuser", cmd_resetuser))
     app.add_handler(CommandHandler("userinfo",  cmd_userinfo))
+    app.add_handler(CommandHandler("bcaststatus", cmd_bcaststatus))
+    app.add_handler(CommandHandler("bcastcancel", cmd_bcastcancel))
+    app.add_handler(CommandHandler("handlerstats", cmd_handlerstats))
     app.add_handler(CommandHandler("givecoin",  cmd_givecoin))
     app.add_handler(CommandHandler("coinbal",   cmd_coinbal))
     app.add_handler(CommandHandler("verify_queue", cmd_verify_queue))
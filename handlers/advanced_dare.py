@@ -145,7 +145,6 @@ def _next_ist_time(h: int, m: int) -> datetime.datetime:
 # --------- Community Dare Submissions ---------
 async def cmd_submitdare(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Interactive dare submission with category and difficulty selection"""
-    _ensure_dare_schema()
     
     user_id = update.effective_user.id
     
@@ -189,7 +188,6 @@ async def cmd_submitdare(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def _get_or_select_today_dare(user_id: int = None) -> str:
     """Get today's dare or select one from community submissions - different for each user"""
     today = datetime.date.today()
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         # If user_id provided, try to get user-specific dare first
@@ -259,7 +257,6 @@ def _get_or_select_today_dare(user_id: int = None) -> str:
 # --------- Advanced Dare Interface ---------
 async def cmd_advanced_dare(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Advanced dare system with timer and social pressure"""
-    _ensure_dare_schema()
     now = _now_ist()
     user_id = update.effective_user.id
     
@@ -460,7 +457,6 @@ async def _show_difficulty_dare(query, user_id: int, today: datetime.date, diffi
 
 async def _handle_dare_accept(query, user_id: int, today: datetime.date, difficulty: str = "medium"):
     """Handle dare acceptance"""
-    _ensure_dare_schema()
     
     # Check if still in window
     if not _in_dare_window(_now_ist()):
@@ -560,7 +556,6 @@ async def _handle_submit_dare_redirect(query):
 
 async def _handle_dare_decline(query, user_id: int, today: datetime.date, difficulty: str = "medium"):
     """Handle dare decline with shame"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         # Record decline with difficulty
@@ -604,7 +599,6 @@ async def _handle_dare_decline(query, user_id: int, today: datetime.date, diffic
 
 async def _show_dare_leaderboard(query):
     """Show dare leaderboard"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         cur.execute("""
@@ -668,7 +662,6 @@ async def _show_dare_info(query):
 # --------- Enhanced Notification System ---------
 async def push_advanced_dare_notification(context: ContextTypes.DEFAULT_TYPE):
     """Push advanced dare notification at 11 PM"""
-    _ensure_dare_schema()
     
     # Get today's dare (random for notification - no specific user)
     dare_text = _get_or_select_today_dare()
@@ -690,21 +683,12 @@ async def push_advanced_dare_notification(context: ContextTypes.DEFAULT_TYPE):
     )
     
     # No inline keyboard - users must use /timedare command
-    kb = None
-    
-    sent = 0
-    for uid in users:
-        try:
-            await context.bot.send_message(
-                uid, text, parse_mode="Markdown"
-            )
-            sent += 1
-            # Add small delay to avoid rate limits
-            await asyncio.sleep(0.1)
-        except Exception:
-            pass
-    
-    print(f"[advanced-dare] Sent to {sent}/{len(users)} users")
+    from utils.broadcast import ENGINE
+    job_id = await ENGINE.submit(
+        context.bot, "advanced_dare", text, users, parse_mode="Markdown",
+        dedupe_key=f"advanced_dare:{datetime.date.today().isoformat()}",
+    )
+    print(f"[advanced-dare] queued job={job_id} recipients={len(users)}")
 
 # --------- Handle Text Submissions ---------
 @requires_state("dare", "submit")
@@ -829,7 +813,6 @@ async def cmd_admin_approve_dares(update: Update, context: ContextTypes.DEFAULT_
     if user_id not in admin_ids:
         return await update.message.reply_text("❌ Admin access required.")
     
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         cur.execute("""
@@ -894,7 +877,6 @@ async def handle_admin_dare_callbacks(update: Update, context: ContextTypes.DEFA
 
 async def _approve_dare_submission(query, submission_id: int):
     """Approve a dare submission"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         # Get submitter info before approval
@@ -930,7 +912,6 @@ async def _approve_dare_submission(query, submission_id: int):
 
 async def _reject_dare_submission(query, submission_id: int):
     """Reject a dare submission"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         cur.execute("DELETE FROM dare_submissions WHERE id=%s AND approved=FALSE", (submission_id,))
@@ -947,7 +928,6 @@ async def _reject_dare_submission(query, submission_id: int):
 
 async def _show_pending_submissions(query):
     """Show pending submissions in callback"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         cur.execute("""
@@ -1265,7 +1245,6 @@ async def _process_dare_submission(query, context: ContextTypes.DEFAULT_TYPE):
             parse_mode="Markdown"
         )
     
-    _ensure_dare_schema()
     today = datetime.date.today()
     
     with _conn() as con, con.cursor() as cur:
@@ -1340,7 +1319,6 @@ async def handle_mydares_callbacks(update: Update, context: ContextTypes.DEFAULT
 
 async def _show_detailed_dare_stats(query, user_id: int):
     """Show detailed statistics for user's dare submissions"""
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         # Get detailed stats
@@ -1575,7 +1553,6 @@ async def notify_dare_creator_when_accepted(context: ContextTypes.DEFAULT_TYPE,
 async def cmd_mydares(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user's dare submission history and stats"""
     user_id = update.effective_user.id
-    _ensure_dare_schema()
     
     with _conn() as con, con.cursor() as cur:
         # Get user's submissions
@@ -1741,7 +1718,6 @@ async def send_morning_dare_recap(context: ContextTypes.DEFAULT_TYPE):
 async def cmd_timedare(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main entry point for timed dare system (consolidated from dare_60s.py)"""
     try:
-        _ensure_dare_schema()  # Ensure tables exist
         return await cmd_advanced_dare(update, context)
     except Exception as e:
         print(f"[timedare] Advanced system error: {e}")
@@ -1789,7 +1765,6 @@ async def handle_dare_reminder_callbacks(update: Update, context: ContextTypes.D
     if query.data == "dare:yesterday":
         # Get yesterday's dare stats
         yesterday = datetime.date.today() - datetime.timedelta(days=1)
-        _ensure_dare_schema()
         
         with _conn() as con, con.cursor() as cur:
             # Get yesterday's stats
@@ -11,6 +11,7 @@ import registration as reg
 from handlers.text_framework import (
     claim_or_reject, clear_state, FEATURE_KEY, MODE_KEY, make_cancel_kb
 )
+from utils.broadcast import ENGINE as BROADCAST
 
 log = logging.getLogger("afterdark")
 
@@ -93,7 +94,6 @@ def ensure_ad_tables():
 
 def ensure(app):
     """Main entry point called by main.py"""
-    ensure_ad_tables()
     register(app)
 
 # =================== TIME/SESSION HELPERS ===================
@@ -162,13 +162,10 @@ async def _broadcast(context: ContextTypes.DEFAULT_TYPE, session_id:int, text:st
                      kb:InlineKeyboardMarkup=None):
     participants = _list_participants(session_id)
     user_ids = [u for (u,_,_) in participants]
-    for uid in user_ids:
-        try:
-            await context.bot.send_message(uid, text,
-                                           reply_markup=kb,
-                                           parse_mode="Markdown")
-        except Exception as e:
-            log.debug(f"[AD] broadcast fail {uid}: {e}")
+    sent = await BROADCAST.send_now(context.bot, user_ids, text,
+                                    reply_markup=kb, parse_mode="Markdown")
+    if sent < len(user_ids):
+        log.debug(f"[AD] broadcast reached {sent}/{len(user_ids)} in session {session_id}")
 
 def _log_ad_event(session_id:int, user_id:int, anon:str, msg_type:str, content:str=None, meta:dict=None):
     try:
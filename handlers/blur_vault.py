@@ -3,11 +3,13 @@ from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from telegram.error import BadRequest
 import registration as reg
-import re
+import asyncio
 import logging
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
+from utils.impressions import CountInto, ImpressionBuffer
+from utils import blur_text, vault_index
 # optional: bilingual teaser text central file
 try:
     from utils.feature_texts import VAULT_TEXT
@@ -16,6 +18,16 @@ except ImportError:
 
 log = logging.getLogger("blur_vault")
 
+# Reveals are written in batches (utils/impressions.py); each newly inserted
+# row also bumps vault_content.view_count / reveal_count. flush_reveals()
+# runs at shutdown.
+REVEALS = ImpressionBuffer("vault_interactions", ("user_id", "content_id", "action"), tag="vault_reveals",
+                           count_into=CountInto("vault_content", "id", "content_id",
+                                                ("view_count", "reveal_count")))
+
+def flush_reveals():
+    REVEALS.close()
+
 # ============ HELPER FUNCTIONS ============
 
 async def _safe_edit_or_send(query, context, text, reply_markup=None, parse_mode="Markdown"):
@@ -365,60 +377,22 @@ def add_comprehensive_seed_data():
                     VALUES (8482725798, %s, %s, %s, 'text', 75, 2, 'approved', NOW(), 647778438)
                 """, (category_id, content, blurred))
 
+        # seeded rows go in approved; bring the per-category counts up to date
+        cur.execute("""
+            UPDATE vault_categories c
+               SET approved_count = (SELECT COUNT(*) FROM vault_content v
+                                      WHERE v.category_id = c.id AND v.approval_status = 'approved')
+        """)
         con.commit()
         print("✅ Comprehensive seed data added to vault categories")
 
 # ============ BLUR SYSTEM ============
 
-def create_smart_blur(text: str, blur_level: int = 70) -> str:
-    """Smart blurring algorithm that preserves readability while hiding sensitive content"""
-    # Words to always blur (sensitive content)
-    sensitive_words = [
-        'love', 'kiss', 'sex', 'naked', 'orgasm', 'desire', 'fantasy', 'secret',
-        'affair', 'cheat', 'crush', 'masturbate', 'porn', 'virgin', 'hook',
-        'date', 'boyfriend', 'girlfriend', 'husband', 'wife', 'marriage',
-        'pregnant', 'drugs', 'alcohol', 'drunk', 'money', 'steal', 'lie'
-    ]
-
-    words = text.split()
-    blurred_words = []
-
-    for i, word in enumerate(words):
-        # Clean word for checking
-        clean_word = re.sub(r'[^\w]', '', word.lower())
-
-        # Calculate blur probability
-        should_blur = False
-
-        if clean_word in sensitive_words:
-            should_blur = True
-        elif len(clean_word) > 6:
-            # Longer words more likely to be blurred
-            should_blur = (hash(word) % 100) < (blur_level + 20)
-        elif len(clean_word) > 3:
-            # Medium words
-            should_blur = (hash(word) % 100) < blur_level
-        else:
-            # Short words (articles, etc.) rarely blurred
-            should_blur = (hash(word) % 100) < (blur_level - 30)
-
-        if should_blur and len(clean_word) > 2:
-            # Create blur pattern
-            if len(word) <= 3:
-                blurred = '█' * len(word)
-            elif len(word) <= 5:
-                blurred = word[0] + '█' * (len(word) - 2) + word[-1]
-            else:
-                visible_chars = max(1, len(word) // 3)
-                blurred = word[:visible_chars] + '█' * (len(word) - 2 * visible_chars) + word[-visible_chars:]
-
-            # Preserve punctuation
-            punct = ''.join(c for c in word if not c.isalnum())
-            blurred_words.append(blurred + punct.replace(word.translate(str.maketrans('', '', ''.join(c for c in word if c.isalnum()))), ''))
-        else:
-            blurred_words.append(word)
-
-    return ' '.join(blurred_words)
+def create_smart_blur(text: str, blur_level: int = 70, content_id: Optional[int] = None) -> str:
+    """Smart blurring algorithm that preserves readability while hiding sensitive content.
+    Deterministic: the same text and level blur the same way in every process.
+    Renders are cached (by content_id when known, else by the text itself)."""
+    return blur_text.blur_content(content_id, text, blur_level)
 
 # ============ TOKEN SYSTEM ============
 
@@ -692,150 +666,56 @@ async def cmd_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def get_vault_categories(user_id: int = None) -> List[Dict[str, Any]]:
     """Get active vault categories with remaining content counts for user"""
+    # approved_count is kept by admin approve/delete; "remaining" subtracts the
+    # user's cached revealed tally (utils/vault_index.py) instead of an anti-join
     with reg._conn() as con, con.cursor() as cur:
-        if user_id is None:
-            # Original behavior for admin/general use
-            cur.execute("""
-                SELECT 
-                    vc.id, vc.name, vc.description, vc.emoji, vc.blur_intensity,
-                    COUNT(vco.id) as content_count
-                FROM vault_categories vc
-                LEFT JOIN vault_content vco ON vc.id = vco.category_id 
-                    AND vco.approval_status = 'approved'
-                WHERE vc.active = TRUE
-                GROUP BY vc.id, vc.name, vc.description, vc.emoji, vc.blur_intensity
-                ORDER BY content_count DESC, vc.name
-            """)
-        else:
-            # Calculate remaining content per user (total - viewed)
-            cur.execute("""
-                SELECT 
-                    vc.id, vc.name, vc.description, vc.emoji, vc.blur_intensity,
-                    (
-                        SELECT COUNT(*) 
-                        FROM vault_content vco 
-                        WHERE vco.category_id = vc.id 
-                        AND vco.approval_status = 'approved'
-                        AND vco.id NOT IN (
-                            SELECT vi.content_id 
-                            FROM vault_interactions vi 
-                            WHERE vi.user_id = %s 
-                            AND vi.action IN ('viewed', 'revealed')
-                            AND vi.content_id IS NOT NULL
-                        )
-                    ) as remaining_count
-                FROM vault_categories vc
-                WHERE vc.active = TRUE
-                ORDER BY remaining_count DESC, vc.name
-            """, (user_id,))
-
-        return [
-            {
-                'id': row[0], 'name': row[1], 'description': row[2],
-                'emoji': row[3], 'blur_intensity': row[4], 'content_count': row[5]
-            }
-            for row in cur.fetchall()
-        ]
-
-def get_vault_content_by_category(category_id: int, user_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
-    """Get vault content for a category - filters out already revealed content for normal users"""
-    with reg._conn() as con, con.cursor() as cur:
-        # Admin ko sab dikhna chahiye (unseen filter hata ke)
-        if user_id in [647778438, 1437934486]:  # Admin IDs
-            cur.execute("""
-                SELECT 
-                    vc.id, vc.content_text, vc.blurred_text, vc.reveal_cost,
-                    vc.view_count, vc.reveal_count, vc.created_at, vc.media_type,
-                    vc.file_url, vc.thumbnail_url, vc.blurred_thumbnail_url,
-                    CASE WHEN vi.action = 'revealed' THEN TRUE ELSE FALSE END as already_revealed
-                FROM vault_content vc
-                LEFT JOIN vault_interactions vi
-                  ON vc.id = vi.content_id
-                 AND vi.user_id = %s
-                 AND vi.action = 'revealed'
-                WHERE vc.category_id = %s
-                  AND vc.approval_status = 'approved'
-                ORDER BY vc.created_at DESC
-                LIMIT %s OFFSET %s
-            """, (user_id, category_id, limit, offset))
-        else:
-            # Normal users ke liye sirf unseen
-            cur.execute("""
-                SELECT 
-                    vc.id, vc.content_text, vc.blurred_text, vc.reveal_cost,
-                    vc.view_count, vc.reveal_count, vc.created_at, vc.media_type,
-                    vc.file_url, vc.thumbnail_url, vc.blurred_thumbnail_url,
-                    FALSE as already_revealed
-                FROM vault_content vc
-                WHERE vc.category_id = %s
-                  AND vc.approval_status = 'approved'
-                  AND vc.id NOT IN (
-                      SELECT content_id
-                      FROM vault_interactions
-                      WHERE user_id = %s
-                        AND action = 'revealed'
-                  )
-                ORDER BY vc.created_at DESC
-                LIMIT %s OFFSET %s
-            """, (category_id, user_id, limit, offset))
-
+        cur.execute("""
+            SELECT id, name, description, emoji, blur_intensity, approved_count
+            FROM vault_categories
+            WHERE active = TRUE
+        """)
         rows = cur.fetchall()
 
-    # Map results to dict
-    content_list = []
-    for row in rows:
-        content_list.append({
-            "id": row[0],
-            "content_text": row[1],
-            "blurred_text": row[2],
-            "reveal_cost": row[3],
-            "view_count": row[4],
-            "reveal_count": row[5],
-            "created_at": row[6],
-            "media_type": row[7],
-            "file_url": row[8],
-            "thumbnail_url": row[9],
-            "blurred_thumbnail_url": row[10],
-            "user_revealed": row[11],  # Keep consistent naming with rest of code
-        })
-    return content_list
+    categories = [
+        {
+            'id': row[0], 'name': row[1], 'description': row[2],
+            'emoji': row[3], 'blur_intensity': row[4], 'content_count': int(row[5] or 0)
+        }
+        for row in rows
+    ]
+    if user_id is not None:
+        revealed = vault_index.REVEALED.get(user_id)
+        for cat in categories:
+            cat['content_count'] = max(0, cat['content_count'] - revealed.in_category(cat['id']))
+    categories.sort(key=lambda c: (-c['content_count'], c['name']))
+    return categories
+
+def _is_vault_admin(user_id: int) -> bool:
+    return user_id in [647778438, 1437934486]  # Admin IDs
+
+def get_vault_content_by_category(category_id: int, user_id: int, limit: int = 10,
+                                  after=None, before=None):
+    """Get one keyset page of vault content for a category - filters out already
+    revealed content for normal users. Returns (items, more); see vault_index.page."""
+    # Admin ko sab dikhna chahiye (unseen filter hata ke)
+    return vault_index.page(category_id, user_id, after=after, before=before, limit=limit,
+                            hide_revealed=not _is_vault_admin(user_id))
 
 def get_vault_content_total_count(category_id: int, user_id: int) -> int:
     """Get total count of vault content for a category (for pagination)"""
     with reg._conn() as con, con.cursor() as cur:
-        # Admin can see all content
-        if user_id in [647778438, 1437934486]:  # Admin IDs
-            cur.execute("""
-                SELECT COUNT(*)
-                FROM vault_content vc
-                WHERE vc.category_id = %s
-                  AND vc.approval_status = 'approved'
-            """, (category_id,))
-        else:
-            # Normal users can only see unrevealed content
-            cur.execute("""
-                SELECT COUNT(*)
-                FROM vault_content vc
-                WHERE vc.category_id = %s
-                  AND vc.approval_status = 'approved'
-                  AND vc.id NOT IN (
-                      SELECT content_id
-                      FROM vault_interactions
-                      WHERE user_id = %s
-                        AND action = 'revealed'
-                  )
-            """, (category_id, user_id))
-        
-        result = cur.fetchone()
-        return result[0] if result else 0
+        cur.execute("SELECT approved_count FROM vault_categories WHERE id = %s", (category_id,))
+        row = cur.fetchone()
+    approved = int(row[0] or 0) if row else 0
+    # Admin can see all content; normal users only unrevealed content
+    if _is_vault_admin(user_id):
+        return approved
+    return vault_index.remaining(category_id, approved, user_id)
 
 async def cmd_vault(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main vault command - shows categories or content based on premium status"""
     uid = update.effective_user.id
 
-    # Initialize vault tables on first run
-    ensure_vault_tables()
-
     # Admin bypass - Allow admin access even without premium
     if uid != 647778438 and not reg.has_active_premium(uid):
         # Show lock screen to free users (except admin)
@@ -860,12 +740,50 @@ async def cmd_vault_migrate(update, context):
         await update.message.reply_text(f"❌ Migration failed: {e}")
 
 
-# /vault_backfill (admins only)
+def backfill_blurs(batch: int = 1000) -> int:
+    """Re-render blurred_text of text items with create_smart_blur, `batch` rows per
+    round trip; only rows whose stored blur differs are written. Returns rows updated."""
+    from psycopg2.extras import execute_values
+
+    updated = 0
+    last_id = 0
+    with reg._conn() as con, con.cursor() as cur:
+        while True:
+            cur.execute("""
+                SELECT id, content_text, COALESCE(blur_level, 70), blurred_text
+                  FROM vault_content
+                 WHERE media_type = 'text' AND content_text IS NOT NULL AND id > %s
+                 ORDER BY id
+                 LIMIT %s
+            """, (last_id, batch))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            stored = {cid: old for cid, _, _, old in rows}
+            changed = [(cid, new) for cid, new in blur_text.blur_many((cid, text, level) for cid, text, level, _ in rows)
+                       if new != stored[cid]]
+            if changed:
+                execute_values(cur, """
+                    UPDATE vault_content v SET blurred_text = d.blurred
+                      FROM (VALUES %s) AS d(id, blurred)
+                     WHERE v.id = d.id
+                """, changed, page_size=batch)
+                con.commit()
+                updated += len(changed)
+    return updated
+
+# /vault_backfill (admins only); "/vault_backfill blurs" re-renders text blurs
 async def cmd_vault_backfill(update, context):
     admin_ids = [647778438]  # Add your admin IDs
     if update.effective_user.id not in admin_ids:
         return await update.message.reply_text("⛔ Admin only.")
 
+    if context.args and context.args[0] == "blurs":
+        # table-wide loop: keep it off the event loop
+        updated = await asyncio.to_thread(backfill_blurs)
+        return await update.message.reply_text(f"Blur backfill done. Updated={updated}")
+
     fixed = 0; failed = 0
     with reg._conn() as con, con.cursor() as cur:
         cur.execute("""
@@ -969,23 +887,11 @@ async def show_category_content(query, category_id: int, user_id: int):
     cat_name, cat_emoji, cat_desc = cat_info
     # Premium users and admin get unlimited content
     limit = 1000  # Show all content for premium users and admin
-    content_list = get_vault_content_by_category(category_id, user_id, limit)
+    content_list, _ = get_vault_content_by_category(category_id, user_id, limit)
 
     # YOUR EXACT PATCH C - Proper counts (no more "1 item" confusion)
-    with reg._conn() as con, con.cursor() as cur:
-        # total approved in this category (for everyone)
-        cur.execute("""
-            SELECT COUNT(*) FROM vault_content
-             WHERE category_id=%s AND approval_status='approved'
-        """, (category_id,))
-        total_cat = cur.fetchone()[0] or 0
-
-        # total items available to THIS user (everyone sees all now)
-        cur.execute("""
-            SELECT COUNT(*) FROM vault_content
-             WHERE category_id=%s AND approval_status='approved'
-        """, (category_id,))
-        total_for_you = cur.fetchone()[0] or 0
+    # total approved in this category (for everyone) = items available to THIS user
+    total_cat = total_for_you = vault_index.category_counts().get(category_id, 0)
 
     if not content_list:
         text = (
@@ -1111,14 +1017,9 @@ async def handle_content_reveal(query, context: ContextTypes.DEFAULT_TYPE, conte
 
     content_text, blurred_text, reveal_cost, submitter_id, media_type, file_url, thumbnail_url, blurred_thumbnail_url = content_info
 
-    # Check if already revealed
-    with reg._conn() as con, con.cursor() as cur:
-        cur.execute("""
-            SELECT id FROM vault_interactions 
-            WHERE user_id = %s AND content_id = %s AND action = 'revealed'
-        """, (user_id, content_id))
-
-        already = cur.fetchone() is not None
+    # Check if already revealed (user's cached revealed set, which also holds
+    # reveals still waiting in the REVEALS buffer)
+    already = content_id in vault_index.REVEALED.get(user_id)
 
     if already:
         # fetch media info
@@ -1418,14 +1319,9 @@ async def confirm_content_reveal(query, context: ContextTypes.DEFAULT_TYPE, cont
         else:
             return await query.edit_message_text("⚠️ Media not available. Ask admin to re-submit.")
 
-        # mark this item as revealed for this user
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute("""
-                INSERT INTO vault_interactions(user_id, content_id, action, created_at)
-                VALUES (%s, %s, 'revealed', NOW())
-                ON CONFLICT (user_id, content_id, action) DO NOTHING
-            """, (user_id, content_id))
-            con.commit()
+        # mark this item as revealed for this user (batched; bumps view/reveal counts)
+        REVEALS.add(user_id, content_id, "revealed")
+        vault_index.REVEALED.add(user_id, content_id, cat_id)
 
         # harvest id if needed
         if not file_id and new_file_id:
@@ -1433,24 +1329,14 @@ async def confirm_content_reveal(query, context: ContextTypes.DEFAULT_TYPE, cont
                 cur.execute("UPDATE vault_content SET file_id=%s WHERE id=%s", (new_file_id, content_id))
                 con.commit()
 
-        # bump counters
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute("""
-                UPDATE vault_content
-                   SET view_count = COALESCE(view_count,0)+1,
-                       reveal_count = COALESCE(reveal_count,0)+1,
-                       updated_at = NOW()
-                 WHERE id=%s
-            """, (content_id,))
-            con.commit()
-
     except Exception as e:
         await query.edit_message_text(f"❌ Reveal failed: {e}")
 
 
 # ============ SENDING FUNCTIONS (for navigation) ============
 
-async def send_category_page(context, chat_id: int, user_id: int, category_id: int, page: int = 1):
+async def send_category_page(context, chat_id: int, user_id: int, category_id: int, page: int = 1,
+                             after=None, before=None):
     """Send fresh category page with pagination support"""
     # Check if user is premium (admin bypass)
     is_premium = reg.has_active_premium(user_id)
@@ -1479,16 +1365,27 @@ async def send_category_page(context, chat_id: int, user_id: int, category_id: i
 
     cat_name, cat_emoji, cat_desc = cat_info
     
-    # Pagination setup
+    # Pagination setup: keyset pages (see utils/vault_index.py); `after` / `before`
+    # is the key of the item the user paged from
     items_per_page = 10
-    offset = (page - 1) * items_per_page
-    
+
     # Get total count for pagination
     total_count = get_vault_content_total_count(category_id, user_id)
-    total_pages = (total_count + items_per_page - 1) // items_per_page  # Ceiling division
-    
+    total_pages = max(1, (total_count + items_per_page - 1) // items_per_page)  # Ceiling division
+
     # Get content for current page
-    content_list = get_vault_content_by_category(category_id, user_id, items_per_page, offset)
+    content_list, more = get_vault_content_by_category(category_id, user_id, items_per_page,
+                                                       after=after, before=before)
+    if not content_list and (after is not None or before is not None):
+        # everything past the key was revealed or removed meanwhile: start over
+        return await send_category_page(context, chat_id, user_id, category_id)
+    if before is not None:
+        has_prev, has_next = more, True
+        if not more:
+            page = 1
+    else:
+        has_prev, has_next = page > 1, more
+    page = max(1, min(page, total_pages))
 
     if not content_list:
         text = f"{cat_emoji} **{cat_name}**\n\n🔒 No content available in this category yet.\n\nBe the first to submit something exciting!"
@@ -1521,12 +1418,14 @@ async def send_category_page(context, chat_id: int, user_id: int, category_id: i
     nav_buttons = []
     
     # Previous page button (if not on first page)
-    if page > 1:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"vault:cat:{category_id}:{page-1}"))
+    if has_prev:
+        first = vault_index.encode_key(content_list[0]["key"])
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"vault:cat:{category_id}:{page-1}:p{first}"))
     
     # Next page button (if not on last page)
-    if page < total_pages:
-        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"vault:cat:{category_id}:{page+1}"))
+    if has_next:
+        last = vault_index.encode_key(content_list[-1]["key"])
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"vault:cat:{category_id}:{page+1}:n{last}"))
     
     # Add navigation row if we have nav buttons
     if nav_buttons:
@@ -1560,11 +1459,19 @@ async def handle_vault_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             parts = data.split(":")
             category_id = int(parts[2])
             page = int(parts[3]) if len(parts) > 3 else 1  # Default to page 1
+            # vault:cat:<id>:<page>:n<key> (older than key) / p<key> (newer than key);
+            # without a key (old buttons) start from the first page
+            key = vault_index.decode_key(parts[4][1:]) if len(parts) > 4 else None
+            after = key if key and parts[4][0] == "n" else None
+            before = key if key and parts[4][0] == "p" else None
+            if key is None:
+                page = 1
             try:
                 # Delete media card and send fresh category list
                 chat_id = query.message.chat_id
                 await _delete_quiet(query)  # delete media card
-                await send_category_page(context, chat_id, user_id, category_id, page)  # fresh list with pagination
+                await send_category_page(context, chat_id, user_id, category_id, page,
+                                         after=after, before=before)  # fresh list with pagination
                 log.info(f"User {user_id} navigated to category {category_id}, page {page}")
             except Exception as e:
                 log.error(f"Error showing category {category_id}, page {page}: {e}")
@@ -1844,13 +1751,10 @@ async def show_random_content(query, user_id: int):
             FROM vault_content 
             WHERE approval_status = 'approved' 
                 AND submitter_id != %s
-                AND id NOT IN (
-                    SELECT content_id FROM vault_interactions 
-                    WHERE user_id = %s AND action = 'revealed'
-                )
+                AND id <> ALL(%s)
             ORDER BY RANDOM()
             LIMIT 1
-        """, (user_id, user_id))
+        """, (user_id, list(vault_index.REVEALED.get(user_id).ids)))
 
         random_content = cur.fetchone()
 
@@ -13,7 +13,8 @@ from registration import _conn
 import psycopg2
 
 # Import async database utility
-from utils.db_async import run_db
+from utils import db_async as adb
+from utils.confession_assign import assign_recipients, claim_round_locks, mark_delivered
 
 # Import state management
 from handlers.text_framework import set_state, make_cancel_kb, clear_state, requires_state, claim_or_reject
@@ -48,7 +49,6 @@ def _ensure_conf_round_lock():
         print(f"[conf] lock schema err: {e}")
 
 def _try_mark_round_delivery(user_id: int) -> bool:
-    _ensure_conf_round_lock()
     rk = _current_round_key()
     try:
         with _conn() as con, con.cursor() as cur:
@@ -668,28 +668,16 @@ async def notify_admin_new_reply(context, pending_reply_id: int, confession_id:
 async def approve_confession(update, context, pending_id: int):
     """Admin approves a confession - moves it to main confessions table"""
     try:
-        def approve_db_transaction(pending_id):
-            with _conn() as con, con.cursor() as cur:
-                # Get pending confession
-                cur.execute("SELECT author_id, text FROM pending_confessions WHERE id = %s", (pending_id,))
-                result = cur.fetchone()
-                if not result:
-                    return None
-
-                author_id, text = result
-
-                # Move to main confessions table
-                cur.execute(
-                    "INSERT INTO confessions (author_id, text, system_seed) VALUES (%s, %s, FALSE)",
-                    (author_id, text)
-                )
-
-                # Remove from pending
-                cur.execute("DELETE FROM pending_confessions WHERE id = %s", (pending_id,))
-                con.commit()
-                return (author_id, text)
-        
-        result = await run_db(approve_db_transaction, pending_id)
+        # Move pending -> confessions in one atomic statement
+        result = await adb.fetchrow("""
+            WITH p AS (
+                DELETE FROM pending_confessions WHERE id = $1 RETURNING author_id, text
+            ), moved AS (
+                INSERT INTO confessions (author_id, text, system_seed)
+                SELECT author_id, text, FALSE FROM p
+            )
+            SELECT author_id, text FROM p
+        """, pending_id)
         if not result:
             return await update.callback_query.answer("❌ Confession not found!")
         
@@ -711,22 +699,10 @@ async def approve_confession(update, context, pending_id: int):
 async def reject_confession(update, context, pending_id: int):
     """Admin rejects a confession - removes it permanently"""
     try:
-        def reject_db_transaction(pending_id):
-            with _conn() as con, con.cursor() as cur:
-                # Get pending confession for notification
-                cur.execute("SELECT author_id, text FROM pending_confessions WHERE id = %s", (pending_id,))
-                result = cur.fetchone()
-                if not result:
-                    return None
-
-                author_id, text = result
-
-                # Remove from pending (rejected)
-                cur.execute("DELETE FROM pending_confessions WHERE id = %s", (pending_id,))
-                con.commit()
-                return (author_id, text)
-        
-        result = await run_db(reject_db_transaction, pending_id)
+        # Remove from pending (rejected), keeping text for the admin message
+        result = await adb.fetchrow(
+            "DELETE FROM pending_confessions WHERE id = $1 RETURNING author_id, text", pending_id
+        )
         if not result:
             return await update.callback_query.answer("❌ Confession not found!")
         
@@ -1243,18 +1219,10 @@ async def save_confession_reply(update: Update, context: ContextTypes.DEFAULT_TY
     user_id = update.effective_user.id
 
     try:
-        def save_reply_db_transaction(confession_id, user_id, reply_text):
-            with _conn() as con, con.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO pending_confession_replies (original_confession_id, replier_user_id, reply_text) 
-                    VALUES (%s, %s, %s) RETURNING id
-                """, (confession_id, user_id, reply_text))
-
-                pending_reply_id = cur.fetchone()[0]
-                con.commit()
-                return pending_reply_id
-        
-        pending_reply_id = await run_db(save_reply_db_transaction, confession_id, user_id, reply_text)
+        pending_reply_id = await adb.fetchval("""
+            INSERT INTO pending_confession_replies (original_confession_id, replier_user_id, reply_text)
+            VALUES ($1, $2, $3) RETURNING id
+        """, confession_id, user_id, reply_text)
         
         # Notify admin for approval
         await notify_admin_new_reply(context, pending_reply_id, confession_id, reply_text, user_id)
@@ -1770,55 +1738,29 @@ async def deliver_confessions_batch(context: ContextTypes.DEFAULT_TYPE):
                     base_union |= TESTERS
                     print(f"[confession] 🧪 Added testers, pool size: {len(base_union)}")
 
-                per_recipient = {}
-                recent_pairs  = set()
-                assignments   = []
-
-                def _pick(author: int, pool: set[int], cap: int):
-                    cand = set(pool)
-                    cand.discard(int(author))
-                    if not cand: return None
-                    ordered = sorted(cand, key=lambda r: per_recipient.get(r, 0))
-                    for r in ordered:
-                        if per_recipient.get(r, 0) < cap and (author, r) not in recent_pairs:
-                            return r
-                    return None
-
-                # FIRST PASS: guarantee for confessors
-                for cid, author, text in confs:
-                    if int(author) not in today_conf:
-                        continue
-                    r = _pick(author, base_union, FIRST_PASS_MAX)
-                    if r is None:  continue
-                    assignments.append((int(cid), int(author), str(text), int(r)))
-                    per_recipient[r] = per_recipient.get(r, 0) + 1
-                    recent_pairs.add((int(author), int(r)))
-
-                # SECOND PASS: fill remaining
-                assigned_ids = {a[0] for a in assignments}
-                remaining = [(int(cid), int(author), str(text)) for (cid, author, text) in confs
-                             if int(cid) not in assigned_ids]
-                for cid, author, text in remaining:
-                    r = _pick(author, base_union, SECOND_PASS_MAX)
-                    if r is None:  continue
-                    assignments.append((cid, int(author), text, int(r)))
-                    per_recipient[r] = per_recipient.get(r, 0) + 1
-                    recent_pairs.add((int(author), int(r)))
+                assignments, per_recipient = assign_recipients(
+                    confs, today_conf, base_union, FIRST_PASS_MAX, SECOND_PASS_MAX)
 
                 if not assignments:
                     print("[confession] no eligible recipients this tick");  return
 
                 print(f"[confession] 📤 Ready to send {len(assignments)} confessions to {len(per_recipient)} recipients")
 
-                # SEND in chunks + mark delivered (same conn reused)
+                # SEND in chunks: one round-lock claim + one delivered UPDATE per chunk (same conn)
+                rk = _current_round_key()
                 sent = 0
                 for i in range(0, len(assignments), CHUNK_SIZE):
                     chunk = assignments[i:i+CHUNK_SIZE]
+                    with con.cursor() as cur:
+                        claimed = claim_round_locks(cur, [a[3] for a in chunk], rk)
+                    con.commit()
+                    delivered = []
                     for cid, author, text, recipient in chunk:
-                        # Check round lock to prevent double delivery
-                        if not _try_mark_round_delivery(recipient):
+                        # Round lock prevents double delivery (also within this chunk)
+                        if recipient not in claimed:
                             print(f"[confession] 🔒 User {recipient} already got confession this round, skipping")
                             continue
+                        claimed.discard(recipient)
                         # Enhanced confession message with reply option
                         msg = f"""🔔 SOMEONE NEEDS YOUR SUPPORT!
 
@@ -1836,20 +1778,15 @@ Type /reply_{cid} followed by your message
                         if not ok:
                             print(f"[confession] 📧❌ send fail (after retries) cid={cid} -> {recipient}")
                             continue
-                        try:
-                            with con.cursor() as cur:
-                                cur.execute("""
-                                  UPDATE confessions
-                                     SET delivered = TRUE,
-                                         delivered_to = %s,
-                                         delivered_at = NOW()
-                                   WHERE id = %s
-                                """, (recipient, cid))
-                            con.commit()
-                            sent += 1
-                            print(f"[confession] ✅ cid={cid} -> user_{recipient}")
-                        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-                            print(f"[confession] 🗄️❌ DB mark failed, will retry next tick: {e}")
+                        delivered.append((cid, recipient))
+                    try:
+                        with con.cursor() as cur:
+                            mark_delivered(cur, delivered)
+                        con.commit()
+                        sent += len(delivered)
+                        print(f"[confession] ✅ chunk {i // CHUNK_SIZE + 1}: {len(delivered)}/{len(chunk)} delivered")
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                        print(f"[confession] 🗄️❌ DB mark failed, will retry next tick: {e}")
                     await asyncio.sleep(CHUNK_PAUSE_SEC)
 
                 print(f"[confession] 🎯 delivered={sent} rows; recipients_served={len(per_recipient)}")
@@ -2071,9 +2008,6 @@ def _get_confession_author(conf_id: int) -> int | None:
         return None
 
 def register(app):
-    # Ensure table structure is up to date
-    ensure_confessions_table()
-
     # Insert seed confessions on startup
     insert_seed_confessions()
 
@@ -2140,15 +2074,6 @@ async def conf_mute(update: Update, context: ContextTypes.DEFAULT_TYPE):
         conf_id = int((q.data or "").split(":")[1])
         uid = q.from_user.id
         with _conn() as con, con.cursor() as cur:
-            # Ensure table exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS confession_mutes(
-                    user_id BIGINT NOT NULL,
-                    confession_id BIGINT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY(user_id, confession_id)
-                )
-            """)
             # Insert mute, do nothing if already exists
             cur.execute(
                 "INSERT INTO confession_mutes(user_id, confession_id) VALUES (%s,%s) ON CONFLICT DO NOTHING",
@@ -163,7 +163,6 @@ def ensure_powerup_tables():
 
 async def check_and_award_achievements(user_id: int, context: ContextTypes.DEFAULT_TYPE):
     """Check and award achievements to user (MY ADDITION!)"""
-    ensure_powerup_tables()
     
     # Get user stats for achievement checking
     stats_query = """
@@ -257,7 +256,6 @@ async def cmd_fantasy_leaderboard(update: Update, context: ContextTypes.DEFAULT_
     if not update.effective_user or not update.message:
         return
     
-    ensure_powerup_tables()
     
     # Get current week's leaderboard
     week_start = datetime.utcnow().date() - timedelta(days=datetime.utcnow().weekday())
@@ -309,7 +307,6 @@ async def cmd_fantasy_events(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not update.effective_user or not update.message:
         return
     
-    ensure_powerup_tables()
     
     # Get active events
     active_events = _exec("""
@@ -372,7 +369,6 @@ async def cmd_fantasy_events(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def start_fantasy_event(event_key: str, duration_hours: int = 24):
     """Start a fantasy event (MY ADDITION!)"""
-    ensure_powerup_tables()
     
     start_time = datetime.utcnow()
     end_time = start_time + timedelta(hours=duration_hours)
@@ -393,7 +389,6 @@ async def cmd_fantasy_achievements(update: Update, context: ContextTypes.DEFAULT
         return
     
     user_id = update.effective_user.id
-    ensure_powerup_tables()
     
     # Get user's achievements
     user_achievements = _exec("""
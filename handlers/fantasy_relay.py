@@ -32,7 +32,6 @@ def _ensure_relay_table():
         con.commit()
 
 def relay_open(a_id: int, b_id: int) -> int:
-    _ensure_relay_table()
     with reg._conn() as con, con.cursor() as cur:
         cur.execute("INSERT INTO fantasy_chat_sessions(a_id,b_id) VALUES(%s,%s) RETURNING id",(a_id,b_id))
         sid = cur.fetchone()[0]
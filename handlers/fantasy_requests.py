@@ -261,7 +261,6 @@ async def start_connect_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
     If requester is male w/o premium -> show neutral premium upsell (no request is sent).
     Otherwise -> send consent request to owner. Also show an ephemeral 'Request sent!' that auto-deletes.
     """
-    ensure_match_request_table()
 
     uid = effective_uid(update)
     if uid is None:
@@ -690,7 +690,6 @@ async def _show_post_vote_interface(update: Update, user_choice: str):
 
 # --------- /naughtywyr command ---------
 async def cmd_naughtywyr(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    _ensure_schema()
     now = _now_ist()
 
     if _in_live_window(now):
@@ -755,7 +754,6 @@ async def cmd_naughtywyr(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --------- Scheduler push at 8:15 PM (notifications.job_wyr_push calls this) ---------
 async def push_naughty_wyr_question(context: ContextTypes.DEFAULT_TYPE):
-    _ensure_schema()
     today = datetime.date.today()
     a_text, b_text = _get_or_seed_today_question()
 
@@ -788,32 +786,34 @@ async def push_naughty_wyr_question(context: ContextTypes.DEFAULT_TYPE):
             f"🔥 {b_text}\n\n"
             f"⚡ LIVE NOW: {live} have voted so far!")
 
-    sent = 0
-    for uid in recipients:
+    # Variant 1 = premium users, whose button opens the voter list
+    premium = set()
+    if recipients:
         try:
-            # Create dynamic keyboard based on user's premium status
-            from registration import has_active_premium
-
-            if has_active_premium(uid):
-                premium_btn = InlineKeyboardButton("💎 See who voted", callback_data="nwyr:who")
-            else:
-                premium_btn = InlineKeyboardButton("💎 See who voted", callback_data="premium:open")
-
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("💋 Option A", callback_data="nwyr:vote:A"),
-                 InlineKeyboardButton("🔥 Option B", callback_data="nwyr:vote:B")],
-                [premium_btn]
-            ])
-
-            await context.bot.send_message(uid, text, reply_markup=kb)
-            sent += 1
+            with _conn() as con, con.cursor() as cur:
+                cur.execute("""
+                  SELECT tg_user_id FROM users
+                  WHERE tg_user_id = ANY(%s)
+                    AND (COALESCE(is_premium, FALSE) OR premium_until > NOW())
+                """, (recipients,))
+                premium = {int(r[0]) for r in cur.fetchall()}
         except Exception:
             pass
-    print(f"[nwyr-push] sent={sent}/{len(recipients)}")
+
+    vote_row = [InlineKeyboardButton("💋 Option A", callback_data="nwyr:vote:A"),
+                InlineKeyboardButton("🔥 Option B", callback_data="nwyr:vote:B")]
+    kb_free = InlineKeyboardMarkup([vote_row, [InlineKeyboardButton("💎 See who voted", callback_data="premium:open")]])
+    kb_premium = InlineKeyboardMarkup([vote_row, [InlineKeyboardButton("💎 See who voted", callback_data="nwyr:who")]])
+
+    from utils.broadcast import ENGINE
+    job_id = await ENGINE.submit(
+        context.bot, "nwyr", text, {uid: int(uid in premium) for uid in recipients},
+        markups=(kb_free, kb_premium), dedupe_key=f"nwyr:{today.isoformat()}",
+    )
+    print(f"[nwyr-push] queued job={job_id} recipients={len(recipients)}")
 
 # --------- Vote handler ---------
 async def on_nwyr_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    _ensure_schema()
     q = update.callback_query
     await q.answer()
 
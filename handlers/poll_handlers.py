@@ -408,7 +408,6 @@ async def cmd_poll(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def register(app):
     """Register poll handlers"""
-    ensure_poll_tables()
 
     # HIGHEST PRIORITY: Poll text capture (runs BEFORE all other text handlers to prevent swallowing)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, poll_text_sink), group=-9)
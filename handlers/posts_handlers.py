@@ -14,6 +14,10 @@ import chat # Import chat module for busy check
 from utils.cb import cb_match, CBError
 from utils.val import clip, MAX_POST, MAX_COMMENT
 from utils.input_validation import validate_and_sanitize_input
+from utils import db_async as adb
+from utils.feed_cursor import CURSORS, POSTS, get_post
+from utils import story_tray
+from utils.impressions import CountInto, ImpressionBuffer
 
 log = logging.getLogger("luvbot.posts")
 
@@ -64,39 +68,19 @@ def _list_blocked(uid: int, limit: int = 30) -> list[tuple[int, str]]:
 
 
 # --- Views (seen) helpers ---
-async def _track_view(post_id: int, viewer_id: int):
-    try:
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "INSERT INTO feed_views(post_id,viewer_id) VALUES (%s,%s) ON CONFLICT DO NOTHING",
-                (post_id, viewer_id)
-            )
-            con.commit()
-    except Exception as e:
-        print(f"track_view error: {e}")
+# Views are written behind the handler in batches (see utils/impressions.py),
+# which also keep feed_posts.view_count / stories.view_count up to date;
+# flush_views() runs at shutdown. Story views share the mini app's buffer
+# (story_tray.VIEWS, keyed by users.id).
+FEED_VIEWS = ImpressionBuffer("feed_views", ("post_id", "viewer_id"), tag="feed_views",
+                              count_into=CountInto("feed_posts", "id", "post_id", ("view_count",)))
 
-def _seen_count(pid: int) -> int:
-    try:
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM feed_views WHERE post_id=%s", (pid,))
-            row = cur.fetchone()
-            return int(row[0] or 0)
-    except Exception as e:
-        print(f"seen_count error: {e}")
-        return 0
+async def _track_view(post_id: int, viewer_id: int):
+    FEED_VIEWS.add(post_id, viewer_id)
 
-# --- Reactions helper ---
-def _rx_counts(pid: int) -> dict:
-    try:
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "SELECT emoji, COUNT(*) FROM feed_reactions WHERE post_id=%s GROUP BY emoji",
-                (pid,)
-            )
-            return {row[0]: int(row[1]) for row in cur.fetchall()}
-    except Exception as e:
-        print(f"rx_counts error: {e}")
-        return {}
+def flush_views():
+    FEED_VIEWS.close()
+    story_tray.VIEWS.close()
 
 # ---- display helpers ----
 def safe_display_name(uid: int) -> str:
@@ -264,22 +248,11 @@ def ensure_feed_posts_table():
                     expires_at TIMESTAMPTZ NOT NULL
                 );
             """)
-            # Add story_views table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS story_views (
-                    story_id BIGINT REFERENCES stories(id) ON DELETE CASCADE,
-                    viewer_id BIGINT NOT NULL,
-                    viewed_at TIMESTAMPTZ DEFAULT NOW(),
-                    PRIMARY KEY (story_id, viewer_id)
-                );
-            """)
+            # story_views (keyed by users.id) comes from V20261017.2__request_path_tables.sql
             con.commit()
     except Exception as e:
         print(f"Table creation error: {e}")
 
-# Initialize tables at startup
-ensure_feed_posts_table()
-
 USER_STATE = {}       # uid -> state string (e.g. set_uname, set_bio, set_privacy, comment:<pid>, search)
 
 # Story constants
@@ -301,8 +274,10 @@ def _posts_count(uid: int) -> int:
     return len(posts_dict.get(uid, []))
 
 # --- FEED NAV STATE ---
-POST_INDEX: dict[int, int] = {}     # user_id -> current index within FEED_LIST
-FEED_LIST: dict[int, list[int]] = {}  # user_id -> list of post IDs (current feed)
+# Per-viewer feed position lives in utils.feed_cursor.CURSORS (keyset pages).
+def _nav_flags(uid: int) -> tuple[bool, bool]:
+    cur = CURSORS.get(uid)
+    return (cur.has_prev, cur.has_next) if cur else (False, False)
 
 USERNAME_RE = re.compile(r"^[a-zA-Z0-9_]{3,20}$")
 UNAME_COOLDOWN = timedelta(days=30)
@@ -471,39 +446,28 @@ async def safe_edit(target, text, kb=None, **kwargs):
         except Exception:
             return
 
+def _rx_line(post) -> str:
+    rx = post["reactions"]
+    return " ".join([f"{e} {rx.get(e,0)}" for e in ["😍","🔥","😂","😢","👏"] if rx.get(e)])
+
 def build_post_caption(post):
-    likes = len(post["likes"])
-    author_id = post["author_id"]
-    disp = safe_display_name(author_id)
-    # show comment count
-    cc = len(post["comments"])
+    disp = post["author_name"]
     text = post["text"] or ""
-    # show seen count
-    seen = _seen_count(post["id"])
-    # Add reaction counts
-    rx = _rx_counts(post["id"])
-    rx_line = " ".join([f"{e} {rx.get(e,0)}" for e in ["😍","🔥","😂","😢","👏"] if rx.get(e)])
-    return f"👤 {disp}\n{text}\n\n❤️ {likes}   💬 {cc}   👁 {seen}\n{rx_line}\n{cap_invisible()}".strip()
+    likes, cc, seen = post["like_count"], post["comment_count"], post["seen_count"]
+    return f"👤 {disp}\n{text}\n\n❤️ {likes}   💬 {cc}   👁 {seen}\n{_rx_line(post)}\n{cap_invisible()}".strip()
 
 def build_post_caption_with_clickable_user(post):
     """Post caption with clickable username button"""
-    likes = len(post["likes"])
     author_id = post["author_id"]
     prof = ensure_profile(author_id)
     disp = prof["username"] if prof["username"] else f"ID {author_id}"
-    # show comment count
-    cc = len(post["comments"])
     text = post["text"] or ""
-    # show seen count
-    seen = _seen_count(post["id"])
-    # Add reaction counts
-    rx = _rx_counts(post["id"])
-    rx_line = " ".join([f"{e} {rx.get(e,0)}" for e in ["😍","🔥","😂","😢","👏"] if rx.get(e)])
-    return f"👤 {disp}\n{text}\n\n❤️ {likes}   💬 {cc}   👁 {seen}\n{rx_line}\n{cap_invisible()}".strip()
+    likes, cc, seen = post["like_count"], post["comment_count"], post["seen_count"]
+    return f"👤 {disp}\n{text}\n\n❤️ {likes}   💬 {cc}   👁 {seen}\n{_rx_line(post)}\n{cap_invisible()}".strip()
 
-def build_nav_kb(pid: int, has_prev: bool, has_next: bool, own: bool) -> InlineKeyboardMarkup:
-    # Find post to get author info
-    post = find_post(pid)
+def build_nav_kb(pid: int, has_prev: bool, has_next: bool, own: bool, post=None) -> InlineKeyboardMarkup:
+    # Author info comes from the hydrated post (usually already cached)
+    post = post or get_post(pid)
 
     row1 = [
         InlineKeyboardButton("❤️ Like", callback_data=f"like:{pid}"),
@@ -526,9 +490,7 @@ def build_nav_kb(pid: int, has_prev: bool, has_next: bool, own: bool) -> InlineK
     username_row = []
     if post and not own:
         author_id = post["author_id"]
-        prof = ensure_profile(author_id)
-        username = prof.get("username") or get_username(None, author_id)
-        name = safe_display_name(author_id)
+        name = post["author_name"]
         username_row = [InlineKeyboardButton(f"👤 View {name}", callback_data=f"uprof:{author_id}")]
 
     row2 = []
@@ -762,8 +724,11 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "text": text,
                     "photo": photo,
                     "video": video,
-                    "likes": set(),
-                    "comments": []
+                    "author_name": safe_display_name(uid),
+                    "like_count": 0,
+                    "comment_count": 0,
+                    "seen_count": 0,
+                    "reactions": {},
                 }
         except Exception as e:
             await update.message.reply_text(f"❌ Error creating post: {e}")
@@ -777,18 +742,18 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
             sent = await update.message.reply_video(
                 video,
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(post["id"], False, False, True)
+                reply_markup=build_nav_kb(post["id"], False, False, True, post)
             )
         elif photo:
             sent = await update.message.reply_photo(
                 photo,
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(post["id"], False, False, True)
+                reply_markup=build_nav_kb(post["id"], False, False, True, post)
             )
         else:
             sent = await update.message.reply_text(
                 build_post_caption(post),
-                reply_markup=build_nav_kb(post["id"], False, False, True)
+                reply_markup=build_nav_kb(post["id"], False, False, True, post)
             )
 
         # delete preview after 5 sec
@@ -943,7 +908,8 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
             asyncio.create_task(delete_msgs())
 
             # Send notification for comment
-            post = find_post(pid)
+            POSTS.invalidate(pid)
+            post = get_post(pid)
             if post:
                 author = post.get("author_id")
                 actor = uid
@@ -956,8 +922,6 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await _send_post_notify(context.bot, recipient_uid=author, actor_uid=actor,
                                             title=title, body=body, kind="comment", pid=pid)
 
-            # Update all instances of this post in currently active feeds
-            await update_post_everywhere(context.bot, pid)
             return
         except Exception as e:
             print(f"Comment error: {e}")
@@ -1006,14 +970,10 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await update.message.reply_text("❌ User not found or profile is private.")
                     return
 
-                # Get user's posts
-                cur.execute(
-                    "SELECT id FROM feed_posts WHERE author_id=%s ORDER BY created_at DESC",
-                    (target,)
-                )
-                post_rows = cur.fetchall()
+                # Open a cursor over the user's posts
+                feed = CURSORS.open(uid, "author", target)
 
-                if not post_rows:
+                if feed is None:
                     # Open the user's profile instead of just saying no posts
                     try:
                         await update.message.reply_text("📭 No posts found. Opening profile…")
@@ -1045,17 +1005,12 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         await update.message.reply_text(txt)
                     return
 
-                post_ids = [r[0] for r in post_rows]
-                FEED_LIST[uid] = post_ids
-                POST_INDEX[uid] = 0
-
-                p0 = find_post(post_ids[0])
+                p0 = get_post(feed.current, ahead=feed.ahead())
                 if not p0:
                     await update.message.reply_text("❌ Error loading posts.")
                     return
 
-                has_prev = False
-                has_next = len(post_ids) > 1
+                has_prev, has_next = feed.has_prev, feed.has_next
                 own = (p0["author_id"] == uid)
 
                 # Track view
@@ -1065,17 +1020,17 @@ async def handle_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 if p0.get("video"):
                     sent = await update.message.reply_video(
                         p0["video"], caption=build_post_caption(p0),
-                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own)
+                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own, p0)
                     )
                 elif p0.get("photo"):
                     sent = await update.message.reply_photo(
                         p0["photo"], caption=build_post_caption(p0),
-                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own)
+                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own, p0)
                     )
                 else:
                     sent = await update.message.reply_text(
                         build_post_caption(p0),
-                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own)
+                        reply_markup=build_nav_kb(p0["id"], has_prev, has_next, own, p0)
                     )
         except Exception as e:
             await update.message.reply_text(f"❌ Error searching: {e}")
@@ -1168,45 +1123,22 @@ async def on_public_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
 
-        with reg._conn() as con, con.cursor() as cur:
-            # Get posts from public profiles OR friends (excluding blocked users)
-            cur.execute("""
-                SELECT fp.id, fp.author_id, fp.text, fp.photo, fp.video, fp.created_at
-                FROM feed_posts fp
-                JOIN users u ON fp.author_id = u.tg_user_id
-                WHERE (u.feed_is_public = TRUE OR EXISTS (
-                           SELECT 1 FROM friends f
-                           WHERE f.user_id = %s AND f.friend_id = fp.author_id
-                       ))
-                  AND fp.author_id <> %s
-                  AND NOT EXISTS (
-                           SELECT 1 FROM blocked_users bu
-                           WHERE (bu.user_id = %s AND bu.blocked_uid = fp.author_id)
-                              OR (bu.user_id = fp.author_id AND bu.blocked_uid = %s)
-                       )
-                  -- Filter out shadow banned users' posts (unless viewing own posts)
-                  AND (COALESCE(u.shadow_banned, FALSE) = FALSE OR fp.author_id = %s)
-                ORDER BY fp.created_at DESC
-                LIMIT 50
-            """, (viewer_uid, viewer_uid, viewer_uid, viewer_uid, viewer_uid))
-            rows = cur.fetchall()
+        # Public profiles OR friends, minus blocked / shadow-banned authors,
+        # paged newest first by the cursor (see utils/feed_cursor.py)
+        feed = CURSORS.open(viewer_uid, "public")
 
-        if not rows:
+        if feed is None:
             await q.message.reply_text("No public posts yet.", reply_markup=kb_public_menu())
             return
 
-        post_ids = [r[0] for r in rows]
-        FEED_LIST[viewer_uid] = post_ids
-        POST_INDEX[viewer_uid] = 0
-        pid = post_ids[0]
-        post = find_post(pid)
+        pid = feed.current
+        post = get_post(pid, ahead=feed.ahead())
 
         if not post:
             await q.message.reply_text("❌ Error loading posts.", reply_markup=kb_public_menu())
             return
 
-        has_prev = False
-        has_next = len(post_ids) > 1
+        has_prev, has_next = feed.has_prev, feed.has_next
         own = (post["author_id"] == viewer_uid)
 
         # Track view
@@ -1230,18 +1162,18 @@ async def on_public_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await q.message.reply_video(
                 post["video"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         elif post.get("photo"):
             await q.message.reply_photo(
                 post["photo"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         else:
             await q.message.reply_text(
                 build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
     except Exception as e:
         await q.message.reply_text(f"❌ Error loading feed: {e}", reply_markup=kb_public_menu())
@@ -1314,68 +1246,45 @@ async def on_public_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -----------------------------
 # Post callbacks: like / comment / next / delete
 # -----------------------------
-def find_post(pid):
-    """Find post by ID in database"""
+def _post_comments(pid: int) -> list[dict]:
+    """Comments of a post, oldest first (only the View Comments screen needs them)."""
     try:
 
         with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "SELECT id, author_id, text, photo, video, created_at FROM feed_posts WHERE id=%s",
-                (pid,)
-            )
-            row = cur.fetchone()
-            if not row:
-                return None
-
-            # Get likes count
-            cur.execute("SELECT COUNT(*) FROM feed_likes WHERE post_id=%s", (pid,))
-            likes_count = cur.fetchone()[0] or 0
-
-            # Get likes set (for current user check)
-            cur.execute("SELECT user_id FROM feed_likes WHERE post_id=%s", (pid,))
-            likes = {r[0] for r in cur.fetchall()}
-
-            # Get comments
             cur.execute(
                 "SELECT author_id, author_name, text FROM feed_comments WHERE post_id=%s ORDER BY created_at",
                 (pid,)
             )
-            comments = [{"uid": r[0], "user": r[1], "text": r[2]} for r in cur.fetchall()]
-
-            return {
-                "id": row[0],
-                "author_id": row[1],
-                "text": row[2],
-                "photo": row[3],
-                "video": row[4],
-                "created_at": row[5],
-                "likes": likes,
-                "comments": comments
-            }
+            return [{"uid": r[0], "user": r[1], "text": r[2]} for r in cur.fetchall()]
     except Exception as e:
-        print(f"Find post error: {e}")
-        return None
+        print(f"Post comments error: {e}")
+        return []
 
-async def update_post_everywhere(bot, pid):
-    """Update all instances of a post across all active feeds when comments/likes change"""
-    post = find_post(pid)
-    if not post:
-        return
+async def _show_post_edit(q, post, uid: int):
+    """Replace the feed message with `post`, keeping the viewer's nav flags."""
+    pid = post["id"]
+    has_prev, has_next = _nav_flags(uid)
+    own = (post.get("author_id") == uid)
+    kb = build_nav_kb(pid, has_prev, has_next, own, post)
+    if post.get("video"):
+        media = InputMediaVideo(media=post["video"], caption=nz(build_post_caption(post)))
+        await q.edit_message_media(media=media, reply_markup=kb)
+    elif post.get("photo"):
+        media = InputMediaPhoto(media=post["photo"], caption=nz(build_post_caption(post)))
+        await q.edit_message_media(media=media, reply_markup=kb)
+    else:
+        await q.edit_message_text(nz(build_post_caption(post)), reply_markup=kb)
 
-    # Find all users who might have this post in their current feed
-    for user_id, feed_ids in FEED_LIST.items():
-        if pid in feed_ids:
-            current_idx = POST_INDEX.get(user_id, 0)
-            if current_idx < len(feed_ids) and feed_ids[current_idx] == pid:
-                # This user is currently viewing this post
-                has_prev = current_idx > 0
-                has_next = current_idx + 1 < len(feed_ids)
-                own = (post.get("author_id") == user_id)
-
-                # We need to find their current message to update it
-                # Since we don't store message IDs, this is a limitation
-                # In a real app, you'd store message_id with each post view
-                pass
+async def _refresh_post_caption(q, post, uid: int):
+    """Re-render the counts on the message showing `post` (media stays as is)."""
+    pid = post["id"]
+    has_prev, has_next = _nav_flags(uid)
+    own = (post.get("author_id") == uid)
+    kb = build_nav_kb(pid, has_prev, has_next, own, post)
+    if post.get("video") or post.get("photo"):
+        await q.edit_message_caption(caption=nz(build_post_caption(post)), reply_markup=kb)
+    else:
+        await q.edit_message_text(text=nz(build_post_caption(post)), reply_markup=kb)
 
 async def handle_feed_nav(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle feed navigation callbacks (next/prev)"""
@@ -1383,74 +1292,27 @@ async def handle_feed_nav(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = q.data or ""
     uid = q.from_user.id
 
-    if data == "next":
-        ids = FEED_LIST.get(uid, [])
-        idx = POST_INDEX.get(uid, 0)
-        if not ids:
-            await q.answer("No feed state", show_alert=True)
-            return
-        if idx + 1 >= len(ids):
-            await q.answer("⚠️ This is the last post.", show_alert=True)
-            return
-
-        await q.answer()
-        idx += 1
-        POST_INDEX[uid] = idx
-        pid = ids[idx]
-        post = find_post(pid)
-        if not post:
-            return
-
-        has_prev = idx > 0
-        has_next = idx + 1 < len(ids)
-        own = (post.get("author_id") == uid)
-
-        await _track_view(pid, uid)
-
-        if post.get("video"):
-            media = InputMediaVideo(media=post["video"], caption=nz(build_post_caption(post)))
-            await q.edit_message_media(media=media, reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        elif post.get("photo"):
-            media = InputMediaPhoto(media=post["photo"], caption=nz(build_post_caption(post)))
-            await q.edit_message_media(media=media, reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        else:
-            await q.edit_message_text(nz(build_post_caption(post)), reply_markup=build_nav_kb(pid, has_prev, has_next, own))
+    if data not in ("next", "prev"):
+        return
+    feed = CURSORS.get(uid)
+    if feed is None:
+        await q.answer("No feed state", show_alert=True)
         return
 
-    elif data == "prev":
-        ids = FEED_LIST.get(uid, [])
-        idx = POST_INDEX.get(uid, 0)
-        if not ids:
-            await q.answer("No feed state", show_alert=True)
-            return
-        if idx == 0:
-            await q.answer("⚠️ This is the first post.", show_alert=True)
-            return
-
-        await q.answer()
-        idx -= 1
-        POST_INDEX[uid] = idx
-        pid = ids[idx]
-        post = find_post(pid)
-        if not post:
-            return
-
-        has_prev = idx > 0
-        has_next = idx + 1 < len(ids)
-        own = (post.get("author_id") == uid)
-
-        await _track_view(pid, uid)
+    pid = CURSORS.move(uid, +1 if data == "next" else -1)
+    if pid is None:
+        msg = "⚠️ This is the last post." if data == "next" else "⚠️ This is the first post."
+        await q.answer(msg, show_alert=True)
+        return
 
-        if post.get("video"):
-            media = InputMediaVideo(media=post["video"], caption=nz(build_post_caption(post)))
-            await q.edit_message_media(media=media, reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        elif post.get("photo"):
-            media = InputMediaPhoto(media=post["photo"], caption=nz(build_post_caption(post)))
-            await q.edit_message_media(media=media, reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        else:
-            await q.edit_message_text(nz(build_post_caption(post)), reply_markup=build_nav_kb(pid, has_prev, has_next, own))
+    await q.answer()
+    post = get_post(pid, ahead=feed.ahead())
+    if not post:
         return
 
+    await _track_view(pid, uid)
+    await _show_post_edit(q, post, uid)
+
 async def view_profile_friends(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View other user's friends list with posts/add friend actions."""
     q = update.callback_query
@@ -1767,35 +1629,23 @@ async def show_user_feed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if reg.is_blocked(viewer_uid, target_uid):
         return
 
-    # Fetch posts from DB
+    # Set up feed state for viewer (first page of the user's posts)
     try:
-
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM feed_posts WHERE author_id=%s ORDER BY created_at DESC",
-                (target_uid,)
-            )
-            rows = cur.fetchall()
-        if not rows:
-            await q.message.reply_text("📭 No posts found for this user.")
-            return
-        post_ids = [r[0] for r in rows]
+        feed = CURSORS.open(viewer_uid, "author", target_uid)
     except Exception as e:
         await q.message.reply_text(f"❌ Error loading posts: {e}")
         return
+    if feed is None:
+        await q.message.reply_text("📭 No posts found for this user.")
+        return
 
-    # Set up feed state for viewer
-    FEED_LIST[viewer_uid] = post_ids
-    POST_INDEX[viewer_uid] = 0
-
-    pid = post_ids[0]
-    post = find_post(pid)
+    pid = feed.current
+    post = get_post(pid, ahead=feed.ahead())
     if not post:
         await q.message.reply_text("❌ Error loading post.")
         return
 
-    has_prev = False
-    has_next = len(post_ids) > 1
+    has_prev, has_next = feed.has_prev, feed.has_next
     own = (target_uid == viewer_uid)
 
     # Count a view
@@ -1806,18 +1656,18 @@ async def show_user_feed(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.message.reply_video(
             post["video"],
             caption=build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
     elif post.get("photo"):
         await q.message.reply_photo(
             post["photo"],
             caption=build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
     else:
         await q.message.reply_text(
             build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
 
 async def view_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1832,31 +1682,6 @@ async def view_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except (CBError, ValueError):
         return
 
-    # Get posts from database using correct column names
-    try:
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                """SELECT id, text, photo, video, created_at 
-                   FROM feed_posts WHERE author_id=%s ORDER BY created_at DESC""", 
-                (target_uid,)
-            )
-            rows = cur.fetchall()
-            posts = []
-            for row in rows:
-                posts.append({
-                    "id": row[0],
-                    "text": row[1] or "",
-                    "photo": row[2],
-                    "video": row[3], 
-                    "created_at": row[4]
-                })
-    except Exception:
-        posts = []
-    
-    if not posts or post_index >= len(posts):
-        await q.answer("❌ No posts found", show_alert=True)
-        return
-
     viewer_uid = q.from_user.id
     profile = ensure_profile(target_uid)
 
@@ -1865,16 +1690,18 @@ async def view_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.answer("❌ This profile is private", show_alert=True)
         return
 
-    # Set up feed for this user's posts
-    post_ids = [p["id"] for p in posts]
-    FEED_LIST[viewer_uid] = post_ids
-    POST_INDEX[viewer_uid] = post_index
+    # Set up feed for this user's posts, positioned at the requested index
+    try:
+        feed = CURSORS.open(viewer_uid, "author", target_uid, start=post_index)
+    except Exception:
+        feed = None
+    post = get_post(feed.current, ahead=feed.ahead()) if feed else None
+    if not post:
+        await q.answer("❌ No posts found", show_alert=True)
+        return
 
-    post = posts[post_index]
     pid = post["id"]
-
-    has_prev = post_index > 0
-    has_next = post_index + 1 < len(posts)
+    has_prev, has_next = feed.has_prev, feed.has_next
     own = (target_uid == viewer_uid)
 
     # Show the post
@@ -1882,18 +1709,18 @@ async def view_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.message.reply_video(
             post["video"],
             caption=build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
     elif post.get("photo"):
         await q.message.reply_photo(
             post["photo"],
             caption=build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
     else:
         await q.message.reply_text(
             build_post_caption(post),
-            reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+            reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
         )
 
 # --- Friend Requests ---
@@ -1908,9 +1735,7 @@ async def on_friend_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await q.answer("Invalid request.", show_alert=True)
 
     # remove pending request
-    with reg._conn() as con, con.cursor() as cur:
-        cur.execute("DELETE FROM friend_requests WHERE requester_id=%s AND target_id=%s", (uid, tid))
-        con.commit()
+    await adb.execute("DELETE FROM friend_requests WHERE requester_id=$1 AND target_id=$2", uid, tid)
 
     await q.answer("❌ Request cancelled.")
     return await view_profile(update, context)
@@ -1925,12 +1750,11 @@ async def on_friend_accept(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         return await q.answer("Invalid.", show_alert=True)
 
-    # delete pending + insert friendship both sides
-    with reg._conn() as con, con.cursor() as cur:
-        cur.execute("DELETE FROM friend_requests WHERE requester_id=%s AND target_id=%s", (rid, uid))
-        cur.execute("INSERT INTO friends(user_id, friend_id) VALUES (%s,%s) ON CONFLICT DO NOTHING", (uid, rid))
-        cur.execute("INSERT INTO friends(user_id, friend_id) VALUES (%s,%s) ON CONFLICT DO NOTHING", (rid, uid))
-        con.commit()
+    # delete pending + insert friendship both sides (one atomic statement)
+    await adb.execute("""
+        WITH d AS (DELETE FROM friend_requests WHERE requester_id=$1 AND target_id=$2)
+        INSERT INTO friends(user_id, friend_id) VALUES ($2,$1), ($1,$2) ON CONFLICT DO NOTHING
+    """, rid, uid)
 
     await q.answer("✅ Accepted.")
     # notify both
@@ -1957,9 +1781,7 @@ async def on_friend_decline(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         return await q.answer("Invalid.", show_alert=True)
 
-    with reg._conn() as con, con.cursor() as cur:
-        cur.execute("DELETE FROM friend_requests WHERE requester_id=%s AND target_id=%s", (rid, uid))
-        con.commit()
+    await adb.execute("DELETE FROM friend_requests WHERE requester_id=$1 AND target_id=$2", rid, uid)
 
     await q.answer("❌ Declined.")
     # notify requester with auto-delete
@@ -1996,9 +1818,10 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 con.commit()
         except Exception as e:
             print(f"rx error: {e}")
+        POSTS.invalidate(pid)
 
         # send notification for reactions (all emojis)
-        post = find_post(pid)
+        post = get_post(pid)
         if post:
             author_uid = post.get("author_id")
             actor_uid  = uid
@@ -2020,26 +1843,11 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                         pid=pid)
 
         # refresh caption
-        post = find_post(pid)
         if not post:
             return
-        ids = FEED_LIST.get(uid, [])
-        idx = POST_INDEX.get(uid, 0)
-        has_prev = idx > 0 if ids else False
-        has_next = idx + 1 < len(ids) if ids else False
-        own = (post.get("author_id") == uid)
 
         await q.answer()
-
-        if post.get("video"):
-            await q.edit_message_caption(caption=nz(build_post_caption(post)),
-                                         reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        elif post.get("photo"):
-            await q.edit_message_caption(caption=nz(build_post_caption(post)),
-                                         reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        else:
-            await q.edit_message_text(text=nz(build_post_caption(post)),
-                                      reply_markup=build_nav_kb(pid, has_prev, has_next, own))
+        await _refresh_post_caption(q, post, uid)
         return
 
     # Handle user profile viewing
@@ -2175,7 +1983,7 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     action, pid = data_parts[0], int(data_parts[1])
-    post = find_post(pid)
+    post = get_post(pid)
     if not post:
         await q.answer()
         return
@@ -2201,23 +2009,11 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
             print(f"Like error: {e}")
 
         # Refresh post data
-        post = find_post(pid)
+        POSTS.invalidate(pid)
+        post = get_post(pid)
         if not post:
             return
-
-        # Get current nav state
-        ids = FEED_LIST.get(uid, [])
-        idx = POST_INDEX.get(uid, 0)
-        has_prev = idx > 0 if ids else False
-        has_next = idx + 1 < len(ids) if ids else False
-        own = (post.get("author_id") == uid)
-
-        if post.get("video"):
-            await q.edit_message_caption(caption=nz(build_post_caption(post)), reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        elif post.get("photo"):
-            await q.edit_message_caption(caption=nz(build_post_caption(post)), reply_markup=build_nav_kb(pid, has_prev, has_next, own))
-        else:
-            await q.edit_message_text(text=nz(build_post_caption(post)), reply_markup=build_nav_kb(pid, has_prev, has_next, own))
+        await _refresh_post_caption(q, post, uid)
 
         # Send notification for like
         author_uid = post.get("author_id")
@@ -2236,8 +2032,8 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if action == "viewc":
-        post = find_post(pid)
-        if not post or not post["comments"]:
+        comments = _post_comments(pid) if post["comment_count"] else []
+        if not comments:
             await q.answer("No comments yet.", show_alert=True)
             return
 
@@ -2245,7 +2041,7 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # Show all comments with proper formatting
         text = "💬 **Comments:**\n\n"
-        for c in post["comments"]:
+        for c in comments:
             text += f"👤 {c['user']}: {c['text']}\n"
 
         # Add back button to return to post
@@ -2258,18 +2054,9 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if action == "backto":
         # Return to post from comments view
-        post = find_post(pid)
-        if not post:
-            await q.answer("Post not found.", show_alert=True)
-            return
-
         await q.answer()
 
-        # Get current nav state
-        ids = FEED_LIST.get(uid, [])
-        idx = POST_INDEX.get(uid, 0)
-        has_prev = idx > 0 if ids else False
-        has_next = idx + 1 < len(ids) if ids else False
+        has_prev, has_next = _nav_flags(uid)
         own = (post.get("author_id") == uid)
 
         # Track view when returning to post
@@ -2280,18 +2067,18 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await q.message.reply_video(
                 post["video"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         elif post["photo"]:
             await q.message.reply_photo(
                 post["photo"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         else:
             await q.message.reply_text(
                 build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         return
 
@@ -2311,29 +2098,14 @@ async def on_post_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await q.answer(f"❌ Error deleting post: {e}", show_alert=True)
             return
 
-        ids = FEED_LIST.get(uid, [])
-        if post["id"] in ids:
-            pos = ids.index(post["id"])
-            ids.pop(pos)
-            FEED_LIST[uid] = ids
-
-        # If posts still left, show next/previous
-        if ids:
-            POST_INDEX[uid] = max(0, min(pos, len(ids) - 1))
-            new_pid = ids[POST_INDEX[uid]]
-            new_post = find_post(new_pid)
+        POSTS.invalidate(pid)
+
+        # If posts still left, show the next (or previous) one
+        new_pid = CURSORS.discard_post(uid, pid)
+        if new_pid is not None:
+            new_post = get_post(new_pid)
             if new_post:
-                has_prev = POST_INDEX[uid] > 0
-                has_next = POST_INDEX[uid] + 1 < len(ids)
-                own = True
-                if new_post.get("video"):
-                    media = InputMediaVideo(media=new_post["video"], caption=nz(build_post_caption(new_post)))
-                    await q.edit_message_media(media=media, reply_markup=build_nav_kb(new_pid, has_prev, has_next, own))
-                elif new_post["photo"]:
-                    media = InputMediaPhoto(media=new_post["photo"], caption=nz(build_post_caption(new_post)))
-                    await q.edit_message_media(media=media, reply_markup=build_nav_kb(new_pid, has_prev, has_next, own))
-                else:
-                    await q.edit_message_text(nz(build_post_caption(new_post)), reply_markup=build_nav_kb(new_pid, has_prev, has_next, own))
+                await _show_post_edit(q, new_post, uid)
             else:
                 await safe_edit(q, "❌ Post not found. Use /post to create a new one!", kb_public_menu())
         else:
@@ -2535,10 +2307,11 @@ async def _show_story_author(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     with reg._conn() as con, con.cursor() as cur:
         cur.execute("""
-            SELECT s.id, s.kind, s.text, s.media_id, s.created_at
+            SELECT s.id, s.kind, s.text, s.media_id, s.created_at, COALESCE(s.view_count, 0),
+                   (SELECT id FROM users WHERE tg_user_id=%s)
             FROM stories s
             WHERE s.id=%s AND s.expires_at > NOW()
-        """, (sid,))
+        """, (viewer, sid))
         row = cur.fetchone()
 
     if not row:
@@ -2546,14 +2319,9 @@ async def _show_story_author(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context.user_data["stories_idx"] = idx + 1
         return await _show_story_author(update, context)
 
-    story_id, kind, text, media, created = row
+    story_id, kind, text, media, created, vcount, viewer_uid = row
     name = safe_display_name(au)
 
-    # compute views (unique)
-    with reg._conn() as con, con.cursor() as cur:
-        cur.execute("SELECT COUNT(*) FROM story_views WHERE story_id=%s", (story_id,))
-        vcount = int(cur.fetchone()[0] or 0)
-
     cap = f"📚 <b>{name}</b>\n{(text or '').strip()}\n\n👀 {vcount} views"
     
     # Only show Prev/Next buttons if there are multiple stories
@@ -2567,16 +2335,9 @@ async def _show_story_author(update: Update, context: ContextTypes.DEFAULT_TYPE)
     kb_rows.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data="pf:menu:clean")])
     kb = InlineKeyboardMarkup(kb_rows)
 
-    # mark view (unique)
-    try:
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "INSERT INTO story_views(story_id, viewer_id) VALUES (%s,%s) ON CONFLICT DO NOTHING",
-                (story_id, viewer)
-            )
-            con.commit()
-    except Exception as e:
-        print("story view err", e)
+    # mark view (unique; batched, bumps stories.view_count)
+    if viewer_uid is not None:
+        story_tray.record_view(story_id, viewer_uid, viewer)
 
     try:
         if kind == "photo":
@@ -2687,7 +2448,7 @@ async def _show_my_story(update: Update, context: ContextTypes.DEFAULT_TYPE):
         import registration as reg
         with reg._conn() as con, con.cursor() as cur:
             cur.execute("""
-                SELECT kind, text, media_id, created_at, expires_at
+                SELECT kind, text, media_id, created_at, expires_at, COALESCE(view_count, 0)
                 FROM stories
                 WHERE id=%s
             """, (sid,))
@@ -2697,10 +2458,7 @@ async def _show_my_story(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data["my_stories_idx"] = idx + 1
                 return await _show_my_story(update, context)
 
-            kind, text, media, created, expires = row
-
-            cur.execute("SELECT COUNT(*) FROM story_views WHERE story_id=%s", (sid,))
-            vcount = int(cur.fetchone()[0] or 0)
+            kind, text, media, created, expires, vcount = row
     except Exception as e:
         return await safe_edit(q, f"❌ Error: {e}", kb_public_menu())
 
@@ -2757,10 +2515,11 @@ async def on_my_story_viewers(update: Update, context: ContextTypes.DEFAULT_TYPE
         import registration as reg
         with reg._conn() as con, con.cursor() as cur:
             cur.execute("""
-                SELECT viewer_id, viewed_at
-                FROM story_views
-                WHERE story_id=%s
-                ORDER BY viewed_at DESC
+                SELECT u.tg_user_id, v.viewed_at
+                FROM story_views v
+                JOIN users u ON u.id = v.user_id
+                WHERE v.story_id=%s
+                ORDER BY v.viewed_at DESC
                 LIMIT 20
             """, (sid,))
             rows = cur.fetchall()
@@ -2834,16 +2593,10 @@ async def on_my_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = q.from_user.id
 
     try:
-        # Fetch user's own posts (DB-based)
-
-        with reg._conn() as con, con.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM feed_posts WHERE author_id=%s ORDER BY created_at DESC",
-                (uid,)
-            )
-            rows = cur.fetchall()
+        # Cursor over the user's own posts (DB-based, paged)
+        feed = CURSORS.open(uid, "author", uid)
 
-        if not rows:
+        if feed is None:
             guide_text = "📭 You have no posts yet.\n\n✍️ Use /post to create your first post!"
             guide_kb = InlineKeyboardMarkup([
                 [InlineKeyboardButton("➕ Create Post", callback_data="pf:newpost")],
@@ -2852,18 +2605,13 @@ async def on_my_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await safe_edit(q, guide_text, guide_kb)
             return
 
-        post_ids = [r[0] for r in rows]
-        FEED_LIST[uid] = post_ids
-        POST_INDEX[uid] = 0
-
-        pid = post_ids[0]
-        post = find_post(pid)
+        pid = feed.current
+        post = get_post(pid, ahead=feed.ahead())
         if not post:
             await safe_edit(q, "❌ Error loading posts.", kb_public_menu())
             return
 
-        has_prev = False
-        has_next = len(post_ids) > 1
+        has_prev, has_next = feed.has_prev, feed.has_next
         own = True  # "My Posts" are always the user's
 
         # Track view
@@ -2874,18 +2622,18 @@ async def on_my_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await q.message.reply_video(
                 post["video"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         elif post.get("photo"):
             await q.message.reply_photo(
                 post["photo"],
                 caption=build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
         else:
             await q.message.reply_text(
                 build_post_caption(post),
-                reply_markup=build_nav_kb(pid, has_prev, has_next, own)
+                reply_markup=build_nav_kb(pid, has_prev, has_next, own, post)
             )
     except Exception as e:
         await safe_edit(q, f"❌ Error loading posts: {e}", kb_public_menu())
@@ -416,7 +416,6 @@ async def qa_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # register all
 def register(app):
-    ensure_qa_tables()
     
     # HIGH PRIORITY: QA text capture (runs BEFORE firewall)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, qa_text_sink), group=-6)
@@ -662,9 +662,6 @@ async def story_submit_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def register(app):
     """Register all sensual stories handlers"""
-    # Ensure database tables exist
-    ensure_sensual_table()
-    
     # Register command handlers
     app.add_handler(CommandHandler("post_sensual", cmd_post_sensual), group=-4)
     app.add_handler(CommandHandler("sensual", cmd_sensual), group=-4)
@@ -133,11 +133,10 @@ import profile as prof
 
 # Import bulletproof protection systems
 from utils.monitoring import metrics
-from utils.db_integrity import apply_missing_constraints
+from utils import db_migration
 from utils.maintenance import maintenance_system
 from utils.privacy_compliance import privacy_manager
 from admin_commands import bulletproof_handlers
-from profile_metrics import ensure_metric_columns
 from handlers.settings_handlers import register as register_settings_handlers
 from handlers.premium_handlers import register as register_premium_handlers
 from handlers.admin_handlers import register as register_admin_handlers
@@ -293,6 +292,14 @@ async def safe_send(bot, chat_id, text, **kwargs):
     log.error(f"[safe_send] Failed to send after 3 attempts to {chat_id}")
     return None
 
+def _expire_feed_timelines() -> int:
+    """Drop following-tab timeline rows that fell out of the feed window."""
+    import registration as reg
+    from utils import feed
+
+    with reg._conn() as con:
+        return feed.expire_timelines(con, feed.TTL_HOURS)
+
 # ---- Stories cleanup loop (if you enabled Stories) ----
 async def _stories_cleanup(app):
     import registration as reg
@@ -314,6 +321,12 @@ async def _stories_cleanup(app):
                         print("[stories cleanup] skipped - another instance running")
         except Exception as e:
             print("[stories cleanup] warn:", e)
+        try:
+            expired = await asyncio.to_thread(_expire_feed_timelines)
+            if expired > 0:
+                print(f"[feed cleanup] expired {expired} timeline rows")
+        except Exception as e:
+            print("[feed cleanup] warn:", e)
         await asyncio.sleep(600)   # every 10 minutes
 
 # keep a reference to the background task
@@ -327,13 +340,6 @@ async def _on_startup(app: Application):
     try:
         print("[startup] Initializing bulletproof protection systems...")
 
-        # Initialize database integrity constraints
-        apply_missing_constraints()
-
-        # Initialize Midnight University Chronicles database schema
-        from muc_schema import ensure_muc_tables
-        ensure_muc_tables()
-
         # Initialize maintenance system
         maintenance_system.setup_automated_maintenance()
 
@@ -349,9 +355,21 @@ async def _on_startup(app: Application):
     _stories_task = app.create_task(_stories_cleanup(app))
     print("[startup] stories cleanup task started")
 
+    # resume unfinished broadcast jobs
+    try:
+        from utils.broadcast import ENGINE as BROADCAST
+        BROADCAST.start(app.bot)
+    except Exception as e:
+        log.warning(f"[startup] broadcast engine not started: {e}")
+
 async def _on_shutdown(app: Application):
     """PTB post-shutdown hook: cancel background tasks cleanly."""
     global _stories_task
+    try:
+        from utils.db_async import close_pool
+        await close_pool()
+    except Exception as e:
+        log.warning(f"[shutdown] async DB pool close failed: {e}")
     if _stories_task:
         _stories_task.cancel()
         try:
@@ -360,14 +378,46 @@ async def _on_shutdown(app: Application):
             pass
         _stories_task = None
     print("[shutdown] stories cleanup task stopped")
+    try:
+        from utils.broadcast import ENGINE as BROADCAST
+        await BROADCAST.stop()
+    except Exception as e:
+        log.warning(f"[shutdown] broadcast engine stop failed: {e}")
+    try:
+        from chat import flush_counters
+        flush_counters()
+    except Exception as e:
+        log.warning(f"[shutdown] counter flush failed: {e}")
+    try:
+        from handlers.posts_handlers import flush_views
+        flush_views()
+    except Exception as e:
+        log.warning(f"[shutdown] feed view flush failed: {e}")
+    try:
+        from handlers.blur_vault import flush_reveals
+        flush_reveals()
+    except Exception as e:
+        log.warning(f"[shutdown] vault reveal flush failed: {e}")
+    try:
+        from utils import db_pool
+        db_pool.close_pool()
+    except Exception as e:
+        log.warning(f"[shutdown] DB pool close failed: {e}")
+    # Application.shutdown() has already flushed persistence; checkpoint the WAL
+    try:
+        if hasattr(app.persistence, "close"):
+            app.persistence.close()
+    except Exception as e:
+        log.warning(f"[shutdown] persistence close failed: {e}")
 
 # ---------- Ban gate helper ----------
 async def _ban_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if user is banned and show message if so. Return True if banned."""
     uid = update.effective_user.id
     try:
-        if reg.is_banned(uid):
-            until, reason, _ = reg.get_ban_info(uid)
+        snap = await reg.aget_user_snapshot(uid)
+        if snap.is_banned():
+            until, reason = snap.banned_until, snap.banned_reason
             msg = "🚫 You are banned."
             if until:
                 try:
@@ -415,6 +465,13 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             con.commit()
     except Exception:
         pass
+    # Back from blocking the bot: include them in broadcasts again
+    try:
+        with reg._conn() as con, con.cursor() as cur:
+            cur.execute("UPDATE users SET bot_blocked_at=NULL WHERE tg_user_id=%s AND bot_blocked_at IS NOT NULL", (uid,))
+            con.commit()
+    except Exception:
+        pass
 
     # capture referral if present
     if update.message and update.message.text and update.message.text.startswith("/start"):
@@ -432,7 +489,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Not registered? kick off registration
     try:
-        if not reg.is_registered(uid):
+        if not (await reg.aget_user_snapshot(uid)).registered:
             await reg.start_registration(update, context)
             return
     except Exception:
@@ -457,7 +514,7 @@ async def on_btn_find(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await _ban_gate(update, context):
         return
     uid = update.effective_user.id
-    if not reg.is_registered(uid):
+    if not (await reg.aget_user_snapshot(uid)).registered:
         await update.message.reply_text("ℹ️ Please complete your profile first: open /settings and set gender, age and interests.")
         return
     reg.set_search_pref(uid, "any")   # reset to random
@@ -512,10 +569,11 @@ async def on_btn_match_girls(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if await _ban_gate(update, context):
         return
     uid = update.effective_user.id
-    if not reg.has_active_premium(uid):
+    snap = await reg.aget_user_snapshot(uid)
+    if not snap.has_premium():
         await update.message.reply_text("⚡⭐ To use this feature you must have a premium subscription.")
         return
-    if not reg.is_registered(uid):
+    if not snap.registered:
         await update.message.reply_text("ℹ️ Please complete your profile first: open /settings and set gender, age and interests.")
         return
     reg.set_search_pref(uid, "f")
@@ -525,10 +583,11 @@ async def on_btn_match_boys(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await _ban_gate(update, context):
         return
     uid = update.effective_user.id
-    if not reg.has_active_premium(uid):
+    snap = await reg.aget_user_snapshot(uid)
+    if not snap.has_premium():
         await update.message.reply_text("⚡⭐ To use this feature you must have a premium subscription.")
         return
-    if not reg.is_registered(uid):
+    if not snap.registered:
         await update.message.reply_text("ℹ️ Please complete your profile first: open /settings and set gender, age and interests.")
         return
     reg.set_search_pref(uid, "m")
@@ -597,67 +656,19 @@ def _is_blocked(viewer: int, author: int) -> bool:
         return cur.fetchone() is not None
 
 def main():
-    # Initialize all DB tables
-    reg.init_db()
-    reg.ensure_verification_columns()
-    reg.ensure_reports_table()
-    reg.ensure_ban_columns()
-    reg.ensure_feature_columns()
-    reg.ensure_questions_table()
-    reg.ensure_friend_requests_table()
-    reg.ensure_leaderboard_columns()
-    reg.ensure_profile_upgrade_columns()
-    reg.ensure_public_feed_columns()
-    reg.ensure_social_tables()
-    reg.ensure_secret_crush_table()
-    reg.ensure_leaderboard_columns()
-    reg.ensure_profile_upgrade_columns()
-    reg.ensure_public_feed_columns()
-    reg.ensure_blocked_users_table()
-    reg.ensure_age_pref_columns()
-    reg.ensure_forward_column()
-
-    # Initialize feed posts tables
-    try:
-        from handlers.posts_handlers import ensure_feed_posts_table
-        ensure_feed_posts_table()
-    except Exception as e:
-        log.warning(f"Feed posts table init failed: {e}")
-
-    # Initialize story tables
-    try:
-        reg.ensure_story_tables()
-    except Exception as e:
-        log.warning(f"Story tables init failed: {e}")
-
-    # Initialize confessions table
-    try:
-        reg.ensure_confessions_table()
-    except Exception as e:
-        log.warning(f"Confessions table init failed: {e}")
-
-    # Initialize QA tables
-    try:
-        qa_handlers.ensure_qa_tables()
-    except Exception as e:
-        print("[startup] QA ensure warn:", e)
-
-    # Initialize Poll tables
-    try:
-        poll_handlers.ensure_poll_tables()
-    except Exception as e:
-        print("[startup] Poll ensure warn:", e)
-
-    chat.init_db()
-    prof.init_profile_db()
-    ensure_metric_columns()
+    # Bring the DB schema up to date (one query when nothing is pending)
+    for line in db_migration.migrate():
+        log.info(f"[migrate] {line}")
 
     # >>> PATCH START: PRODUCTION-GRADE CONFIGURATION FOR 100K+ USERS
-    from telegram.ext import JobQueue, PicklePersistence
+    from telegram.ext import JobQueue
     from telegram.request import HTTPXRequest
+    from utils.persistence import SQLitePersistence
     
     # Enable persistence for relay state survival across restarts
-    persistence = PicklePersistence(filepath="bot_state.pkl")
+    # (per-user rows, lazy loads, change-only writes off the event loop;
+    #  import an old bot_state.pkl with scripts/migrate_pickle_persistence.py)
+    persistence = SQLitePersistence()
     
     # Production-optimized network timeouts with connection pooling
     request = HTTPXRequest(
@@ -727,9 +738,7 @@ def main():
 
     # After Dark feature removed - replaced with story building system
     
-    # Ensure fantasy tables before registering handlers
     from handlers import fantasy_match
-    fantasy_match.ensure_fantasy_tables()
     
     # Register ONLY the /fantasy command from fantasy_match (avoid conflicts)
     app.add_handler(CommandHandler("fantasy", fantasy_match.cmd_fantasy), group=-1)
@@ -1063,6 +1072,14 @@ def main():
     if friends_handlers:
         friends_handlers.register(app)
 
+    # Per-user update flood gate (group -90, ahead of every feature handler)
+    from utils import rate_limiter
+    rate_limiter.install(app)
+
+    # Per-update tracing: wraps every handler registered above (keep this last)
+    from utils import tracing
+    tracing.install(app)
+
     # --- MS Dhoni Performance System Setup 🏏 ---
     try:
         apply_ms_dhoni_mode()
@@ -2,8 +2,6 @@
 
 from __future__ import annotations
 
-import os
-from contextlib import contextmanager
 from typing import List, Dict, Any, Optional
 
 import psycopg2
@@ -11,6 +9,8 @@ import psycopg2.extras
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import BadRequest
 
+from utils import db_pool
+
 # ===== Callback IDs (used by handlers/profile_handlers.py) =====
 CB_PREFIX = "prof"
 CB_PROFILE = "prof"
@@ -23,26 +23,8 @@ CB_PHOTO_SET = f"{CB_PREFIX}:photo_set"
 CB_PHOTO_DEL = f"{CB_PREFIX}:photo_del"
 
 # ===== PG connection =====
-@contextmanager
 def _conn():
-    url = os.getenv("DATABASE_URL")
-    if url and not (url.startswith("postgres://") or url.startswith("postgresql://")):
-        url = None
-    if url:
-        con = psycopg2.connect(url, cursor_factory=psycopg2.extras.DictCursor)
-    else:
-        con = psycopg2.connect(
-            host=os.getenv("PGHOST", "localhost"),
-            port=int(os.getenv("PGPORT", "5432")),
-            dbname=os.getenv("PGDATABASE", "postgres"),
-            user=os.getenv("PGUSER", "postgres"),
-            password=os.getenv("PGPASSWORD", ""),
-            cursor_factory=psycopg2.extras.DictCursor,
-        )
-    try:
-        yield con
-    finally:
-        con.close()
+    return db_pool.connection("profile", cursor_factory=psycopg2.extras.DictCursor)
 
 # ===== Internal helpers =====
 def _ensure_user_row(tg_user_id: int) -> Dict[str, Any]:
@@ -2,28 +2,28 @@
 # Fast Postgres-backed registration for LuvHive
 
 import os
+import asyncio
 import logging
 from typing import Optional, List, Set, Tuple
 import time
 from datetime import datetime, timezone, timedelta
-from contextlib import contextmanager
 
+import sys
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
 from telegram import (
     Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 )
 from telegram.ext import ContextTypes
 
 from menu import main_menu_kb  # shared reply keyboard for the app
+from utils import db_async as adb
+from utils import db_pool
 import chat # imported for in_chat check
 
 DB_URL = os.environ.get("DATABASE_URL")
 log = logging.getLogger("luvbot")
 
-# --- SSL-enforced canonical connection pool ---
-_POOL: SimpleConnectionPool | None = None
-
+# --- SSL-enforced canonical connection pool (utils/db_pool.py) ---
 def _dsn_with_ssl(url: str) -> str:
     """Ensure SSL is enforced in connection string"""
     if not url:
@@ -39,24 +39,9 @@ def _dsn_with_ssl(url: str) -> str:
         url = f"{url}{sep}sslmode=require"
     return url
 
-def _get_pool() -> SimpleConnectionPool:
-    """Get or create connection pool with SSL enforcement - PRODUCTION OPTIMIZED"""
-    global _POOL
-    if _POOL is None:
-        dsn = _dsn_with_ssl(DB_URL)
-        _POOL = SimpleConnectionPool(
-            minconn=10,          # Keep minimum connections ready
-            maxconn=100,         # Handle 100K+ users with proper pooling
-            dsn=dsn,
-            keepalives=1, 
-            keepalives_idle=30, 
-            keepalives_interval=10, 
-            keepalives_count=5,
-            connect_timeout=10,  # Increased timeout for high load
-            application_name="luvhive-bot"
-        )
-        log.info("✅ SSL-enabled connection pool created")
-    return _POOL
+def _get_pool() -> db_pool.ConnectionPool:
+    """The shared process-wide pool (kept for callers that still use getconn/putconn)."""
+    return db_pool.get_pool()
 
 # --- tiny retry wrapper for transient DB hiccups ---
 def _exec_with_retry(fn, retries: int = 2, delay: float = 0.5):
@@ -109,68 +94,134 @@ def _settings_interests_text(ud: dict) -> str:
     return ", ".join(labels)
 
 # ---------- DB helpers ----------
-@contextmanager
-def _conn():
+def _conn(tag: str | None = None):
     """
-    Canonical SSL-enforced pooled connection with proper cleanup and validation.
+    Canonical SSL-enforced pooled connection, tagged with the calling module.
     Usage: with _conn() as con, con.cursor() as cur: ...
+    Uncommitted work is rolled back when the block exits.
     """
-    pool = _get_pool()
-    conn = None
-    max_retries = 3
-
-    for attempt in range(max_retries):
-        try:
-            conn = pool.getconn()
-
-            # CRITICAL: Validate connection before using
-            if conn.closed:
-                log.warning(f"🔄 Got closed connection from pool, retrying ({attempt+1}/{max_retries})")
-                pool.putconn(conn, close=True)  # Force close the bad connection
-                conn = None
-                continue
-
-            # Test connection with a simple query
-            with conn.cursor() as test_cur:
-                test_cur.execute("SELECT 1")
-                test_cur.fetchone()
-
-            yield conn
-            return  # Success, exit the retry loop
+    if tag is None:
+        tag = sys._getframe(1).f_globals.get("__name__", "untagged")
+    return db_pool.connection(tag)
+
+# ---------- In-process user snapshot cache ----------
+# One compact record per user with everything the chat hot path needs
+# (relay, match filters, menu gates). Loaded in a single round-trip and
+# invalidated by the setters below; TTL bounds staleness for writes made
+# outside this process (API server, manual SQL).
+SNAPSHOT_TTL = float(os.environ.get("USER_SNAPSHOT_TTL", "60"))
+SNAPSHOT_MAX = int(os.environ.get("USER_SNAPSHOT_MAX", "200000"))
+
+class UserSnapshot:
+    __slots__ = (
+        "gender", "age", "interests",
+        "banned_until", "banned_reason",
+        "premium_flag", "premium_until",
+        "allow_forward", "is_verified", "incognito", "match_verified_only",
+        "min_age_pref", "max_age_pref",
+        "loaded_at",
+    )
 
-        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            if "SSL connection has been closed" in str(e) or "connection is closed" in str(e):
-                log.warning(f"🔄 Stale connection detected, retrying ({attempt+1}/{max_retries}): {e}")
-                if conn:
-                    try:
-                        pool.putconn(conn, close=True)  # Force close the stale connection
-                    except:
-                        pass
-                    conn = None
-
-                if attempt < max_retries - 1:
-                    time.sleep(0.5 * (attempt + 1))  # Exponential backoff
-                    continue
-                else:
-                    log.error(f"🚨 DB connection failed after {max_retries} attempts: {e}")
-                    raise
-            else:
-                log.error(f"🚨 DB connection error: {e}")
-                raise
-        finally:
-            if conn and not conn.closed:
-                try:
-                    # rollback any open txn to avoid 'idle in transaction'
-                    try:
-                        conn.rollback()
-                    except:
-                        pass
-                    pool.putconn(conn)
-                except:
-                    try:
-                        pool.putconn(conn, close=True)
-                    except:
-                        pass
+    def __init__(self, row: tuple | None):
+        if row is None:
+            row = (None, None, (), None, None, False, None, False, False, False, False, 18, 99)
+        (self.gender, self.age, interests,
+         self.banned_until, self.banned_reason,
+         premium_flag, self.premium_until,
+         allow_forward, is_verified, incognito, verified_only,
+         min_age, max_age) = row
+        self.interests = frozenset(interests or ())
+        self.premium_flag = bool(premium_flag)
+        self.allow_forward = bool(allow_forward)
+        self.is_verified = bool(is_verified)
+        self.incognito = bool(incognito)
+        self.match_verified_only = bool(verified_only)
+        self.min_age_pref = int(min_age if min_age is not None else 18)
+        self.max_age_pref = int(max_age if max_age is not None else 99)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def registered(self) -> bool:
+        """Same rule as is_registered(): gender, age and interests present."""
+        return bool(self.gender and self.age and self.interests)
+
+    @property
+    def gender_key(self) -> str:
+        g = (self.gender or "").strip().lower()
+        return g[:1] if g else ""
+
+    @property
+    def age_pref(self) -> tuple[int, int]:
+        return (self.min_age_pref, self.max_age_pref)
+
+    def is_banned(self, now: datetime | None = None) -> bool:
+        until = self.banned_until
+        if not until:
+            return False
+        now = now or datetime.now(timezone.utc)
+        if until.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        return until > now
+
+    def has_premium(self, now: datetime | None = None) -> bool:
+        """Same rule as has_active_premium()."""
+        if self.premium_flag:
+            return True
+        until = self.premium_until
+        return bool(until and until > (now or datetime.now(timezone.utc)))
+
+_SNAPSHOTS: dict[int, UserSnapshot] = {}
+
+_SNAPSHOT_SQL = """
+    SELECT u.gender, u.age,
+           ARRAY(SELECT ui.interest_key FROM user_interests ui WHERE ui.user_id = u.id),
+           u.banned_until, u.banned_reason,
+           COALESCE(u.is_premium, FALSE), u.premium_until,
+           COALESCE(u.allow_forward, FALSE), COALESCE(u.is_verified, FALSE),
+           COALESCE(u.incognito, FALSE), COALESCE(u.match_verified_only, FALSE),
+           COALESCE(u.min_age_pref, 18), COALESCE(u.max_age_pref, 99)
+      FROM users u
+     WHERE u.tg_user_id = $1
+"""
+
+def _load_user_snapshot(tg_user_id: int) -> UserSnapshot:
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute(_SNAPSHOT_SQL.replace("$1", "%s"), (tg_user_id,))
+        return UserSnapshot(cur.fetchone())
+
+def _store_snapshot(tg_user_id: int, snap: UserSnapshot) -> UserSnapshot:
+    if len(_SNAPSHOTS) >= SNAPSHOT_MAX and tg_user_id not in _SNAPSHOTS:
+        # dicts keep insertion order: drop the oldest ~10% in one go
+        for k in list(_SNAPSHOTS)[: max(1, SNAPSHOT_MAX // 10)]:
+            _SNAPSHOTS.pop(k, None)
+    _SNAPSHOTS[tg_user_id] = snap
+    return snap
+
+def peek_user_snapshot(tg_user_id: int) -> UserSnapshot | None:
+    """Cached snapshot if fresh, else None. Never touches the DB."""
+    snap = _SNAPSHOTS.get(tg_user_id)
+    if snap is None or time.monotonic() - snap.loaded_at > SNAPSHOT_TTL:
+        return None
+    return snap
+
+def get_user_snapshot(tg_user_id: int) -> UserSnapshot:
+    """Cached snapshot, loading it (one query) on miss or expiry."""
+    snap = peek_user_snapshot(tg_user_id)
+    if snap is not None:
+        return snap
+    return _store_snapshot(tg_user_id, _exec_with_retry(lambda: _load_user_snapshot(tg_user_id)))
+
+async def aget_user_snapshot(tg_user_id: int) -> UserSnapshot:
+    """Like get_user_snapshot(), but a cache miss is awaited on the async pool."""
+    snap = peek_user_snapshot(tg_user_id)
+    if snap is not None:
+        return snap
+    row = await adb.fetchrow(_SNAPSHOT_SQL, tg_user_id)
+    return _store_snapshot(tg_user_id, UserSnapshot(tuple(row) if row else None))
+
+def invalidate_user_snapshot(tg_user_id: int) -> None:
+    """Drop a user's snapshot; call after any write to the snapshotted columns."""
+    _SNAPSHOTS.pop(tg_user_id, None)
 
 def init_db():
     if not DB_URL:
@@ -249,6 +300,7 @@ def set_is_premium(tg_id: int, value: bool) -> None:
             (tg_id, value),
         )
         con.commit()  # ← REQUIRED to persist the change
+    invalidate_user_snapshot(tg_id)
 
 def has_active_premium(tg_user_id: int) -> bool:
     """True if premium_until in future OR legacy is_premium True."""
@@ -279,6 +331,7 @@ def set_premium_until(tg_id: int, dt: datetime) -> None:
             DO UPDATE SET is_premium=TRUE, premium_until=EXCLUDED.premium_until;
         """, (tg_id, dt))
         con.commit()
+    invalidate_user_snapshot(tg_id)
 
 def ensure_verification_columns():
     """Add verification columns to users table if they don't exist."""
@@ -411,6 +464,7 @@ def set_age_pref(tg_user_id: int, lo: int, hi: int):
                           max_age_pref = EXCLUDED.max_age_pref
         """, (tg_user_id, lo, hi))
         con.commit()
+    invalidate_user_snapshot(tg_user_id)
 
 def get_age_pref(tg_user_id: int) -> tuple[int,int]:
     with _conn() as con, con.cursor() as cur:
@@ -430,6 +484,7 @@ def set_allow_forward(tg_user_id: int, value: bool):
             DO UPDATE SET allow_forward = EXCLUDED.allow_forward
         """, (tg_user_id, value))
         con.commit()
+    invalidate_user_snapshot(tg_user_id)
 
 def get_allow_forward(tg_user_id: int) -> bool:
     with _conn() as con, con.cursor() as cur:
@@ -1036,14 +1091,7 @@ def ensure_story_tables():
               expires_at  TIMESTAMPTZ NOT NULL
             );
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS story_views (
-              story_id  BIGINT NOT NULL,
-              viewer_id BIGINT NOT NULL,
-              viewed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-              PRIMARY KEY(story_id, viewer_id)
-            );
-        """)
+        # story_views (keyed by users.id) comes from V20261017.2__request_path_tables.sql
         con.commit()
 
 def ensure_confessions_table():
@@ -1357,6 +1405,7 @@ def set_match_verified_only(tg_id: int, value: bool):
     with _conn() as con, con.cursor() as cur:
         cur.execute("UPDATE users SET match_verified_only=%s WHERE tg_user_id=%s", (value, tg_id))
         con.commit()
+    invalidate_user_snapshot(tg_id)
 
 def get_match_verified_only(tg_id: int) -> bool:
     with _conn() as con, con.cursor() as cur:
@@ -1369,6 +1418,7 @@ def set_incognito(tg_id: int, value: bool):
     with _conn() as con, con.cursor() as cur:
         cur.execute("UPDATE users SET incognito=%s WHERE tg_user_id=%s", (value, tg_id))
         con.commit()
+    invalidate_user_snapshot(tg_id)
 
 def get_incognito(tg_id: int) -> bool:
     with _conn() as con, con.cursor() as cur:
@@ -1417,11 +1467,13 @@ def set_ban(tg_id: int, until_ts, reason: str, by_admin: int):
                           banned_by=EXCLUDED.banned_by
         """, (tg_id, until_ts, reason, by_admin))
         con.commit()
+    invalidate_user_snapshot(tg_id)
 
 def clear_ban(tg_id: int):
     with _conn() as con, con.cursor() as cur:
         cur.execute("UPDATE users SET banned_until=NULL, banned_reason=NULL, banned_by=NULL WHERE tg_user_id=%s", (tg_id,))
         con.commit()
+    invalidate_user_snapshot(tg_id)
 
 def add_strike(uid: int) -> int:
     """Return current strikes after adding; auto-resets if >24h old."""
@@ -1575,6 +1627,7 @@ def redeem_premium_with_coins(uid: int, need: int = 500, days: int = 3):
             (new_balance, new_until, uid)
         )
         con.commit()
+    invalidate_user_snapshot(uid)
     return (True, new_balance, new_until)
 
 def get_ban_info(tg_id: int):
@@ -1674,6 +1727,94 @@ def persist_registration(tg_user_id: int, reg_data: dict, selected: Set[str]):
         for key in selected:
             cur.execute("INSERT INTO user_interests (user_id, interest_key) VALUES (%s, %s);", (user_id, key))
         conn.commit()
+    invalidate_user_snapshot(tg_user_id)
+
+# ---------- Async twins ----------
+# Awaitable versions of the hot readers on the native async pool
+# (utils/db_async). Any other sync helper is reachable as reg.a<name>,
+# e.g. reg.aset_bio(uid, text), and runs in the DB worker threads.
+
+_PROFILE_SQL = """
+    SELECT u.id, u.gender, u.age, u.country, u.city, u.is_premium,
+           COALESCE(u.is_verified, FALSE), COALESCE(u.verify_status, 'none'),
+           COALESCE(u.feed_username, ''),
+           ARRAY(SELECT ui.interest_key FROM user_interests ui WHERE ui.user_id = u.id)
+      FROM users u WHERE u.tg_user_id = $1
+"""
+
+async def aget_profile(tg_user_id: int) -> dict:
+    row = await adb.fetchrow(_PROFILE_SQL, tg_user_id)
+    if not row:
+        return {"id": None, "gender": None, "age": None, "country": None, "city": None,
+                "is_premium": False, "is_verified": False, "verify_status": "none", "interests": set()}
+    user_id, gender, age, country, city, is_premium, is_verified, verify_status, feed_username, interests = row
+    return {"id": user_id, "gender": gender, "age": age, "country": country, "city": city,
+            "is_premium": bool(is_premium), "is_verified": bool(is_verified),
+            "verify_status": str(verify_status or "none"), "interests": set(interests or ()),
+            "username": (feed_username or None)}
+
+async def ais_registered(tg_user_id: int) -> bool:
+    try:
+        profile = await aget_profile(tg_user_id)
+        return bool(profile.get("gender") and profile.get("age") and profile.get("interests"))
+    except Exception:
+        return False
+
+async def ahas_active_premium(tg_user_id: int) -> bool:
+    if not DB_URL:
+        return False
+    row = await adb.fetchrow("""
+        SELECT COALESCE(is_premium, FALSE), COALESCE(premium_until, TIMESTAMPTZ 'epoch')
+          FROM users WHERE tg_user_id=$1
+    """, tg_user_id)
+    if not row:
+        return False
+    return bool(row[0]) or (row[1] and row[1] > datetime.now(timezone.utc))
+
+async def aget_ban_info(tg_id: int):
+    try:
+        row = await adb.fetchrow(
+            "SELECT banned_until, banned_reason, banned_by FROM users WHERE tg_user_id=$1", tg_id
+        )
+        return (row[0], row[1], row[2]) if row else (None, None, None)
+    except Exception:
+        return (None, None, None)
+
+async def ais_banned(tg_id: int) -> bool:
+    until, _, _ = await aget_ban_info(tg_id)
+    if not until:
+        return False
+    now = datetime.now(timezone.utc)
+    return until > (now if until.tzinfo else now.replace(tzinfo=None))
+
+async def aget_allow_forward(tg_user_id: int) -> bool:
+    return bool(await adb.fetchval(
+        "SELECT COALESCE(allow_forward, FALSE) FROM users WHERE tg_user_id=$1", tg_user_id, default=False
+    ))
+
+async def aget_age_pref(tg_user_id: int) -> tuple[int, int]:
+    row = await adb.fetchrow(
+        "SELECT COALESCE(min_age_pref,18), COALESCE(max_age_pref,99) FROM users WHERE tg_user_id=$1",
+        tg_user_id,
+    )
+    return (int(row[0]), int(row[1])) if row else (18, 99)
+
+async def aget_match_verified_only(tg_id: int) -> bool:
+    return bool(await adb.fetchval(
+        "SELECT COALESCE(match_verified_only, FALSE) FROM users WHERE tg_user_id=$1", tg_id, default=False
+    ))
+
+def __getattr__(name: str):
+    """Compatibility shim: reg.a<fn> for any sync helper without a native twin."""
+    fn = globals().get(name[1:]) if name.startswith("a") else None
+    if callable(fn) and not asyncio.iscoroutinefunction(fn) and not isinstance(fn, type):
+        async def _twin(*args, **kwargs):
+            return await adb.run_db(fn, *args, **kwargs)
+        _twin.__name__ = name
+        _twin.__doc__ = f"Async twin of {fn.__name__}() (runs in the DB thread pool)."
+        globals()[name] = _twin
+        return _twin
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---------- Registration flow ----------
 #   reg_state: "GENDER"|"AGE"|"COUNTRY"|"CITY"|"INTERESTS"
@@ -1844,6 +1985,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
                         for key in keys:
                             cur.execute("INSERT INTO user_interests (user_id, interest_key) VALUES (%s, %s);", (user_id, key))
                         conn.commit()
+                invalidate_user_snapshot(uid)
 
                 for k in ("reg_state","sel_interests","edit_mode","_interests_from_settings"):
                     context.user_data.pop(k, None)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Blur Vault blur benchmark - utils/blur_text vs the old per-word
+create_smart_blur.
+
+Generates a corpus of confession-style texts, then:
+  * checks the new engine is deterministic (a second pass, and a run
+    with the word memo cleared, give identical output) and that blurred
+    texts keep the original length and spacing,
+  * reports texts/second for the old loop (re.sub + hash() + list
+    lookup per word), blur() cold and warm, and blur_many() over
+    (content_id, text, level) rows the way /vault_backfill blurs
+    calls it, first pass and repeated.
+
+    python scripts/bench_blur.py --texts 20000
+"""
+import re
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import blur_text
+
+WORDS = [
+    "i", "my", "me", "we", "the", "a", "and", "but", "so", "to", "of", "in", "at", "on", "with",
+    "never", "told", "anyone", "about", "when", "last", "summer", "friend", "office", "party",
+    "really", "still", "think", "night", "because", "everyone", "college", "roommate", "family",
+    "secret", "crush", "love", "kiss", "cheat", "affair", "drunk", "money", "girlfriend",
+    "boyfriend", "husband", "wife", "fantasy", "desire", "virgin", "lie", "steal", "date",
+    "yaar", "sach", "mein", "bahut", "pyaar", "dil", "kabhi", "nahi", "bataya", "kisi", "ko",
+]
+PUNCT = ["", "", "", "", ",", ".", "!", "?", "...", "!!"]
+
+def make_corpus(n, rng):
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) + rng.choice(PUNCT) for _ in range(rng.randint(8, 60))]
+        if rng.random() < 0.3:
+            words[0] = words[0].capitalize()
+        texts.append(" ".join(words))
+    return texts
+
+_OLD_SENSITIVE = sorted(blur_text.SENSITIVE_WORDS)
+
+def old_blur(text, blur_level=70):
+    """The previous create_smart_blur, line for line."""
+    sensitive_words = list(_OLD_SENSITIVE)
+    words = text.split()
+    blurred_words = []
+    for word in words:
+        clean_word = re.sub(r'[^\w]', '', word.lower())
+        if clean_word in sensitive_words:
+            should_blur = True
+        elif len(clean_word) > 6:
+            should_blur = (hash(word) % 100) < (blur_level + 20)
+        elif len(clean_word) > 3:
+            should_blur = (hash(word) % 100) < blur_level
+        else:
+            should_blur = (hash(word) % 100) < (blur_level - 30)
+        if should_blur and len(clean_word) > 2:
+            if len(word) <= 3:
+                blurred = '█' * len(word)
+            elif len(word) <= 5:
+                blurred = word[0] + '█' * (len(word) - 2) + word[-1]
+            else:
+                visible_chars = max(1, len(word) // 3)
+                blurred = word[:visible_chars] + '█' * (len(word) - 2 * visible_chars) + word[-visible_chars:]
+            punct = ''.join(c for c in word if not c.isalnum())
+            blurred_words.append(blurred + punct.replace(word.translate(str.maketrans('', '', ''.join(c for c in word if c.isalnum()))), ''))
+        else:
+            blurred_words.append(word)
+    return ' '.join(blurred_words)
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+def rate(n, seconds):
+    return f"{n / seconds:12,.0f} texts/s"
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--texts", type=int, default=20_000)
+    ap.add_argument("--level", type=int, default=70)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    texts = make_corpus(args.texts, random.Random(args.seed))
+    level = args.level
+    n = len(texts)
+
+    _, t_old = timed(lambda: [old_blur(t, level) for t in texts])
+
+    blur_text.blur_word.cache_clear()
+    cold, t_cold = timed(lambda: [blur_text.blur(t, level) for t in texts])
+    warm, t_warm = timed(lambda: [blur_text.blur(t, level) for t in texts])
+    blur_text.blur_word.cache_clear()
+    again = [blur_text.blur(t, level) for t in texts]
+    assert cold == warm == again, "blur() is not deterministic"
+    assert all(len(b) == len(t) for b, t in zip(cold, texts)), "blur changed the text length"
+    assert all(re.sub(r"\S", "", b) == re.sub(r"\S", "", t) for b, t in zip(cold, texts)), \
+        "blur changed the spacing"
+
+    rows = [(i, t, level) for i, t in enumerate(texts, 1)]
+    many, t_many = timed(lambda: blur_text.blur_many(rows))
+    _, t_many_again = timed(lambda: blur_text.blur_many(rows))
+    assert [b for _, b in many] == cold
+
+    masked = sum(b.count(blur_text.BLUR_CHAR) for b in cold)
+    total = sum(len(t) for t in texts)
+    print(f"{n:,} texts, level {level}: {masked / total:.0%} of characters masked, "
+          f"{blur_text.blur_word.cache_info().currsize:,} distinct words memoised")
+    print(f"old create_smart_blur: {rate(n, t_old)}")
+    print(f"blur() cold:           {rate(n, t_cold)}   ({t_old / t_cold:.1f}x)")
+    print(f"blur() warm:           {rate(n, t_warm)}   ({t_old / t_warm:.1f}x)")
+    print(f"blur_many() first:     {rate(n, t_many)}   (cache holds {blur_text.CACHE_SIZE:,})")
+    print(f"blur_many() repeat:    {rate(n, t_many_again)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Confession assignment benchmark - min-heap assignment vs the old
+copy-and-sort picker, on synthetic pools.
+
+Builds a recipient pool of N users (default 100k), a batch of pending
+confessions (default 2000 = BATCH_LIMIT) from a mix of today's and
+older confessors, then times both algorithms. The old picker is
+O(confessions x pool log pool), so it runs on --legacy-confs
+confessions only and its full-batch time is extrapolated. Both results
+are checked for the same invariants (no self-delivery, caps respected,
+no repeated author->recipient pair).
+
+Also reports DB round-trips per chunk of 30 sends: the old loop made one
+round-lock INSERT plus one delivered UPDATE per send, the new one makes
+one of each per chunk.
+
+    python scripts/bench_confession_assign.py --pool 100000 --confs 2000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.confession_assign import assign_recipients
+
+FIRST_PASS_MAX = 1
+SECOND_PASS_MAX = 2
+CHUNK_SIZE = 30
+
+def legacy_assign(confs, today_conf, pool, first_cap, second_cap):
+    """The pre-heap picker from deliver_confessions_batch, verbatim in spirit."""
+    per_recipient, recent_pairs, assignments = {}, set(), []
+
+    def _pick(author, cap):
+        cand = set(pool)
+        cand.discard(int(author))
+        if not cand:
+            return None
+        for r in sorted(cand, key=lambda r: per_recipient.get(r, 0)):
+            if per_recipient.get(r, 0) < cap and (author, r) not in recent_pairs:
+                return r
+        return None
+
+    for cid, author, text in confs:
+        if author not in today_conf:
+            continue
+        r = _pick(author, first_cap)
+        if r is None:
+            continue
+        assignments.append((cid, author, text, r))
+        per_recipient[r] = per_recipient.get(r, 0) + 1
+        recent_pairs.add((author, r))
+    assigned = {a[0] for a in assignments}
+    for cid, author, text in confs:
+        if cid in assigned:
+            continue
+        r = _pick(author, second_cap)
+        if r is None:
+            continue
+        assignments.append((cid, author, text, r))
+        per_recipient[r] = per_recipient.get(r, 0) + 1
+        recent_pairs.add((author, r))
+    return assignments, per_recipient
+
+def synth(rng: random.Random, pool_size: int, n_confs: int):
+    pool = set(range(1, pool_size + 1))
+    authors = rng.sample(range(1, pool_size + 1), k=max(1, n_confs // 2))
+    today_conf = set(authors[: len(authors) * 2 // 3])
+    confs = [(cid, rng.choice(authors), f"confession {cid}") for cid in range(1, n_confs + 1)]
+    return confs, today_conf, pool
+
+def check(assignments, confs, today_conf, first_cap, second_cap):
+    load, pairs = {}, set()
+    for cid, author, _, r in assignments:
+        assert r != author, f"self-delivery for cid={cid}"
+        assert (author, r) not in pairs, f"repeated pair {author}->{r}"
+        pairs.add((author, r))
+        load[r] = load.get(r, 0) + 1
+    assert max(load.values(), default=0) <= second_cap, "second-pass cap exceeded"
+    first = [a for a in assignments if a[1] in today_conf]
+    return len(assignments), len(load), len(first)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pool", type=int, default=100_000)
+    ap.add_argument("--confs", type=int, default=2000)
+    ap.add_argument("--legacy-confs", type=int, default=100,
+                    help="confessions to time the old picker on (extrapolated to --confs)")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    confs, today_conf, pool = synth(rng, args.pool, args.confs)
+    print(f"pool={len(pool):,} confessions={len(confs):,} today's confessors={len(today_conf):,}")
+
+    t0 = time.perf_counter()
+    new, _ = assign_recipients(confs, today_conf, pool, FIRST_PASS_MAX, SECOND_PASS_MAX)
+    t_new = time.perf_counter() - t0
+    placed, recipients, _ = check(new, confs, today_conf, FIRST_PASS_MAX, SECOND_PASS_MAX)
+    print(f"heap     {t_new * 1e3:10.1f} ms   placed={placed:,} recipients={recipients:,}")
+
+    sub = confs[: args.legacy_confs]
+    t0 = time.perf_counter()
+    old, _ = legacy_assign(sub, today_conf, pool, FIRST_PASS_MAX, SECOND_PASS_MAX)
+    t_old = time.perf_counter() - t0
+    check(old, sub, today_conf, FIRST_PASS_MAX, SECOND_PASS_MAX)
+    est = t_old * len(confs) / max(1, len(sub))
+    sub_new, _ = assign_recipients(sub, today_conf, pool, FIRST_PASS_MAX, SECOND_PASS_MAX)
+    print(f"legacy   {t_old * 1e3:10.1f} ms   on {len(sub):,} confessions "
+          f"(~{est:,.1f} s for the full batch, {est / max(t_new, 1e-9):,.0f}x slower)")
+    print(f"placed on the {len(sub):,}-confession subset: legacy={len(old):,} heap={len(sub_new):,}")
+
+    chunks = -(-placed // CHUNK_SIZE)
+    print(f"DB round-trips for {placed:,} sends: legacy={2 * placed:,} (lock + mark per send), "
+          f"batched={2 * chunks:,} (lock + mark per chunk of {CHUNK_SIZE})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Feed benchmark - queries per request and latency of /api/feed assembly,
+old handler vs utils/feed.fetch_feed_page, against a real database.
+
+The old handler's statement sequence is reproduced below (tab query,
+get_or_create_user_id with its ALTER TABLE, liked lookup, ALTER TABLE
+feed_posts, the second tab query, author and profile hydration). Queries
+are counted by the shared pool's counting cursor.
+
+    DATABASE_URL=... python scripts/bench_feed.py --viewer 647778438 --runs 200
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import db_pool
+from utils import feed
+
+HOURS = 72
+
+_WAVES_SQL = f"""
+  SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+         p.reaction_count, p.comment_count,
+         GREATEST(p.created_at, COALESCE(MAX(c.created_at), p.created_at),
+                  COALESCE(MAX(pl.created_at), p.created_at)) AS last_engaged_at
+    FROM feed_posts p
+    LEFT JOIN comments c ON c.post_id = p.id AND c.created_at > NOW() - INTERVAL '24 hours'
+    LEFT JOIN post_likes pl ON pl.post_id = p.id AND pl.created_at > NOW() - INTERVAL '24 hours'
+   WHERE p.created_at > NOW() - INTERVAL '{HOURS} hours'
+     AND (c.id IS NOT NULL OR pl.post_id IS NOT NULL OR p.reaction_count > 0 OR p.comment_count > 0)
+   GROUP BY p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+            p.reaction_count, p.comment_count
+   ORDER BY last_engaged_at DESC
+   LIMIT %s
+"""
+_FRESH_SQL = f"""
+  SELECT id, author_id, profile_id, created_at, content_type, file_id, text, reaction_count, comment_count
+    FROM feed_posts
+   WHERE created_at > NOW() - INTERVAL '{HOURS} hours' AND author_id != %s
+   ORDER BY created_at DESC LIMIT %s
+"""
+_FOLLOWING_SQL = f"""
+  SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+         p.reaction_count, p.comment_count
+    FROM feed_posts p JOIN user_follows uf ON p.author_id = uf.followee_id
+   WHERE uf.follower_id = %s AND p.created_at > NOW() - INTERVAL '{HOURS} hours'
+   ORDER BY p.created_at DESC LIMIT %s
+"""
+
+def _legacy_user_id(cur, tg_id: int) -> int:
+    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS is_onboarded BOOLEAN NOT NULL DEFAULT FALSE")
+    cur.execute("INSERT INTO users (tg_user_id, display_name, username) VALUES (%s, %s, %s) "
+                "ON CONFLICT (tg_user_id) DO NOTHING", (tg_id, "User", f"user{tg_id}"))
+    cur.execute("SELECT id FROM users WHERE tg_user_id=%s", (tg_id,))
+    return int(cur.fetchone()[0])
+
+def legacy_feed(cur, tg_id: int, tab: str, limit: int) -> int:
+    if tab == "waves":
+        cur.execute(_WAVES_SQL, (limit,))
+    elif tab == "following":
+        cur.execute(_FOLLOWING_SQL, (_legacy_user_id(cur, tg_id), limit))
+    else:
+        cur.execute(_FRESH_SQL, (_legacy_user_id(cur, tg_id), limit))
+    rows = cur.fetchall()
+    me = _legacy_user_id(cur, tg_id)
+    ids = [r[0] for r in rows]
+    if ids:
+        cur.execute("SELECT post_id FROM post_likes WHERE user_id = %s AND post_id = ANY(%s)", (me, ids))
+        cur.fetchall()
+    cur.execute("ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT")
+    if tab == "waves":
+        cur.execute(_WAVES_SQL, (limit,))
+    else:
+        cur.execute(_FRESH_SQL, (me, limit))
+    rows = cur.fetchall()
+    authors = list({r[1] for r in rows})
+    profiles = list({r[2] for r in rows if r[2] is not None})
+    if authors:
+        cur.execute("SELECT id, tg_user_id, COALESCE(NULLIF(display_name, ''), 'User' || tg_user_id) "
+                    "FROM users WHERE id = ANY(%s)", (authors,))
+        cur.fetchall()
+    if profiles:
+        cur.execute("SELECT p.id, u.tg_user_id, p.profile_name FROM profiles p "
+                    "JOIN users u ON p.user_id = u.id WHERE p.id = ANY(%s)", (profiles,))
+        cur.fetchall()
+    return len(rows)
+
+def new_feed(cur, tg_id: int, tab: str, limit: int) -> int:
+    rows, _ = feed.fetch_feed_page(cur, tg_id, tab, limit, None, HOURS)
+    return len(rows)
+
+def percentile(samples, pct):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * pct / 100))] if s else 0.0
+
+def measure(fn, tg_id: int, tab: str, limit: int, runs: int):
+    lat, queries = [], []
+    for _ in range(runs):
+        with db_pool.connection("bench_feed") as con, con.cursor() as cur:
+            t0 = time.perf_counter()
+            fn(cur, tg_id, tab, limit)
+            lat.append(time.perf_counter() - t0)
+            queries.append(con.queries)
+            con.rollback()  # legacy path inserts; keep the DB untouched
+    return sum(queries) / len(queries), percentile(lat, 50), percentile(lat, 95)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--viewer", type=int, required=True, help="tg_user_id to read the feed as")
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args()
+
+    with db_pool.connection("bench_feed") as con:
+        feed.ensure_feed_schema(con)
+
+    print(f"{'tab':<10} {'impl':<7} {'queries/req':>11} {'p50 ms':>8} {'p95 ms':>8}")
+    for tab in feed.TABS:
+        for name, fn in (("legacy", legacy_feed), ("new", new_feed)):
+            q, p50, p95 = measure(fn, args.viewer, tab, args.limit, args.runs)
+            print(f"{tab:<10} {name:<7} {q:>11.1f} {p50*1e3:>8.2f} {p95*1e3:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Matchmaking benchmark - indexed MatchQueue vs the old linear deque scan.
+
+Fills the waiting room with N simulated users (default 10k) and times a
+batch of searches both ways. The legacy scan is reproduced in memory only;
+in production every candidate it touched also cost ~8 Postgres round-trips
+(get_profile / has_active_premium / get_age_pref / get_match_verified_only
+for both sides), which is reported as an estimate.
+
+    python scripts/bench_matchmaking.py --queued 10000 --searches 2000
+"""
+import sys
+import time
+import random
+import argparse
+from collections import deque
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.matchmaking import MatchQueue, SearchTicket
+
+def age_window(rng: random.Random):
+    """Half of premium users keep the default range; the rest pick any window,
+    so the waiting room holds hundreds of distinct ones."""
+    if rng.random() < 0.5:
+        return None
+    lo = rng.randint(18, 50)
+    return (lo, rng.randint(lo, min(lo + 20, 99)))
+
+def make_ticket(rng: random.Random, uid: int) -> SearchTicket:
+    """Skewed like production: mostly men, premium men mostly filter for girls."""
+    premium = rng.random() < 0.3
+    gender = "m" if rng.random() < 0.8 else "f"
+    want = None
+    if premium:
+        want = rng.choice(["f", "f", "f", None]) if gender == "m" else rng.choice(["m", None])
+    return SearchTicket(
+        uid,
+        gender=gender,
+        want=want,
+        age=rng.randint(18, 45),
+        window=age_window(rng) if premium else None,
+        verified=rng.random() < 0.3,
+        verified_only=premium and rng.random() < 0.2,
+    )
+
+def backlog(rng: random.Random, size: int) -> list:
+    """
+    What a 10k-deep waiting room actually holds: people nobody currently
+    satisfies - here premium men in "Match with girls" mode with assorted
+    age windows and verified-only flags.
+    """
+    out = []
+    for uid in range(1, size + 1):
+        t = make_ticket(rng, uid)
+        out.append(SearchTicket(uid, "m", "f", t.age, age_window(rng),
+                                t.verified, rng.random() < 0.2))
+    return out
+
+def legacy_search(waiting: deque, tickets: dict, me: SearchTicket):
+    """The pre-index algorithm: rotate the deque until a mutual match is found."""
+    checked = 0
+    for _ in range(len(waiting)):
+        cand = waiting.popleft()
+        checked += 1
+        other = tickets[cand]
+        if me.accepts(other) and other.accepts(me):
+            return cand, checked
+        waiting.append(cand)
+    return None, checked
+
+def percentile(samples, pct):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * pct / 100))] if s else 0.0
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queued", type=int, default=10_000)
+    ap.add_argument("--searches", type=int, default=2_000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    population = backlog(rng, args.queued)
+    searchers = [make_ticket(rng, uid) for uid in range(10**9, 10**9 + args.searches)]
+
+    # --- legacy ---
+    tickets = {t.uid: t for t in population}
+    waiting = deque(t.uid for t in population)
+    lat, checked_total, matched = [], 0, 0
+    t0 = time.perf_counter()
+    for me in searchers:
+        s = time.perf_counter()
+        partner, checked = legacy_search(waiting, tickets, me)
+        lat.append(time.perf_counter() - s)
+        checked_total += checked
+        if partner is None:
+            waiting.append(me.uid)
+            tickets[me.uid] = me
+        else:
+            matched += 1
+    legacy_total = time.perf_counter() - t0
+    print(f"legacy scan : {legacy_total*1e3:9.1f} ms total  "
+          f"p50={percentile(lat, 50)*1e6:8.1f}us  p99={percentile(lat, 99)*1e6:9.1f}us  "
+          f"matched={matched}  candidates checked={checked_total} "
+          f"(~{checked_total * 8} DB round-trips in production)")
+
+    # --- indexed ---
+    q = MatchQueue()
+    for t in population:
+        q.enqueue(SearchTicket(t.uid, t.gender, t.want, t.age, t.window, t.verified, t.verified_only))
+    lat, matched = [], 0
+    t0 = time.perf_counter()
+    for me in searchers:
+        s = time.perf_counter()
+        partner = q.pop_partner(me)
+        lat.append(time.perf_counter() - s)
+        if partner is None:
+            q.enqueue(me)
+        else:
+            matched += 1
+    indexed_total = time.perf_counter() - t0
+    print(f"MatchQueue  : {indexed_total*1e3:9.1f} ms total  "
+          f"p50={percentile(lat, 50)*1e6:8.1f}us  p99={percentile(lat, 99)*1e6:9.1f}us  "
+          f"matched={matched}  DB round-trips=0")
+    print(f"speedup     : {legacy_total / max(indexed_total, 1e-9):.1f}x (in-memory only)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Content moderation benchmark - compiled single-pass scanner vs the old
+term-by-term checks.
+
+Generates a corpus of Hinglish chat lines (mostly clean small talk, some
+flirting, slurs, leetspeak evasions, zero-width tricks, spam), then:
+  * replays the old ContentModerationSystem logic (normalize per check,
+    one re.search per term) and the new moderate_content() over it and
+    asserts they reach the same action and reason on every line,
+  * reports lines/second for both, and for the spam pattern check with
+    and without the merged prefilter.
+
+    python scripts/bench_moderation.py --lines 50000
+"""
+import re
+import sys
+import time
+import random
+import argparse
+import unicodedata
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.content_moderation import ContentModerationSystem
+from utils.abuse_prevention import AbusePreventionSystem
+
+CLEAN = [
+    "hi kaise ho", "kya kar rahe ho aaj", "main thik hu tum batao", "kahan se ho aap",
+    "bas chill kar raha hu yaar", "aaj office mein bahut kaam tha", "movie dekhi kal raat",
+    "tum kitne saal ke ho", "mujhe music pasand hai, arijit ka fan hu", "good night, kal baat karte",
+    "haha sahi hai", "lol same", "coffee ya chai?", "weekend pe kya plan hai",
+    "mera naam rahul hai, tumhara?", "delhi mein rehta hu, tum?", "ok bye 👋", "😂😂😂",
+    "sach mein? mast", "exam ki tension hai yaar", "what's your fav food", "biryani obviously",
+]
+FLIRTY = [
+    "you're so sexy yaar", "tum bahut hot ho", "i want you so bad", "kiss karu?",
+    "send nude na", "mujhe tumhe touch karna hai", "feeling horny rn", "let's make love",
+]
+ABUSIVE = [
+    "chal nikal chutiya", "tu madarchod hai", "bc kya bakwas hai", "kys loser",
+    "fuck you bhai", "gandu saala", "you are a bitch", "go die",
+]
+EVASIVE = [
+    "m4d4rch0d", "ch00tiya", "behennnchod", "g@ndu", "ch​utiya", "b3h3nch0d", "MAADARCHOD",
+    "ｍａｄａｒｃｈｏｄ",
+]
+SOFT = ["check my onlyfans", "escort services available", "xxx video bhejo", "pay for sex?"]
+SPAMMY = [
+    "earn money from home, click here", "join t.me/freebtc for crypto profit",
+    "call me 9876543210", "aaaaaaaaaa", "hi hi hi", "dm on instagram",
+]
+ALLOW = ["reading dickens lately", "sussex uni se hu", "scunthorpe united fan"]
+
+def make_corpus(n, rng):
+    pools = [(CLEAN, 70), (FLIRTY, 12), (ABUSIVE, 5), (EVASIVE, 3), (SOFT, 3), (SPAMMY, 5), (ALLOW, 2)]
+    weighted = [p for p, w in pools for _ in range(w)]
+    lines = []
+    for _ in range(n):
+        line = rng.choice(rng.choice(weighted))
+        if rng.random() < 0.3:
+            line = f"{line} {rng.choice(CLEAN)}"
+        if rng.random() < 0.2:
+            line = line.capitalize()
+        lines.append(line)
+    return lines
+
+class LegacyModeration(ContentModerationSystem):
+    """The pre-compiled implementation: normalize per check, one search per term."""
+
+    def normalize_text(self, text):
+        if not text:
+            return ""
+        text = unicodedata.normalize("NFKC", text).lower()
+        normalized = "".join(c for c in text if unicodedata.category(c)[0] != "C")
+        for old, new in {"@": "a", "3": "e", "1": "i", "0": "o", "5": "s",
+                         "4": "a", "7": "t", "$": "s", "!": "i", "+": "t"}.items():
+            normalized = normalized.replace(old, new)
+        return normalized
+
+    def contains_any_words(self, text, word_set):
+        normalized = self.normalize_text(text)
+        for word in word_set:
+            if re.search(rf"\b{re.escape(word.lower())}\b", normalized):
+                return word
+        return None
+
+    def contains_fuzzy_slurs(self, text):
+        normalized = self.normalize_text(text)
+        for pattern in self.FUZZY_SLURS:
+            if re.search(pattern, normalized):
+                return pattern
+        return None
+
+    def moderate_content(self, text, user_id=None):
+        if not text:
+            return {"action": "allow", "reason": "empty_text"}
+        if self.check_allowlist(text):
+            return {"action": "allow", "reason": "allowlist_match"}
+        if self.contains_any_words(text, self.SLURS):
+            return {"action": "block", "reason": "slur_detected"}
+        if self.contains_fuzzy_slurs(text):
+            return {"action": "block", "reason": "evasion_detected"}
+        if self.contains_any_words(text, self.SEXUAL_ALLOWED):
+            return {"action": "allow", "reason": "sexual_content"}
+        if self.contains_any_words(text, self.SOFT_WARN):
+            return {"action": "soft_warn", "reason": "adult_content"}
+        return {"action": "allow", "reason": "clean_content"}
+
+def timed(fn, lines):
+    t0 = time.perf_counter()
+    out = [fn(line) for line in lines]
+    return out, time.perf_counter() - t0
+
+def rate(n, seconds):
+    return f"{n / seconds:12,.0f} lines/s"
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lines", type=int, default=50_000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    lines = make_corpus(args.lines, random.Random(args.seed))
+
+    new = ContentModerationSystem()
+    new._log_moderation_event = lambda *a, **k: None  # measure matching, not the DB
+    old = LegacyModeration()
+
+    new_out, t_new = timed(new.moderate_content, lines)
+    old_out, t_old = timed(old.moderate_content, lines)
+    mismatches = [(line, o["reason"], n["reason"]) for line, o, n in zip(lines, old_out, new_out)
+                  if (o["action"], o["reason"]) != (n["action"], n["reason"])]
+    for line, o, n in mismatches[:10]:
+        print(f"MISMATCH {line!r}: old={o} new={n}")
+    counts = {}
+    for r in new_out:
+        counts[r["reason"]] = counts.get(r["reason"], 0) + 1
+    print(f"{len(lines):,} lines, decisions: {counts}")
+    print(f"moderate_content:  new {rate(len(lines), t_new)}   old {rate(len(lines), t_old)}   "
+          f"({t_old / t_new:.1f}x)")
+
+    _, t_scan = timed(new.scan, lines)
+    print(f"scan() only:       new {rate(len(lines), t_scan)}")
+
+    abuse = AbusePreventionSystem()
+    patterns, prefilters = abuse.spam_patterns, abuse._spam_prefilters
+
+    def spam_old(line):
+        return [p.pattern for p in patterns if p.search(line)]
+
+    def spam_new(line):
+        return [p.pattern for pf, members in prefilters if pf.search(line)
+                for p in members if p.search(line)]
+
+    s_new, t_spam_new = timed(spam_new, lines)
+    s_old, t_spam_old = timed(spam_old, lines)
+    # reasons are grouped by flag set now; compare them as sets
+    assert all(set(a) == set(b) for a, b in zip(s_new, s_old)), "spam prefilter changed the reasons"
+    print(f"spam patterns:     new {rate(len(lines), t_spam_new)}   old {rate(len(lines), t_spam_old)}   "
+          f"({t_spam_old / t_spam_new:.1f}x)")
+
+    if mismatches:
+        print(f"{len(mismatches)} decisions differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
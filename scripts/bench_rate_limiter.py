@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Rate limiter benchmark - bounded flat-array buckets vs the old
+defaultdict-of-dicts USER_BUCKETS.
+
+Measures checks/second for:
+  * allow_send() on a hot working set of users (global + per-user),
+  * a four-level check (global, user, feature, IP),
+  * a stream of N distinct keys (default 1M) through a table capped at
+    --max-keys, with Python heap growth measured by tracemalloc.
+The old implementation is replayed on the same key stream to show what
+an unbounded defaultdict costs at that many keys. (In production the
+cap is rarely reached: sweep() drops user buckets idle for burst/rate
+seconds, about 3 s.) Throughput of the filling pass is measured under
+tracemalloc, so it is much lower than the hot-set numbers.
+
+    python scripts/bench_rate_limiter.py --keys 1000000 --max-keys 200000
+"""
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.rate_limiter import BucketTable, RateLimiter
+
+def legacy_take(bucket, rate=1.5, burst=5.0):
+    """The old _refill_tokens + _take_token, verbatim in spirit."""
+    now = time.time()
+    bucket["tokens"] = min(burst, bucket["tokens"] + rate * (now - bucket["ts"]))
+    bucket["ts"] = now
+    if bucket["tokens"] < 1.0:
+        return False
+    bucket["tokens"] -= 1.0
+    return True
+
+def legacy_allow_send(global_bucket, buckets, user_id):
+    """The old allow_send: global bucket, then the never-evicted USER_BUCKETS."""
+    if not legacy_take(global_bucket, 1e9, 1e9):
+        return False
+    return legacy_take(buckets[user_id])
+
+def rate(n, seconds):
+    return f"{n / seconds:12,.0f} checks/s"
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--keys", type=int, default=1_000_000, help="distinct keys in the stream")
+    ap.add_argument("--max-keys", type=int, default=200_000, help="cap per table")
+    ap.add_argument("--hot", type=int, default=5_000, help="hot working set size")
+    ap.add_argument("--checks", type=int, default=500_000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    # 1) hot working set: two levels, like allow_send
+    lim = RateLimiter(max_keys=args.max_keys)
+    lim.global_.set_rate(1e9, 1e9)  # measure the bookkeeping, not refusals
+    ids = [rng.randrange(10**9, 8 * 10**9) for _ in range(args.hot)]
+    stream = [ids[rng.randrange(args.hot)] for _ in range(args.checks)]
+    t0 = time.perf_counter()
+    for uid in stream:
+        lim.check(user_id=uid)
+    t_new = time.perf_counter() - t0
+    old = defaultdict(lambda: {"ts": time.time(), "tokens": 5.0})
+    old_global = {"ts": time.time(), "tokens": 1e9}
+    t0 = time.perf_counter()
+    for uid in stream:
+        legacy_allow_send(old_global, old, uid)
+    t_old = time.perf_counter() - t0
+    print(f"global+user, {args.hot:,} hot users:   new {rate(len(stream), t_new)}   "
+          f"old {rate(len(stream), t_old)}")
+
+    # 2) four levels
+    lim.feature("confession", 0.2, 3)
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(2000)]
+    pairs = [(u, ips[u % len(ips)]) for u in stream]
+    t0 = time.perf_counter()
+    for uid, ip in pairs:
+        lim.check(user_id=uid, feature="confession", ip=ip)
+    t4 = time.perf_counter() - t0
+    print(f"global+user+feature+ip:                new {rate(len(pairs), t4)}")
+
+    # 3) memory at N distinct keys
+    keys = rng.sample(range(10**9, 9 * 10**9), args.keys)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    table = BucketTable("bench", rate=1.5, burst=5.0, max_keys=args.max_keys)
+    t0 = time.perf_counter()
+    for k in keys:
+        table.take(k)
+    t_fill = time.perf_counter() - t0
+    new_mem = tracemalloc.get_traced_memory()[0] - base
+    print(f"{args.keys:,} distinct keys, cap {args.max_keys:,}:   {rate(args.keys, t_fill)}   "
+          f"kept={len(table):,} evicted={table.evicted:,} heap={new_mem / 2**20:,.1f} MiB "
+          f"({new_mem / max(1, len(table)):.0f} B/key)")
+    del table
+
+    base = tracemalloc.get_traced_memory()[0]
+    old = defaultdict(lambda: {"ts": time.time(), "tokens": 5.0})
+    t0 = time.perf_counter()
+    for k in keys:
+        legacy_take(old[k])
+    t_old_fill = time.perf_counter() - t0
+    old_mem = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"{args.keys:,} distinct keys, old defaultdict: {rate(args.keys, t_old_fill)}   "
+          f"kept={len(old):,} (never evicted) heap={old_mem / 2**20:,.1f} MiB "
+          f"({old_mem / max(1, len(old)):.0f} B/key)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Import a PicklePersistence file (bot_state.pkl) into the SQLite store
+used by utils.persistence.SQLitePersistence.
+
+Run once, with the bot stopped, before starting the new build:
+
+    python scripts/migrate_pickle_persistence.py --pickle bot_state.pkl --db bot_state.sqlite3
+
+Rows already in the store are overwritten by the pickle's values; the
+pickle itself is left untouched so the old build can still be rolled
+back to. Re-running is safe.
+"""
+import sys
+import pickle
+import argparse
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.persistence import DEFAULT_PATH, SQLitePersistence, USER, CHAT, BOT
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pickle", default="bot_state.pkl")
+    ap.add_argument("--db", default=DEFAULT_PATH)
+    args = ap.parse_args()
+
+    src = Path(args.pickle)
+    if not src.exists():
+        print(f"❌ {src} not found")
+        return 1
+    with src.open("rb") as f:
+        data = pickle.load(f)
+    if not isinstance(data, dict) or "user_data" not in data:
+        print(f"❌ {src} is not a PicklePersistence file (single_file=True)")
+        return 1
+
+    persistence = SQLitePersistence(path=args.db)
+    try:
+        counts = persistence.import_state(data)
+        store = persistence.store
+        print(f"✅ imported {counts['user_data']:,} user_data, {counts['chat_data']:,} chat_data, "
+              f"{counts['conversations']:,} conversation states into {args.db}")
+
+        # spot-check the round trip
+        for uid, ud in list((data.get("user_data") or {}).items())[:100]:
+            if ud and store.get(USER, str(uid)) != ud:
+                print(f"❌ user_data mismatch for {uid}")
+                return 1
+        for cid, cd in list((data.get("chat_data") or {}).items())[:100]:
+            if cd and store.get(CHAT, str(cid)) != cd:
+                print(f"❌ chat_data mismatch for {cid}")
+                return 1
+        if data.get("bot_data") is not None and store.get(BOT, "") != data["bot_data"]:
+            print("❌ bot_data mismatch")
+            return 1
+        print(f"   store now holds {store.count(USER):,} users, {store.count(CHAT):,} chats")
+    finally:
+        persistence.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
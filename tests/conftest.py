@@ -0,0 +1,97 @@
+"""Fakes shared by the test suite: DB cursors and connections that record
+statements instead of running them."""
+from contextlib import contextmanager
+
+import pytest
+
+class FakeCursor:
+    """Records execute() calls; each fetchall()/fetchone() returns the next scripted result set."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def _next(self):
+        return self.results.pop(0) if self.results else []
+
+    def fetchall(self):
+        return self._next()
+
+    def fetchone(self):
+        rows = self._next()
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+    @property
+    def statements(self):
+        return [sql for sql, _ in self.executed]
+
+class FakeConnection:
+    """Hands out one FakeCursor; counts commits and rollbacks."""
+
+    def __init__(self, cursor=None):
+        self.cur = cursor if cursor is not None else FakeCursor()
+        self.commits = self.rollbacks = 0
+        self.closed = 0
+        self.autocommit = False
+        self.tags = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return self.cur
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+class RecordingWrites:
+    """Mixin for write-behind buffers: _write() records each batch, or raises
+    ConnectionError while .fail is positive."""
+
+    def __init__(self, *args, fail=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes, self.fail = [], fail
+
+    def _write(self, rows):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("db down")
+        self.writes.append(rows)
+
+@pytest.fixture
+def pooled_conn(monkeypatch):
+    """utils.db_pool.connection() (and so reg._conn()) yields this FakeConnection;
+    assign .cur to script what the code under test reads."""
+    pytest.importorskip("psycopg2")
+    from utils import db_pool
+
+    con = FakeConnection()
+
+    @contextmanager
+    def connection(tag="untagged", autocommit=False, cursor_factory=None):
+        con.tags.append(tag)
+        yield con
+    monkeypatch.setattr(db_pool, "connection", connection)
+    return con
@@ -0,0 +1,50 @@
+"""utils/abuse_prevention.AbusePreventionSystem: spam scoring and bounded per-user state."""
+import pytest
+
+from utils import abuse_prevention
+from utils.abuse_prevention import AbusePreventionSystem
+
+BLAST = "Earn 5000 rupees daily from home, join t.me/quickcash now"
+
+@pytest.fixture
+def aps(monkeypatch):
+    monkeypatch.setattr(AbusePreventionSystem, "_log_violation", lambda *a: None)
+    return AbusePreventionSystem()
+
+def test_common_greeting_from_many_users_is_allowed(aps):
+    for uid in range(1, 6):
+        result = aps.check_message_spam(uid, "hi")
+    assert result["action"] == "allow"
+    assert result["reasons"] == []
+
+def test_same_long_message_from_many_users_is_blocked(aps):
+    for uid in range(1, 5):
+        aps.check_message_spam(uid, BLAST)
+    result = aps.check_message_spam(5, BLAST)
+    assert result["is_spam"] and result["action"] == "block"
+    assert "Duplicate content detected" in result["reasons"]
+    assert any("other users" in r for r in result["reasons"])
+
+def test_repeat_violations_escalate_to_a_mute(aps):
+    for _ in range(3):
+        aps.check_message_spam(1, BLAST)
+    assert aps.is_user_muted(1)["is_muted"]
+
+def test_reads_do_not_create_activity_entries(aps):
+    assert aps.is_user_muted(42) == {"is_muted": False}
+    assert 42 not in aps.user_activity
+
+def test_activity_is_bounded_least_recent_first(aps, monkeypatch):
+    monkeypatch.setattr(abuse_prevention, "ACTIVITY_TRACKED_MAX", 3)
+    for uid in range(1, 5):
+        aps.check_message_spam(uid, "hello there")
+    aps.check_message_spam(2, "hello again")
+    aps.check_message_spam(5, "hello there")
+    assert list(aps.user_activity) == [4, 2, 5]
+
+def test_three_reporters_auto_mute(aps):
+    assert not aps.check_user_reports(9, 1)["auto_muted"]
+    aps.check_user_reports(9, 1)
+    assert not aps.check_user_reports(9, 2)["auto_muted"]
+    assert aps.check_user_reports(9, 3)["auto_muted"]
+    assert aps.is_user_muted(9)["is_muted"]
@@ -0,0 +1,62 @@
+"""utils/blur_text: deterministic blurring and the rendered-content cache."""
+import subprocess
+import sys
+
+import pytest
+
+from utils import blur_text
+from utils.blur_text import blur, blur_content, blur_many
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    blur_text._rendered.clear()
+    yield
+    blur_text._rendered.clear()
+
+def test_docstring_example():
+    assert blur("My secret crush, finally.", 70) == "My se██et c███h, fi███ly."
+
+def test_same_blur_in_another_process():
+    code = "from utils.blur_text import blur; print(blur('Nobody knows what happened at the lake house', 50))"
+    other = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert other.rstrip("\n") == blur("Nobody knows what happened at the lake house", 50)
+
+def test_sensitive_words_are_blurred_at_any_level():
+    assert blur("Secret!", 0) == "Se██et!"
+    assert blur("kiss", 0) == "k██s"
+
+def test_level_zero_leaves_ordinary_words_alone():
+    assert blur("hello world", 0) == "hello world"
+
+def test_short_words_spacing_and_punctuation_are_kept():
+    out = blur("a  b\tok!! wonderful...", 100)
+    assert out == "a  b\tok!! won███ful..."
+    assert len(out) == len("a  b\tok!! wonderful...")
+
+def test_empty_text():
+    assert blur("", 70) == ""
+    assert blur_content(1, "", 70) == ""
+
+def test_blur_content_caches_by_id_and_level():
+    assert blur_content(1, "my secret crush", 70) == blur("my secret crush", 70)
+    assert (1, 70) in blur_text._rendered
+    assert blur_content(1, "my secret crush", 10) == blur("my secret crush", 10)
+    assert (1, 10) in blur_text._rendered
+
+def test_edited_text_under_the_same_id_renders_again():
+    blur_content(1, "my secret crush", 70)
+    assert blur_content(1, "my naked truth", 70) == blur("my naked truth", 70)
+
+def test_blur_content_without_an_id_caches_by_text():
+    blur_content(None, "an affair", 70)
+    assert ("text", "an affair", 70) in blur_text._rendered
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(blur_text, "CACHE_SIZE", 3)
+    for cid in range(10):
+        blur_content(cid, f"secret number {cid}", 70)
+    assert list(blur_text._rendered) == [(7, 70), (8, 70), (9, 70)]
+
+def test_blur_many():
+    rows = [(1, "my secret", 70), (2, "love", 0)]
+    assert blur_many(rows) == [(1, "my se██et"), (2, "l██e")]
@@ -0,0 +1,80 @@
+"""utils/broadcast: shared token bucket and per-recipient error handling."""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from utils import broadcast
+from utils.broadcast import BLOCKED, FAILED, SENT, BroadcastEngine, TokenBucket
+
+class FakeBot:
+    """send_message raises the scripted errors for a user, then succeeds."""
+
+    def __init__(self, script=None):
+        self.script = {uid: list(errs) for uid, errs in (script or {}).items()}
+        self.sent = []
+
+    async def send_message(self, uid, text, **kwargs):
+        errs = self.script.get(uid)
+        if errs:
+            raise errs.pop(0)
+        self.sent.append(uid)
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """Network-error backoff sleeps at most 10ms."""
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(broadcast.asyncio, "sleep", lambda s: real_sleep(min(s, 0.01)))
+
+def test_bucket_holds_the_rate():
+    async def go():
+        bucket = TokenBucket(rate=200, burst=1)
+        t0 = time.monotonic()
+        for _ in range(21):
+            await bucket.acquire()
+        return time.monotonic() - t0
+    assert asyncio.run(go()) >= 0.09
+
+def test_pause_empties_the_bucket():
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.pause(30)
+    assert bucket._tokens == 0 and bucket._paused_until > time.monotonic() + 29
+
+@pytest.mark.parametrize("errors, status, attempts", [
+    ([], SENT, 1),
+    ([Forbidden("bot was blocked by the user")], BLOCKED, 1),
+    ([BadRequest("Chat not found")], FAILED, 1),
+    ([NetworkError("reset"), NetworkError("reset")], SENT, 3),
+    ([NetworkError("reset")] * 4, FAILED, 4),
+    ([RuntimeError("unexpected")], FAILED, 1),
+])
+def test_send_outcomes(errors, status, attempts):
+    bot = FakeBot({1: errors})
+    engine = BroadcastEngine(rate=1000)
+    assert asyncio.run(engine._send(bot, 1, "hi", {})) == status
+    assert bot.sent == ([1] if status == SENT else [])
+    assert len(bot.script[1]) == max(0, len(errors) - attempts)
+
+def test_retry_after_pauses_every_sender():
+    bot = FakeBot({1: [RetryAfter(3)]})
+    engine = BroadcastEngine(rate=1000)
+    paused = []
+    engine.bucket.pause = lambda s: paused.append(s)
+    assert asyncio.run(engine._send(bot, 1, "hi", {})) == SENT
+    assert paused == [3.5]
+
+def test_send_now_counts_deliveries_and_marks_blocked(monkeypatch):
+    marked = []
+
+    async def fake_run_db(fn, *args):
+        assert fn is broadcast._mark_blocked
+        marked.extend(args[0])
+    monkeypatch.setattr(broadcast, "run_db", fake_run_db)
+    bot = FakeBot({2: [Forbidden("blocked")], 3: [BadRequest("Chat not found")]})
+    assert asyncio.run(BroadcastEngine(rate=1000).send_now(bot, [1, 2, 3, 4], "hi")) == 2
+    assert marked == [2]
+    assert sorted(bot.sent) == [1, 4]
@@ -0,0 +1,52 @@
+"""utils/confession_assign: load-balanced recipient assignment for confession delivery."""
+from collections import Counter
+
+from tests.conftest import FakeCursor
+from utils.confession_assign import LoadHeap, assign_recipients, claim_round_locks
+
+def test_pick_prefers_least_loaded_and_skips_author():
+    heap = LoadHeap([1, 2, 3])
+    assert heap.pick(author=1, cap=2) == 2
+    assert heap.pick(author=9, cap=2) == 1
+    assert heap.pick(author=9, cap=2) == 3
+    assert heap.load == {2: 1, 1: 1, 3: 1}
+
+def test_pick_never_reaches_the_same_recipient_twice_for_one_author():
+    heap = LoadHeap([1, 2])
+    assert heap.pick(author=5, cap=5) == 1
+    assert heap.pick(author=5, cap=5) == 2
+    assert heap.pick(author=5, cap=5) is None
+
+def test_pick_respects_cap():
+    heap = LoadHeap([1])
+    assert heap.pick(author=5, cap=1) == 1
+    assert heap.pick(author=6, cap=1) is None
+    assert heap.pick(author=6, cap=2) == 1
+
+def test_todays_confessors_are_placed_first():
+    confs = [(1, 100, "a"), (2, 200, "b"), (3, 300, "c")]
+    assignments, load = assign_recipients(confs, confessors_today={300}, pool=[7], first_cap=1, second_cap=1)
+    assert [a[0] for a in assignments] == [3]
+    assert load == {7: 1}
+
+def test_assignment_invariants_on_a_larger_batch():
+    pool = list(range(1, 51))
+    confs = [(cid, (cid % 60) + 1, f"text {cid}") for cid in range(1, 101)]
+    assignments, load = assign_recipients(confs, confessors_today={2, 3, 4}, pool=pool)
+    pairs = [(author, r) for _, author, _, r in assignments]
+    assert all(author != r for author, r in pairs)
+    assert len(pairs) == len(set(pairs))
+    assert max(Counter(r for _, r in pairs).values()) <= 2
+    assert len({cid for cid, *_ in assignments}) == len(assignments)
+    assert sum(load.values()) == len(assignments) == 100
+
+def test_claim_round_locks_is_one_statement():
+    cur = FakeCursor([(1,), (3,)])
+    assert claim_round_locks(cur, [1, 2, 3], "2026-10-17") == {1, 3}
+    assert len(cur.executed) == 1
+    assert cur.executed[0][1] == ("2026-10-17", [1, 2, 3])
+
+def test_claim_round_locks_without_recipients_skips_the_db():
+    cur = FakeCursor()
+    assert claim_round_locks(cur, [], "r") == set()
+    assert cur.executed == []
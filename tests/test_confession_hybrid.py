@@ -0,0 +1,69 @@
+"""utils/confession_hybrid: set-based assignment and bulk delivery tracking."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tests.conftest import FakeCursor
+
+pytest.importorskip("psycopg2")
+
+from utils import confession_hybrid, hybrid_db
+from utils.confession_hybrid import assign_from_matrix
+
+def conf(cid, seed=False, author=100):
+    return {"id": cid, "author_id": author, "text": f"text {cid}", "system_seed": seed}
+
+def test_seeds_are_preferred_over_less_used_confessions():
+    matrix = {1: [conf(10), conf(20, seed=True)], 2: [conf(10), conf(20, seed=True)]}
+    assert [a[0] for a in assign_from_matrix(matrix)] == [20, 20]
+
+def test_least_used_confession_spreads_the_batch():
+    matrix = {uid: [conf(10), conf(20), conf(30)] for uid in range(1, 7)}
+    picked = [a[0] for a in assign_from_matrix(matrix)]
+    assert picked == [10, 20, 30, 10, 20, 30]
+
+def test_users_without_candidates_get_nothing():
+    matrix = {1: [], 2: [conf(10)], 3: []}
+    assert assign_from_matrix(matrix) == [(10, 100, "text 10", 2)]
+
+def test_unseen_matrix_groups_rows_per_user(pooled_conn):
+    pooled_conn.cur = FakeCursor([(1, 10, 100, "a", True), (1, 11, 101, "b", False), (2, 11, 101, "b", False)])
+    matrix = hybrid_db.get_unseen_confessions_for_users_hybrid([1, 2, 3], per_user=2)
+    assert sorted(matrix) == [1, 2]
+    assert [c["id"] for c in matrix[1]] == [10, 11] and matrix[1][0]["system_seed"]
+    (sql, params), = pooled_conn.cur.executed
+    assert "unnest(%s::bigint[])" in sql and params[1:] == ([1, 2, 3], 2)
+
+def test_deliveries_are_tracked_in_one_insert(pooled_conn):
+    pooled_conn.cur.rowcount = 2
+    assert hybrid_db.track_confession_deliveries_hybrid([(10, 1), (11, 2)]) == 2
+    (sql, params), = pooled_conn.cur.executed
+    assert params == ([10, 11], [1, 2]) and pooled_conn.commits == 1
+
+class Bot:
+    """Sends to everyone until *stop_at*, where the job is cancelled mid-batch."""
+
+    def __init__(self, stop_at):
+        self.stop_at, self.sent = stop_at, []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id == self.stop_at:
+            raise asyncio.CancelledError
+        self.sent.append(chat_id)
+
+def test_partial_batch_is_still_tracked(monkeypatch):
+    tracked = []
+    monkeypatch.setattr(confession_hybrid, "TESTERS", set())
+    monkeypatch.setattr(confession_hybrid, "ASSIGN_MODE", "set")
+    monkeypatch.setattr(confession_hybrid, "get_db_status", lambda: {"mode": "test"})
+    monkeypatch.setattr(confession_hybrid, "get_active_user_ids_hybrid", lambda: [1, 2, 3])
+    monkeypatch.setattr(confession_hybrid, "get_unseen_confessions_for_users_hybrid",
+                        lambda uids, per_user: {uid: [conf(10 + uid)] for uid in uids})
+    monkeypatch.setattr(confession_hybrid, "track_confession_deliveries_hybrid",
+                        lambda pairs: tracked.extend(pairs) or len(pairs))
+    bot = Bot(stop_at=3)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(confession_hybrid.deliver_confessions_batch_hybrid(SimpleNamespace(bot=bot)))
+    assert bot.sent == [1, 2]
+    assert tracked == [(11, 1), (12, 2)]
@@ -0,0 +1,49 @@
+"""utils/content_moderation: block slurs and evasions, allow dating-app language."""
+import pytest
+
+from utils.content_moderation import ContentModerationSystem
+
+@pytest.fixture
+def mod():
+    m = ContentModerationSystem()
+    m.events = []
+    m._log_moderation_event = lambda user_id, kind, token, sample: m.events.append((kind, token))
+    return m
+
+@pytest.mark.parametrize("text, action, reason", [
+    ("", "allow", "empty_text"),
+    ("hi kaise ho", "allow", "clean_content"),
+    ("you're so sexy", "allow", "sexual_content"),
+    ("Scunthorpe United", "allow", "allowlist_match"),
+    ("reading dickens lately", "allow", "allowlist_match"),
+    ("MC BC", "block", "slur_detected"),
+    ("fuck you bhai", "block", "slur_detected"),
+    ("m4d4rch0d", "block", "slur_detected"),       # leetspeak is undone before matching
+    ("ch\u200butiya", "block", "slur_detected"),    # so are zero-width characters
+    ("ｍａｄａｒｃｈｏｄ", "block", "slur_detected"),
+    ("behennnchod", "block", "evasion_detected"),
+    ("maaadarchoood", "block", "evasion_detected"),
+    ("check my onlyfans", "soft_warn", "adult_content"),
+])
+def test_actions(mod, text, action, reason):
+    result = mod.moderate_content(text)
+    assert (result["action"], result["reason"]) == (action, reason)
+
+def test_longest_slur_wins_over_allowed_word(mod):
+    assert mod.moderate_content("fuck off")["token"] == "fuck off"
+    assert mod.moderate_content("fuck me baby")["action"] == "allow"
+
+def test_only_blocks_and_soft_warns_are_logged(mod):
+    mod.moderate_content("tu madarchod hai", user_id=1)
+    mod.moderate_content("I wanna fuck", user_id=1)
+    mod.moderate_content("escort services", user_id=1)
+    assert mod.events == [("slur", "madarchod"), ("soft_warn", "escort")]
+
+def test_builtin_samples_all_pass(mod):
+    assert mod.test_moderation_samples()["success_rate"] == 100
+
+def test_recompile_picks_up_new_terms(mod):
+    mod.SLURS.add("bakwaas")
+    assert mod.moderate_content("kya bakwaas")["action"] == "allow"
+    mod.recompile()
+    assert mod.moderate_content("kya bakwaas")["reason"] == "slur_detected"
@@ -0,0 +1,64 @@
+"""utils/counter_buffer.CounterBuffer: delta coalescing, flush order and retry on failure."""
+import pytest
+
+from tests.conftest import RecordingWrites
+from utils.counter_buffer import CounterBuffer
+
+class RecordingBuffer(RecordingWrites, CounterBuffer):
+    pass
+
+@pytest.fixture
+def buf():
+    b = RecordingBuffer("users", "tg_user_id", ("messages_sent", "messages_received"), tag="test",
+                        flush_ms=60_000)
+    yield b
+    b.close()
+
+def test_deltas_for_one_key_coalesce_into_one_row(buf):
+    buf.add(7, messages_sent=1)
+    buf.add(7, messages_sent=2, messages_received=1)
+    buf.add(3, messages_received=5)
+    assert buf.pending() == 2
+    assert buf.flush() == 2
+    assert buf.writes == [[(3, 0, 5), (7, 3, 1)]]   # key order, so flushes can't deadlock
+    assert buf.pending() == 0
+    assert buf.flush() == 0
+
+def test_all_zero_rows_are_not_written(buf):
+    buf.add(1, messages_sent=1)
+    buf.add(1, messages_sent=-1)
+    buf.add(2, messages_sent=1)
+    buf.flush()
+    assert buf.writes == [[(2, 1, 0)]]
+
+def test_failed_flush_merges_deltas_back(buf):
+    buf.fail = 1
+    buf.add(1, messages_sent=1)
+    with pytest.raises(ConnectionError):
+        buf.flush()
+    buf.add(1, messages_sent=2)
+    buf.flush()
+    assert buf.writes == [[(1, 3, 0)]]
+
+def test_restore_drops_rows_beyond_max_rows():
+    b = RecordingBuffer("users", "tg_user_id", ("messages_sent",), tag="test", flush_ms=60_000,
+                        max_rows=2, fail=1)
+    for key in range(4):
+        b.add(key, messages_sent=1)
+    with pytest.raises(ConnectionError):
+        b.flush()
+    assert b.pending() == 2
+    b.close()
+
+def test_sql_updates_every_column_from_values(buf):
+    assert buf._sql == (
+        "UPDATE users AS t SET messages_sent = COALESCE(t.messages_sent,0) + v.messages_sent, "
+        "messages_received = COALESCE(t.messages_received,0) + v.messages_received "
+        "FROM (VALUES %s) AS v(tg_user_id, messages_sent, messages_received) "
+        "WHERE t.tg_user_id = v.tg_user_id"
+    )
+
+def test_add_after_close_is_ignored(buf):
+    buf.close()
+    buf.add(1, messages_sent=1)
+    assert buf.pending() == 0
@@ -0,0 +1,82 @@
+"""utils/db_async without asyncpg: $n queries run on the psycopg2 pool via run_db."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from tests.conftest import FakeCursor
+
+pytest.importorskip("psycopg2")
+
+import registration as reg
+from utils import db_async as adb
+
+class FallbackCursor(FakeCursor):
+    """FakeCursor plus the column description and status message _sync_query reads."""
+
+    def __init__(self, columns, *results):
+        super().__init__(*results)
+        self.description = [SimpleNamespace(name=c) for c in columns] if columns else None
+        self.statusmessage = "UPDATE 1"
+
+    def fetchmany(self, size):
+        return self._next()[:size]
+
+@pytest.fixture(autouse=True)
+def no_asyncpg(monkeypatch):
+    monkeypatch.setattr(adb, "asyncpg", None)
+    monkeypatch.setattr(adb, "_apool", None)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_placeholders_are_rewritten_and_percent_signs_escaped():
+    sql, params = adb._to_pyformat("SELECT $2 || '%' WHERE a=$1 AND b=$2", (7, "x"))
+    assert sql == "SELECT %(p2)s || '%%' WHERE a=%(p1)s AND b=%(p2)s"
+    assert params == {"p1": 7, "p2": "x"}
+
+def test_fetch_returns_rows_addressable_by_name(pooled_conn):
+    pooled_conn.cur = FallbackCursor(("id", "gender"), [(1, "f"), (2, "m")])
+    rows = run(adb.fetch("SELECT id, gender FROM users WHERE age > $1", 18))
+    assert [tuple(r) for r in rows] == [(1, "f"), (2, "m")]
+    assert rows[1]["gender"] == "m" and rows[1][0] == 2
+    assert rows[0].get("missing", "?") == "?"
+    assert pooled_conn.cur.executed == [("SELECT id, gender FROM users WHERE age > %(p1)s", {"p1": 18})]
+
+def test_fetchrow_and_fetchval(pooled_conn):
+    pooled_conn.cur = FallbackCursor(("n",), [(5,), (6,)], [])
+    assert tuple(run(adb.fetchrow("SELECT n FROM t"))) == (5,)
+    assert run(adb.fetchval("SELECT n FROM t", default=0)) == 0
+
+def test_execute_commits_and_returns_the_status(pooled_conn):
+    pooled_conn.cur = FallbackCursor(None)
+    assert run(adb.execute("UPDATE users SET age=$1 WHERE tg_user_id=$2", 30, 7)) == "UPDATE 1"
+    assert pooled_conn.commits == 1
+
+def test_executemany_runs_each_parameter_set(pooled_conn):
+    pooled_conn.cur = FallbackCursor(None)
+    run(adb.executemany("DELETE FROM t WHERE id=$1", [(1,), (2,)]))
+    assert [p for _, p in pooled_conn.cur.executed] == [{"p1": 1}, {"p1": 2}]
+
+def test_transaction_needs_asyncpg():
+    async def use():
+        async with adb.transaction():
+            pass
+    with pytest.raises(RuntimeError, match="asyncpg is not installed"):
+        run(use())
+
+def test_registration_twins_on_the_fallback(pooled_conn, monkeypatch):
+    monkeypatch.setattr(reg, "DB_URL", "postgresql://test")
+    later = datetime.now(timezone.utc) + timedelta(days=3)
+    pooled_conn.cur = FallbackCursor(("lo", "hi"), [(21, 35)], [], [(False, later)], [])
+    assert run(reg.aget_age_pref(7)) == (21, 35)
+    assert run(reg.aget_age_pref(8)) == (18, 99)
+    assert run(reg.ahas_active_premium(7)) is True
+    assert run(reg.aget_allow_forward(7)) is False
+    assert all("$" not in sql for sql in pooled_conn.cur.statements)
+
+def test_aget_profile_defaults_for_unknown_user(pooled_conn):
+    pooled_conn.cur = FallbackCursor(("id",), [])
+    profile = run(reg.aget_profile(9))
+    assert profile["id"] is None and profile["interests"] == set()
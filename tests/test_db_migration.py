@@ -0,0 +1,38 @@
+"""utils/db_migration: migration discovery and version ordering."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from utils import db_migration
+from utils.db_migration import discover
+
+def test_versions_sort_numerically(tmp_path):
+    for name in ("V20261101__later.sql", "V20261017.10__ten.sql", "V20261017.2__two.py",
+                 "V20261017__base.sql", "README.md", "V1__bad-name.sql"):
+        (tmp_path / name).write_text("")
+    assert [m.version for m in discover(tmp_path)] == ["20261017", "20261017.2", "20261017.10", "20261101"]
+
+def test_duplicate_versions_are_rejected(tmp_path):
+    (tmp_path / "V5__a.sql").write_text("")
+    (tmp_path / "V5__b.py").write_text("")
+    with pytest.raises(ValueError, match="duplicate migration version 5"):
+        discover(tmp_path)
+
+def test_shipped_migrations_are_well_formed():
+    migrations = discover()
+    assert migrations[0].version == db_migration.BASELINE_VERSION
+    for mig in migrations:
+        if mig.path.suffix == ".py":
+            assert "def migrate(con)" in mig.path.read_text()
+
+def test_baseline_leaves_story_views_to_the_sql_migration(pooled_conn):
+    import registration as reg
+    from handlers import posts_handlers
+
+    reg.ensure_story_tables()
+    posts_handlers.ensure_feed_posts_table()
+    statements = pooled_conn.cur.statements
+    assert any("CREATE TABLE IF NOT EXISTS stories" in s for s in statements)
+    assert not [s for s in statements if "story_views" in s]
+    (mig,) = [m for m in discover() if m.path.name == "V20261017.2__request_path_tables.sql"]
+    assert "user_id BIGINT NOT NULL REFERENCES users(id)" in mig.path.read_text()
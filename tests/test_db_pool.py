@@ -0,0 +1,117 @@
+"""utils/db_pool.ConnectionPool: LIFO reuse, bounded checkout and clean check-in."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+import psycopg2.extensions as pgext
+
+from tests.conftest import FakeConnection
+from utils import db_pool
+from utils.db_pool import ConnectionPool, PoolTimeout
+
+class PoolConnection(FakeConnection):
+    """FakeConnection plus the libpq state ConnectionPool inspects."""
+
+    def __init__(self):
+        super().__init__()
+        self.status = pgext.TRANSACTION_STATUS_IDLE
+        self.tag, self.queries, self.idle_since = "untagged", 0, time.monotonic()
+        self.session_dirty, self.cursor_factory = False, None
+
+    @property
+    def info(self):
+        return SimpleNamespace(transaction_status=self.status)
+
+    def rollback(self):
+        super().rollback()
+        self.status = pgext.TRANSACTION_STATUS_IDLE
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_pool, "CHECKOUT_TIMEOUT", 0.05)
+    monkeypatch.setattr(ConnectionPool, "_connect", lambda self: PoolConnection())
+    p = ConnectionPool("postgresql://unused", minconn=1, maxconn=2)
+    yield p
+    p.closeall()
+
+def test_connections_are_reused_last_in_first_out(pool):
+    a = pool.getconn("a")
+    b = pool.getconn("b")
+    pool.putconn(a)
+    pool.putconn(b)
+    assert pool.getconn("c") is b
+    assert pool.stats()["checkouts"] == 3
+
+def test_checkout_blocks_then_times_out_when_exhausted(pool):
+    pool.getconn()
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn("starved")
+
+def test_checkout_waits_for_a_returned_connection(pool):
+    a = pool.getconn()
+    pool.getconn()
+    threading.Timer(0.01, pool.putconn, args=(a,)).start()
+    assert pool.getconn() is a
+
+def test_open_transaction_is_rolled_back_on_return(pool):
+    conn = pool.getconn()
+    conn.status = pgext.TRANSACTION_STATUS_INTRANS
+    conn.autocommit = True
+    pool.putconn(conn)
+    assert conn.rollbacks == 1 and conn.autocommit is False
+
+def test_session_settings_are_reset_before_reuse(pool):
+    conn = pool.getconn()
+    conn.session_dirty = True
+    pool.putconn(conn)
+    assert conn.cur.statements == ["RESET ALL"] and conn.commits == 1
+    assert not conn.session_dirty
+    pool.putconn(pool.getconn())
+    assert conn.cur.statements == ["RESET ALL"]
+
+def test_broken_connection_is_discarded(pool):
+    conn = pool.getconn()
+    pool.putconn(conn, close=True)
+    assert conn.closed
+    assert pool.getconn() is not conn
+    assert pool.stats()["discarded"] == 1
+
+def test_reap_idle_keeps_minconn(pool):
+    conns = [pool.getconn(), pool.getconn()]
+    for c in conns:
+        pool.putconn(c)
+        c.idle_since = 0.0
+    assert pool.reap_idle(max_idle=1) == 1
+    assert pool.stats()["idle"] == 1
+
+def test_checkout_on_the_event_loop_fails_fast(pool, monkeypatch):
+    monkeypatch.setattr(db_pool, "CHECKOUT_TIMEOUT", 10)
+    monkeypatch.setattr(db_pool, "LOOP_CHECKOUT_TIMEOUT", 0.01)
+
+    async def handler():
+        held = [pool.getconn(), pool.getconn()]
+        t0 = time.monotonic()
+        with pytest.raises(PoolTimeout, match="after 0.01s"):
+            pool.getconn("handler")
+        waited = time.monotonic() - t0
+        for conn in held:
+            pool.putconn(conn)
+        return waited
+
+    assert asyncio.run(handler()) < 1
+
+def test_worker_threads_off_the_loop_keep_the_full_wait(pool, monkeypatch):
+    monkeypatch.setattr(db_pool, "CHECKOUT_TIMEOUT", 10)
+    monkeypatch.setattr(db_pool, "LOOP_CHECKOUT_TIMEOUT", 0)
+
+    async def handler():
+        a, _ = pool.getconn(), pool.getconn()
+        asyncio.get_running_loop().call_later(0.02, pool.putconn, a)
+        return await asyncio.to_thread(pool.getconn, "worker")
+
+    assert asyncio.run(handler()).tag == "worker"
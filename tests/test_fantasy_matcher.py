@@ -0,0 +1,43 @@
+"""utils/fantasy_matcher: greedy keyword-overlap matching over a whole batch."""
+from utils.fantasy_matcher import Pair, build_index, make_submission, match_batch, pair_key
+
+def sub(uid, keywords, vibe="romantic"):
+    return make_submission(uid, vibe, keywords)
+
+def test_make_submission_dedups_drops_empty_and_caps_keywords():
+    s = make_submission("7", None, ["b", "a", "", "b", "d", "c"])
+    assert s.user_id == 7 and s.vibe == ""
+    assert s.keywords == frozenset({"a", "b", "c"})
+
+def test_index_files_each_boy_under_every_keyword_subset():
+    index = build_index([sub(1, ["a", "b", "c"])])
+    assert len(index) == 7
+    assert index[("romantic", frozenset({"a", "c"}))] == [0]
+
+def test_most_shared_keywords_are_paired_first():
+    girls = [sub(10, ["a"]), sub(11, ["a", "b", "c"])]
+    boys = [sub(1, ["a"]), sub(2, ["a", "b", "c"])]
+    pairs = match_batch(girls, boys, excluded=set())
+    assert Pair(2, 11, "romantic", ("a", "b", "c")) in pairs
+    assert Pair(1, 10, "romantic", ("a",)) in pairs
+
+def test_older_girl_takes_the_oldest_free_boy():
+    girls = [sub(10, ["a"]), sub(11, ["a"])]
+    boys = [sub(1, ["a"]), sub(2, ["a"]), sub(3, ["a"])]
+    assert [(p.girl_id, p.boy_id) for p in match_batch(girls, boys, set())] == [(10, 1), (11, 2)]
+
+def test_vibes_must_match():
+    assert match_batch([sub(10, ["a"], "wild")], [sub(1, ["a"], "romantic")], set()) == []
+
+def test_excluded_pair_is_skipped_for_that_girl_only():
+    girls = [sub(10, ["a"]), sub(11, ["a"])]
+    boys = [sub(1, ["a"]), sub(2, ["a"])]
+    pairs = match_batch(girls, boys, excluded={pair_key(10, 1)})
+    assert [(p.girl_id, p.boy_id) for p in pairs] == [(10, 2), (11, 1)]
+
+def test_everyone_is_paired_at_most_once():
+    girls = [sub(100 + i, ["a", "b"][: 1 + i % 2]) for i in range(30)]
+    boys = [sub(i, ["b", "a"][: 1 + i % 2]) for i in range(20)]
+    pairs = match_batch(girls, boys, set())
+    assert len({p.girl_id for p in pairs}) == len({p.boy_id for p in pairs}) == len(pairs)
+    assert all(p.shared for p in pairs)
@@ -0,0 +1,60 @@
+"""utils/feed: opaque keyset cursors and the per-tab page query."""
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.conftest import FakeCursor
+from utils import feed
+from utils.feed import COLUMNS, TABS, decode_cursor, encode_cursor, fetch_feed_page
+
+@pytest.mark.parametrize("rank", [
+    datetime(2026, 10, 17, 12, 30, 5, 123456, tzinfo=timezone.utc),
+    123.456789012345,
+    -0.5,
+])
+def test_cursor_round_trip(rank):
+    cursor = encode_cursor(rank, 42)
+    assert "=" not in cursor and "|" not in cursor
+    assert decode_cursor(cursor) == (rank, 42)
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "dGVzdA", encode_cursor(1.0, 1)[:-3] + "xyz"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def row(post_id, rank):
+    values = dict.fromkeys(COLUMNS)
+    values.update(id=post_id, rank_key=rank)
+    return tuple(values[c] for c in COLUMNS)
+
+def test_full_page_returns_cursor_of_last_row():
+    t = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    cur = FakeCursor([row(9, t), row(7, t)])
+    rows, next_cursor = fetch_feed_page(cur, 1, "fresh", 2, None, 72)
+    assert len(rows) == 2
+    assert decode_cursor(next_cursor) == (t, 7)
+    sql, params = cur.executed[0]
+    assert sql is feed._SQL["fresh"]
+    assert params == {"viewer": 1, "hours": 72, "after_rank": None, "after_id": None, "limit": 2}
+
+def test_short_page_is_the_last():
+    cur = FakeCursor([row(3, 1.5)])
+    assert fetch_feed_page(cur, 1, "waves", 2, encode_cursor(2.0, 4), 72) == ([row(3, 1.5)], None)
+    assert cur.executed[0][1]["after_rank"] == 2.0
+    assert cur.executed[0][1]["after_id"] == 4
+
+def test_unknown_tab_is_rejected_before_the_query():
+    cur = FakeCursor()
+    with pytest.raises(ValueError):
+        fetch_feed_page(cur, 1, "trending", 10, None, 72)
+    assert cur.executed == []
+
+@pytest.mark.parametrize("tab, rank", [("waves", datetime(2026, 1, 1)), ("fresh", 3.0), ("following", 3.0)])
+def test_cursor_from_another_tab_is_rejected(tab, rank):
+    with pytest.raises(ValueError):
+        fetch_feed_page(FakeCursor(), 1, tab, 10, encode_cursor(rank, 1), 72)
+
+def test_every_tab_has_a_page_query_with_cursor_and_limit():
+    assert set(feed._SQL) == set(TABS)
+    for sql in feed._SQL.values():
+        assert "%(after_rank)s" in sql and "%(limit)s" in sql and "%(viewer)s" in sql
@@ -0,0 +1,94 @@
+"""utils/feed_cursor: windowed keyset cursors, the cursor store and the post cache."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from utils import feed_cursor
+from utils.feed_cursor import CursorStore, FeedCursor, PostCache
+
+POSTS = [(pid, pid * 1000) for pid in range(100, 0, -1)]   # (id, created_at µs), newest first
+
+@pytest.fixture
+def pages(monkeypatch):
+    """Serve _page() from POSTS, counting calls."""
+    calls = []
+
+    def fake_page(kind, viewer, arg, after=None, before=None, limit=None):
+        calls.append((after, before))
+        limit = limit or feed_cursor.PAGE_SIZE
+        if after is not None:
+            return [k for k in POSTS if k[1] < after[1]][:limit]
+        if before is not None:
+            return [k for k in POSTS if k[1] > before[1]][-limit:]
+        return POSTS[:limit]
+    monkeypatch.setattr(feed_cursor, "_page", fake_page)
+    monkeypatch.setattr(feed_cursor, "PAGE_SIZE", 10)
+    return calls
+
+def test_walks_the_whole_feed_one_page_at_a_time(pages):
+    cur = FeedCursor("public", 1)
+    cur.load_first()
+    seen = [cur.current]
+    while (pid := cur.move(+1)) is not None:
+        seen.append(pid)
+    assert seen == list(range(100, 0, -1))
+    assert len(pages) == 11          # first page + one per further page + the empty one
+    assert not cur.has_next
+
+def test_window_is_bounded_and_reloads_going_back(pages, monkeypatch):
+    monkeypatch.setattr(feed_cursor, "WINDOW", 25)
+    cur = FeedCursor("public", 1)
+    cur.load_first()
+    for _ in range(60):
+        cur.move(+1)
+    assert cur.current == 40 and len(cur) <= 25 + 10
+    for _ in range(60):
+        cur.move(-1)
+    assert cur.current == 100 and not cur.has_prev
+    assert cur.move(-1) is None
+
+def test_load_first_at_an_offset(pages):
+    cur = FeedCursor("author", 1, 5)
+    cur.load_first(start=14)
+    assert cur.current == 86 and cur.has_prev
+    assert cur.move(+1) == 85
+    assert cur.ahead(2) == [84, 83]
+
+def test_discard_moves_to_the_next_post(pages):
+    cur = FeedCursor("public", 1)
+    cur.load_first()
+    cur.move(+1)
+    assert cur.discard(99) == 98
+    assert cur.move(-1) == 100
+
+def test_store_replaces_expires_and_bounds_cursors(pages):
+    store = CursorStore(idle_s=1800, max_cursors=2)
+    store.open(1, "public")
+    store.open(2, "public")
+    store.open(3, "public")
+    assert store.get(1) is None and len(store) == 2
+    assert store.move(2, +1) == 99
+    store.open(2, "public")
+    assert store.get(2).current == 100
+    expired = CursorStore(idle_s=0)
+    expired.open(1, "public")
+    assert expired.get(1) is None
+
+def test_empty_feed_gives_no_cursor(monkeypatch):
+    monkeypatch.setattr(feed_cursor, "_page", lambda *a, **k: [])
+    assert CursorStore().open(1, "public") is None
+
+def test_post_cache_hydrates_misses_together(monkeypatch):
+    batches = []
+
+    def fake_hydrate(ids):
+        batches.append(list(ids))
+        return {pid: {"id": pid} for pid in ids if pid != 13}
+    monkeypatch.setattr(feed_cursor, "hydrate", fake_hydrate)
+    cache = PostCache(ttl=60, max_entries=3)
+    assert set(cache.get_many([10, 11, 12, 13])) == {10, 11, 12}
+    assert set(cache.get_many([11, 12, 14])) == {11, 12, 14}
+    assert batches == [[10, 11, 12, 13], [14]]
+    assert len(cache) == 3
+    cache.invalidate(14)
+    assert cache.get(14) is None
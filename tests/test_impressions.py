@@ -0,0 +1,82 @@
+"""utils/impressions.ImpressionBuffer: dedup, read-your-writes, backpressure and counter SQL."""
+import pytest
+
+from tests.conftest import RecordingWrites
+from utils.impressions import CountInto, ImpressionBuffer
+
+class RecordingBuffer(RecordingWrites, ImpressionBuffer):
+    def _write_each(self, rows):
+        raise ConnectionError("db down")
+
+@pytest.fixture
+def buf():
+    b = RecordingBuffer("feed_views", ("post_id", "viewer_id"), tag="test_views", flush_ms=60_000)
+    yield b
+    b.close()
+
+def test_duplicate_rows_are_skipped_while_pending_and_after_write(buf):
+    assert buf.add(1, 10)
+    assert not buf.add(1, 10)
+    assert buf.flush() == 1
+    assert not buf.add(1, 10)
+    assert buf.add(1, 11)
+    assert buf.writes == [[(1, 10)]]
+
+def test_seen_covers_pending_and_written_rows(buf):
+    buf.add(5, 50)
+    assert buf.seen(5, 50)
+    buf.flush()
+    assert buf.seen(5, 50)
+    assert not buf.seen(5, 51)
+
+def test_dedup_window_expires(buf):
+    buf.dedup_s = 0
+    buf.add(1, 10)
+    buf.flush()
+    buf.flush()   # rotates twice: the row leaves both generations
+    buf._rotate(float("inf"))
+    assert buf.add(1, 10)
+
+def test_rows_beyond_max_rows_are_dropped():
+    b = RecordingBuffer("feed_views", ("post_id", "viewer_id"), tag="test_full", flush_ms=60_000, max_rows=2)
+    assert b.add(1, 1) and b.add(1, 2)
+    assert not b.add(1, 3)
+    assert b.pending() == 2
+    b.close()
+
+def test_unreachable_db_puts_rows_back(buf):
+    buf.fail = 1
+    buf.add(1, 10)
+    with pytest.raises(ConnectionError):
+        buf.flush()
+    assert buf.pending() == 1
+    assert buf.flush() == 1
+    assert buf.writes == [[(1, 10)]]
+
+def test_plain_sql_is_insert_on_conflict_do_nothing(buf):
+    assert buf._sql == "INSERT INTO feed_views (post_id, viewer_id) VALUES %s ON CONFLICT DO NOTHING"
+
+def test_count_into_bumps_counters_by_rows_inserted():
+    b = ImpressionBuffer("story_views", ("story_id", "viewer_id"), tag="test_count",
+                         count_into=CountInto("stories", "id", "story_id", ("view_count",)))
+    assert b._sql == (
+        "WITH ins AS (INSERT INTO story_views (story_id, viewer_id) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING story_id) "
+        "UPDATE stories t SET view_count = COALESCE(t.view_count, 0) + n.n "
+        "FROM (SELECT story_id AS k, COUNT(*) AS n FROM ins GROUP BY 1) n "
+        "WHERE t.id = n.k"
+    )
+
+def test_add_after_close_is_ignored(buf):
+    buf.close()
+    assert not buf.add(1, 10)
+
+def test_bot_and_api_share_one_story_view_buffer():
+    pytest.importorskip("psycopg2")
+    from handlers import posts_handlers
+    from utils import story_tray
+
+    buffers = [v for m in (posts_handlers, story_tray) for v in vars(m).values()
+               if isinstance(v, ImpressionBuffer) and v.table == "story_views"]
+    assert buffers == [story_tray.VIEWS]
+    assert "INSERT INTO story_views (story_id, user_id)" in story_tray.VIEWS._sql
@@ -0,0 +1,110 @@
+"""utils/matchmaking.MatchQueue: mutual filters, FIFO order, boosts and removal."""
+from utils.matchmaking import MatchQueue, SearchTicket
+
+def ticket(uid, gender="m", **kw):
+    return SearchTicket(uid, gender=gender, **kw)
+
+def test_oldest_compatible_ticket_wins():
+    q = MatchQueue()
+    for uid in (1, 2, 3):
+        q.enqueue(ticket(uid, "f"))
+    assert q.pop_partner(ticket(10)) == 1
+    assert list(q) == [2, 3]
+
+def test_filters_must_match_both_ways():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f", want="f"))      # only wants women
+    q.enqueue(ticket(2, "m"))
+    q.enqueue(ticket(3, "f"))
+    assert q.pop_partner(ticket(10, "m", want="f")) == 3
+
+def test_age_window_only_matches_ages_inside_it():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f", age=30))
+    q.enqueue(ticket(2, "f", age=22))
+    q.enqueue(ticket(3, "f"))                # no age given
+    assert q.pop_partner(ticket(10, age=25, window=(20, 25))) == 2
+    assert q.pop_partner(ticket(11, age=25, window=(20, 25))) is None
+
+def test_waiting_window_must_accept_the_searcher():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f", age=25, window=(18, 21)))
+    assert q.pop_partner(ticket(10, age=30)) is None
+    assert q.pop_partner(ticket(11, age=20)) == 1
+
+def test_verified_only_both_directions():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f", verified_only=True))
+    q.enqueue(ticket(2, "f", verified=False))
+    assert q.pop_partner(ticket(10, verified_only=True)) is None
+    assert q.pop_partner(ticket(11, verified=True)) == 1
+
+def test_front_enqueue_jumps_the_line():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f"))
+    q.enqueue(ticket(2, "f"), front=True)
+    assert list(q) == [2, 1]
+    assert q.pop_partner(ticket(10)) == 2
+
+def test_discard_and_reenqueue():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "f"))
+    q.enqueue(ticket(2, "f"))
+    assert q.discard(1).uid == 1
+    assert 1 not in q and len(q) == 1
+    assert q.discard(1) is None
+    q.enqueue(ticket(1, "f"))
+    assert list(q) == [2, 1]
+
+def test_searcher_is_never_paired_with_itself():
+    q = MatchQueue()
+    me = ticket(1, "f")
+    q.enqueue(me)
+    assert q.pop_partner(me) is None
+    assert len(q) == 0
+
+def test_many_removals_compact_groups():
+    q = MatchQueue()
+    for uid in range(500):
+        q.enqueue(ticket(uid, "f"))
+    for uid in range(499):
+        q.discard(uid)
+    grp = next(iter(q._groups.values()))
+    assert len(grp.order) < 100
+    assert q.pop_partner(ticket(1000)) == 499
+
+def test_distinct_windows_share_one_group():
+    q = MatchQueue()
+    for uid, lo in enumerate(range(18, 60)):
+        q.enqueue(ticket(uid, "m", want="f", age=30, window=(lo, lo + 10)))
+    assert len(q._groups) == 1
+    assert q.pop_partner(ticket(100, "f", age=65)) == 37    # first window reaching 65
+    assert q.pop_partner(ticket(101, "f", age=17)) is None
+
+def test_windowed_ticket_without_own_age_still_matches_open_searchers():
+    q = MatchQueue()
+    q.enqueue(ticket(1, "m", window=(20, 30)))
+    assert q.pop_partner(ticket(10, "f", age=25, window=(20, 30))) is None
+    assert q.pop_partner(ticket(11, "f", age=25)) == 1
+
+def test_lookup_agrees_with_pairwise_filters():
+    import random
+    rng = random.Random(7)
+
+    def random_ticket(uid):
+        lo = rng.randint(18, 50)
+        return ticket(uid, rng.choice("mf"), want=rng.choice(["m", "f", None]),
+                      age=rng.choice([None, rng.randint(18, 60)]),
+                      window=rng.choice([None, (lo, lo + rng.randint(0, 15))]),
+                      verified=rng.random() < 0.5, verified_only=rng.random() < 0.2)
+
+    q, waiting = MatchQueue(), []
+    for uid in range(300):
+        t = random_ticket(uid)
+        q.enqueue(t, front=rng.random() < 0.1)
+        waiting.append(t)
+    for uid in range(1000, 1200):
+        me = random_ticket(uid)
+        fits = [t for t in waiting if t.alive and t.accepts(me) and me.accepts(t)]
+        expected = min(fits, key=lambda t: t.seq).uid if fits else None
+        assert q.peek_partner(me) is (q._tickets[expected] if fits else None)
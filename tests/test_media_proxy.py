@@ -0,0 +1,143 @@
+"""utils/media_proxy against a local fake Telegram Bot API (getFile + file download)."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from utils import media_proxy
+
+TOKEN = "123:fake"
+FILES = {f"fid{i}": bytes([i]) * (40_000 + i) for i in range(8)}
+MAX_BYTES = 150_000
+
+class FakeTelegram(BaseHTTPRequestHandler):
+    calls = {"getFile": 0, "download": 0}
+    stale = set()  # file paths that 404 once
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == f"/bot{TOKEN}/getFile":
+            self.calls["getFile"] += 1
+            fid = parse_qs(url.query).get("file_id", [""])[0]
+            if fid in FILES:
+                body = {"ok": True, "result": {"file_id": fid, "file_unique_id": f"u-{fid}",
+                                               "file_path": f"photos/{fid}.jpg"}}
+            else:
+                body = {"ok": False, "description": "Bad Request: invalid file_id"}
+            return self._send(200 if body["ok"] else 400, json.dumps(body).encode(), "application/json")
+        prefix = f"/file/bot{TOKEN}/photos/"
+        if url.path.startswith(prefix):
+            self.calls["download"] += 1
+            fid = url.path[len(prefix):-4]
+            if url.path in self.stale or fid not in FILES:
+                self.stale.discard(url.path)
+                return self._send(404)
+            return self._send(200, FILES[fid])
+        self._send(404)
+
+@pytest.fixture(scope="module")
+def api_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def calls():
+    FakeTelegram.calls.update(getFile=0, download=0)
+    FakeTelegram.stale.clear()
+    return FakeTelegram.calls
+
+@pytest.fixture
+def make_proxy(api_base, tmp_path):
+    def make(**kwargs):
+        return media_proxy.TelegramMediaProxy(TOKEN, api_base=api_base, cache_dir=str(tmp_path),
+                                              max_bytes=MAX_BYTES, **kwargs)
+    return make
+
+def run(proxy, coro_fn):
+    async def go():
+        try:
+            return await coro_fn(proxy)
+        finally:
+            await proxy.aclose()
+    return asyncio.run(go())
+
+def test_concurrent_misses_share_one_upstream_fetch(make_proxy, calls):
+    entries = run(make_proxy(), lambda p: asyncio.gather(*(p.get("fid1") for _ in range(20))))
+    assert calls == {"getFile": 1, "download": 1}
+    assert all(e is entries[0] for e in entries)
+    assert Path(entries[0].path).read_bytes() == FILES["fid1"]
+    assert entries[0].content_type == "image/jpeg"
+    assert entries[0].etag == '"u-fid1"'
+
+def test_repeat_request_is_served_from_disk(make_proxy, calls):
+    async def twice(p):
+        await p.get("fid1")
+        await p.get("fid1")
+    run(make_proxy(), twice)
+    assert calls == {"getFile": 1, "download": 1}
+
+def test_expired_path_is_resolved_again(make_proxy, calls):
+    async def go(p):
+        p._paths["fid1"] = (0, "photos/fid1.jpg", "u-fid1")
+        await p.get("fid1")
+    run(make_proxy(path_ttl=60), go)
+    assert calls == {"getFile": 1, "download": 1}
+
+def test_stale_path_is_retried_once_with_a_fresh_one(make_proxy, calls):
+    async def go(p):
+        await p.get("fid1")
+        p._lru.clear(); p._bytes = 0
+        FakeTelegram.stale.add(f"/file/bot{TOKEN}/photos/fid1.jpg")
+        return await p.get("fid1")
+    entry = run(make_proxy(), go)
+    assert calls == {"getFile": 2, "download": 3}
+    assert Path(entry.path).read_bytes() == FILES["fid1"]
+
+def test_unknown_file_id_raises_not_found(make_proxy, calls):
+    with pytest.raises(media_proxy.MediaNotFound):
+        run(make_proxy(), lambda p: p.get("nope"))
+
+def test_disk_cache_stays_under_budget_and_survives_restart(make_proxy, calls, tmp_path):
+    async def fill(p):
+        for fid in FILES:
+            await p.get(fid)
+        return p
+    proxy = run(make_proxy(), fill)
+    on_disk = sum(f.stat().st_size for f in tmp_path.iterdir() if not f.suffix)
+    assert proxy._bytes <= MAX_BYTES
+    assert on_disk == proxy._bytes
+    assert list(proxy._lru)[-1] == "fid7"
+    assert set(make_proxy()._lru) == set(proxy._lru)
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=50-500", (50, 99)),
+    ("bytes=0-1,5-6", None),
+    ("bytes=x-y", None),
+])
+def test_parse_range(header, expected):
+    assert media_proxy.parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=5-4", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        media_proxy.parse_range(header, 100)
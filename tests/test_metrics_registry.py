@@ -0,0 +1,65 @@
+"""utils/metrics_registry: per-thread counters, histograms and Prometheus exposition."""
+import threading
+
+import pytest
+
+from utils.metrics_registry import Registry, bucket_quantile
+
+def test_counter_sums_across_threads():
+    reg = Registry()
+    child = reg.counter("hits_total", "Hits", ["kind"]).labels(kind="text")
+
+    def work():
+        for _ in range(10_000):
+            child.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert child.value == 40_000
+
+def test_labels_are_cached_and_validated():
+    fam = Registry().counter("x_total", "", ["a", "b"])
+    assert fam.labels("1", "2") is fam.labels(a=1, b=2)
+    with pytest.raises(ValueError):
+        fam.labels("only-one")
+
+def test_reregistering_with_another_type_or_labels_fails():
+    reg = Registry()
+    assert reg.counter("x_total", "", ["a"]) is reg.counter("x_total", "", ["a"])
+    with pytest.raises(ValueError):
+        reg.gauge("x_total", "", ["a"])
+    with pytest.raises(ValueError):
+        reg.counter("x_total", "", ["b"])
+
+def test_bucket_quantile_interpolates_within_a_bucket():
+    bounds = (10.0, 20.0)
+    assert bucket_quantile(bounds, [0, 10, 0, 0, 0], 0.5) == 15.0
+    assert bucket_quantile(bounds, [0, 0, 4, 0, 0], 0.99) == 20.0   # +Inf bucket
+    assert bucket_quantile(bounds, [0, 0, 0, 0, 0], 0.5) == 0.0
+
+def test_render_exposition_format():
+    reg = Registry()
+    reg.counter("req_total", "Requests", ["path"]).labels(path='/a"b').inc(3)
+    reg.gauge("queue_depth", "Depth").set(2.5)
+    h = reg.histogram("lat_ms", "Latency", buckets=(10, 100))
+    for v in (5, 50, 500):
+        h.observe(v)
+    assert reg.render() == "\n".join([
+        "# HELP lat_ms Latency",
+        "# TYPE lat_ms histogram",
+        'lat_ms_bucket{le="10"} 1',
+        'lat_ms_bucket{le="100"} 2',
+        'lat_ms_bucket{le="+Inf"} 3',
+        "lat_ms_sum 555",
+        "lat_ms_count 3",
+        "# HELP queue_depth Depth",
+        "# TYPE queue_depth gauge",
+        "queue_depth 2.5",
+        "# HELP req_total Requests",
+        "# TYPE req_total counter",
+        'req_total{path="/a\\"b"} 3',
+        "",
+    ])
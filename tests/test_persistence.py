@@ -0,0 +1,113 @@
+"""utils/persistence.SQLitePersistence: per-key rows, lazy loads and change-only writes."""
+import asyncio
+
+import pytest
+
+from utils.persistence import USER, SQLitePersistence
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.sqlite3")
+
+def reopen(db_path):
+    return SQLitePersistence(db_path)
+
+def test_user_data_survives_a_restart_and_loads_lazily(db_path):
+    async def first():
+        p = reopen(db_path)
+        await p.update_user_data(1, {"gender": "f"})
+        await p.update_user_data(2, {"gender": "m"})
+        await p.flush()
+        p.close()
+
+    async def second():
+        p = reopen(db_path)
+        assert await p.get_user_data() == {}
+        data = {}
+        await p.refresh_user_data(1, data)
+        assert data == {"gender": "f"}
+        p.close()
+    asyncio.run(first())
+    asyncio.run(second())
+
+def test_values_set_before_the_load_win(db_path):
+    async def go():
+        p = reopen(db_path)
+        await p.update_user_data(1, {"a": 1, "b": 1})
+        await p.flush()
+        p = reopen(db_path)
+        data = {"a": 2}
+        await p.refresh_user_data(1, data)
+        assert data == {"a": 2, "b": 1}
+    asyncio.run(go())
+
+def test_update_before_the_first_load_keeps_stored_keys(db_path):
+    async def go():
+        p = reopen(db_path)
+        await p.update_user_data(1, {"gender": "f", "age": 30})
+        await p.flush()
+        p = reopen(db_path)
+        live = {"last_job": 1}                  # a job touched user_data before any update
+        await p.update_user_data(1, dict(live))
+        await p.flush()
+        assert p.store.get(USER, "1") == {"gender": "f", "age": 30, "last_job": 1}
+        await p.refresh_user_data(1, live)      # the live dict still hydrates afterwards
+        assert live == {"gender": "f", "age": 30, "last_job": 1}
+    asyncio.run(go())
+
+def test_unchanged_data_is_not_rewritten(db_path):
+    async def go():
+        p = reopen(db_path)
+        await p.update_user_data(1, {"n": 1})
+        await p.flush()
+        await p.update_user_data(1, {"n": 1})
+        batch, p._pending = dict(p._pending), {}
+        return p._write_batch(batch)
+    assert asyncio.run(go()) == (0, 0)
+
+def test_dropped_user_row_is_deleted(db_path):
+    async def go():
+        p = reopen(db_path)
+        await p.update_user_data(1, {"n": 1})
+        await p.flush()
+        await p.drop_user_data(1)
+        await p.flush()
+        return p.store.count(USER)
+    assert asyncio.run(go()) == 0
+
+def test_failed_write_keeps_entries_for_retry(db_path, monkeypatch):
+    def disk_full(upserts, deletes):
+        raise OSError("disk full")
+
+    async def go():
+        p = reopen(db_path)
+        real_write = p.store.write
+        monkeypatch.setattr(p.store, "write", disk_full)
+        await p.update_user_data(1, {"n": 1})
+        await p.flush()
+        assert p._pending
+        monkeypatch.setattr(p.store, "write", real_write)
+        await p.flush()
+        return p.store.get(USER, "1")
+    assert asyncio.run(go()) == {"n": 1}
+
+def test_conversations_round_trip(db_path):
+    async def go():
+        p = reopen(db_path)
+        await p.update_conversation("reg", (1, 1), 3)
+        await p.update_conversation("reg", (2, 2), 4)
+        await p.update_conversation("reg", (2, 2), None)
+        await p.flush()
+        return await reopen(db_path).get_conversations("reg")
+    assert asyncio.run(go()) == {(1, 1): 3}
+
+def test_import_state_from_pickle_persistence_dict(db_path):
+    p = reopen(db_path)
+    counts = p.import_state({
+        "user_data": {1: {"a": 1}, 2: {}},
+        "chat_data": {5: {"c": 1}},
+        "bot_data": {"k": "v"},
+        "conversations": {"reg": {(1, 1): 2}},
+    })
+    assert counts == {"user_data": 1, "chat_data": 1, "conversations": 1}
+    assert asyncio.run(p.get_bot_data()) == {"k": "v"}
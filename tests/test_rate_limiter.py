@@ -0,0 +1,136 @@
+"""utils/rate_limiter: token buckets, bounded tables and hierarchical checks."""
+import threading
+
+import pytest
+
+from utils.rate_limiter import SHARDS, BucketTable, RateLimiter, SingleBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def test_burst_then_refill(clock):
+    t = BucketTable("t", rate=2.0, burst=3.0, clock=clock)
+    assert [t.take("a")[0] for _ in range(4)] == [True, True, True, False]
+    assert t.take("a") == (False, 0.5)
+    clock.now += 0.5
+    assert t.take("a") == (True, 0.0)
+    clock.now += 100
+    assert t.tokens("a") == 3.0
+
+def test_keys_are_independent(clock):
+    t = BucketTable("t", rate=1.0, burst=1.0, clock=clock)
+    assert t.take("a")[0] and t.take("b")[0]
+    assert not t.take("a")[0]
+
+def test_cost_and_refund(clock):
+    t = BucketTable("t", rate=1.0, burst=5.0, clock=clock)
+    assert t.take("a", cost=4)[0]
+    assert t.take("a", cost=2) == (False, 1.0)
+    t.refund("a", cost=10)
+    assert t.tokens("a") == 5.0
+
+def test_reset_gives_a_fresh_bucket(clock):
+    t = BucketTable("t", rate=0.0, burst=1.0, clock=clock)
+    t.take("a")
+    assert t.take("a") == (False, float("inf"))
+    t.reset("a")
+    assert t.take("a")[0]
+
+def test_sweep_drops_only_refilled_buckets(clock):
+    t = BucketTable("t", rate=1.0, burst=2.0, clock=clock)
+    t.take("a")
+    t.take("b", cost=2)
+    clock.now += 1
+    assert t.sweep() == 1
+    assert len(t) == 1
+    assert t.tokens("b") == 1.0
+
+def test_table_is_bounded_by_max_keys(clock):
+    t = BucketTable("t", rate=1.0, burst=1.0, max_keys=SHARDS * 4, clock=clock)
+    for key in range(1000):
+        clock.now += 0.001
+        t.take(key)
+    assert len(t) <= SHARDS * 4
+    assert t.evicted == 1000 - len(t)
+
+def test_concurrent_takes_never_overspend():
+    t = BucketTable("t", rate=0.0, burst=1000.0, max_keys=SHARDS * 2)
+    granted = []
+
+    def worker(offset):
+        n = 0
+        for i in range(5000):
+            n += t.take((offset + i) % 8)[0]
+            if i % 97 == 0:
+                t.sweep()
+        granted.append(n)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    # rate 0 and nothing refilled, so nothing is swept or evicted: 8 keys x 1000 tokens
+    assert sum(granted) == 8000
+    assert t.evicted == 0
+
+def test_single_bucket(clock):
+    b = SingleBucket("g", rate=1.0, burst=2.0, clock=clock)
+    assert b.take()[0] and b.take("ignored")[0]
+    assert b.take() == (False, 1.0)
+    clock.now += 1
+    assert b.take()[0]
+    b.reset()
+    assert b.tokens() == 2.0
+
+def test_check_refunds_higher_levels_when_a_lower_one_refuses():
+    lim = RateLimiter(max_keys=1024)
+    lim.global_.set_rate(0.0)
+    lim.user.set_rate(0.0)
+    lim.feature("confession", rate=0.0, burst=1.0)
+    assert lim.check(user_id=1, feature="confession").allowed
+    d = lim.check(user_id=1, feature="confession")
+    assert (d.allowed, d.scope) == (False, "confession")
+    assert lim.user.tokens(1) == 4.0
+    assert lim.global_.tokens() == 59.0
+
+def test_check_refuses_at_user_level_without_touching_features():
+    lim = RateLimiter(max_keys=1024)
+    lim.user.set_rate(0.0)
+    for _ in range(5):
+        assert lim.check(user_id=1).allowed
+    assert lim.check(user_id=1).scope == "user"
+    assert lim.check(user_id=2).allowed
+
+def test_ip_refusal_refunds_user_and_feature():
+    lim = RateLimiter(max_keys=1024)
+    feat = lim.feature("f", rate=0.0, burst=3.0)
+    lim.ip.set_rate(0.0, burst=0.0)
+    d = lim.check(user_id=1, feature="f", ip="1.2.3.4")
+    assert d.scope == "ip"
+    assert feat.tokens(1) == 3.0
+
+def test_feature_and_single_are_declared_once():
+    lim = RateLimiter(max_keys=1024)
+    assert lim.feature("f", 1, 2) is lim.feature("f", 5, 5)
+    g = lim.single("abuse", 10, 20)
+    assert lim.single("abuse", 1, 1) is g
+    assert g in lim.tables()
+
+def test_reduce_and_restore_rates():
+    lim = RateLimiter(max_keys=1024)
+    lim.feature("f", rate=4.0, burst=4.0)
+    lim.single("s", rate=10.0, burst=10.0)
+    lim.reduce_rate_limits(0.5)
+    lim.reduce_rate_limits(0.25)   # relative to the normal rate, not compounded
+    assert [t.rate for t in lim.tables()] == [3.75, 0.375, 0.25, 1.0, 2.5]
+    lim.restore_rate_limits()
+    assert [t.rate for t in lim.tables()] == [15.0, 1.5, 1.0, 4.0, 10.0]
@@ -0,0 +1,65 @@
+"""utils/spam_fingerprint: exact and near-duplicate detection over a time window."""
+from utils.spam_fingerprint import MIN_CHARS, SpamFingerprinter, Seen, minhash, normalize
+
+BLAST = "Earn 5000 rupees daily from home, join t.me/quickcash now"
+
+def test_normalize_folds_case_digits_and_whitespace():
+    assert normalize("  Call ME\n on 98765  43210 ") == "call me on 0 0"
+
+def test_short_texts_have_no_signature():
+    assert minhash("a" * (MIN_CHARS - 1)) is None
+    assert minhash("a" * MIN_CHARS) is not None
+
+def test_exact_duplicates_from_one_user():
+    fp = SpamFingerprinter()
+    assert fp.observe(1, BLAST, now=0) == Seen(0, 0, 0)
+    assert fp.observe(1, BLAST, now=1).duplicates == 1
+    assert fp.observe(1, BLAST.upper(), now=2).duplicates == 2
+
+def test_blast_from_many_users_counts_other_senders():
+    fp = SpamFingerprinter()
+    for uid in range(1, 5):
+        fp.observe(uid, BLAST, now=uid)
+    seen = fp.observe(9, BLAST, now=10)
+    assert seen.duplicates == 4
+    assert seen.users == 4
+
+def test_changed_numbers_are_near_duplicates():
+    fp = SpamFingerprinter()
+    fp.observe(1, BLAST, now=0)
+    seen = fp.observe(2, BLAST.replace("5000", "7500"), now=1)
+    assert seen == Seen(0, 1, 1)
+
+def test_lightly_edited_long_copy_is_a_near_duplicate():
+    text = ("Congratulations! You have been selected for our exclusive work from home programme. "
+            "Earn up to 5000 rupees every single day with just your phone and two hours of time. "
+            "No experience needed, limited seats left, message the coordinator on telegram now.")
+    fp = SpamFingerprinter()
+    fp.observe(1, text, now=0)
+    seen = fp.observe(2, text.replace("coordinator", "co-ordinator"), now=1)
+    assert seen.duplicates == 0
+    assert seen.near == 1
+
+def test_unrelated_messages_do_not_match():
+    fp = SpamFingerprinter()
+    fp.observe(1, BLAST, now=0)
+    assert fp.observe(2, "what are you doing this weekend, any plans?", now=1) == Seen(0, 0, 0)
+
+def test_short_messages_never_count():
+    fp = SpamFingerprinter()
+    for uid in range(10):
+        assert fp.observe(uid, "good night", now=uid) == Seen(0, 0, 0)
+    assert len(fp.exact) == 0 and len(fp.near) == 0
+
+def test_entries_expire_after_the_window():
+    fp = SpamFingerprinter(window=60)
+    fp.observe(1, BLAST, now=0)
+    assert fp.observe(1, BLAST, now=61) == Seen(0, 0, 0)
+
+def test_indexes_stay_within_size():
+    fp = SpamFingerprinter(size=50)
+    for i in range(500):
+        fp.observe(i, f"message number {i} with some distinct words {i * 7919}", now=i)
+    assert len(fp.exact) <= 50
+    assert len(fp.near) == 50
+    assert max(len(b) for b in fp.near._buckets.values()) <= 64
@@ -0,0 +1,73 @@
+"""utils/story_tray: fixed-query tray builder and the per-viewer tray cache."""
+from datetime import datetime
+
+import pytest
+
+from tests.conftest import FakeCursor
+from utils import story_tray
+
+T = datetime(2026, 10, 17, 12, 0)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    story_tray.invalidate_all()
+    yield
+    story_tray.invalidate_all()
+
+def test_tray_is_four_queries_however_many_stories():
+    followees = [20, 30]
+    cur = FakeCursor(
+        [(1, None, "official", "welcome", None, T, followees),
+         (11, 20, "user", "a", None, T, followees),
+         (12, 30, "user", None, "m1", T, followees)],
+        [(11, 101, "photo", "image", "f1", None, T)],
+        [(12,)],
+        [(20, "asha"), (30, "ravi")],
+    )
+    stories, authors = story_tray.build_tray(cur, 10, media_url=lambda fid: f"/m/{fid}")
+    assert len(cur.executed) == 4
+    assert [(s["id"], s["name"], s["seen"]) for s in stories] == [
+        (1, "LuvHive✨", False), (11, "asha", False), (12, "ravi", True),
+    ]
+    assert stories[1]["segments"][0]["media_url"] == "/m/f1"
+    assert stories[2]["media_url"] == "/m/m1"
+    assert authors == {10, 20, 30}
+
+def test_no_stories_is_one_query_and_empty_official_is_hidden():
+    cur = FakeCursor([(None, None, None, None, None, None, [])])
+    assert story_tray.build_tray(cur, 10, media_url=str) == ([], frozenset({10}))
+    assert len(cur.executed) == 1
+
+def test_views_still_in_the_buffer_count_as_seen(monkeypatch):
+    monkeypatch.setattr(story_tray.VIEWS, "seen", lambda story_id, viewer_id: story_id == 11)
+    cur = FakeCursor([(11, 20, "user", "a", None, T, [20])], [], [], [(20, "asha")])
+    stories, _ = story_tray.build_tray(cur, 10, media_url=str)
+    assert stories[0]["seen"]
+
+def test_new_story_evicts_only_trays_that_cover_its_author():
+    story_tray.store_tray(1, frozenset({1, 20}), [{"id": 5}])
+    story_tray.store_tray(2, frozenset({2, 30}), [{"id": 6}])
+    story_tray.invalidate_author(20)
+    assert story_tray.cached_tray(1) is None
+    assert story_tray.cached_tray(2) == [{"id": 6}]
+
+def test_mark_seen_updates_the_cached_tray_only():
+    tray = [{"id": 5, "seen": False}, {"id": 6, "seen": False}]
+    story_tray.store_tray(1, frozenset({1}), tray)
+    story_tray.mark_seen(1, 6)
+    assert story_tray.cached_tray(1) == [{"id": 5, "seen": False}, {"id": 6, "seen": True}]
+    assert tray[1]["seen"] is False
+    story_tray.mark_seen(99, 6)
+    assert story_tray.cached_tray(99) is None
+
+def test_trays_expire(monkeypatch):
+    monkeypatch.setattr(story_tray, "TRAY_TTL", -1)
+    story_tray.store_tray(1, frozenset({1}), [])
+    assert story_tray.cached_tray(1) is None
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(story_tray, "TRAY_CACHE_MAX", 10)
+    for viewer in range(50):
+        story_tray.store_tray(viewer, frozenset({viewer}), [])
+    assert len(story_tray._CACHE) <= 10
+    assert story_tray.cached_tray(49) == []
@@ -0,0 +1,90 @@
+"""utils/tracing: per-update traces, per-handler DB attribution and flagging."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import tracing
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    tracing._windows.clear()
+    tracing._flagged.clear()
+    yield
+    tracing._windows.clear()
+    tracing._flagged.clear()
+
+def message_update():
+    return SimpleNamespace(message=object())
+
+async def lookup(update, context):
+    for _ in range(3):
+        tracing.add_query(2.0)
+    return "done"
+
+async def broken(update, context):
+    tracing.add_query(1.0)
+    raise RuntimeError("boom")
+
+def run_update(*callbacks):
+    """Open a trace the way the group -100 handler does, run the wrapped callbacks in its task."""
+    async def task():
+        await tracing._begin(message_update(), None)
+        trace = tracing.CURRENT.get()
+        for cb in callbacks:
+            try:
+                await tracing._wrap(cb)(message_update(), None)
+            except RuntimeError:
+                pass
+        return trace
+
+    async def main():
+        trace = await asyncio.create_task(task())
+        await asyncio.sleep(0)   # let the task's done callback run
+        return trace
+    return asyncio.run(main())
+
+def test_db_time_is_charged_to_the_handler_that_ran_it():
+    trace = run_update(lookup, broken)
+    assert trace.finished
+    assert (trace.queries, trace.db_ms) == (4, 7.0)
+    assert [(h[0].rsplit(".", 1)[-1], h[2], h[3], h[4]) for h in trace.handlers] == [
+        ("lookup", 6.0, 3, "ok"), ("broken", 1.0, 1, "error"),
+    ]
+    stats = {s["handler"].rsplit(".", 1)[-1]: s for s in tracing.handler_stats()}
+    assert stats["lookup"]["queries_max"] == 3
+    assert stats["broken"]["errors"] == 1
+
+def test_updates_over_the_query_budget_are_flagged(monkeypatch):
+    monkeypatch.setattr(tracing, "QUERY_LIMIT", 5)
+    run_update(lookup)
+    assert tracing.flagged_updates() == []
+    run_update(lookup, lookup)
+    flagged = tracing.flagged_updates()
+    assert len(flagged) == 1
+    assert flagged[0]["queries"] == 6 and flagged[0]["type"] == "message"
+
+def test_queries_outside_a_trace_are_ignored():
+    tracing.add_query(5.0)
+    with tracing.query_span():
+        pass
+    assert tracing.CURRENT.get() is None
+
+def test_wrapping_is_idempotent():
+    wrapped = tracing._wrap(lookup)
+    assert tracing._wrap(wrapped) is wrapped
+
+def test_install_wraps_nested_conversation_handlers():
+    from telegram.ext import ApplicationBuilder, CommandHandler, ConversationHandler, MessageHandler, filters
+
+    app = ApplicationBuilder().token("1:test").build()
+    app.add_handler(CommandHandler("start", lookup))
+    app.add_handler(ConversationHandler(
+        entry_points=[CommandHandler("chat", lookup)],
+        states={1: [MessageHandler(filters.TEXT, lookup)]},
+        fallbacks=[CommandHandler("cancel", lookup)],
+    ))
+    assert tracing.install(app) == 4
+    assert app.handlers[0][0].callback.__traced__
+    assert app.handlers[0][1].states[1][0].callback.__traced__
+    assert app.handlers[-100][0].callback is tracing._begin
@@ -0,0 +1,77 @@
+"""registration user snapshot cache: one-query load, TTL, invalidation, and the reg.a<fn> shim."""
+import asyncio
+
+import pytest
+
+from tests.conftest import FakeCursor
+
+pytest.importorskip("psycopg2")
+
+import registration as reg
+
+ROW = ("Female", 24, ["music"], None, None, True, None, False, True, False, False, 21, 30)
+
+@pytest.fixture(autouse=True)
+def snapshots(monkeypatch):
+    monkeypatch.setattr(reg, "_SNAPSHOTS", {})
+    return reg._SNAPSHOTS
+
+def test_snapshot_is_loaded_once_and_then_cached(pooled_conn):
+    pooled_conn.cur = FakeCursor([ROW])
+    snap = reg.get_user_snapshot(7)
+    assert (snap.gender_key, snap.age, snap.age_pref, snap.is_verified) == ("f", 24, (21, 30), True)
+    assert reg.get_user_snapshot(7) is snap
+    assert len(pooled_conn.cur.executed) == 1
+
+def test_unknown_user_gets_defaults(pooled_conn):
+    snap = reg.get_user_snapshot(8)
+    assert not snap.registered and snap.age_pref == (18, 99)
+
+def test_expired_snapshot_is_reloaded(pooled_conn):
+    pooled_conn.cur = FakeCursor([ROW], [ROW[:11] + (18, 99)])
+    first = reg.get_user_snapshot(7)
+    first.loaded_at -= reg.SNAPSHOT_TTL + 1
+    assert reg.peek_user_snapshot(7) is None
+    assert reg.get_user_snapshot(7).age_pref == (18, 99)
+    assert len(pooled_conn.cur.executed) == 2
+
+def test_setters_invalidate_the_snapshot(pooled_conn):
+    pooled_conn.cur = FakeCursor([ROW], [ROW[:11] + (25, 40)])
+    assert reg.get_user_snapshot(7).age_pref == (21, 30)
+    reg.set_age_pref(7, 25, 40)
+    assert reg.peek_user_snapshot(7) is None
+    assert reg.get_user_snapshot(7).age_pref == (25, 40)
+
+def test_cache_drops_oldest_entries_when_full(pooled_conn, monkeypatch, snapshots):
+    monkeypatch.setattr(reg, "SNAPSHOT_MAX", 10)
+    for uid in range(11):
+        reg.get_user_snapshot(uid)
+    assert 0 not in snapshots and 10 in snapshots and len(snapshots) == 10
+
+def test_premium_payment_invalidates_the_snapshot(pooled_conn, snapshots):
+    from datetime import datetime
+    from utils.payment_safety import PaymentSafetySystem, PaymentStatus
+
+    reg.get_user_snapshot(7)
+    pooled_conn.cur = FakeCursor(
+        [(1, 7, 100, "processing", "premium")],   # payment
+        [(datetime(2026, 10, 17),)],               # UPDATE payments ... RETURNING updated_at
+        [(datetime(2026, 11, 16),)],               # UPDATE users ... RETURNING premium_until
+    )
+    result = PaymentSafetySystem().update_payment_status("charge", PaymentStatus.SUCCEEDED)
+    assert result["success"] and pooled_conn.commits == 1
+    assert 7 not in snapshots
+
+def test_getattr_shim_builds_async_twins(pooled_conn):
+    pooled_conn.cur = FakeCursor([("2000-01-02",)])
+    try:
+        twin = reg.aget_date_of_birth
+        assert asyncio.run(twin(7)) == "2000-01-02"
+        assert reg.aget_date_of_birth is twin
+    finally:
+        vars(reg).pop("aget_date_of_birth", None)
+    assert reg.aget_age_pref.__name__ == "aget_age_pref"   # native twins are not shadowed
+    with pytest.raises(AttributeError):
+        reg.aUserSnapshot
+    with pytest.raises(AttributeError):
+        reg.no_such_helper
@@ -0,0 +1,77 @@
+"""utils/vault_index: page keys, revealed sets and keyset pages that skip revealed items."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from tests.conftest import FakeCursor
+from utils import vault_index
+from utils.vault_index import COLUMNS, RevealedCache, RevealedSet, decode_key, encode_key
+
+T0 = datetime(2026, 10, 17, tzinfo=timezone.utc)
+
+def test_key_round_trip_and_bad_keys():
+    assert decode_key(encode_key((1760659200000000, 42))) == (1760659200000000, 42)
+    assert decode_key("garbage") is None
+    assert decode_key("1.2.3") is None
+
+def test_revealed_set_membership_and_tally():
+    rs = RevealedSet([(3, 1), (8, 2), (12, 1)])
+    assert 8 in rs and 5 not in rs
+    rs.add(5, 2)
+    rs.add(5, 2)
+    assert list(rs.ids) == [3, 5, 8, 12]
+    assert (rs.in_category(1), rs.in_category(2), rs.in_category(9)) == (2, 2, 0)
+
+class VaultCursor(FakeCursor):
+    """Answers the revealed-set query and keyset pages over an in-memory item list."""
+
+    def __init__(self, items, revealed):
+        super().__init__()
+        self.items, self.revealed = items, revealed
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        if "vault_interactions" in sql:
+            self.results = [[(cid, 1) for cid in sorted(self.revealed)]]
+            return
+        newer = "ASC" in sql
+        rows = sorted(self.items, key=lambda it: (it[6], it[0]), reverse=not newer)
+        if "(created_at, id)" in sql:
+            bound = (params["ts"], params["id"])
+            rows = [it for it in rows if ((it[6], it[0]) > bound if newer else (it[6], it[0]) < bound)]
+        self.results = [rows[: params["n"]]]
+
+@pytest.fixture
+def db(pooled_conn, monkeypatch):
+    items = [(cid, f"text {cid}", None, 1, 0, 0, T0 + timedelta(minutes=cid)) + (None,) * (len(COLUMNS) - 7)
+             for cid in range(1, 31)]
+    pooled_conn.cur = VaultCursor(items, revealed={30, 29, 25})
+    monkeypatch.setattr(vault_index, "REVEALED", RevealedCache())
+    monkeypatch.setattr(vault_index, "SCAN_BATCH", 4)
+    return pooled_conn.cur
+
+def test_pages_skip_revealed_items_newest_first(db):
+    first, more = vault_index.page(1, user_id=7, limit=5)
+    assert [it["id"] for it in first] == [28, 27, 26, 24, 23]
+    assert more
+    second, _ = vault_index.page(1, user_id=7, after=first[-1]["key"], limit=5)
+    assert [it["id"] for it in second] == [22, 21, 20, 19, 18]
+    back, _ = vault_index.page(1, user_id=7, before=second[0]["key"], limit=5)
+    assert [it["id"] for it in back] == [28, 27, 26, 24, 23]
+
+def test_last_page_has_no_more(db):
+    items, more = vault_index.page(1, user_id=7, after=vault_index._key(T0 + timedelta(minutes=4), 4), limit=5)
+    assert [it["id"] for it in items] == [3, 2, 1]
+    assert not more
+
+def test_revealed_items_are_shown_when_not_hidden(db):
+    items, _ = vault_index.page(1, user_id=7, limit=2, hide_revealed=False)
+    assert [(it["id"], it["user_revealed"]) for it in items] == [(30, True), (29, True)]
+
+def test_revealed_set_is_loaded_once_and_updated_in_place(db):
+    vault_index.REVEALED.add(7, 1, 1)
+    vault_index.REVEALED.get(7)
+    assert len(db.executed) == 1
+    assert vault_index.remaining(1, approved=30, user_id=7) == 26
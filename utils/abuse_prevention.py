@@ -1,41 +1,43 @@
 # utils/abuse_prevention.py - Advanced abuse prevention and spam detection
 import logging
 import time
-import hashlib
 from typing import Dict, List, Set, Optional, Any, Union
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 from datetime import datetime, timedelta
 import re
 
+from utils.rate_limiter import LIMITER
+from utils.spam_fingerprint import SpamFingerprinter
+
 log = logging.getLogger(__name__)
 
+REPORT_WINDOW_S = 600        # reports older than this no longer count
+REPORT_WINDOW_MAX = 50       # reports kept per reported user
+REPORT_TRACKED_MAX = 10000   # reported users kept at once
+BLAST_USERS = 3              # other senders of the same content before it counts as a blast
+ACTIVITY_TRACKED_MAX = 50000 # users whose message activity / mutes are kept at once
+
 class AbusePreventionSystem:
     """Advanced abuse prevention for large-scale operation."""
     
     def __init__(self):
-        # Spam detection tracking
-        def _create_user_data():
-            return {
-                "messages_last_hour": deque(maxlen=100),
-                "reports_received": 0,
-                "last_warning": 0.0,
-                "violation_count": 0,
-                "auto_muted_until": 0.0,
-                "referral_rewards_today": 0,
-                "last_referral_reset": 0.0
-            }
-        self.user_activity = defaultdict(_create_user_data)
+        # Spam detection tracking: user_id -> activity dict, least recently
+        # active first; entries are only created by _activity() (writes) and
+        # the oldest are dropped beyond ACTIVITY_TRACKED_MAX
+        self.user_activity: "OrderedDict[int, dict]" = OrderedDict()
         
-        # Content fingerprinting for spam detection
-        self.content_hashes = deque(maxlen=1000)  # Track recent content hashes
+        # Content fingerprinting for spam detection (exact + near-duplicate, time-windowed)
+        self.fingerprints = SpamFingerprinter()
         self.spam_patterns = self._load_spam_patterns()
+        self._spam_prefilters = self._compile_prefilters(self.spam_patterns)
         
-        # Report tracking
-        self.recent_reports = defaultdict(list)  # reported_user_id -> [(reporter_id, timestamp)]
+        # Report tracking: reported_user_id -> deque[(reporter_id, timestamp)],
+        # least recently reported first so stale users can be dropped from the front
+        self.recent_reports: "OrderedDict[int, deque]" = OrderedDict()
         
-        # Rate limiting buckets (per-user and global)
-        self.user_buckets = defaultdict(lambda: {"tokens": 10, "last_refill": time.time()})
-        self.global_bucket = {"tokens": 1000, "last_refill": time.time()}
+        # Rate limiting buckets (per-user and global), in the shared bounded limiter
+        self.user_buckets = LIMITER.feature("abuse_user", rate=1.5, burst=10)
+        self.global_bucket = LIMITER.single("abuse_global", rate=15, burst=1000)
         
         # Referral abuse prevention
         def _create_referral_data():
@@ -46,6 +48,29 @@ class AbusePreventionSystem:
             }
         self.referral_tracking = defaultdict(_create_referral_data)
     
+    @staticmethod
+    def _create_user_data() -> dict:
+        return {
+            "messages_last_hour": deque(maxlen=100),
+            "reports_received": 0,
+            "last_warning": 0.0,
+            "violation_count": 0,
+            "auto_muted_until": 0.0,
+            "referral_rewards_today": 0,
+            "last_referral_reset": 0.0
+        }
+
+    def _activity(self, user_id: int) -> dict:
+        """The user's activity entry for updating (created if needed, marked recent)."""
+        data = self.user_activity.get(user_id)
+        if data is None:
+            data = self.user_activity[user_id] = self._create_user_data()
+            while len(self.user_activity) > ACTIVITY_TRACKED_MAX:
+                self.user_activity.popitem(last=False)
+        else:
+            self.user_activity.move_to_end(user_id)
+        return data
+
     def _load_spam_patterns(self) -> List[re.Pattern]:
         """Load common spam patterns for detection."""
         patterns = [
@@ -67,6 +92,31 @@ class AbusePreventionSystem:
         ]
         return patterns
     
+    @staticmethod
+    def _compile_prefilters(patterns: List[re.Pattern]) -> List[tuple]:
+        """
+        Merge the spam patterns into one alternation per flag set, so a
+        clean message costs two regex passes instead of one per pattern;
+        the individual patterns only run (to name the reasons) for a group
+        whose alternation hits. Group numbers are shifted per pattern so
+        backreferences keep pointing at their own groups.
+        """
+        by_flags: Dict[int, List[re.Pattern]] = {}
+        for pattern in patterns:
+            by_flags.setdefault(pattern.flags, []).append(pattern)
+        prefilters = []
+        for flags, members in by_flags.items():
+            parts = []
+            offset = 0
+            for pattern in members:
+                src = pattern.pattern
+                if offset:
+                    src = re.sub(r"\\(\d)", lambda m: f"(?:\\{int(m.group(1)) + offset})", src)
+                parts.append(f"(?:{src})")
+                offset += pattern.groups
+            prefilters.append((re.compile("|".join(parts), flags), members))
+        return prefilters
+    
     def check_message_spam(self, user_id: int, message: str, media_count: int = 0) -> Dict[str, Any]:
         """
         Comprehensive spam detection for messages.
@@ -76,40 +126,48 @@ class AbusePreventionSystem:
         confidence = 0.0
         
         # Check content patterns
-        for pattern in self.spam_patterns:
-            if pattern.search(message):
-                reasons.append(f"Matches spam pattern: {pattern.pattern[:50]}")
-                confidence += 0.3
+        for prefilter, members in self._spam_prefilters:
+            if not prefilter.search(message):
+                continue
+            for pattern in members:
+                if pattern.search(message):
+                    reasons.append(f"Matches spam pattern: {pattern.pattern[:50]}")
+                    confidence += 0.3
         
         # Check for excessive repetition
-        if len(set(message.lower().split())) < len(message.split()) / 3:
+        words = message.split()
+        if len({w.lower() for w in words}) < len(words) / 3:
             reasons.append("Excessive word repetition")
             confidence += 0.4
         
         # Check message frequency
-        user_data = self.user_activity[user_id]
+        user_data = self._activity(user_id)
         now = time.time()
         
-        # Remove old messages (older than 1 hour)
-        user_data["messages_last_hour"] = deque([
-            msg_time for msg_time in user_data["messages_last_hour"]
-            if now - msg_time < 3600
-        ], maxlen=100)
+        # Remove old messages (older than 1 hour); timestamps are in arrival order
+        recent = user_data["messages_last_hour"]
+        while recent and now - recent[0] >= 3600:
+            recent.popleft()
         
-        user_data["messages_last_hour"].append(now)
-        messages_last_hour = len(user_data["messages_last_hour"])
+        recent.append(now)
+        messages_last_hour = len(recent)
         
         if messages_last_hour > 30:  # More than 30 messages per hour
             reasons.append(f"High message frequency: {messages_last_hour}/hour")
             confidence += 0.5
         
-        # Check content similarity (duplicate detection)
-        content_hash = hashlib.md5(message.lower().encode()).hexdigest()
-        if content_hash in self.content_hashes:
+        # Check content similarity (exact and near-duplicate detection; short
+        # messages like "hi" are below spam_fingerprint.MIN_CHARS and never count)
+        seen = self.fingerprints.observe(user_id, message, now)
+        if seen.duplicates:
             reasons.append("Duplicate content detected")
             confidence += 0.6
-        else:
-            self.content_hashes.append(content_hash)
+        elif seen.near >= 2:
+            reasons.append(f"Near-duplicate of {seen.near} recent messages")
+            confidence += 0.4
+        if seen.users >= BLAST_USERS:
+            reasons.append(f"Same content sent by {seen.users} other users")
+            confidence += 0.3
         
         # Check if user has many reports
         if user_data["reports_received"] > 3:
@@ -142,7 +200,7 @@ class AbusePreventionSystem:
     
     def _handle_spam_violation(self, user_id: int, confidence: float, reasons: List[str]):
         """Handle spam violation with escalating responses."""
-        user_data = self.user_activity[user_id]
+        user_data = self._activity(user_id)
         user_data["violation_count"] += 1
         
         now = time.time()
@@ -176,22 +234,33 @@ class AbusePreventionSystem:
         """
         now = time.time()
         
+        reports = self.recent_reports.get(reported_user_id)
+        if reports is None:
+            reports = self.recent_reports[reported_user_id] = deque(maxlen=REPORT_WINDOW_MAX)
+        else:
+            self.recent_reports.move_to_end(reported_user_id)
+        
         # Clean old reports (older than 10 minutes)
-        self.recent_reports[reported_user_id] = [
-            (rep_id, timestamp) for rep_id, timestamp in self.recent_reports[reported_user_id]
-            if now - timestamp < 600  # 10 minutes
-        ]
+        while reports and now - reports[0][1] >= REPORT_WINDOW_S:
+            reports.popleft()
         
         # Add new report
-        self.recent_reports[reported_user_id].append((reporter_id, now))
+        reports.append((reporter_id, now))
+        
+        # Drop users nobody reported within the window, and cap how many are tracked
+        while self.recent_reports:
+            oldest = next(iter(self.recent_reports.values()))
+            if len(self.recent_reports) <= REPORT_TRACKED_MAX and now - oldest[-1][1] < REPORT_WINDOW_S:
+                break
+            self.recent_reports.popitem(last=False)
         
         # Count unique reporters in last 10 minutes
-        unique_reporters = len(set(rep_id for rep_id, _ in self.recent_reports[reported_user_id]))
+        unique_reporters = len(set(rep_id for rep_id, _ in reports))
         report_threshold = 3  # Auto-mute after 3 reports in 10 minutes
         
         if unique_reporters >= report_threshold:
             # Auto-mute user
-            user_data = self.user_activity[reported_user_id]
+            user_data = self._activity(reported_user_id)
             user_data["auto_muted_until"] = now + (30 * 60)  # 30 minute auto-mute
             user_data["reports_received"] += unique_reporters
             
@@ -254,8 +323,8 @@ class AbusePreventionSystem:
             log.warning(f"Could not check referee profile: {e}")
         
         # Pattern detection: suspicious timing/behavior
-        user_data = self.user_activity[referrer_id]
-        recent_activity = len([
+        user_data = self.user_activity.get(referrer_id)
+        recent_activity = 0 if user_data is None else len([
             msg_time for msg_time in user_data["messages_last_hour"]
             if now - msg_time < 300  # Last 5 minutes
         ])
@@ -279,10 +348,11 @@ class AbusePreventionSystem:
     
     def is_user_muted(self, user_id: int) -> Dict[str, Any]:
         """Check if user is currently auto-muted."""
-        user_data = self.user_activity[user_id]
+        user_data = self.user_activity.get(user_id)
         now = time.time()
         
-        if user_data["auto_muted_until"] > now:
+        if user_data is not None and user_data["auto_muted_until"] > now:
+            self.user_activity.move_to_end(user_id)  # keep active mutes away from eviction
             remaining_seconds = int(user_data["auto_muted_until"] - now)
             return {
                 "is_muted": True,
@@ -297,57 +367,39 @@ class AbusePreventionSystem:
         Advanced rate limiting with per-user and global buckets.
         Implements token bucket algorithm for smooth rate limiting.
         """
-        now = time.time()
-        
-        # Refill user bucket (1.5 tokens per second, max 10)
-        user_bucket = self.user_buckets[user_id]
-        time_passed = now - user_bucket["last_refill"]
-        user_bucket["tokens"] = min(10, user_bucket["tokens"] + (time_passed * 1.5))
-        user_bucket["last_refill"] = now
-        
-        # Refill global bucket (15 tokens per second, max 1000)
-        time_passed = now - self.global_bucket["last_refill"]
-        self.global_bucket["tokens"] = min(1000, self.global_bucket["tokens"] + (time_passed * 15))
-        self.global_bucket["last_refill"] = now
-        
         # Check if request can be served
-        user_cost = 1  # Most actions cost 1 token
-        global_cost = 1
-        
+        cost = 1  # Most actions cost 1 token
         if action == "media_upload":
-            user_cost = 3  # Media uploads cost more
-            global_cost = 3
+            cost = 3  # Media uploads cost more
         elif action == "friend_request":
-            user_cost = 2
-            global_cost = 2
+            cost = 2
         
         # Check user bucket
-        if user_bucket["tokens"] < user_cost:
+        ok, wait = self.user_buckets.take(user_id, cost)
+        if not ok:
             return {
                 "allowed": False,
                 "reason": "User rate limit exceeded",
-                "retry_after_seconds": max(1, int((user_cost - user_bucket["tokens"]) / 1.5)),
+                "retry_after_seconds": max(1, int(wait)),
                 "bucket_type": "user"
             }
         
         # Check global bucket  
-        if self.global_bucket["tokens"] < global_cost:
+        ok, wait = self.global_bucket.take("global", cost)
+        if not ok:
+            self.user_buckets.refund(user_id, cost)
             return {
                 "allowed": False,
                 "reason": "Global rate limit exceeded (high server load)",
-                "retry_after_seconds": max(1, int((global_cost - self.global_bucket["tokens"]) / 15)),
+                "retry_after_seconds": max(1, int(wait)),
                 "bucket_type": "global"
             }
         
-        # Consume tokens
-        user_bucket["tokens"] -= user_cost
-        self.global_bucket["tokens"] -= global_cost
-        
         return {
             "allowed": True,
             "tokens_remaining": {
-                "user": user_bucket["tokens"],
-                "global": self.global_bucket["tokens"]
+                "user": self.user_buckets.tokens(user_id),
+                "global": self.global_bucket.tokens("global")
             }
         }
     
@@ -360,7 +412,7 @@ class AbusePreventionSystem:
                 "confidence": confidence,
                 "reasons": reasons,
                 "action": action,
-                "violation_count": self.user_activity[user_id]["violation_count"]
+                "violation_count": self.user_activity.get(user_id, {}).get("violation_count", 0)
             }
             
             # Write to violation log file
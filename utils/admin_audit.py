@@ -11,12 +11,9 @@ class AdminAuditLogger:
     
     def __init__(self):
         self.audit_file = "/tmp/luvhive_admin_audit.log"
-        
-        # Initialize audit table
-        self._init_audit_table()
     
     def _init_audit_table(self):
-        """Create admin audit log table if not exists"""
+        """Create admin audit log table if not exists (run by the schema migrations)"""
         try:
             import registration as reg
             
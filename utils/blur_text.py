@@ -0,0 +1,119 @@
+# utils/blur_text.py - Deterministic text blurring for Blur Vault
+"""
+Renders the "blurred" teaser of a vault confession: some words keep
+their first / last letters and the middle becomes █, the rest stay
+readable.
+
+    blur("My secret crush, finally.", 70) -> "My se██et c███h, fi███ly."
+
+Which words are blurred:
+  * anything in SENSITIVE_WORDS, always;
+  * otherwise a word is blurred when its stable bucket (0-99, from
+    blake2b of the lowercased word) is below a threshold: blur_level + 20
+    for words longer than 6 letters, blur_level for 4-6 letters and
+    blur_level - 30 for shorter ones;
+  * words of one or two letters never are.
+
+The bucket used to come from hash(), which is salted per process, so the
+same text blurred differently in the bot, the API and every restart.
+blake2b gives every process the same answer and lets a backfill tell
+which stored blurs are already current.
+
+One compiled regex finds the words (a run from the first to the last
+word character of each whitespace-separated token), so punctuation
+around a word and the original spacing are left as they are. The
+rendering of a (word, blur_level) pair is memoised, and whole renders
+are cached by (content_id, blur_level), or by (text, blur_level) for a
+submission that has no id yet.
+
+    blur(text, level)                     -> str
+    blur_content(content_id, text, level) -> str (cached; content_id may be None)
+    blur_many([(content_id, text, level), ...]) -> [(content_id, blurred), ...]
+
+Env:
+    BLUR_CACHE_SIZE  rendered contents kept by blur_content (default 4096)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+BLUR_CHAR = "█"
+CACHE_SIZE = int(os.getenv("BLUR_CACHE_SIZE", "4096"))
+
+SENSITIVE_WORDS = frozenset({
+    "love", "kiss", "sex", "naked", "orgasm", "desire", "fantasy", "secret",
+    "affair", "cheat", "crush", "masturbate", "porn", "virgin", "hook",
+    "date", "boyfriend", "girlfriend", "husband", "wife", "marriage",
+    "pregnant", "drugs", "alcohol", "drunk", "money", "steal", "lie",
+})
+
+# first to last word character of a whitespace-separated token
+_WORD = re.compile(r"\w(?:\S*\w)?")
+_NON_WORD = re.compile(r"\W+")
+
+def bucket(word: str) -> int:
+    """Stable 0-99 bucket for a (lowercased) word, identical in every process."""
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "big") % 100
+
+def _mask(word: str) -> str:
+    n = len(word)
+    if n <= 3:
+        return BLUR_CHAR * n
+    if n <= 5:
+        return word[0] + BLUR_CHAR * (n - 2) + word[-1]
+    keep = n // 3
+    return word[:keep] + BLUR_CHAR * (n - 2 * keep) + word[-keep:]
+
+@lru_cache(maxsize=65536)
+def blur_word(word: str, blur_level: int) -> str:
+    """`word` as it appears in a blur at `blur_level`: masked or unchanged."""
+    clean = _NON_WORD.sub("", word.lower())
+    if len(clean) <= 2:
+        return word
+    if clean in SENSITIVE_WORDS:
+        return _mask(word)
+    if len(clean) > 6:
+        threshold = blur_level + 20
+    elif len(clean) > 3:
+        threshold = blur_level
+    else:
+        threshold = blur_level - 30
+    return _mask(word) if bucket(clean) < threshold else word
+
+def blur(text: str, blur_level: int = 70) -> str:
+    if not text:
+        return text
+    return _WORD.sub(lambda m: blur_word(m.group(), blur_level), text)
+
+# --- rendered contents, by id ---
+_rendered: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+_lock = threading.Lock()
+
+def blur_content(content_id: Optional[int], text: str, blur_level: int = 70) -> str:
+    """blur() cached by (content_id, blur_level), or by the text when there is no id
+    yet; a changed text under the same id renders again."""
+    if not text:
+        return text
+    key = (content_id, blur_level) if content_id is not None else ("text", text, blur_level)
+    with _lock:
+        hit = _rendered.get(key)
+        if hit is not None and hit[0] == text:
+            _rendered.move_to_end(key)
+            return hit[1]
+    out = blur(text, blur_level)
+    with _lock:
+        _rendered[key] = (text, out)
+        _rendered.move_to_end(key)
+        while len(_rendered) > CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return out
+
+def blur_many(rows: Iterable[Tuple[int, str, int]]) -> List[Tuple[int, str]]:
+    """Render (content_id, text, blur_level) rows; returns (content_id, blurred) pairs."""
+    return [(cid, blur_content(cid, text, level)) for cid, text, level in rows]
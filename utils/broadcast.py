@@ -0,0 +1,445 @@
+# utils/broadcast.py - Rate-limited, resumable broadcast engine
+"""
+One engine for every mass send (admin broadcast, Naughty WYR push,
+advanced dare push, After Dark session messages).
+
+- A shared token bucket keeps the whole bot under Telegram's global
+  limit (BROADCAST_RATE msg/s, default 28 - a little under the
+  documented ~30). RetryAfter pauses the bucket, not only the sender
+  that hit it.
+- BROADCAST_CONCURRENCY senders drain a job in parallel, so slow sends
+  don't eat into the rate.
+- Jobs and their recipients live in Postgres (broadcast_jobs,
+  broadcast_recipients). Progress is written back every page, so a
+  restart resumes with the recipients that haven't been tried yet.
+- Users who answer Forbidden get users.bot_blocked_at set and are left
+  out of later jobs until they /start again.
+
+Persistent jobs:    job_id = await ENGINE.submit(bot, "admin", text, user_ids)
+Ephemeral sends:    sent = await ENGINE.send_now(bot, user_ids, text)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from utils import db_pool
+from utils.db_async import run_db
+
+log = logging.getLogger("luvbot.broadcast")
+
+RATE = float(os.environ.get("BROADCAST_RATE", "28"))
+CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "8"))
+PAGE_SIZE = 300           # recipients claimed (and progress saved) per round
+MAX_ATTEMPTS = 4          # per recipient, network errors and RetryAfter included
+STALE_AFTER = "2 minutes" # a 'running' job without heartbeat this long is taken over
+IDLE_POLL = 30.0          # seconds between job table polls when nothing was submitted
+
+# recipient status
+PENDING, SENT, FAILED, BLOCKED = 0, 1, 2, 3
+
+try:
+    from utils.monitoring import metrics as _metrics
+except Exception as e:  # psutil missing etc. - sending must still work
+    _metrics = None
+    log.warning(f"broadcast metrics disabled: {e}")
+
+SCHEMA = (
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS bot_blocked_at TIMESTAMPTZ",
+    """
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id             BIGSERIAL PRIMARY KEY,
+        kind           TEXT NOT NULL,
+        dedupe_key     TEXT UNIQUE,
+        payload        JSONB NOT NULL,
+        status         TEXT NOT NULL DEFAULT 'pending',  -- pending|running|done|cancelled
+        total          INT NOT NULL DEFAULT 0,
+        sent           INT NOT NULL DEFAULT 0,
+        failed         INT NOT NULL DEFAULT 0,
+        blocked        INT NOT NULL DEFAULT 0,
+        notify_chat_id BIGINT,
+        created_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        started_at     TIMESTAMPTZ,
+        heartbeat_at   TIMESTAMPTZ,
+        finished_at    TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+        job_id     BIGINT NOT NULL REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+        tg_user_id BIGINT NOT NULL,
+        variant    SMALLINT NOT NULL DEFAULT 0,
+        status     SMALLINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (job_id, tg_user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_open ON broadcast_jobs(id) WHERE status IN ('pending','running')",
+)
+
+def ensure_schema() -> None:
+    """Create the broadcast tables; run once by the schema migrations."""
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        for stmt in SCHEMA:
+            cur.execute(stmt)
+        con.commit()
+
+def _retry_seconds(e: RetryAfter) -> float:
+    ra = e.retry_after  # int seconds, or timedelta on newer PTB
+    return ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra)
+
+def _count(name: str, value: int = 1, **tags) -> None:
+    if _metrics is not None and value:
+        _metrics.increment(name, value, tags=tags or None)
+
+class TokenBucket:
+    """Async token bucket shared by every sender in the process."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for *seconds* (Telegram said RetryAfter)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:  # FIFO among waiters
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._last = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# ---------- DB side (sync; called through run_db) ----------
+def _create_job(kind: str, payload: dict, recipients: Sequence[Tuple[int, int]],
+                notify_chat_id: Optional[int], dedupe_key: Optional[str]) -> Optional[int]:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("""
+            INSERT INTO broadcast_jobs (kind, dedupe_key, payload, notify_chat_id)
+            VALUES (%s, %s, %s::jsonb, %s)
+            ON CONFLICT (dedupe_key) DO NOTHING
+            RETURNING id
+        """, (kind, dedupe_key, json.dumps(payload), notify_chat_id))
+        row = cur.fetchone()
+        if row is None:
+            con.rollback()
+            return None
+        job_id = row[0]
+        cur.execute("""
+            INSERT INTO broadcast_recipients (job_id, tg_user_id, variant)
+            SELECT %s, r.uid, r.v
+              FROM unnest(%s::bigint[], %s::smallint[]) AS r(uid, v)
+             WHERE NOT EXISTS (SELECT 1 FROM users u
+                                WHERE u.tg_user_id = r.uid AND u.bot_blocked_at IS NOT NULL)
+            ON CONFLICT DO NOTHING
+        """, (job_id, [r[0] for r in recipients], [r[1] for r in recipients]))
+        cur.execute("UPDATE broadcast_jobs SET total=%s WHERE id=%s", (cur.rowcount, job_id))
+        con.commit()
+        return job_id
+
+def _claim_job() -> Optional[tuple]:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute(f"""
+            UPDATE broadcast_jobs
+               SET status='running', heartbeat_at=NOW(), started_at=COALESCE(started_at, NOW())
+             WHERE id = (SELECT id FROM broadcast_jobs
+                          WHERE status='pending'
+                             OR (status='running' AND heartbeat_at < NOW() - INTERVAL '{STALE_AFTER}')
+                          ORDER BY id LIMIT 1
+                          FOR UPDATE SKIP LOCKED)
+         RETURNING id, kind, payload, notify_chat_id
+        """)
+        row = cur.fetchone()
+        con.commit()
+        return row
+
+def _next_page(job_id: int, after: int) -> Tuple[str, List[Tuple[int, int]]]:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("UPDATE broadcast_jobs SET heartbeat_at=NOW() WHERE id=%s RETURNING status", (job_id,))
+        status = cur.fetchone()[0]
+        cur.execute("""
+            SELECT tg_user_id, variant FROM broadcast_recipients
+             WHERE job_id=%s AND status=0 AND tg_user_id > %s
+             ORDER BY tg_user_id LIMIT %s
+        """, (job_id, after, PAGE_SIZE))
+        rows = cur.fetchall()
+        con.commit()
+        return status, rows
+
+def _record(job_id: int, results: Sequence[Tuple[int, int]]) -> Tuple[int, int, int, int]:
+    """Persist one page of outcomes; returns the job's (total, sent, failed, blocked)."""
+    from psycopg2.extras import execute_values
+    blocked = [uid for uid, st in results if st == BLOCKED]
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        execute_values(cur, """
+            UPDATE broadcast_recipients AS r SET status = v.st
+              FROM (VALUES %s) AS v(job_id, uid, st)
+             WHERE r.job_id = v.job_id AND r.tg_user_id = v.uid
+        """, [(job_id, uid, st) for uid, st in sorted(results)],
+            template="(%s::bigint, %s::bigint, %s::smallint)")
+        cur.execute("""
+            UPDATE broadcast_jobs
+               SET sent = sent + %s, failed = failed + %s, blocked = blocked + %s, heartbeat_at = NOW()
+             WHERE id = %s
+         RETURNING total, sent, failed, blocked
+        """, (sum(1 for _, st in results if st == SENT),
+              sum(1 for _, st in results if st == FAILED), len(blocked), job_id))
+        progress = cur.fetchone()
+        if blocked:
+            cur.execute("UPDATE users SET bot_blocked_at=NOW() WHERE tg_user_id = ANY(%s)", (blocked,))
+        con.commit()
+        return progress
+
+def _finish_job(job_id: int, status: str) -> None:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("UPDATE broadcast_jobs SET status=%s, finished_at=NOW() WHERE id=%s AND status IN ('running','cancelled')",
+                    (status, job_id))
+        con.commit()
+
+def _requeue_running(job_ids: Sequence[int]) -> None:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("UPDATE broadcast_jobs SET status='pending' WHERE id = ANY(%s) AND status='running'",
+                    (list(job_ids),))
+        con.commit()
+
+def _mark_blocked(user_ids: Sequence[int]) -> None:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("UPDATE users SET bot_blocked_at=NOW() WHERE tg_user_id = ANY(%s)", (list(user_ids),))
+        con.commit()
+
+def cancel_job(job_id: int) -> bool:
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cur.execute("UPDATE broadcast_jobs SET status='cancelled' WHERE id=%s AND status IN ('pending','running')",
+                    (job_id,))
+        con.commit()
+        return cur.rowcount > 0
+
+def job_status(job_id: Optional[int] = None) -> Optional[dict]:
+    """Progress of *job_id*, or of the newest job when omitted."""
+    with db_pool.connection("broadcast") as con, con.cursor() as cur:
+        cols = "id, kind, status, total, sent, failed, blocked, created_at, started_at, finished_at"
+        if job_id:
+            cur.execute(f"SELECT {cols} FROM broadcast_jobs WHERE id=%s", (job_id,))
+        else:
+            cur.execute(f"SELECT {cols} FROM broadcast_jobs ORDER BY id DESC LIMIT 1")
+        row = cur.fetchone()
+    if not row:
+        return None
+    return dict(zip(cols.split(", "), row))
+
+# ---------- engine ----------
+Recipients = Union[Iterable[int], Dict[int, int]]
+
+class BroadcastEngine:
+    def __init__(self, rate: float = RATE, concurrency: int = CONCURRENCY):
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._current: Optional[int] = None
+
+    # --- lifecycle ---
+    def start(self, bot) -> None:
+        """Start the job runner (idempotent); resumes unfinished jobs."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="broadcast-runner")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        if self._current is not None:
+            # hand the job straight back instead of waiting out STALE_AFTER
+            await run_db(_requeue_running, [self._current])
+            self._current = None
+
+    # --- producers ---
+    async def submit(self, bot, kind: str, text: str, recipients: Recipients, *,
+                     markups: Sequence[Optional[InlineKeyboardMarkup]] = (None,),
+                     parse_mode: Optional[str] = None, disable_web_page_preview: bool = True,
+                     notify_chat_id: Optional[int] = None, dedupe_key: Optional[str] = None) -> Optional[int]:
+        """
+        Queue a persistent broadcast. *recipients* is a list of tg ids, or a
+        {tg_id: variant} map choosing which of *markups* each user gets.
+        Returns the job id, or None if *dedupe_key* was already used.
+        """
+        pairs = list(recipients.items()) if isinstance(recipients, dict) else [(int(u), 0) for u in recipients]
+        payload = {
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": disable_web_page_preview,
+            "markups": [m.to_dict() if m is not None else None for m in markups],
+        }
+        job_id = await run_db(_create_job, kind, payload, pairs, notify_chat_id, dedupe_key)
+        if job_id is None:
+            log.info(f"[broadcast] {kind} skipped, dedupe key {dedupe_key!r} already queued")
+            return None
+        log.info(f"[broadcast] job {job_id} ({kind}) queued for {len(pairs)} users")
+        self.start(bot)
+        self._wake.set()
+        return job_id
+
+    async def send_now(self, bot, user_ids: Iterable[int], text: str, **kwargs) -> int:
+        """
+        Send to a handful of users right away (not persisted), sharing the
+        global rate limit. Returns how many were delivered.
+        """
+        user_ids = list(user_ids)
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(uid: int) -> int:
+            async with sem:
+                return await self._send(bot, uid, text, kwargs)
+
+        results = await asyncio.gather(*(one(u) for u in user_ids))
+        blocked = [u for u, st in zip(user_ids, results) if st == BLOCKED]
+        if blocked:
+            await run_db(_mark_blocked, blocked)
+        return sum(1 for st in results if st == SENT)
+
+    # --- sending ---
+    async def _send(self, bot, uid: int, text: str, kwargs: dict) -> int:
+        for attempt in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(uid, text, **kwargs)
+                return SENT
+            except RetryAfter as e:
+                wait = _retry_seconds(e)
+                self.bucket.pause(wait + 0.5)
+                if _metrics is not None:
+                    _metrics.record_floodwait(int(wait), uid)
+                log.warning(f"[broadcast] RetryAfter {wait}s, pausing all senders")
+            except Forbidden:
+                return BLOCKED
+            except BadRequest as e:  # chat not found, bad markup... retrying won't help
+                log.debug(f"[broadcast] bad request for {uid}: {e}")
+                return FAILED
+            except (TimedOut, NetworkError) as e:
+                log.debug(f"[broadcast] network error for {uid} (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+            except Exception as e:
+                log.warning(f"[broadcast] send to {uid} failed: {e}")
+                return FAILED
+        return FAILED
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await run_db(_claim_job)
+            except Exception as e:
+                log.warning(f"[broadcast] job poll failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), IDLE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            job_id, kind, payload, notify_chat_id = job
+            self._current = job_id
+            try:
+                await self._run_job(job_id, kind, payload, notify_chat_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # leave it 'running'; another pass takes it over after STALE_AFTER
+                log.error(f"[broadcast] job {job_id} interrupted: {e}")
+                await asyncio.sleep(IDLE_POLL)
+            self._current = None
+
+    async def _run_job(self, job_id: int, kind: str, payload: dict, notify_chat_id: Optional[int]) -> None:
+        bot = self._bot
+        text = payload["text"]
+        base = {"parse_mode": payload.get("parse_mode"),
+                "disable_web_page_preview": payload.get("disable_web_page_preview", True)}
+        markups = [InlineKeyboardMarkup.de_json(m, bot) if m else None for m in payload.get("markups") or [None]]
+        t0 = time.monotonic()
+        after, done, status = 0, 0, "running"
+        progress = None
+        queue: asyncio.Queue = asyncio.Queue()
+        results: List[Tuple[int, int]] = []
+
+        async def sender() -> None:
+            while True:
+                uid, variant = await queue.get()
+                try:
+                    markup = markups[variant] if variant < len(markups) else markups[0]
+                    st = await self._send(bot, uid, text, dict(base, reply_markup=markup))
+                except Exception:
+                    st = FAILED
+                results.append((uid, st))
+                queue.task_done()
+
+        workers = [asyncio.create_task(sender()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                status, page = await run_db(_next_page, job_id, after)
+                if status == "cancelled" or not page:
+                    break
+                for item in page:
+                    queue.put_nowait(item)
+                await queue.join()
+                after = page[-1][0]
+                batch, results[:] = list(results), []
+                progress = await run_db(_record, job_id, batch)
+                done += len(batch)
+                _count("broadcast_sent_total", sum(1 for _, s in batch if s == SENT), kind=kind)
+                _count("broadcast_failed_total", sum(1 for _, s in batch if s == FAILED), kind=kind)
+                _count("broadcast_blocked_total", sum(1 for _, s in batch if s == BLOCKED), kind=kind)
+                if _metrics is not None and progress[0]:
+                    pct = 100.0 * sum(progress[1:]) / progress[0]
+                    _metrics.gauge("broadcast_progress_pct", pct, tags={"job": str(job_id), "kind": kind})
+                    _metrics.gauge("broadcast_rate_per_s", done / max(1e-6, time.monotonic() - t0))
+        finally:
+            for w in workers:
+                w.cancel()
+            if results:  # sends that completed before a cancellation still count
+                try:
+                    await run_db(_record, job_id, list(results))
+                except Exception as e:
+                    log.warning(f"[broadcast] job {job_id} final progress write failed: {e}")
+
+        final = "cancelled" if status == "cancelled" else "done"
+        await run_db(_finish_job, job_id, final)
+        elapsed = time.monotonic() - t0
+        summary = f"job {job_id} ({kind}) {final}"
+        if progress:
+            total, sent, failed, blocked = progress
+            summary += f": {sent}/{total} sent, {failed} failed, {blocked} blocked the bot"
+        log.info(f"[broadcast] {summary} in {elapsed:.0f}s")
+        if notify_chat_id:
+            try:
+                await bot.send_message(notify_chat_id, f"📣 Broadcast {summary}.")
+            except Exception:
+                pass
+
+ENGINE = BroadcastEngine()
@@ -0,0 +1,110 @@
+# utils/confession_assign.py - Recipient assignment + bulk DB marks for confession delivery
+"""
+Assignment used by confession_roulette.deliver_confessions_batch.
+
+The old picker copied and sorted the whole recipient pool for every
+confession (O(confessions x pool log pool)). Here the pool lives in a
+min-heap keyed by (load, recipient): each pick pops the least-loaded
+recipient, skipping only the author and recipients that author already
+reached in this batch, so a pick costs O(log pool) plus those few skips.
+
+Semantics match the old picker: confessions by today's confessors are
+placed first with a per-recipient cap of `first_cap`, then everything
+left is placed with `second_cap`, never to the author and never twice
+to the same (author, recipient) pair.
+
+The DB helpers batch what used to be one round-trip per send: round-lock
+claims are one INSERT ... ON CONFLICT DO NOTHING RETURNING per chunk,
+and delivered marks one UPDATE ... FROM (VALUES ...) per chunk.
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+Confession = Tuple[int, int, str]               # (id, author_id, text)
+Assignment = Tuple[int, int, str, int]          # (id, author_id, text, recipient)
+
+class LoadHeap:
+    """Recipients ordered by how many confessions they've been given so far."""
+
+    def __init__(self, pool: Iterable[int]):
+        self._heap: List[Tuple[int, int]] = [(0, int(r)) for r in pool]
+        heapq.heapify(self._heap)
+        self.load: Dict[int, int] = {}
+        self._reached: Dict[int, Set[int]] = {}  # author -> recipients already given one of theirs
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def pick(self, author: int, cap: int) -> Optional[int]:
+        heap = self._heap
+        reached = self._reached.get(author, ())
+        skipped = []
+        chosen = None
+        while heap and heap[0][0] < cap:
+            load, r = heapq.heappop(heap)
+            if r == author or r in reached:
+                skipped.append((load, r))
+                continue
+            chosen = r
+            heapq.heappush(heap, (load + 1, r))
+            self.load[r] = load + 1
+            self._reached.setdefault(author, set()).add(r)
+            break
+        for item in skipped:
+            heapq.heappush(heap, item)
+        return chosen
+
+def assign_recipients(confs: Sequence[Confession], confessors_today: Set[int], pool: Iterable[int],
+                      first_cap: int = 1, second_cap: int = 2) -> Tuple[List[Assignment], Dict[int, int]]:
+    """Returns (assignments in send order, recipient -> load)."""
+    heap = LoadHeap(pool)
+    assignments: List[Assignment] = []
+    placed = set()
+
+    # FIRST PASS: guarantee for today's confessors
+    for cid, author, text in confs:
+        if int(author) not in confessors_today:
+            continue
+        r = heap.pick(int(author), first_cap)
+        if r is None:
+            continue
+        assignments.append((int(cid), int(author), str(text), r))
+        placed.add(int(cid))
+
+    # SECOND PASS: fill remaining
+    for cid, author, text in confs:
+        if int(cid) in placed:
+            continue
+        r = heap.pick(int(author), second_cap)
+        if r is None:
+            continue
+        assignments.append((int(cid), int(author), str(text), r))
+
+    return assignments, heap.load
+
+def claim_round_locks(cur, recipients: Sequence[int], round_key: str) -> Set[int]:
+    """Claim this round for every recipient at once; returns the ones we got."""
+    if not recipients:
+        return set()
+    cur.execute("""
+        INSERT INTO confession_round_lock (user_id, round_key)
+        SELECT DISTINCT u, %s::text FROM unnest(%s::bigint[]) AS u
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    """, (round_key, list(recipients)))
+    return {int(r[0]) for r in cur.fetchall()}
+
+def mark_delivered(cur, delivered: Sequence[Tuple[int, int]]) -> int:
+    """Mark (confession_id, recipient) pairs delivered in one statement."""
+    if not delivered:
+        return 0
+    from psycopg2.extras import execute_values
+    execute_values(cur, """
+        UPDATE confessions AS c
+           SET delivered = TRUE, delivered_to = v.recipient, delivered_at = NOW()
+          FROM (VALUES %s) AS v(id, recipient)
+         WHERE c.id = v.id
+    """, sorted(delivered), template="(%s::bigint, %s::bigint)", page_size=len(delivered))
+    return cur.rowcount
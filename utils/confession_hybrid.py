@@ -1,11 +1,13 @@
 # utils/confession_hybrid.py - ROTATING CONFESSION POOL SYSTEM
 import logging
+import os
 from typing import List, Dict, Any
 from telegram.ext import ContextTypes
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from utils.hybrid_db import (
     get_available_confessions_for_user_hybrid,
-    track_confession_delivery_hybrid, 
+    get_unseen_confessions_for_users_hybrid,
+    track_confession_deliveries_hybrid,
     get_active_user_ids_hybrid,
     get_db_status
 )
@@ -16,6 +18,9 @@ log = logging.getLogger("luvbot.confession_hybrid")
 TESTERS = {8482725798, 647778438, 1437934486}
 BATCH_LIMIT = 10
 FIRST_PASS_MAX = 2
+# "set": one unseen-confession query for all recipients; "per_user": legacy one query per user
+ASSIGN_MODE = os.environ.get("CONFESSION_ASSIGN_MODE", "set")
+CANDIDATES_PER_USER = 3  # unseen confessions fetched per user to spread load across confessions
 
 def clean_text_for_telegram(text: str) -> str:
     """Remove ALL characters that could cause Telegram parsing issues"""
@@ -161,6 +166,35 @@ def create_confession_reaction_keyboard(confession_id: int):
         ]
     ])
 
+def assign_from_matrix(matrix: Dict[int, List[Dict[str, Any]]]) -> List[tuple]:
+    """
+    One confession per user from their unseen candidates: seeds first (as the
+    per-user query orders them), then whichever confession has been handed
+    out least in this batch so the same one doesn't go to everybody.
+    """
+    uses: Dict[int, int] = {}
+    assignments = []
+    for user_id in sorted(matrix):
+        cands = matrix[user_id]
+        if not cands:
+            continue
+        best = min(cands, key=lambda c: (not c.get('system_seed'), uses.get(c['id'], 0)))
+        uses[best['id']] = uses.get(best['id'], 0) + 1
+        assignments.append((best['id'], best['author_id'], best['text'], user_id))
+    return assignments
+
+def _assign_per_user(active_users) -> List[tuple]:
+    """Legacy path: one availability query per user."""
+    assignments = []
+    for user_id in active_users:
+        available_confessions = get_available_confessions_for_user_hybrid(user_id, limit=1)
+        if available_confessions:
+            confession = available_confessions[0]
+            assignments.append((confession['id'], confession['author_id'], confession['text'], user_id))
+        else:
+            log.warning(f"⚠️ No available confessions for user {user_id} (all seen before)")
+    return assignments
+
 async def deliver_confessions_batch_hybrid(context: ContextTypes.DEFAULT_TYPE):
     """
     🔄 ROTATING CONFESSION POOL SYSTEM
@@ -176,26 +210,16 @@ async def deliver_confessions_batch_hybrid(context: ContextTypes.DEFAULT_TYPE):
         # ALWAYS include testers for guaranteed delivery
         active_users |= TESTERS
         log.info(f"[confession-hybrid] 🎯 Total recipient pool: {len(active_users)} users")
-        log.info(f"[confession-hybrid] 🧪 Pool includes: {sorted(active_users)}")
+        log.debug(f"[confession-hybrid] 🧪 Pool includes: {sorted(active_users)}")
         
         # ROTATING POOL: Each user gets a confession they haven't seen before
-        assignments = []
-        
-        for user_id in active_users:
-            # Get confessions available for this specific user (no repeats)
-            available_confessions = get_available_confessions_for_user_hybrid(user_id, limit=1)
-            
-            if available_confessions:
-                confession = available_confessions[0]
-                conf_id = confession['id']
-                author_id = confession['author_id']
-                text = confession['text']
-                
-                assignments.append((conf_id, author_id, text, user_id))
-                log.info(f"🎯 Assigned confession #{conf_id}: {author_id} → {user_id}")
-            else:
-                log.warning(f"⚠️ No available confessions for user {user_id} (all seen before)")
-        
+        if ASSIGN_MODE == "per_user":
+            assignments = _assign_per_user(active_users)
+        else:
+            matrix = get_unseen_confessions_for_users_hybrid(sorted(active_users), per_user=CANDIDATES_PER_USER)
+            assignments = assign_from_matrix(matrix)
+            log.info(f"[confession-hybrid] 🧮 {len(matrix)}/{len(active_users)} users have unseen confessions")
+
         if not assignments:
             log.warning("⚠️ No assignments made! All users may have seen all available confessions.")
             return
@@ -203,23 +227,41 @@ async def deliver_confessions_batch_hybrid(context: ContextTypes.DEFAULT_TYPE):
         log.info(f"📋 Final assignments: {len(assignments)} confessions to {len(assignments)} unique recipients")
         
         # Send confessions with bulletproof delivery
-        sent_count = 0
-        for conf_id, author_id, text, recipient in assignments:
+        delivered = []
+        try:
+            await _send_assignments(context, assignments, delivered)
+        finally:
+            # Track all deliveries at once (allows confession reuse for others)
+            tracked = track_confession_deliveries_hybrid(delivered)
+            if tracked < len(delivered):
+                log.warning(f"⚠️ Tracked {tracked}/{len(delivered)} confession deliveries")
+        sent_count = len(delivered)
+
+        log.info(f"🎯 Successfully delivered {sent_count}/{len(assignments)} confessions")
+        log.info(f"🔄 ROTATING POOL: Confessions can be reused for other users!")
+
+    except Exception as e:
+        log.error(f"🚨 Confession delivery system failed: {e}")
+        # This should never fail with HTTP-based Supabase!
+
+async def _send_assignments(context, assignments, delivered: list):
+    """Send each assignment; successful (conf_id, recipient) pairs go to *delivered*."""
+    for conf_id, author_id, text, recipient in assignments:
+        try:
+            # Create exciting confession delivery message
+            message = await create_exciting_confession_delivery(conf_id, text, recipient)
+            
+            # Try with reaction buttons first (bulletproof)
             try:
-                # Create exciting confession delivery message
-                message = await create_exciting_confession_delivery(conf_id, text, recipient)
-                
-                # Try with reaction buttons first (bulletproof)
-                try:
-                    reaction_keyboard = create_confession_reaction_keyboard(conf_id)
-                    await context.bot.send_message(recipient, message, reply_markup=reaction_keyboard)
-                    sent_count += 1
-                    log.info(f"✅ Delivered confession #{conf_id} from {author_id} → {recipient} with reaction buttons")
-                except Exception as parse_error:
-                    log.warning(f"⚠️ Parse mode failed for #{conf_id}, trying ultra-safe fallback: {parse_error}")
-                    # Ultra-safe fallback message with zero formatting
-                    safe_text = clean_text_for_telegram(text)
-                    ultra_safe_message = f"""🌀 ANONYMOUS CONFESSION RECEIVED!
+                reaction_keyboard = create_confession_reaction_keyboard(conf_id)
+                await context.bot.send_message(recipient, message, reply_markup=reaction_keyboard)
+                delivered.append((conf_id, recipient))
+                log.info(f"✅ Delivered confession #{conf_id} from {author_id} → {recipient} with reaction buttons")
+            except Exception as parse_error:
+                log.warning(f"⚠️ Parse mode failed for #{conf_id}, trying ultra-safe fallback: {parse_error}")
+                # Ultra-safe fallback message with zero formatting
+                safe_text = clean_text_for_telegram(text)
+                ultra_safe_message = f"""🌀 ANONYMOUS CONFESSION RECEIVED!
 
 {safe_text}
 
@@ -227,29 +269,16 @@ Someone trusted you with their secret...
 
 Reply: /reply_{conf_id} <your message>
 Share yours: /confess"""
-                    
-                    try:
-                        # Try fallback with buttons
-                        reaction_keyboard = create_confession_reaction_keyboard(conf_id)
-                        await context.bot.send_message(recipient, ultra_safe_message, reply_markup=reaction_keyboard)
-                        sent_count += 1
-                        log.info(f"✅ Delivered confession #{conf_id} with ultra-safe fallback + buttons")
-                    except Exception as final_error:
-                        log.error(f"💀 FINAL FALLBACK FAILED for #{conf_id}: {final_error}")
-                        continue
                 
-                # Track delivery (allows confession reuse for others)
-                if track_confession_delivery_hybrid(conf_id, recipient):
-                    log.info(f"📋 Tracked delivery for confession #{conf_id}")
-                else:
-                    log.warning(f"⚠️ Failed to track confession #{conf_id} delivery")
-                    
-            except Exception as e:
-                log.error(f"❌ Complete failure for confession #{conf_id} to {recipient}: {e}")
-        
-        log.info(f"🎯 Successfully delivered {sent_count}/{len(assignments)} confessions")
-        log.info(f"🔄 ROTATING POOL: Confessions can be reused for other users!")
-        
-    except Exception as e:
-        log.error(f"🚨 Confession delivery system failed: {e}")
-        # This should never fail with HTTP-based Supabase!
\ No newline at end of file
+                try:
+                    # Try fallback with buttons
+                    reaction_keyboard = create_confession_reaction_keyboard(conf_id)
+                    await context.bot.send_message(recipient, ultra_safe_message, reply_markup=reaction_keyboard)
+                    delivered.append((conf_id, recipient))
+                    log.info(f"✅ Delivered confession #{conf_id} with ultra-safe fallback + buttons")
+                except Exception as final_error:
+                    log.error(f"💀 FINAL FALLBACK FAILED for #{conf_id}: {final_error}")
+                    continue
+            
+        except Exception as e:
+            log.error(f"❌ Complete failure for confession #{conf_id} to {recipient}: {e}")
@@ -9,8 +9,7 @@ import time
 import functools
 from typing import Dict, Any, Optional
 import psycopg2
-from psycopg2 import pool
-import registration as reg
+from utils import db_pool
 
 log = logging.getLogger("luvbot.connections")
 
@@ -35,20 +34,10 @@ class SmartConnectionManager:
             return
         
         try:
-            # Force cleanup of reg connection pool if available
-            if hasattr(reg, '_pool') and reg._pool:
-                # Check pool stats
-                unused = getattr(reg._pool, '_unused', [])
-                if len(unused) > 5:  # Too many idle connections
-                    # Close some idle connections
-                    for _ in range(3):
-                        if unused:
-                            conn = unused.pop()
-                            try:
-                                conn.close()
-                            except:
-                                pass
-                    log.info(f"🧹 Cleaned up {3} idle database connections")
+            # Close connections that sat idle too long (the shared pool keeps its minimum warm)
+            closed = db_pool.get_pool().reap_idle(self.max_idle_time)
+            if closed:
+                log.info(f"🧹 Cleaned up {closed} idle database connections")
             
             self.last_cleanup = current_time
             
@@ -61,11 +50,13 @@ class SmartConnectionManager:
         
         for attempt, delay in enumerate(self.retry_delays, 1):
             try:
-                # Use existing connection function with optimizations
-                conn = reg._conn()
+                # Caller returns it with db_pool.get_pool().putconn(conn)
+                conn = db_pool.get_pool().getconn("connection_optimizer")
                 
-                # Set connection-level optimizations
+                # Set connection-level optimizations; putconn() RESETs them so
+                # they don't follow the connection to its next borrower
                 if conn:
+                    conn.session_dirty = True
                     with conn.cursor() as cur:
                         # Optimize connection settings for performance
                         cur.execute("SET statement_timeout = '30s'")
@@ -1,12 +1,59 @@
 # utils/content_moderation.py - Refined content moderation for dating/anonymous chat platform
+"""
+Every relayed text message goes through moderate_content(), so the term
+lists are compiled once into a single scanner instead of being searched
+term by term:
+
+  * normalization is NFKC + lower + one str.translate() that deletes
+    control / zero-width characters and maps evasion characters
+    (@ -> a, 3 -> e, ...); the per-character category scan only runs for
+    the rare text that still contains non-printable characters;
+  * allowlist, slur, fuzzy-slur, sexual and soft-warn terms are one regex
+    of zero-width lookaheads, tried at every position in a single pass.
+    At each position the alternatives are ordered by precedence
+    (allowlist, slur, fuzzy, sexual/soft-warn), so the decision is the
+    same as checking the lists one after the other.
+
+After changing one of the term sets on an instance, call recompile().
+"""
 import re
 import unicodedata
 import logging
-from typing import Dict, Set, Optional, List, Any
+from functools import lru_cache
+from typing import Dict, Set, Optional, List, Any, FrozenSet, Pattern
 from datetime import datetime
 
 log = logging.getLogger(__name__)
 
+# Evasion characters, mapped in the same translate() that drops controls
+_EVASIONS = {
+    "@": "a", "3": "e", "1": "i", "0": "o", "5": "s",
+    "4": "a", "7": "t", "$": "s", "!": "i", "+": "t"
+}
+
+def _build_translate_table() -> Dict[int, Optional[str]]:
+    table: Dict[int, Optional[str]] = {ord(k): v for k, v in _EVASIONS.items()}
+    # The control / format characters seen in practice: C0, DEL + C1, soft
+    # hyphen, zero-width and bidi controls, BOM. Anything else in category C
+    # is caught by the isprintable() fallback in normalize_text().
+    candidates = [*range(0x00, 0x20), *range(0x7F, 0xA0), 0xAD,
+                  *range(0x200B, 0x2010), *range(0x202A, 0x202F),
+                  *range(0x2060, 0x2070), 0xFEFF]
+    for cp in candidates:
+        if unicodedata.category(chr(cp))[0] == "C":
+            table[cp] = None
+    return table
+
+_TRANSLATE = _build_translate_table()
+
+def _alternation(terms) -> str:
+    # Longest first, so "fuck you" wins over "fuck" at the same position
+    return "|".join(re.escape(t) for t in sorted(set(terms), key=lambda t: (-len(t), t)))
+
+@lru_cache(maxsize=32)
+def _word_set_regex(words: FrozenSet[str]) -> Pattern:
+    return re.compile(rf"\b(?:{_alternation(w.lower() for w in words)})\b")
+
 class ContentModerationSystem:
     """
     Dating platform appropriate content moderation.
@@ -57,58 +104,90 @@ class ContentModerationSystem:
             r"g+a+n+d+u+",             # gandu variants
         ]
 
+        self.recompile()
+
+    def recompile(self) -> None:
+        """Build the single-pass scanner from the current term sets."""
+        slurs = {w.lower(): w for w in self.SLURS}
+        # sexual wins over soft-warn if a term is in both, as in the old order
+        terms = {w.lower(): ("soft_warn", w) for w in self.SOFT_WARN}
+        terms.update({w.lower(): ("sexual", w) for w in self.SEXUAL_ALLOWED})
+        fuzzy = "|".join(f"(?P<f{i}>{p})" for i, p in enumerate(self.FUZZY_SLURS))
+        parts = [
+            rf"(?=(?P<allow>{_alternation(w.lower() for w in self.ALLOWLIST_EXACT)}))" if self.ALLOWLIST_EXACT else "",
+            rf"\b(?=(?P<slur>{_alternation(slurs)})\b)" if slurs else "",
+            rf"(?=(?:{fuzzy}))" if self.FUZZY_SLURS else "",
+            rf"\b(?=(?P<term>{_alternation(terms)})\b)" if terms else "",
+        ]
+        self._scanner = re.compile("|".join(p for p in parts if p) or "(?!)")
+        self._slur_tokens = slurs
+        self._term_tokens = terms
+        self._fuzzy_groups = {f"f{i}": p for i, p in enumerate(self.FUZZY_SLURS)}
+        self._fuzzy_regex = re.compile(fuzzy) if fuzzy else None
+
     def normalize_text(self, text: str) -> str:
         """Normalize text for consistent matching."""
         if not text:
             return ""
         
-        # Lower case and strip accents to catch variants (e.g., mādarchōd)
-        text = unicodedata.normalize("NFKC", text).lower()
-        
-        # Remove control characters and zero-width characters
-        normalized = "".join(
-            c for c in text
-            if unicodedata.category(c)[0] != "C"
-        )
+        # Lower case and strip accents to catch variants (e.g., mādarchōd);
+        # drop control/zero-width characters and replace evasion characters
+        normalized = unicodedata.normalize("NFKC", text).lower().translate(_TRANSLATE)
         
-        # Replace common evasion characters
-        replacements = {
-            "@": "a", "3": "e", "1": "i", "0": "o", "5": "s", 
-            "4": "a", "7": "t", "$": "s", "!": "i", "+": "t"
-        }
-        
-        for old, new in replacements.items():
-            normalized = normalized.replace(old, new)
+        # Rare: other category-C characters (private use, unassigned, ...)
+        if not normalized.isprintable():
+            normalized = "".join(
+                c for c in normalized
+                if unicodedata.category(c)[0] != "C"
+            )
             
         return normalized
 
+    def scan(self, text: str) -> Dict[str, str]:
+        """
+        All categories present in text, in one pass over the normalized text.
+        Returns {category: first token} for "allowlist", "slur", "fuzzy_slur"
+        (the pattern), "sexual" and "soft_warn"; an allowlist hit ends the scan.
+        """
+        hits: Dict[str, str] = {}
+        if not text:
+            return hits
+        for m in self._scanner.finditer(self.normalize_text(text)):
+            group = m.lastgroup
+            if group == "allow":
+                hits["allowlist"] = m.group("allow")
+                break
+            if group == "slur":
+                hits.setdefault("slur", self._slur_tokens[m.group("slur")])
+            elif group == "term":
+                kind, token = self._term_tokens[m.group("term")]
+                hits.setdefault(kind, token)
+            elif group:
+                hits.setdefault("fuzzy_slur", self._fuzzy_groups[group])
+        return hits
+
     def contains_any_words(self, text: str, word_set: Set[str]) -> Optional[str]:
         """Check if text contains any words from set using word boundaries."""
         if not text or not word_set:
             return None
             
-        normalized = self.normalize_text(text)
-        
-        for word in word_set:
-            # Use word boundaries to avoid false positives like "scunthorpe" 
-            pattern = rf"\b{re.escape(word.lower())}\b"
-            if re.search(pattern, normalized):
-                return word
-                
-        return None
+        words = frozenset(word_set)
+        # Use word boundaries to avoid false positives like "scunthorpe"
+        m = _word_set_regex(words).search(self.normalize_text(text))
+        if not m:
+            return None
+        hit = m.group()
+        return next((w for w in words if w.lower() == hit), hit)
 
     def contains_fuzzy_slurs(self, text: str) -> Optional[str]:
         """Check for fuzzy slur patterns (evaded spellings)."""
         if not text:
             return None
             
-        normalized = self.normalize_text(text)
-        
-        for pattern in self.FUZZY_SLURS:
-            if re.search(pattern, normalized):
-                return pattern
-                
-        return None
+        if self._fuzzy_regex is None:
+            return None
+        m = self._fuzzy_regex.search(self.normalize_text(text))
+        return self._fuzzy_groups[m.lastgroup] if m else None
 
     def check_allowlist(self, text: str) -> bool:
         """Check if text contains known false positives that should be allowed."""
@@ -130,8 +209,10 @@ class ContentModerationSystem:
         if not text:
             return {"action": "allow", "reason": "empty_text"}
             
+        hits = self.scan(text)
+        
         # First check allowlist for known false positives
-        if self.check_allowlist(text):
+        if "allowlist" in hits:
             return {
                 "action": "allow", 
                 "reason": "allowlist_match",
@@ -139,7 +220,7 @@ class ContentModerationSystem:
             }
         
         # Check for actual slurs/harassment
-        slur_hit = self.contains_any_words(text, self.SLURS)
+        slur_hit = hits.get("slur")
         if slur_hit:
             self._log_moderation_event(user_id, "slur", slur_hit, text[:50])
             return {
@@ -150,7 +231,7 @@ class ContentModerationSystem:
             }
         
         # Check for fuzzy slur evasion
-        fuzzy_hit = self.contains_fuzzy_slurs(text)
+        fuzzy_hit = hits.get("fuzzy_slur")
         if fuzzy_hit:
             self._log_moderation_event(user_id, "fuzzy_slur", fuzzy_hit, text[:50])
             return {
@@ -161,7 +242,7 @@ class ContentModerationSystem:
             }
         
         # Check sexual content (allowed but logged)
-        sexual_hit = self.contains_any_words(text, self.SEXUAL_ALLOWED)
+        sexual_hit = hits.get("sexual")
         if sexual_hit:
             return {
                 "action": "allow",
@@ -171,7 +252,7 @@ class ContentModerationSystem:
             }
         
         # Check soft warning content
-        soft_hit = self.contains_any_words(text, self.SOFT_WARN)
+        soft_hit = hits.get("soft_warn")
         if soft_hit:
             self._log_moderation_event(user_id, "soft_warn", soft_hit, text[:50])
             return {
@@ -196,19 +277,6 @@ class ContentModerationSystem:
             import registration as reg
             
             with reg._conn() as con, con.cursor() as cur:
-                # Create moderation events table if not exists
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS moderation_events (
-                        id BIGSERIAL PRIMARY KEY,
-                        tg_user_id BIGINT,
-                        kind TEXT NOT NULL,
-                        token TEXT NOT NULL,
-                        sample TEXT,
-                        created_at TIMESTAMPTZ DEFAULT NOW()
-                    );
-                """)
-                
-                # Insert moderation event
                 cur.execute("""
                     INSERT INTO moderation_events (tg_user_id, kind, token, sample)
                     VALUES (%s, %s, %s, %s);
@@ -0,0 +1,148 @@
+# utils/counter_buffer.py - Write-behind aggregation for per-user counters
+"""
+Coalesces per-row counter deltas in memory and writes them back in one
+multi-row statement:
+
+    UPDATE users AS t
+       SET messages_sent = COALESCE(t.messages_sent,0) + v.messages_sent, ...
+      FROM (VALUES (...), (...)) AS v(tg_user_id, messages_sent, ...)
+     WHERE t.tg_user_id = v.tg_user_id
+
+A flush happens every `flush_ms` milliseconds or as soon as `flush_events`
+deltas are pending, whichever comes first, from a daemon thread so the
+event loop never waits on it. Rows are written in key order so two
+overlapping flushes can't deadlock on row locks.
+
+Loss window: at most one flush interval / `flush_events` worth of deltas
+if the process dies without running flush() (main._on_shutdown calls it).
+A failed flush merges its deltas back and retries on the next tick; if
+the DB stays down long enough for the buffer to exceed `max_rows`, the
+excess rows are dropped and logged.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+log = logging.getLogger("luvbot.counters")
+
+class CounterBuffer:
+    def __init__(self, table: str, key: str, columns: Iterable[str], tag: str,
+                 flush_ms: int = 1000, flush_events: int = 5000, max_rows: int = 200_000):
+        self.table = table
+        self.key = key
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.tag = tag
+        self.flush_ms = flush_ms
+        self.flush_events = flush_events
+        self.max_rows = max_rows
+        self._pending: Dict[int, list] = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._index = {c: i for i, c in enumerate(self.columns)}
+        self._sql = self._build_sql()
+
+    def _build_sql(self) -> str:
+        sets = ", ".join(f"{c} = COALESCE(t.{c},0) + v.{c}" for c in self.columns)
+        names = ", ".join((self.key,) + self.columns)
+        return (
+            f"UPDATE {self.table} AS t SET {sets} "
+            f"FROM (VALUES %s) AS v({names}) "
+            f"WHERE t.{self.key} = v.{self.key}"
+        )
+
+    @property
+    def _template(self) -> str:
+        return "(" + ", ".join(["%s::bigint"] + ["%s::int"] * len(self.columns)) + ")"
+
+    # --- producer side (hot path: dict update under a lock, no I/O) ---
+    def add(self, key: int, **deltas: int) -> None:
+        if self._stopped:
+            return
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._pending[key] = [0] * len(self.columns)
+            for col, d in deltas.items():
+                row[self._index[col]] += d
+            self._events += 1
+            due = self._events >= self.flush_events
+        if self._thread is None:
+            self._start()
+        if due:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # --- consumer side ---
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"counters-{self.tag}", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning(f"[{self.tag}] counter flush failed, will retry: {e}")
+
+    def flush(self) -> int:
+        """Write all pending deltas now; returns the number of rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                events, self._events = self._events, 0
+            if not batch:
+                return 0
+            rows = [(k, *v) for k, v in sorted(batch.items()) if any(v)]
+            t0 = time.perf_counter()
+            try:
+                self._write(rows)
+            except Exception:
+                self._restore(batch, events)
+                raise
+            log.debug(f"[{self.tag}] flushed {events} events as {len(rows)} rows "
+                      f"in {(time.perf_counter() - t0) * 1000:.1f}ms")
+            return len(rows)
+
+    def _write(self, rows: list) -> None:
+        from psycopg2.extras import execute_values
+        from utils import db_pool
+        with db_pool.connection(self.tag) as con, con.cursor() as cur:
+            execute_values(cur, self._sql, rows, template=self._template, page_size=1000)
+            con.commit()
+
+    def _restore(self, batch: Dict[int, list], events: int) -> None:
+        with self._lock:
+            for key, row in batch.items():
+                cur = self._pending.get(key)
+                if cur is None:
+                    self._pending[key] = row
+                else:
+                    for i, d in enumerate(row):
+                        cur[i] += d
+            self._events += events
+            overflow = len(self._pending) - self.max_rows
+            if overflow > 0:
+                for key in list(self._pending)[:overflow]:
+                    del self._pending[key]
+                log.error(f"[{self.tag}] counter buffer full; dropped deltas for {overflow} rows")
+
+    def close(self) -> None:
+        """Final flush; later add() calls are ignored."""
+        self._stopped = True
+        self._wake.set()
+        self.flush()
@@ -6,11 +6,22 @@ This utility wraps synchronous database operations in thread executors
 to prevent blocking the asyncio event loop during DB I/O operations.
 """
 import asyncio
-from typing import Any, Callable
-from registration import _conn
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import Any, Callable, List, Optional, Sequence
+
+try:
+    import asyncpg
+except ImportError:  # optional: fall back to psycopg2 + threads
+    asyncpg = None
+
+from utils import tracing
+
+log = logging.getLogger("luvbot.db_async")
 
 # Optional semaphore to prevent thread pool exhaustion
-# Set to slightly less than DB pool size (maxconn=15)
 DB_SEMAPHORE = asyncio.Semaphore(12)
 
 async def run_db(fn: Callable, *args: Any, **kwargs: Any) -> Any:
@@ -44,4 +55,164 @@ async def run_db_uncapped(fn: Callable, *args: Any, **kwargs: Any) -> Any:
     Execute a synchronous database function without semaphore protection.
     Use this for non-critical operations that can tolerate higher concurrency.
     """
-    return await asyncio.to_thread(fn, *args, **kwargs)
\ No newline at end of file
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+# ------------------------------------------------------------------------------
+# Native asyncio Postgres access (asyncpg)
+# ------------------------------------------------------------------------------
+#
+# Handlers can await queries instead of parking a worker thread per query:
+#
+#     row  = await fetchrow("SELECT gender, age FROM users WHERE tg_user_id=$1", uid)
+#     rows = await fetch("SELECT id FROM feed_posts WHERE author_id=$1", uid)
+#     await execute("UPDATE users SET last_seen=NOW() WHERE tg_user_id=$1", uid)
+#
+# Queries use asyncpg's $1..$n placeholders. asyncpg prepares and caches every
+# statement per connection, so hot queries are parsed/planned once. If asyncpg
+# is not installed the same helpers transparently fall back to the psycopg2
+# pool via run_db (placeholders are rewritten to pyformat).
+
+ASYNC_POOL_MIN = int(os.environ.get("ASYNC_DB_POOL_MIN", "2"))
+ASYNC_POOL_MAX = int(os.environ.get("ASYNC_DB_POOL_MAX", "20"))
+STATEMENT_CACHE_SIZE = int(os.environ.get("ASYNC_DB_STATEMENT_CACHE", "256"))
+
+_apool = None
+_apool_lock: Optional[asyncio.Lock] = None
+
+def _async_dsn() -> str:
+    from registration import DB_URL, _dsn_with_ssl
+    # asyncpg understands sslmode=... in the URL just like libpq
+    return _dsn_with_ssl(DB_URL)
+
+async def get_pool():
+    """Shared asyncpg pool, created lazily on the running loop (None without asyncpg)."""
+    global _apool, _apool_lock
+    if asyncpg is None:
+        return None
+    if _apool is not None:
+        return _apool
+    if _apool_lock is None:
+        _apool_lock = asyncio.Lock()
+    async with _apool_lock:
+        if _apool is None:
+            _apool = await asyncpg.create_pool(
+                dsn=_async_dsn(),
+                min_size=ASYNC_POOL_MIN,
+                max_size=ASYNC_POOL_MAX,
+                statement_cache_size=STATEMENT_CACHE_SIZE,
+                max_inactive_connection_lifetime=300,
+                command_timeout=30,
+                server_settings={"application_name": "luvhive-bot-async"},
+            )
+            log.info(f"✅ asyncpg pool created ({ASYNC_POOL_MIN}-{ASYNC_POOL_MAX})")
+    return _apool
+
+async def close_pool() -> None:
+    """Close the shared pool (PTB post_shutdown)."""
+    global _apool
+    if _apool is not None:
+        pool, _apool = _apool, None
+        await pool.close()
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+class _Row(tuple):
+    """Fallback row that, like asyncpg.Record, supports unpacking, row[0] and row["col"]."""
+
+    def __new__(cls, cols, values):
+        row = super().__new__(cls, values)
+        row._cols = cols
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._cols[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._cols else default
+
+def _to_pyformat(sql: str, args: Sequence[Any]) -> tuple[str, dict]:
+    """Rewrite $n placeholders for psycopg2 (fallback path)."""
+    sql = sql.replace("%", "%%")
+    return _PLACEHOLDER.sub(lambda m: f"%(p{m.group(1)})s", sql), {
+        f"p{i}": v for i, v in enumerate(args, start=1)
+    }
+
+def _sync_query(sql: str, args: Sequence[Any], mode: str):
+    from registration import _conn
+    q, params = _to_pyformat(sql, args)
+    with _conn() as con, con.cursor() as cur:
+        cur.execute(q, params)
+        if mode == "execute":
+            con.commit()
+            return cur.statusmessage
+        if mode == "many":
+            rows = cur.fetchall() if cur.description else []
+        else:
+            rows = cur.fetchmany(1) if cur.description else []
+        con.commit()
+        if cur.description is None:
+            return rows
+        cols = {c.name: i for i, c in enumerate(cur.description)}
+        return [_Row(cols, r) for r in rows]
+
+async def fetch(sql: str, *args: Any) -> List[Any]:
+    """All rows (asyncpg Records, or equivalent rows on the fallback path)."""
+    pool = await get_pool()
+    if pool is None:
+        return await run_db(_sync_query, sql, args, "many")
+    async with pool.acquire() as con, tracing.query_span():
+        return await con.fetch(sql, *args)
+
+async def fetchrow(sql: str, *args: Any) -> Optional[Any]:
+    """First row or None."""
+    pool = await get_pool()
+    if pool is None:
+        rows = await run_db(_sync_query, sql, args, "one")
+        return rows[0] if rows else None
+    async with pool.acquire() as con, tracing.query_span():
+        return await con.fetchrow(sql, *args)
+
+async def fetchval(sql: str, *args: Any, default: Any = None) -> Any:
+    """First column of the first row (or *default*)."""
+    row = await fetchrow(sql, *args)
+    if row is None:
+        return default
+    return row[0]
+
+async def execute(sql: str, *args: Any) -> str:
+    """Run a statement in autocommit mode; returns the status tag."""
+    pool = await get_pool()
+    if pool is None:
+        return await run_db(_sync_query, sql, args, "execute")
+    async with pool.acquire() as con, tracing.query_span():
+        return await con.execute(sql, *args)
+
+async def executemany(sql: str, args_list: Sequence[Sequence[Any]]) -> None:
+    """Run one statement for many parameter tuples (single prepared statement)."""
+    pool = await get_pool()
+    if pool is None:
+        for args in args_list:
+            await run_db(_sync_query, sql, args, "execute")
+        return
+    async with pool.acquire() as con, tracing.query_span():
+        await con.executemany(sql, args_list)
+
+@asynccontextmanager
+async def transaction():
+    """
+    Native connection inside a transaction:
+
+        async with transaction() as con:
+            await con.execute(...)
+            await con.fetchrow(...)
+
+    Requires asyncpg (there is no sensible thread fallback for a live txn).
+    """
+    pool = await get_pool()
+    if pool is None:
+        raise RuntimeError("asyncpg is not installed; use run_db() for transactions")
+    async with pool.acquire() as con:
+        async with con.transaction():
+            yield con
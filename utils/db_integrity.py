@@ -232,9 +232,3 @@ def upsert_reaction(user_id: int, post_id: int, emoji: str) -> dict:
     except Exception as e:
         log.error(f"Reaction operation failed: {e}")
         return {"action": "error", "emoji": emoji, "counts": {}}
-
-# Initialize integrity constraints at startup
-try:
-    apply_missing_constraints()
-except Exception as e:
-    log.error(f"Failed to apply startup constraints: {e}")
\ No newline at end of file
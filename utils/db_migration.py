@@ -1,10 +1,158 @@
-# utils/db_migration.py
+# utils/db_migration.py - Versioned schema migrations and scaling constraints
+"""
+Schema changes live in backend/migrations as numbered files:
+
+    V<version>__<name>.sql    run in one transaction
+    V<version>__<name>.py     defines migrate(con); committed by the runner
+
+Versions are dotted integers (V20261017.2 sorts after V20261017.1 and
+before V20261101). Each applied migration is recorded in schema_version
+with a checksum of its file.
+
+    from utils import db_migration
+    db_migration.migrate()      # at startup, before anything touches the DB
+
+migrate() costs one query when the schema is current (SELECT version FROM
+schema_version); pending migrations are applied under a Postgres
+advisory lock, so the bot and the API starting together don't race.
+Migrations at or below BASELINE_VERSION predate the runner and were
+applied by hand; they are recorded, never executed.
+
+New tables and columns go in a new migration file, not in an ensure_*()
+call on a startup or request path. Editing an applied file only logs a
+checksum warning; it is not re-run.
+"""
+import hashlib
+import importlib.util
 import logging
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
 import registration as reg
 from psycopg2 import sql
+from psycopg2.errors import UndefinedTable
+from utils import db_pool
 
 log = logging.getLogger("luvbot.migration")
 
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "backend" / "migrations"
+BASELINE_VERSION = "20251006"
+_LOCK_KEY = 0x4C555648  # pg_advisory_lock id for the runner ("LUVH")
+_FILE_RE = re.compile(r"^V(\d+(?:\.\d+)*)__(\w+)\.(sql|py)$")
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    path: Path
+
+    @property
+    def key(self) -> Tuple[int, ...]:
+        return _version_key(self.version)
+
+def _version_key(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in version.split("."))
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Migration files in version order; raises on duplicate versions."""
+    found: Dict[Tuple[int, ...], Migration] = {}
+    for path in directory.iterdir():
+        m = _FILE_RE.match(path.name)
+        if not m:
+            continue
+        mig = Migration(m.group(1), m.group(2), path)
+        if mig.key in found:
+            raise ValueError(f"duplicate migration version {mig.version}: "
+                             f"{found[mig.key].path.name}, {path.name}")
+        found[mig.key] = mig
+    return [found[k] for k in sorted(found)]
+
+def _checksum(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+def _applied_versions(con) -> Optional[Dict[str, str]]:
+    """version -> checksum, or None if schema_version doesn't exist yet."""
+    try:
+        with con.cursor() as cur:
+            cur.execute("SELECT version, checksum FROM schema_version")
+            return dict(cur.fetchall())
+    except UndefinedTable:
+        con.rollback()
+        return None
+
+def _record(cur, mig: Migration) -> None:
+    cur.execute(
+        "INSERT INTO schema_version (version, name, checksum) VALUES (%s, %s, %s)",
+        (mig.version, mig.name, _checksum(mig.path)),
+    )
+
+def _apply(mig: Migration) -> None:
+    """Run one migration and record it in the same transaction."""
+    with reg._conn() as con:
+        if mig.path.suffix == ".sql":
+            with con.cursor() as cur:
+                cur.execute(mig.path.read_text())
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{mig.name}", mig.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.migrate(con)
+        with con.cursor() as cur:
+            _record(cur, mig)
+        con.commit()
+
+def migrate(directory: Path = MIGRATIONS_DIR) -> List[str]:
+    """
+    Bring the schema up to date. Returns one line per migration applied
+    (empty when nothing was pending). Stops at the first failure; the
+    failed migration and everything after it are retried next start.
+    """
+    migrations = discover(directory)
+    with db_pool.connection("migration") as con:
+        applied = _applied_versions(con)
+    if applied is not None:
+        for mig in migrations:
+            if mig.version in applied and applied[mig.version] != _checksum(mig.path):
+                log.warning(f"Migration V{mig.version}__{mig.name} changed after it was applied")
+        if all(mig.version in applied for mig in migrations):
+            return []
+
+    results = []
+    baseline = _version_key(BASELINE_VERSION)
+    with db_pool.connection("migration", autocommit=True) as lock, lock.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            # re-read under the lock: another process may have got here first
+            cur.execute("SELECT version FROM schema_version")
+            done = {row[0] for row in cur.fetchall()}
+            for mig in migrations:
+                if mig.version in done:
+                    continue
+                if mig.key <= baseline:
+                    _record(cur, mig)
+                    results.append(f"⏭️ V{mig.version} {mig.name} (baseline, recorded)")
+                    continue
+                try:
+                    _apply(mig)
+                except Exception as e:
+                    error_msg = f"❌ V{mig.version} {mig.name} failed: {e}"
+                    log.error(error_msg)
+                    results.append(error_msg)
+                    break
+                log.info(f"Applied migration V{mig.version}__{mig.name}")
+                results.append(f"✅ V{mig.version} {mig.name}")
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    return results
+
 def apply_scaling_constraints():
     """
     Apply critical unique constraints for scaling to 10k+ users.
@@ -115,10 +263,10 @@ def ensure_payment_constraints():
             pass
 
 def run_all_migrations():
-    """Run all scaling migrations safely."""
+    """Run pending schema migrations, then the scaling migrations."""
     log.info("🔧 Starting scaling migrations...")
     
-    results = []
+    results = migrate()
     results.extend(apply_scaling_constraints())
     results.extend(ensure_payment_constraints())
     
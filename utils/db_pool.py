@@ -0,0 +1,370 @@
+# utils/db_pool.py - Single shared, instrumented Postgres pool
+"""
+The one psycopg2 pool every module checks connections out of.
+
+    from utils import db_pool
+    with db_pool.connection("chat") as con, con.cursor() as cur:
+        cur.execute(...)
+
+registration._conn() is a thin wrapper over this and tags the checkout
+with the calling module, so existing `with reg._conn() as con` code is
+attributed automatically.
+
+Compared to the old per-module pools:
+- thread-safe (PTB runs handlers concurrently and run_db fans sync work
+  out to executor threads; psycopg2's SimpleConnectionPool is not safe
+  for that) and checkout blocks up to DB_POOL_TIMEOUT when exhausted
+  instead of raising PoolError - except on a thread running an asyncio
+  event loop, where blocking would stall every other update: there it
+  waits at most DB_POOL_LOOP_TIMEOUT and raises PoolTimeout (use
+  run_db / asyncio.to_thread for work that may queue for a connection);
+- health checks are free on the hot path: a checkout only inspects the
+  libpq connection state, and pings with SELECT 1 only if the connection
+  sat idle longer than DB_POOL_PING_AFTER seconds;
+- idle connections above the minimum are closed after DB_POOL_MAX_IDLE;
+- checkout wait, in-use / idle counts and per-tag query counts are
+  exported through utils.monitoring.metrics;
+- query time is charged to the PTB update being traced (utils.tracing).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import psycopg2
+import psycopg2.extensions as pgext
+
+from utils.tracing import CURRENT as _TRACE
+
+log = logging.getLogger("luvbot.db_pool")
+
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "4"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "40"))
+CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+LOOP_CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_LOOP_TIMEOUT", "0.05"))
+PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "30"))
+MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", "600"))
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within the checkout timeout."""
+
+# ---------- query counting ----------
+class _CountingMixin:
+    """Counts execute()/executemany() calls on the owning pooled connection,
+    and charges their time to the update being traced (utils.tracing)."""
+
+    def execute(self, query, vars=None):
+        self.connection.queries += 1
+        trace = _TRACE.get()
+        if trace is None:
+            return super().execute(query, vars)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            trace.add_query((time.perf_counter() - t0) * 1000)
+
+    def executemany(self, query, vars_list):
+        self.connection.queries += 1
+        trace = _TRACE.get()
+        if trace is None:
+            return super().executemany(query, vars_list)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            trace.add_query((time.perf_counter() - t0) * 1000)
+
+class _CountingCursor(_CountingMixin, pgext.cursor):
+    pass
+
+_COUNTING_FACTORIES: Dict[type, type] = {pgext.cursor: _CountingCursor}
+
+def _counting(factory: type) -> type:
+    cls = _COUNTING_FACTORIES.get(factory)
+    if cls is None:
+        cls = type(f"Counting{factory.__name__}", (_CountingMixin, factory), {})
+        _COUNTING_FACTORIES[factory] = cls
+    return cls
+
+class _PooledConnection(pgext.connection):
+    """psycopg2 connection that remembers who checked it out and how much it ran."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tag = "untagged"
+        self.queries = 0
+        self.idle_since = time.monotonic()
+        self.cursor_factory = _CountingCursor
+        self.session_dirty = False  # set after session-level SETs; putconn() resets them
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory")
+        if factory is not None:
+            kwargs["cursor_factory"] = _counting(factory)
+        return super().cursor(*args, **kwargs)
+
+# ---------- pool ----------
+class ConnectionPool:
+    """Bounded LIFO pool with blocking checkout."""
+
+    def __init__(self, dsn: str, minconn: int = POOL_MIN, maxconn: int = POOL_MAX, **connect_kwargs):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.connect_kwargs = connect_kwargs
+        self._idle: List[_PooledConnection] = []
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self.query_counts: Counter = Counter()
+        self.checkouts = 0
+        self.discarded = 0
+        for _ in range(self.minconn):
+            self._idle.append(self._connect())
+
+    def _connect(self) -> _PooledConnection:
+        return psycopg2.connect(self.dsn, connection_factory=_PooledConnection, **self.connect_kwargs)
+
+    # --- health ---
+    @staticmethod
+    def _usable(conn: _PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == pgext.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - conn.idle_since < PING_AFTER:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # --- checkout / checkin ---
+    @staticmethod
+    def _checkout_timeout() -> float:
+        """Full timeout on worker threads; a short one on an event loop thread."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return CHECKOUT_TIMEOUT
+        return min(LOOP_CHECKOUT_TIMEOUT, CHECKOUT_TIMEOUT)
+
+    def getconn(self, tag: str = "untagged") -> _PooledConnection:
+        t0 = time.perf_counter()
+        timeout = self._checkout_timeout()
+        deadline = time.monotonic() + timeout
+        conn = None
+        with self._cond:
+            if self._closed:
+                raise psycopg2.InterfaceError("connection pool is closed")
+            while not self._idle and self._in_use >= self.maxconn:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    _record_timeout(tag)
+                    raise PoolTimeout(
+                        f"no free DB connection after {timeout:g}s "
+                        f"({self._in_use}/{self.maxconn} in use, tag={tag})"
+                    )
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+            self._in_use += 1
+
+        # validate / connect outside the lock
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._usable(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self.discarded += 1
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        conn.tag = tag
+        conn.queries = 0
+        with self._cond:
+            self.checkouts += 1
+            in_use, idle = self._in_use, len(self._idle)
+        _record_checkout(tag, (time.perf_counter() - t0) * 1000, in_use, idle)
+        return conn
+
+    def putconn(self, conn: _PooledConnection, close: bool = False) -> None:
+        tag, queries = conn.tag, conn.queries
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != pgext.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.session_dirty:
+                    # session settings must not leak to the next borrower
+                    with conn.cursor() as cur:
+                        cur.execute("RESET ALL")
+                    conn.commit()
+                    conn.session_dirty = False
+                conn.autocommit = False
+                conn.cursor_factory = _CountingCursor
+                conn.idle_since = time.monotonic()
+            except Exception:
+                close = True
+        else:
+            close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if queries:
+                self.query_counts[tag] += queries
+            if close:
+                self.discarded += 1
+            elif self._closed:
+                close = True
+            else:
+                self._idle.append(conn)
+            in_use, idle = self._in_use, len(self._idle)
+            self._cond.notify()
+        if close:
+            self._close_quietly(conn)
+        _record_checkin(tag, queries, in_use, idle)
+
+    # --- maintenance ---
+    def reap_idle(self, max_idle: float = MAX_IDLE) -> int:
+        """Close connections idle longer than max_idle, keeping minconn warm."""
+        now = time.monotonic()
+        victims = []
+        with self._cond:
+            # _idle is LIFO, so the longest-idle connections sit at the front
+            excess = len(self._idle) - self.minconn
+            while excess > 0 and now - self._idle[0].idle_since > max_idle:
+                victims.append(self._idle.pop(0))
+                excess -= 1
+        for conn in victims:
+            self._close_quietly(conn)
+        return len(victims)
+
+    def closeall(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "discarded": self.discarded,
+                "queries_by_tag": dict(self.query_counts),
+            }
+
+# ---------- metrics ----------
+try:
+    from utils.monitoring import metrics as _metrics
+except Exception as e:  # psutil missing etc. - pool must still work
+    _metrics = None
+    log.warning(f"db_pool metrics disabled: {e}")
+
+def _record_checkout(tag: str, wait_ms: float, in_use: int, idle: int) -> None:
+    if _metrics is None:
+        return
+    _metrics.timer("db_pool_checkout_wait_ms", wait_ms, tags={"tag": tag})
+    _metrics.gauge("db_pool_in_use", in_use)
+    _metrics.gauge("db_pool_idle", idle)
+
+def _record_checkin(tag: str, queries: int, in_use: int, idle: int) -> None:
+    if _metrics is None:
+        return
+    if queries:
+        _metrics.increment("db_pool_queries_total", queries, tags={"tag": tag})
+    _metrics.gauge("db_pool_in_use", in_use)
+    _metrics.gauge("db_pool_idle", idle)
+
+def _record_timeout(tag: str) -> None:
+    if _metrics is not None:
+        _metrics.increment("db_pool_timeouts_total", tags={"tag": tag})
+
+# ---------- module-level singleton ----------
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """The process-wide pool, created on first use from DATABASE_URL."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                from registration import DB_URL, _dsn_with_ssl
+                _POOL = ConnectionPool(
+                    _dsn_with_ssl(DB_URL),
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=5,
+                    connect_timeout=10,
+                    application_name="luvhive-bot",
+                )
+                log.info(f"✅ Shared DB pool created ({POOL_MIN}-{POOL_MAX})")
+    return _POOL
+
+def close_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.closeall()
+
+def stats() -> dict:
+    return get_pool().stats() if _POOL is not None else {}
+
+@contextmanager
+def connection(tag: str = "untagged", autocommit: bool = False,
+               cursor_factory: Optional[type] = None) -> Iterator[_PooledConnection]:
+    """
+    Check a connection out for the duration of the block.
+    Uncommitted work is rolled back on return; a connection that raised a
+    connection-level error is closed instead of going back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn(tag)
+    broken = False
+    try:
+        if autocommit:
+            conn.autocommit = True
+        if cursor_factory is not None:
+            conn.cursor_factory = _counting(cursor_factory)
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or conn.closed)
+
+def execute(sql: str, params=(), tag: str = "untagged") -> None:
+    """Fire-and-forget write in autocommit mode."""
+    with connection(tag, autocommit=True) as con, con.cursor() as cur:
+        cur.execute(sql, params)
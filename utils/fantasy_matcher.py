@@ -0,0 +1,101 @@
+# utils/fantasy_matcher.py - Batch matcher for fantasy_match.job_fantasy_match_pairs
+"""
+Pairs girls' and boys' fantasy submissions by shared keywords, for a
+whole batch at once instead of girl-by-girl.
+
+Submissions carry at most 3 keywords (_normalize_keywords caps them),
+so the inverted index is keyed by (vibe, keyword subset): every boy is
+filed under each non-empty subset of his keywords (at most 7 entries).
+The boys sharing exactly S with a girl are then one dict lookup away.
+
+Matching is greedy by weight over the whole batch: first every pair
+sharing 3 keywords, then 2, then 1. Within a level, older girls pick
+first and take the oldest free boy (callers pass submissions oldest
+first). At level w, a free girl and a free boy found under a size-w
+subset share exactly w keywords; had they shared more, the higher
+level would already have paired her. This is the same result as sorting
+all candidate edges by weight, without building them. Greedy
+max-weight matching is within 2x of the optimum and, with weights of
+only 1..3, close to it in practice.
+
+Pairs that are already pending/connected are skipped with one set
+lookup; the caller loads them in a single query.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Sequence, Set, Tuple
+
+MAX_KEYWORDS = 3
+
+class Submission(NamedTuple):
+    user_id: int
+    vibe: str
+    keywords: FrozenSet[str]
+
+class Pair(NamedTuple):
+    boy_id: int
+    girl_id: int
+    vibe: str
+    shared: Tuple[str, ...]  # sorted
+
+def pair_key(a: int, b: int) -> Tuple[int, int]:
+    """Order-free key for the excluded-pairs set."""
+    return (a, b) if a <= b else (b, a)
+
+def make_submission(user_id: int, vibe: str, keywords: Iterable[str]) -> Submission:
+    kws = sorted({k for k in (keywords or ()) if k})[:MAX_KEYWORDS]
+    return Submission(int(user_id), vibe or "", frozenset(kws))
+
+def _subsets(keywords: FrozenSet[str], size: int):
+    return (frozenset(c) for c in combinations(sorted(keywords), size))
+
+def build_index(boys: Sequence[Submission]) -> Dict[Tuple[str, FrozenSet[str]], List[int]]:
+    """(vibe, keyword subset) -> boy indexes, oldest first."""
+    index: Dict[Tuple[str, FrozenSet[str]], List[int]] = defaultdict(list)
+    for i, b in enumerate(boys):
+        for size in range(1, len(b.keywords) + 1):
+            for sub in _subsets(b.keywords, size):
+                index[(b.vibe, sub)].append(i)
+    return index
+
+def match_batch(girls: Sequence[Submission], boys: Sequence[Submission],
+                excluded: Set[Tuple[int, int]]) -> List[Pair]:
+    """Greedy max-weight matching over the whole batch; one pair per user."""
+    index = build_index(boys)
+    head: Dict[Tuple[str, FrozenSet[str]], int] = defaultdict(int)  # first maybe-free slot per bucket
+    used: Set[int] = set()
+    pairs: List[Pair] = []
+
+    for w in range(MAX_KEYWORDS, 0, -1):
+        for g in girls:
+            if g.user_id in used or len(g.keywords) < w:
+                continue
+            best = None  # (boy index, bucket key)
+            for sub in _subsets(g.keywords, w):
+                key = (g.vibe, sub)
+                bucket = index.get(key)
+                if not bucket:
+                    continue
+                # boys used up are gone for good: advance the bucket head past them
+                i = head[key]
+                while i < len(bucket) and boys[bucket[i]].user_id in used:
+                    i += 1
+                head[key] = i
+                # boys excluded for *this* girl only are skipped, not dropped
+                while i < len(bucket):
+                    b = boys[bucket[i]]
+                    if b.user_id not in used and b.user_id != g.user_id \
+                            and pair_key(b.user_id, g.user_id) not in excluded:
+                        if best is None or bucket[i] < best:
+                            best = bucket[i]
+                        break
+                    i += 1
+            if best is None:
+                continue
+            b = boys[best]
+            used.add(g.user_id)
+            used.add(b.user_id)
+            pairs.append(Pair(b.user_id, g.user_id, g.vibe, tuple(sorted(g.keywords & b.keywords))))
+    return pairs
@@ -0,0 +1,430 @@
+# utils/feed.py - Ranked feed page assembly for /api/feed
+"""
+One ranked, keyset-paginated query per feed tab, with the page hydrated
+(author name, sub-profile name, viewer's liked flag) in the same
+statement - a feed request is a single round-trip.
+
+    fresh     - newest posts by others          rank = created_at
+    following - the viewer's feed_timeline      rank = created_at
+                (+ pull from big authors)
+    waves     - posts with engagement           rank = post_engagement.score
+
+Cursors are opaque strings encoding the (rank, id) of the last item on
+the previous page; the next page is `(rank, id) < cursor`. For waves a
+post can move up between pages when it gets new engagement, so a page
+boundary may show it twice or skip it - same trade-off every
+engagement-ranked keyset feed makes.
+
+post_engagement is maintained incrementally by the write endpoints
+(record_engagement) instead of aggregating comments/post_likes per
+request. `score` is a time-decayed hotness kept in log2 space relative
+to a fixed epoch:
+
+    score = log2( sum_i  w_i * 2 ** ((t_i - EPOCH) / HALF_LIFE) )
+
+so adding an event is a log-sum-exp on one row, and ordering by the
+stored score equals ordering by "decayed to now" hotness for every row
+at once - no periodic re-decay job, and waves is a range scan on the
+score index.
+
+The following tab is fan-out-on-write: create_post copies the post id
+into feed_timeline for every follower (fan_out_post), follow/unfollow
+backfills or prunes that viewer's rows. Authors with more than
+FANOUT_MAX_FOLLOWERS followers are not fanned out; they are recorded in
+feed_pull_authors and their posts are pulled at read time by the
+viewers that follow them. Either branch of the read is an index range
+scan bounded by the page size.
+
+DDL lives in ensure_feed_schema(), applied by the schema migrations
+(utils/db_migration.py).
+"""
+from __future__ import annotations
+
+import base64
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+TABS = ("fresh", "waves", "following")
+
+# Columns returned per row by fetch_feed_page()
+COLUMNS = (
+    "id", "author_id", "profile_id", "created_at", "content_type", "file_id", "text",
+    "reaction_count", "comment_count", "rank_key",
+    "author_name", "author_tg_id", "profile_name", "liked",
+)
+
+# ---------- cursors ----------
+Rank = Union[datetime, float]
+
+def encode_cursor(rank: Rank, post_id: int) -> str:
+    val = f"t{rank.isoformat()}" if isinstance(rank, datetime) else f"f{float(rank)!r}"
+    raw = f"{val}|{int(post_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Rank, int]:
+    """Inverse of encode_cursor; ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        val, pid = raw.rsplit("|", 1)
+        rank = datetime.fromisoformat(val[1:]) if val[0] == "t" else float(val[1:])
+        return rank, int(pid)
+    except Exception as e:
+        raise ValueError(f"bad cursor: {cursor!r}") from e
+
+# ---------- engagement materialization ----------
+HALF_LIFE_HOURS = float(os.environ.get("FEED_WAVES_HALF_LIFE_HOURS", "6"))
+TTL_HOURS = int(os.environ.get("FEED_PUBLIC_TTL_HOURS", "72"))   # feed window
+EPOCH = "2024-01-01T00:00:00Z"
+
+# event weights
+W_POST = 1.0
+W_LIKE = 1.0
+W_COMMENT = 2.0
+W_COMMENT_LIKE = 0.5
+
+# log2(w) + hours-since-epoch / half-life, for an event happening now
+_EVENT_SCORE = (
+    "LN(%(w)s::float8) / LN(2) + "
+    "EXTRACT(EPOCH FROM NOW() - %(epoch)s::timestamptz) / (3600.0 * %(half_life)s::float8)"
+)
+
+# log2(2^a + 2^b) without overflow; the exponent is clamped so
+# POWER() can't underflow (2^-60 is noise at any realistic score)
+def _log2_add(a: str, b: str) -> str:
+    return f"GREATEST({a}, {b}) + LN(1 + POWER(2::float8, -LEAST(ABS({a} - {b}), 60))) / LN(2)"
+
+_UPSERT_SQL = f"""
+    INSERT INTO post_engagement (post_id, post_created_at, last_engaged_at, engagements, score)
+    SELECT p.id, p.created_at, NOW(), %(inc)s, {_EVENT_SCORE}
+      FROM feed_posts p
+     WHERE p.id = {{post}}
+    ON CONFLICT (post_id) DO UPDATE
+       SET last_engaged_at = GREATEST(post_engagement.last_engaged_at, EXCLUDED.last_engaged_at),
+           engagements     = post_engagement.engagements + EXCLUDED.engagements,
+           score           = {_log2_add("post_engagement.score", "EXCLUDED.score")}
+"""
+_UPSERT_BY_POST = _UPSERT_SQL.format(post="%(target)s")
+_UPSERT_BY_COMMENT = _UPSERT_SQL.format(post="(SELECT post_id FROM comments WHERE id = %(target)s)")
+
+# log2(2^score - 2^event) for an event that happened at %(at)s: removes
+# exactly what record_engagement added for it. The remainder is clamped
+# at 2^-60 of the old score (the event was all there was).
+_EVENT_SCORE_AT = (
+    "(LN(%(w)s::float8) / LN(2) + "
+    "EXTRACT(EPOCH FROM %(at)s::timestamptz - %(epoch)s::timestamptz) / (3600.0 * %(half_life)s::float8))"
+)
+_RETRACT_SQL = f"""
+    UPDATE post_engagement
+       SET engagements = GREATEST(engagements - 1, 0),
+           score = score + LN(GREATEST(1 - POWER(2::float8, LEAST({_EVENT_SCORE_AT} - score, 0)),
+                                       POWER(2::float8, -60))) / LN(2)
+     WHERE post_id = %(target)s
+"""
+
+def record_engagement(cur, post_id: int, weight: float, engaged: bool = True) -> None:
+    """
+    Fold one event into post_engagement, inside the caller's transaction.
+    engaged=False is for post creation: it seeds the score but doesn't make
+    the post eligible for waves on its own.
+    """
+    cur.execute(_UPSERT_BY_POST, {
+        "target": int(post_id), "w": float(weight), "inc": 1 if engaged else 0,
+        "epoch": EPOCH, "half_life": HALF_LIFE_HOURS,
+    })
+
+def retract_engagement(cur, post_id: int, weight: float, at: datetime) -> None:
+    """
+    Undo one record_engagement() event that happened at `at` (an unlike
+    passes the deleted like's created_at), so toggling cannot pump a score.
+    """
+    cur.execute(_RETRACT_SQL, {
+        "target": int(post_id), "w": float(weight), "at": at,
+        "epoch": EPOCH, "half_life": HALF_LIFE_HOURS,
+    })
+
+def record_comment_engagement(cur, comment_id: int, weight: float = W_COMMENT_LIKE) -> None:
+    """Same as record_engagement, attributed to the post a comment belongs to."""
+    cur.execute(_UPSERT_BY_COMMENT, {
+        "target": int(comment_id), "w": float(weight), "inc": 1,
+        "epoch": EPOCH, "half_life": HALF_LIFE_HOURS,
+    })
+
+# Seeds post_engagement for posts in the TTL window from existing
+# likes/comments (migration V20261017.7; rows that already exist are left alone).
+_BACKFILL_SQL = f"""
+    WITH recent AS (
+        SELECT id, created_at FROM feed_posts
+         WHERE created_at > NOW() - make_interval(hours => %(hours)s)
+    ),
+    ev AS (
+        SELECT r.id AS post_id, r.created_at AS t, {W_POST}::float8 AS w, 0 AS inc FROM recent r
+        UNION ALL
+        SELECT c.post_id, c.created_at, {W_COMMENT}::float8, 1 FROM comments c JOIN recent r ON r.id = c.post_id
+        UNION ALL
+        SELECT l.post_id, l.created_at, {W_LIKE}::float8, 1 FROM post_likes l JOIN recent r ON r.id = l.post_id
+    ),
+    x AS (
+        SELECT post_id, t, inc,
+               LN(w) / LN(2) + EXTRACT(EPOCH FROM t - %(epoch)s::timestamptz) / (3600.0 * %(half_life)s::float8) AS s
+          FROM ev
+    ),
+    m AS (SELECT post_id, MAX(s) AS top FROM x GROUP BY post_id)
+    INSERT INTO post_engagement (post_id, post_created_at, last_engaged_at, engagements, score)
+    SELECT x.post_id, r.created_at, MAX(x.t), SUM(x.inc),
+           m.top + LN(SUM(POWER(2::float8, GREATEST(x.s - m.top, -60)))) / LN(2)
+      FROM x
+      JOIN m ON m.post_id = x.post_id
+      JOIN recent r ON r.id = x.post_id
+     GROUP BY x.post_id, r.created_at, m.top
+    ON CONFLICT (post_id) DO NOTHING
+"""
+
+def backfill_engagement(cur, hours: int) -> int:
+    """One-off seed of post_engagement, in the caller's transaction."""
+    cur.execute(_BACKFILL_SQL, {"hours": int(hours), "epoch": EPOCH, "half_life": HALF_LIFE_HOURS})
+    return cur.rowcount
+
+# ---------- following timelines ----------
+FANOUT_MAX_FOLLOWERS = int(os.environ.get("FEED_FANOUT_MAX_FOLLOWERS", "5000"))
+
+def fan_out_post(cur, post_id: int, author_id: int, created_at: datetime) -> int:
+    """
+    Push a new post into its author's followers' timelines (caller's
+    transaction). Returns rows written, or -1 if the author is above
+    FANOUT_MAX_FOLLOWERS and was switched to read-time pull instead.
+    """
+    cur.execute("SELECT COUNT(*) FROM user_follows WHERE followee_id = %s", (author_id,))
+    followers = cur.fetchone()[0]
+    if followers > FANOUT_MAX_FOLLOWERS:
+        cur.execute("INSERT INTO feed_pull_authors (author_id) VALUES (%s) ON CONFLICT DO NOTHING",
+                    (author_id,))
+        return -1
+    if not followers:
+        return 0
+    cur.execute("""
+        INSERT INTO feed_timeline (owner_id, post_id, author_id, created_at)
+        SELECT follower_id, %s, %s, %s FROM user_follows WHERE followee_id = %s
+        ON CONFLICT DO NOTHING
+    """, (post_id, author_id, created_at, author_id))
+    return cur.rowcount
+
+def backfill_timeline(cur, owner_id: int, author_id: int, hours: int) -> None:
+    """New follow: copy the author's posts inside the feed window into the owner's timeline."""
+    cur.execute("""
+        INSERT INTO feed_timeline (owner_id, post_id, author_id, created_at)
+        SELECT %s, p.id, p.author_id, p.created_at
+          FROM feed_posts p
+         WHERE p.author_id = %s
+           AND p.created_at > NOW() - make_interval(hours => %s)
+        ON CONFLICT DO NOTHING
+    """, (owner_id, author_id, int(hours)))
+
+def prune_timeline(cur, owner_id: int, author_id: int) -> None:
+    """Unfollow / block: drop the author's posts from the owner's timeline."""
+    cur.execute("DELETE FROM feed_timeline WHERE owner_id = %s AND author_id = %s", (owner_id, author_id))
+
+def seed_timelines(cur, hours: int) -> int:
+    """One-off: timeline rows for follows that predate fan-out (migration V20261017.7)."""
+    cur.execute("""
+        INSERT INTO feed_timeline (owner_id, post_id, author_id, created_at)
+        SELECT uf.follower_id, p.id, p.author_id, p.created_at
+          FROM user_follows uf
+          JOIN feed_posts p ON p.author_id = uf.followee_id
+         WHERE p.created_at > NOW() - make_interval(hours => %s)
+           AND uf.followee_id NOT IN (SELECT author_id FROM feed_pull_authors)
+        ON CONFLICT DO NOTHING
+    """, (int(hours),))
+    return cur.rowcount
+
+def expire_timelines(con, hours: int) -> int:
+    """Periodic: drop timeline rows that fell out of the feed window. Returns rows deleted."""
+    with con.cursor() as cur:
+        cur.execute("DELETE FROM feed_timeline WHERE created_at < NOW() - make_interval(hours => %s)",
+                    (int(hours),))
+        n = cur.rowcount
+    con.commit()
+    return n
+
+# ---------- ranked candidate sets (one per tab) ----------
+_RANKED = {
+    "fresh": """
+        SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+               p.reaction_count, p.comment_count, p.created_at AS rank_key
+          FROM feed_posts p
+         WHERE p.created_at > NOW() - make_interval(hours => %(hours)s)
+           AND p.author_id IS DISTINCT FROM (SELECT id FROM me)
+    """,
+    # Pushed rows from feed_timeline plus posts pulled from followed
+    # high-fan-out authors. Each branch applies the cursor and LIMIT on its
+    # own index (idx_feed_timeline_owner_created; per pull author,
+    # idx_feed_posts_author_created), so at most 2 x limit rows reach the
+    # outer page; DISTINCT ON drops a post present in both (an author who
+    # crossed the threshold after some posts were already fanned out).
+    "following": """
+        SELECT DISTINCT ON (b.rank_key, b.id) b.* FROM (
+            (SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+                    p.reaction_count, p.comment_count, t.created_at AS rank_key
+               FROM feed_timeline t
+               JOIN feed_posts p ON p.id = t.post_id
+              WHERE t.owner_id = (SELECT id FROM me)
+                AND t.created_at > NOW() - make_interval(hours => %(hours)s)
+                AND (%(after_rank)s::timestamptz IS NULL
+                     OR (t.created_at, t.post_id) < (%(after_rank)s::timestamptz, %(after_id)s::bigint))
+              ORDER BY t.created_at DESC, t.post_id DESC
+              LIMIT %(limit)s)
+            UNION ALL
+            (SELECT p.*
+               FROM user_follows uf
+               JOIN feed_pull_authors pa ON pa.author_id = uf.followee_id
+              CROSS JOIN LATERAL (
+                    SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+                           p.reaction_count, p.comment_count, p.created_at AS rank_key
+                      FROM feed_posts p
+                     WHERE p.author_id = uf.followee_id
+                       AND p.created_at > NOW() - make_interval(hours => %(hours)s)
+                       AND (%(after_rank)s::timestamptz IS NULL
+                            OR (p.created_at, p.id) < (%(after_rank)s::timestamptz, %(after_id)s::bigint))
+                     ORDER BY p.created_at DESC, p.id DESC
+                     LIMIT %(limit)s) p
+              WHERE uf.follower_id = (SELECT id FROM me)
+              ORDER BY p.rank_key DESC, p.id DESC
+              LIMIT %(limit)s)
+        ) b
+    """,
+    # Range scan on idx_post_engagement_score; old posts have decayed to
+    # the bottom of the index, so the TTL filter rarely discards anything.
+    "waves": """
+        SELECT p.id, p.author_id, p.profile_id, p.created_at, p.content_type, p.file_id, p.text,
+               p.reaction_count, p.comment_count, e.score AS rank_key
+          FROM post_engagement e
+          JOIN feed_posts p ON p.id = e.post_id
+         WHERE e.engagements > 0
+           AND e.post_created_at > NOW() - make_interval(hours => %(hours)s)
+    """,
+}
+
+_PAGE_SQL = """
+    WITH me AS (SELECT id FROM users WHERE tg_user_id = %(viewer)s),
+    ranked AS ({ranked}),
+    page AS (
+        SELECT * FROM ranked
+         WHERE %(after_rank)s::{rank_type} IS NULL
+            OR (rank_key, id) < (%(after_rank)s::{rank_type}, %(after_id)s::bigint)
+         ORDER BY rank_key DESC, id DESC
+         LIMIT %(limit)s
+    )
+    SELECT pg.id, pg.author_id, pg.profile_id, pg.created_at, pg.content_type, pg.file_id, pg.text,
+           pg.reaction_count, pg.comment_count, pg.rank_key,
+           COALESCE(NULLIF(u.display_name, ''), NULLIF(u.username, ''),
+                    NULLIF(u.feed_username, ''), 'User' || u.tg_user_id) AS author_name,
+           u.tg_user_id AS author_tg_id,
+           CASE WHEN pr.id IS NOT NULL THEN
+                COALESCE(NULLIF(pr.profile_name, ''), NULLIF(pr.username, ''), 'Profile' || pr.id)
+           END AS profile_name,
+           EXISTS (SELECT 1 FROM post_likes pl
+                    WHERE pl.post_id = pg.id AND pl.user_id = (SELECT id FROM me)) AS liked
+      FROM page pg
+      LEFT JOIN users u ON u.id = pg.author_id
+      LEFT JOIN profiles pr ON pr.id = pg.profile_id
+     ORDER BY pg.rank_key DESC, pg.id DESC
+"""
+
+_RANK_TYPE = {"fresh": "timestamptz", "following": "timestamptz", "waves": "float8"}
+
+_SQL = {tab: _PAGE_SQL.format(ranked=sql, rank_type=_RANK_TYPE[tab]) for tab, sql in _RANKED.items()}
+
+def fetch_feed_page(cur, viewer_tg_id: int, tab: str, limit: int,
+                    cursor: Optional[str], hours: int) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Run the single page query for *tab*. Returns (rows, next_cursor) where
+    rows follow COLUMNS and next_cursor is None on the last page.
+    Raises ValueError for an unknown tab or malformed cursor.
+    """
+    if tab not in _SQL:
+        raise ValueError(f"unknown feed tab: {tab!r}")
+    after_rank, after_id = decode_cursor(cursor) if cursor else (None, None)
+    if after_rank is not None and isinstance(after_rank, datetime) != (_RANK_TYPE[tab] == "timestamptz"):
+        raise ValueError("cursor belongs to a different tab")
+    cur.execute(_SQL[tab], {
+        "viewer": int(viewer_tg_id),
+        "hours": int(hours),
+        "after_rank": after_rank,
+        "after_id": after_id,
+        "limit": int(limit),
+    })
+    rows = cur.fetchall()
+    next_cursor = encode_cursor(rows[-1][9], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
+
+# ---------- schema (migrations only, never per request) ----------
+FEED_SCHEMA = (
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_onboarded BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE feed_posts ADD COLUMN IF NOT EXISTS profile_id BIGINT",
+    """CREATE TABLE IF NOT EXISTS user_follows (
+        follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (follower_id, followee_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS post_likes (
+        post_id BIGINT REFERENCES feed_posts(id) ON DELETE CASCADE,
+        user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (post_id, user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS comments (
+        id BIGSERIAL PRIMARY KEY,
+        post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
+        user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        text TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        is_pinned BOOLEAN DEFAULT FALSE,
+        like_count INT DEFAULT 0,
+        profile_id BIGINT
+    )""",
+    # keyset scans
+    "CREATE INDEX IF NOT EXISTS idx_feed_posts_created_id ON feed_posts (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_feed_posts_author_created ON feed_posts (author_id, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_user_follows_follower ON user_follows (follower_id, followee_id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_follows_followee ON user_follows (followee_id)",
+    # following timelines (fan-out-on-write)
+    """CREATE TABLE IF NOT EXISTS feed_timeline (
+        owner_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        post_id BIGINT NOT NULL REFERENCES feed_posts(id) ON DELETE CASCADE,
+        author_id BIGINT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (owner_id, post_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_feed_timeline_owner_created ON feed_timeline (owner_id, created_at DESC, post_id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_feed_timeline_owner_author ON feed_timeline (owner_id, author_id)",
+    """CREATE TABLE IF NOT EXISTS feed_pull_authors (
+        author_id BIGINT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+        since TIMESTAMPTZ DEFAULT NOW()
+    )""",
+    # waves materialization
+    """CREATE TABLE IF NOT EXISTS post_engagement (
+        post_id BIGINT PRIMARY KEY REFERENCES feed_posts(id) ON DELETE CASCADE,
+        post_created_at TIMESTAMPTZ NOT NULL,
+        last_engaged_at TIMESTAMPTZ NOT NULL,
+        engagements INT NOT NULL DEFAULT 0,
+        score DOUBLE PRECISION NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_post_engagement_score ON post_engagement (score DESC, post_id DESC) "
+    "WHERE engagements > 0",
+    "CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments (post_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_post_likes_user_post ON post_likes (user_id, post_id)",
+)
+
+def ensure_feed_schema(con) -> List[str]:
+    """Apply FEED_SCHEMA statement by statement; returns the ones that failed."""
+    failed = []
+    with con.cursor() as cur:
+        for stmt in FEED_SCHEMA:
+            try:
+                cur.execute(stmt)
+                con.commit()
+            except Exception:
+                con.rollback()
+                failed.append(stmt.split("(")[0].strip())
+    return failed
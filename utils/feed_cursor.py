@@ -0,0 +1,367 @@
+# utils/feed_cursor.py - Keyset cursors and one-query post hydration for the in-bot feed
+"""
+Navigation state for the bot's post feeds (Public Feed, a user's posts,
+My Posts), replacing the FEED_LIST / POST_INDEX dicts that kept every
+post id of every feed a user ever opened, forever.
+
+A FeedCursor is a window of (post_id, created_at) keys in feed order,
+loaded a page at a time with a keyset predicate
+
+    AND (fp.created_at, fp.id) < (%(ts)s, %(id)s)
+    ORDER BY fp.created_at DESC, fp.id DESC LIMIT %(limit)s
+
+so every page costs one index range scan and posts created meanwhile
+don't shift the viewer's position. Moving back past the start of the
+window loads the previous page with the predicate reversed. The window
+keeps at most WINDOW keys in two arrays (16 bytes per post). Cursors
+live in a CursorStore keyed by viewer, dropped when idle for
+FEED_CURSOR_IDLE_S or, least recently used first, when more than
+FEED_CURSOR_MAX viewers hold one.
+
+hydrate() loads posts for rendering in one statement: the post, author
+name, like / comment counts, the view counter (feed_posts.view_count,
+kept by the feed_views buffer) and per-emoji reaction counts.
+PostCache keeps those rows for FEED_POST_CACHE_S seconds; get_post()
+hydrates the post being shown together with the next FEED_PREFETCH ones
+of the cursor, so Next is usually answered without touching the DB.
+Handlers invalidate() a post after changing its likes, reactions or
+comments.
+
+    cur = CURSORS.open(viewer, "public")        # or ("author", author_id)
+    post = get_post(cur.current, ahead=cur.ahead())
+    pid = CURSORS.move(viewer, +1)              # None at the end
+
+Env:
+    FEED_PAGE_SIZE       keys per page load (default 20)
+    FEED_PREFETCH        posts hydrated ahead of the viewer (default 3)
+    FEED_CURSOR_IDLE_S   idle seconds before a cursor is dropped (default 1800)
+    FEED_CURSOR_MAX      viewers holding a cursor (default 50000)
+    FEED_POST_CACHE_S    seconds a hydrated post is reused (default 15)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from utils import db_pool
+
+PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "20"))
+PREFETCH = int(os.getenv("FEED_PREFETCH", "3"))
+IDLE_S = float(os.getenv("FEED_CURSOR_IDLE_S", "1800"))
+MAX_CURSORS = int(os.getenv("FEED_CURSOR_MAX", "50000"))
+POST_CACHE_S = float(os.getenv("FEED_POST_CACHE_S", "15"))
+POST_CACHE_MAX = 20_000
+WINDOW = 200        # keys kept per cursor; older ones are reloaded on demand
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+def _to_us(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // _US
+
+def _from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=us)
+
+# --- feed sources: {keyset} and {order} are filled in per direction ---
+_SOURCES = {
+    # one author's posts (a profile's posts, My Posts)
+    "author": """
+        SELECT fp.id, fp.created_at
+          FROM feed_posts fp
+         WHERE fp.author_id = %(arg)s {keyset}
+         ORDER BY fp.created_at {order}, fp.id {order}
+         LIMIT %(limit)s
+    """,
+    # public profiles and friends, minus blocks both ways and shadow-banned authors
+    "public": """
+        SELECT fp.id, fp.created_at
+          FROM feed_posts fp
+          JOIN users u ON fp.author_id = u.tg_user_id
+         WHERE (u.feed_is_public = TRUE OR EXISTS (
+                    SELECT 1 FROM friends f
+                     WHERE f.user_id = %(viewer)s AND f.friend_id = fp.author_id
+               ))
+           AND fp.author_id <> %(viewer)s
+           AND NOT EXISTS (
+                    SELECT 1 FROM blocked_users bu
+                     WHERE (bu.user_id = %(viewer)s AND bu.blocked_uid = fp.author_id)
+                        OR (bu.user_id = fp.author_id AND bu.blocked_uid = %(viewer)s)
+               )
+           AND COALESCE(u.shadow_banned, FALSE) = FALSE
+           {keyset}
+         ORDER BY fp.created_at {order}, fp.id {order}
+         LIMIT %(limit)s
+    """,
+}
+_OLDER = "AND (fp.created_at, fp.id) < (%(ts)s, %(id)s)"
+_NEWER = "AND (fp.created_at, fp.id) > (%(ts)s, %(id)s)"
+
+def _page(kind: str, viewer: int, arg, after=None, before=None, limit: int = PAGE_SIZE) -> list:
+    """Keys (id, created_at µs) in feed order: the first page, or the page older than
+    `after` / newer than `before` (each an (id, µs) key)."""
+    params = {"viewer": viewer, "arg": arg, "limit": limit}
+    if after is not None:
+        keyset, order = _OLDER, "DESC"
+        params["id"], params["ts"] = after[0], _from_us(after[1])
+    elif before is not None:
+        keyset, order = _NEWER, "ASC"
+        params["id"], params["ts"] = before[0], _from_us(before[1])
+    else:
+        keyset, order = "", "DESC"
+    sql = _SOURCES[kind].format(keyset=keyset, order=order)
+    with db_pool.connection("feed_cursor") as con, con.cursor() as cur:
+        cur.execute(sql, params)
+        rows = [(r[0], _to_us(r[1])) for r in cur.fetchall()]
+    if before is not None:
+        rows.reverse()
+    return rows
+
+class FeedCursor:
+    """A viewer's position in one feed: a window of keys plus an index into it."""
+    __slots__ = ("kind", "viewer", "arg", "ids", "ts", "pos", "at_start", "at_end", "touched")
+
+    def __init__(self, kind: str, viewer: int, arg=None):
+        self.kind, self.viewer, self.arg = kind, viewer, arg
+        self.ids = array("q")
+        self.ts = array("q")
+        self.pos = 0
+        self.at_start = True    # nothing newer than ids[0]
+        self.at_end = False     # nothing older than ids[-1]
+        self.touched = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def current(self) -> Optional[int]:
+        return self.ids[self.pos] if self.ids else None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.pos > 0 or not self.at_start
+
+    @property
+    def has_next(self) -> bool:
+        return self.pos + 1 < len(self.ids) or not self.at_end
+
+    def ahead(self, n: int = PREFETCH) -> List[int]:
+        return list(self.ids[self.pos + 1:self.pos + 1 + n])
+
+    def _append(self, rows: Sequence[tuple], want: int) -> None:
+        for pid, us in rows:
+            self.ids.append(pid)
+            self.ts.append(us)
+        self.at_end = len(rows) < want
+        drop = len(self.ids) - WINDOW
+        if drop > 0 and self.pos >= drop:
+            del self.ids[:drop], self.ts[:drop]
+            self.pos -= drop
+            self.at_start = False
+
+    def _prepend(self, rows: Sequence[tuple], want: int) -> None:
+        self.ids[0:0] = array("q", (r[0] for r in rows))
+        self.ts[0:0] = array("q", (r[1] for r in rows))
+        self.pos += len(rows)
+        self.at_start = len(rows) < want
+        drop = len(self.ids) - WINDOW
+        if drop > 0 and self.pos < len(self.ids) - drop:
+            del self.ids[-drop:], self.ts[-drop:]
+            self.at_end = False
+
+    def load_first(self, start: int = 0) -> None:
+        """Load the newest page, positioned on the `start`-th post; stays empty
+        if the feed has no post there."""
+        want = max(PAGE_SIZE, start + 1)
+        rows = _page(self.kind, self.viewer, self.arg, limit=want)
+        if len(rows) <= start:
+            return
+        skip = max(0, start + 1 - WINDOW)
+        self.ids = array("q", (r[0] for r in rows[skip:]))
+        self.ts = array("q", (r[1] for r in rows[skip:]))
+        self.pos = start - skip
+        self.at_start = skip == 0
+        self.at_end = len(rows) < want
+
+    def move(self, delta: int) -> Optional[int]:
+        """Step `delta` posts (+1 older, -1 newer); None (and no move) past either end."""
+        target = self.pos + delta
+        if target >= len(self.ids) and not self.at_end and self.ids:
+            self._append(_page(self.kind, self.viewer, self.arg,
+                               after=(self.ids[-1], self.ts[-1])), PAGE_SIZE)
+            target = self.pos + delta
+        if target < 0 and not self.at_start and self.ids:
+            self._prepend(_page(self.kind, self.viewer, self.arg,
+                                before=(self.ids[0], self.ts[0])), PAGE_SIZE)
+            target = self.pos + delta
+        if not 0 <= target < len(self.ids):
+            return None
+        self.pos = target
+        return self.ids[target]
+
+    def discard(self, pid: int) -> Optional[int]:
+        """Drop a deleted post from the window; returns the post now current."""
+        try:
+            i = self.ids.index(pid)
+        except ValueError:
+            return self.current
+        last = (self.ids[-1], self.ts[-1])
+        del self.ids[i], self.ts[i]
+        if i < self.pos:
+            self.pos -= 1
+        if self.pos >= len(self.ids) and not self.at_end:
+            self._append(_page(self.kind, self.viewer, self.arg, after=last), PAGE_SIZE)
+        self.pos = min(self.pos, max(0, len(self.ids) - 1))
+        return self.current
+
+class CursorStore:
+    """One FeedCursor per viewer, LRU-ordered, with idle expiry."""
+
+    def __init__(self, idle_s: float = IDLE_S, max_cursors: int = MAX_CURSORS):
+        self.idle_s = idle_s
+        self.max_cursors = max_cursors
+        self._cursors: "OrderedDict[int, FeedCursor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+    def _evict(self, now: float) -> None:
+        cursors = self._cursors
+        while cursors:
+            viewer, cur = next(iter(cursors.items()))
+            if len(cursors) <= self.max_cursors and now - cur.touched < self.idle_s:
+                break
+            del cursors[viewer]
+
+    def open(self, viewer: int, kind: str, arg=None, start: int = 0) -> Optional[FeedCursor]:
+        """Start `viewer` on a feed at post `start` (replacing any previous cursor);
+        None if the feed has no post there."""
+        cur = FeedCursor(kind, viewer, arg)
+        cur.load_first(start)
+        with self._lock:
+            self._cursors.pop(viewer, None)
+            if not cur.ids:
+                return None
+            self._cursors[viewer] = cur
+            self._evict(cur.touched)
+        return cur
+
+    def get(self, viewer: int) -> Optional[FeedCursor]:
+        now = time.monotonic()
+        with self._lock:
+            cur = self._cursors.get(viewer)
+            if cur is None:
+                return None
+            if now - cur.touched >= self.idle_s:
+                del self._cursors[viewer]
+                return None
+            cur.touched = now
+            self._cursors.move_to_end(viewer)
+            return cur
+
+    def move(self, viewer: int, delta: int) -> Optional[int]:
+        cur = self.get(viewer)
+        return cur.move(delta) if cur else None
+
+    def discard_post(self, viewer: int, pid: int) -> Optional[int]:
+        cur = self.get(viewer)
+        return cur.discard(pid) if cur else None
+
+# --- hydration ---
+_HYDRATE_SQL = """
+    SELECT fp.id, fp.author_id, fp.text, fp.photo, fp.video, fp.created_at,
+           COALESCE(NULLIF(TRIM(u.feed_username), ''), 'User'),
+           (SELECT COUNT(*) FROM feed_likes l WHERE l.post_id = fp.id),
+           (SELECT COUNT(*) FROM feed_comments c WHERE c.post_id = fp.id),
+           COALESCE(fp.view_count, 0),
+           (SELECT COALESCE(json_object_agg(r.emoji, r.n), '{}'::json)
+              FROM (SELECT emoji, COUNT(*) AS n FROM feed_reactions
+                     WHERE post_id = fp.id GROUP BY emoji) r)
+      FROM feed_posts fp
+      LEFT JOIN users u ON u.tg_user_id = fp.author_id
+     WHERE fp.id = ANY(%s)
+"""
+
+def hydrate(ids: Iterable[int]) -> Dict[int, dict]:
+    """Posts ready to render, keyed by id, in one query; missing ids are left out."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    with db_pool.connection("feed_cursor") as con, con.cursor() as cur:
+        cur.execute(_HYDRATE_SQL, (ids,))
+        rows = cur.fetchall()
+    return {
+        r[0]: {
+            "id": r[0],
+            "author_id": r[1],
+            "text": r[2],
+            "photo": r[3],
+            "video": r[4],
+            "created_at": r[5],
+            "author_name": r[6],
+            "like_count": int(r[7]),
+            "comment_count": int(r[8]),
+            "seen_count": int(r[9]),
+            "reactions": {e: int(n) for e, n in (r[10] or {}).items()},
+        }
+        for r in rows
+    }
+
+class PostCache:
+    """Hydrated posts for `ttl` seconds, bounded to `max_entries` (oldest dropped)."""
+
+    def __init__(self, ttl: float = POST_CACHE_S, max_entries: int = POST_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._posts: "OrderedDict[int, tuple]" = OrderedDict()   # id -> (expires, post)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._posts)
+
+    def get(self, pid: int) -> Optional[dict]:
+        """The cached post, without going to the DB."""
+        with self._lock:
+            hit = self._posts.get(pid)
+        return hit[1] if hit is not None and hit[0] > time.monotonic() else None
+
+    def get_many(self, ids: Sequence[int]) -> Dict[int, dict]:
+        """Cached posts among `ids`; the rest are hydrated together in one query."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for pid in ids:
+                hit = self._posts.get(pid)
+                if hit is not None and hit[0] > now:
+                    found[pid] = hit[1]
+                else:
+                    missing.append(pid)
+        if missing:
+            fresh = hydrate(missing)
+            found.update(fresh)
+            expires = now + self.ttl
+            with self._lock:
+                for pid, post in fresh.items():
+                    self._posts[pid] = (expires, post)
+                    self._posts.move_to_end(pid)
+                while len(self._posts) > self.max_entries:
+                    self._posts.popitem(last=False)
+        return found
+
+    def invalidate(self, pid: int) -> None:
+        with self._lock:
+            self._posts.pop(pid, None)
+
+CURSORS = CursorStore()
+POSTS = PostCache()
+
+def get_post(pid: int, ahead: Sequence[int] = ()) -> Optional[dict]:
+    """The hydrated post `pid`; on a miss, `ahead` is hydrated in the same query."""
+    return POSTS.get(pid) or POSTS.get_many([pid, *ahead]).get(pid)
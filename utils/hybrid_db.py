@@ -136,6 +136,47 @@ def get_available_confessions_for_user_hybrid(user_id: int, limit: int = 10) ->
             log.error(f"🚨 PostgreSQL get available confessions failed: {e}")
             return []
 
+def get_unseen_confessions_for_users_hybrid(user_ids: List[int], per_user: int = 3,
+                                             days: int = 7) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    ROTATING POOL, set-based: up to *per_user* unseen confessions for every
+    user in one round-trip (anti-join against confession_deliveries), seeds
+    first. Users with nothing left are absent from the result.
+    """
+    if not user_ids:
+        return {}
+    if DB_MODE == "supabase":
+        return get_unseen_confessions_for_users(user_ids, per_user, days)
+    try:
+        with _conn() as con, con.cursor() as cur:
+            cur.execute("""
+                WITH cand AS MATERIALIZED (
+                    SELECT id, author_id, text, COALESCE(system_seed, FALSE) AS seed
+                    FROM confessions
+                    WHERE created_at >= NOW() - make_interval(days => %s)
+                )
+                SELECT u.uid, c.id, c.author_id, c.text, c.seed
+                FROM unnest(%s::bigint[]) AS u(uid)
+                CROSS JOIN LATERAL (
+                    SELECT cand.* FROM cand
+                    WHERE cand.author_id <> u.uid
+                      AND NOT EXISTS (
+                          SELECT 1 FROM confession_deliveries cd
+                          WHERE cd.confession_id = cand.id AND cd.user_id = u.uid
+                      )
+                    ORDER BY cand.seed DESC, RANDOM()
+                    LIMIT %s
+                ) c
+            """, (days, list(user_ids), per_user))
+            out: Dict[int, List[Dict[str, Any]]] = {}
+            for uid, cid, author_id, text, seed in cur.fetchall() or []:
+                out.setdefault(int(uid), []).append(
+                    {'id': cid, 'author_id': author_id, 'text': text, 'system_seed': seed})
+            return out
+    except Exception as e:
+        log.error(f"🚨 PostgreSQL unseen confessions matrix failed: {e}")
+        return {}
+
 def get_pending_confessions_hybrid(limit: int = 50) -> List[Dict[str, Any]]:
     """DEPRECATED: Use get_available_confessions_for_user_hybrid instead"""
     # Fallback for compatibility - return seed confessions
@@ -178,6 +219,27 @@ def track_confession_delivery_hybrid(confession_id: int, user_id: int) -> bool:
             log.error(f"🚨 PostgreSQL track delivery failed: {e}")
             return False
 
+def track_confession_deliveries_hybrid(pairs: List[tuple]) -> int:
+    """ROTATING POOL: record many (confession_id, user_id) deliveries in one insert."""
+    if not pairs:
+        return 0
+    if DB_MODE == "supabase":
+        return track_confession_deliveries(pairs)
+    try:
+        with _conn() as con, con.cursor() as cur:
+            cur.execute("""
+                INSERT INTO confession_deliveries (confession_id, user_id, delivered_at)
+                SELECT c, u, NOW() FROM unnest(%s::bigint[], %s::bigint[]) AS t(c, u)
+                ON CONFLICT (confession_id, user_id) DO NOTHING
+            """, ([int(c) for c, _ in pairs], [int(u) for _, u in pairs]))
+            inserted = cur.rowcount
+            con.commit()
+            log.info(f"📋 Tracked {inserted} confession deliveries in one insert")
+            return inserted
+    except Exception as e:
+        log.error(f"🚨 PostgreSQL bulk track deliveries failed: {e}")
+        return 0
+
 def mark_confession_delivered_hybrid(confession_id: int, delivered_to: int) -> bool:
     """LEGACY: Use track_confession_delivery_hybrid for rotating pool"""
     # For backward compatibility, just track the delivery
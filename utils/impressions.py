@@ -0,0 +1,229 @@
+# utils/impressions.py - Write-behind batching for "X saw Y" rows
+"""
+Buffers (subject, viewer) rows such as feed views, story views and Blur
+Vault reveals in memory and writes them in one multi-row statement:
+
+    INSERT INTO feed_views (post_id, viewer_id) VALUES (...), (...)
+    ON CONFLICT DO NOTHING
+
+Same shape as utils/counter_buffer.py: a daemon thread flushes every
+`flush_ms` milliseconds or as soon as `flush_events` rows are pending,
+so a view costs the caller a set lookup instead of a round-trip and a
+commit. It is a thread rather than an asyncio task because the bot's
+sync helpers and the API workers share it.
+
+Dedup: a row already pending, or written within the last `dedup_s`
+seconds, is skipped before it reaches the queue (two generations of
+"recently written" sets, rotated every window). seen() answers from the
+same sets, so a reader can treat a view that is still in flight as
+written.
+
+Counters: with `count_into`, each statement also bumps per-subject
+counter columns by the number of rows that were actually inserted:
+
+    WITH ins AS (INSERT ... ON CONFLICT DO NOTHING RETURNING post_id)
+    UPDATE feed_posts t SET view_count = view_count + n.n
+      FROM (SELECT post_id, COUNT(*) n FROM ins GROUP BY 1) n
+     WHERE t.id = n.post_id
+
+so "N views" is a column read instead of COUNT(*) over the view table.
+
+Backpressure: the queue holds at most `max_rows`; beyond that new rows
+are dropped. Per buffer, REGISTRY exports rows added / deduplicated /
+dropped / written, failed flushes, the pending gauge and flush latency.
+
+Loss window: at most one flush interval of rows if the process dies
+without close() (shutdown hooks call it). A batch the database rejects
+is retried row by row and only the offending rows are dropped; if the
+database is unreachable the rows go back on the queue for the next tick.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional, Set, Tuple
+
+from utils.metrics_registry import REGISTRY
+
+log = logging.getLogger("luvbot.impressions")
+
+_ADDED = REGISTRY.counter("impressions_added_total", "Rows queued for a batched insert", ["buffer"])
+_DEDUPED = REGISTRY.counter("impressions_deduped_total", "Rows skipped as pending or recently written", ["buffer"])
+_DROPPED = REGISTRY.counter("impressions_dropped_total", "Rows dropped because the queue was full", ["buffer"])
+_WRITTEN = REGISTRY.counter("impressions_written_total", "Rows sent to the database", ["buffer"])
+_FAILED = REGISTRY.counter("impression_flush_failures_total", "Flushes that raised", ["buffer"])
+_PENDING = REGISTRY.gauge("impressions_pending", "Rows waiting for the next flush", ["buffer"])
+_FLUSH_MS = REGISTRY.histogram("impression_flush_ms", "Time to write one batch", ["buffer"])
+
+class CountInto(NamedTuple):
+    """Counter columns bumped per newly inserted row: UPDATE `table` SET col = col + n
+    WHERE `key` = the row's `subject` column."""
+    table: str
+    key: str
+    subject: str
+    columns: Tuple[str, ...]
+
+class ImpressionBuffer:
+    def __init__(self, table: str, columns: Iterable[str], tag: str,
+                 flush_ms: int = 300, flush_events: int = 2000, max_rows: int = 200_000,
+                 dedup_s: float = 60.0, count_into: Optional[CountInto] = None):
+        self.table = table
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.tag = tag
+        self.flush_ms = flush_ms
+        self.flush_events = flush_events
+        self.max_rows = max_rows
+        self.dedup_s = dedup_s
+        self._pending: Set[tuple] = set()
+        self._recent: Set[tuple] = set()        # written in the current window
+        self._recent_prev: Set[tuple] = set()   # written in the previous one
+        self._rotated = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._sql = self._build_sql(count_into)
+        self._m_added, self._m_deduped, self._m_dropped, self._m_written, self._m_failed, \
+            self._m_pending, self._m_flush_ms = (m.labels(tag) for m in (
+                _ADDED, _DEDUPED, _DROPPED, _WRITTEN, _FAILED, _PENDING, _FLUSH_MS))
+
+    def _build_sql(self, count_into: Optional[CountInto]) -> str:
+        insert = (f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES %s "
+                  f"ON CONFLICT DO NOTHING")
+        if count_into is None:
+            return insert
+        t, key, subject, cols = count_into
+        sets = ", ".join(f"{c} = COALESCE(t.{c}, 0) + n.n" for c in cols)
+        return (f"WITH ins AS ({insert} RETURNING {subject}) "
+                f"UPDATE {t} t SET {sets} "
+                f"FROM (SELECT {subject} AS k, COUNT(*) AS n FROM ins GROUP BY 1) n "
+                f"WHERE t.{key} = n.k")
+
+    # --- producer side (hot path: set lookups under a lock, no I/O) ---
+    def add(self, *row) -> bool:
+        """Queue a row; False if it was a duplicate, dropped, or the buffer is closed."""
+        if self._stopped:
+            return False
+        with self._lock:
+            if row in self._pending or row in self._recent or row in self._recent_prev:
+                self._m_deduped.inc()
+                return False
+            if len(self._pending) >= self.max_rows:
+                self._m_dropped.inc()
+                log.error(f"[{self.tag}] impression buffer full; dropped a row")
+                return False
+            self._pending.add(row)
+            n = len(self._pending)
+        self._m_added.inc()
+        self._m_pending.set(n)
+        if self._thread is None:
+            self._start()
+        if n >= self.flush_events:
+            self._wake.set()
+        return True
+
+    def seen(self, *row) -> bool:
+        """True if `row` is pending or was written within the dedup window."""
+        with self._lock:
+            return row in self._pending or row in self._recent or row in self._recent_prev
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # --- consumer side ---
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"impressions-{self.tag}", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning(f"[{self.tag}] impression flush failed, will retry: {e}")
+
+    def _rotate(self, now: float) -> None:
+        # caller holds self._lock
+        if now - self._rotated >= self.dedup_s or len(self._recent) >= self.max_rows:
+            self._recent_prev, self._recent = self._recent, set()
+            self._rotated = now
+
+    def flush(self) -> int:
+        """Write all pending rows now; returns the number of rows sent."""
+        with self._flush_lock:
+            with self._lock:
+                self._rotate(time.monotonic())
+                batch = self._pending
+                if not batch:
+                    return 0
+                # keep them visible to add()/seen() while the write is in flight
+                self._recent.update(batch)
+                self._pending = set()
+            rows = sorted(batch)
+            t0 = time.perf_counter()
+            try:
+                try:
+                    self._write(rows)
+                except Exception as e:
+                    self._m_failed.inc()
+                    log.warning(f"[{self.tag}] batch of {len(rows)} failed ({e}); retrying row by row")
+                    skipped = self._write_each(rows)
+                    if skipped:
+                        self._m_dropped.inc(skipped)
+                        log.error(f"[{self.tag}] {skipped} rows rejected by the database; dropped")
+            except Exception:
+                with self._lock:
+                    self._recent.difference_update(rows)
+                    room = max(0, self.max_rows - len(self._pending))
+                    self._pending.update(rows[:room])
+                    if room < len(rows):
+                        self._m_dropped.inc(len(rows) - room)
+                        log.error(f"[{self.tag}] impression buffer full; dropped {len(rows) - room} rows")
+                    self._m_pending.set(len(self._pending))
+                raise
+            ms = (time.perf_counter() - t0) * 1000
+            self._m_flush_ms.observe(ms)
+            self._m_written.inc(len(rows))
+            self._m_pending.set(self.pending())
+            log.debug(f"[{self.tag}] flushed {len(rows)} rows in {ms:.1f}ms")
+            return len(rows)
+
+    def _write(self, rows: list) -> None:
+        from psycopg2.extras import execute_values
+        from utils import db_pool
+        with db_pool.connection(self.tag) as con, con.cursor() as cur:
+            execute_values(cur, self._sql, rows, page_size=1000)
+            con.commit()
+
+    def _write_each(self, rows: list) -> int:
+        """Fallback after a failed batch: one statement per row under a savepoint,
+        skipping rows the database rejects (say, the story was deleted meanwhile).
+        Returns the number skipped; connection errors propagate."""
+        import psycopg2
+        from utils import db_pool
+        one = self._sql.replace("VALUES %s", f"VALUES ({', '.join(['%s'] * len(self.columns))})")
+        skipped = 0
+        with db_pool.connection(self.tag) as con, con.cursor() as cur:
+            for row in rows:
+                cur.execute("SAVEPOINT impression")
+                try:
+                    cur.execute(one, row)
+                except psycopg2.Error:
+                    cur.execute("ROLLBACK TO SAVEPOINT impression")
+                    skipped += 1
+            con.commit()
+        return skipped
+
+    def close(self) -> None:
+        """Final flush; later add() calls are ignored."""
+        self._stopped = True
+        self._wake.set()
+        self.flush()
@@ -86,12 +86,6 @@ class MaintenanceSystem:
                 
                 # 5. Archive old completed payments (move to archive table)
                 days = self.retention_policies["old_payments"]
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS payments_archive (
-                        LIKE payments INCLUDING ALL
-                    );
-                """)
-                
                 cur.execute("""
                     WITH archived AS (
                         DELETE FROM payments 
@@ -327,23 +321,8 @@ class MaintenanceSystem:
                 return {"success": False, "error": str(e2)}
     
     def setup_automated_maintenance(self) -> Dict[str, Any]:
-        """Set up automated maintenance schedules."""
+        """Set up automated maintenance schedules (maintenance_log comes from the migrations)."""
         try:
-            # Create maintenance log table
-            import registration as reg
-            with reg._conn() as con, con.cursor() as cur:
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS maintenance_log (
-                        id BIGSERIAL PRIMARY KEY,
-                        operation TEXT NOT NULL,
-                        status TEXT NOT NULL,
-                        details JSONB,
-                        duration_seconds REAL,
-                        executed_at TIMESTAMPTZ DEFAULT NOW()
-                    );
-                """)
-                con.commit()
-            
             log.info("✅ Maintenance system initialized")
             
             return {
@@ -0,0 +1,231 @@
+# utils/matchmaking.py - Indexed waiting queue for chat matchmaking
+"""
+Indexed matchmaking queue used by chat.start_search.
+
+Waiting users are bucketed by their filter attributes, captured once at
+enqueue time from the user snapshot, so a pairing decision never touches
+the DB:
+
+    group key = (gender, wanted_gender, verified_only, verified)
+
+That is a fixed, small set of groups. A searcher looks up only the groups
+whose key is compatible with it (at most genders x 2 x 2 x 2 dict hits),
+never the whole table.
+
+Inside a group, tickets without an age window sit in one FIFO deque plus
+one deque per age. Premium tickets with a window are indexed by every age
+their window accepts, then by their own age, so whether a waiting window
+accepts the searcher is a dict lookup too. Per group a search reads at
+most one deque per age in the searcher's window (or per age present, for
+a windowed ticket without one) - bounded by the age range, however many
+users or distinct windows are waiting. A windowed ticket costs one deque
+slot per age it accepts at enqueue time.
+
+Order is a global sequence number: normal enqueues append, boosts and
+re-match requests go to the front, and the oldest compatible ticket wins
+(the old rotate-the-deque scan approximated the same FIFO order).
+
+Removal is lazy (tickets are flagged dead and skipped at the head); groups
+compact themselves once stale entries outnumber live ones.
+"""
+from __future__ import annotations
+
+import itertools
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+
+AgeWindow = Optional[Tuple[int, int]]
+
+MAX_AGE = 120   # ages a window is indexed under are clamped to 0..MAX_AGE
+
+class SearchTicket:
+    """Filter attributes of one waiting user, frozen at enqueue time."""
+    __slots__ = ("uid", "gender", "want", "age", "window",
+                 "verified", "verified_only", "seq", "alive")
+
+    def __init__(self, uid: int, gender: str = "", want: str | None = None,
+                 age: int | None = None, window: AgeWindow = None,
+                 verified: bool = False, verified_only: bool = False):
+        self.uid = uid
+        self.gender = gender or ""
+        self.want = want or None
+        self.age = int(age) if age is not None else None
+        self.window = tuple(window) if window else None
+        self.verified = bool(verified)
+        self.verified_only = bool(verified_only)
+        self.seq = 0
+        self.alive = False
+
+    @property
+    def key(self) -> tuple:
+        return (self.gender, self.want, self.verified_only, self.verified)
+
+    def accepts(self, other: "SearchTicket") -> bool:
+        """Does this user's filter accept *other*? (same rules as chat._allows)"""
+        if self.want and other.gender != self.want:
+            return False
+        if self.window:
+            lo, hi = self.window
+            if other.age is None or not (lo <= other.age <= hi):
+                return False
+        if self.verified_only and not other.verified:
+            return False
+        return True
+
+class _Group:
+    __slots__ = ("order", "fifo", "by_age", "windowed", "live")
+
+    def __init__(self):
+        self.order: deque[SearchTicket] = deque()   # every ticket, for compaction
+        self.fifo: deque[SearchTicket] = deque()    # tickets without a window
+        self.by_age: Dict[int, deque[SearchTicket]] = {}
+        # windowed tickets: accepted age -> own age (None if unknown) -> tickets
+        self.windowed: Dict[int, Dict[int | None, deque[SearchTicket]]] = {}
+        self.live = 0
+
+    def _queues(self, t: SearchTicket):
+        yield self.order
+        if t.window is None:
+            yield self.fifo
+            if t.age is not None:
+                yield self.by_age.setdefault(t.age, deque())
+        else:
+            lo, hi = t.window
+            for a in range(max(lo, 0), min(hi, MAX_AGE) + 1):
+                yield self.windowed.setdefault(a, {}).setdefault(t.age, deque())
+
+    def add(self, t: SearchTicket, front: bool) -> None:
+        for dq in self._queues(t):
+            if front:
+                dq.appendleft(t)
+            else:
+                dq.append(t)
+        self.live += 1
+
+    def compact(self) -> None:
+        live = [t for t in self.order if t.alive]
+        self.order, self.fifo, self.by_age, self.windowed = deque(), deque(), {}, {}
+        for t in live:
+            for dq in self._queues(t):
+                dq.append(t)
+
+def _head(dq: deque) -> SearchTicket | None:
+    while dq and not dq[0].alive:
+        dq.popleft()
+    return dq[0] if dq else None
+
+class MatchQueue:
+    """
+    Waiting-room index. Not thread-safe on its own: callers hold
+    chat.queue_lock around every mutation, as they did for the deque.
+    """
+
+    def __init__(self):
+        self._tickets: Dict[int, SearchTicket] = {}
+        self._groups: Dict[tuple, _Group] = {}
+        self._genders: Dict[str, int] = {}   # gender -> waiting tickets, for "any gender" searches
+        self._back = itertools.count(1)
+        self._front = itertools.count(-1, -1)
+
+    # --- container protocol (admin/runtime_counts, left_menu cleanup) ---
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self._tickets
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(sorted(self._tickets, key=lambda u: self._tickets[u].seq))
+
+    def get(self, uid: int) -> SearchTicket | None:
+        return self._tickets.get(uid)
+
+    # --- mutations ---
+    def enqueue(self, ticket: SearchTicket, front: bool = False) -> None:
+        """Add (or re-add) a waiting user; front=True for boost / re-match."""
+        self.discard(ticket.uid)
+        ticket.seq = next(self._front) if front else next(self._back)
+        ticket.alive = True
+        self._tickets[ticket.uid] = ticket
+        self._genders[ticket.gender] = self._genders.get(ticket.gender, 0) + 1
+        grp = self._groups.get(ticket.key)
+        if grp is None:
+            grp = self._groups[ticket.key] = _Group()
+        grp.add(ticket, front)
+
+    def discard(self, uid: int) -> SearchTicket | None:
+        """Remove a waiting user if present; returns the ticket."""
+        t = self._tickets.pop(uid, None)
+        if t is None:
+            return None
+        t.alive = False
+        n = self._genders[t.gender] - 1
+        if n:
+            self._genders[t.gender] = n
+        else:
+            del self._genders[t.gender]
+        grp = self._groups.get(t.key)
+        if grp is not None:
+            grp.live -= 1
+            if grp.live <= 0:
+                del self._groups[t.key]
+            elif len(grp.order) > 2 * grp.live + 64:
+                grp.compact()
+        return t
+
+    remove = discard
+
+    def clear(self) -> None:
+        for t in self._tickets.values():
+            t.alive = False
+        self._tickets.clear()
+        self._groups.clear()
+        self._genders.clear()
+
+    # --- pairing ---
+    def _compatible_groups(self, me: SearchTicket) -> Iterator[_Group]:
+        """The groups whose filters are compatible with *me*, by direct lookup."""
+        genders = (me.want,) if me.want else self._genders
+        wants = (None, me.gender) if me.gender else (None,)
+        verified_only = (False, True) if me.verified else (False,)
+        verified = (True,) if me.verified_only else (False, True)
+        for key in itertools.product(genders, wants, verified_only, verified):
+            grp = self._groups.get(key)
+            if grp is not None:
+                yield grp
+
+    def peek_partner(self, me: SearchTicket) -> SearchTicket | None:
+        """
+        Oldest waiting ticket that *me* accepts and that accepts *me*.
+        *me* must not be waiting itself (pop_partner takes care of that).
+        """
+        best: SearchTicket | None = None
+
+        def consider(dq):
+            nonlocal best
+            cand = _head(dq) if dq else None
+            if cand is not None and (best is None or cand.seq < best.seq):
+                best = cand
+
+        ages = range(me.window[0], me.window[1] + 1) if me.window else None
+        for grp in self._compatible_groups(me):
+            if ages is None:
+                consider(grp.fifo)
+            else:
+                for age in ages:
+                    consider(grp.by_age.get(age))
+            # waiting windows only ever accept a searcher with a known age
+            accepting = grp.windowed.get(me.age) if me.age is not None else None
+            if accepting:
+                for own_age in (accepting if ages is None else ages):
+                    consider(accepting.get(own_age))
+        return best
+
+    def pop_partner(self, me: SearchTicket) -> int | None:
+        """Find the best mutual match for *me*, remove it from the queue and return its uid."""
+        self.discard(me.uid)
+        cand = self.peek_partner(me)
+        if cand is None:
+            return None
+        self.discard(cand.uid)
+        return cand.uid
@@ -0,0 +1,265 @@
+# utils/media_proxy.py - Cached Telegram media proxy for /api/telefile
+"""
+Serves Telegram files by file_id without re-resolving or re-downloading
+them on every feed render:
+
+    file_id --(path cache, TTL)--> file_path --(disk LRU)--> bytes on disk
+
+- one keep-alive httpx.AsyncClient for getFile and file downloads
+- file_id -> file_path cached for PATH_TTL seconds (Telegram keeps the
+  download path valid for about an hour)
+- downloaded bytes kept in a size-bounded LRU directory keyed by file_id
+- concurrent misses for the same file_id share one upstream fetch
+
+The API layer streams the cached file in chunks and handles Range /
+If-None-Match via parse_range() and the entry's etag.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+log = logging.getLogger("luvbot.media_proxy")
+
+API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "luvhive-media"))
+CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_MB", "512")) * 1024 * 1024
+PATH_TTL = float(os.environ.get("MEDIA_PATH_TTL", "3000"))
+PATH_CACHE_MAX = 50_000
+CHUNK_SIZE = 64 * 1024
+
+class MediaNotFound(Exception):
+    """Telegram doesn't know the file_id or the download failed."""
+
+@dataclass
+class CachedFile:
+    path: str
+    size: int
+    content_type: str
+    etag: str
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single 'bytes=' range into inclusive (start, end).
+    Returns None when there is no usable Range header (serve the full body)
+    and raises ValueError when the range can't be satisfied (416).
+    Multi-range requests are answered with the full body.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, sep, end_s = header[6:].strip().partition("-")
+    if not sep or not (start_s.isdigit() or start_s == "") or not (end_s.isdigit() or end_s == ""):
+        return None
+    if start_s == "":
+        if not end_s:
+            return None
+        suffix = int(end_s)
+        if suffix == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - suffix), size - 1
+    start = int(start_s)
+    end = int(end_s) if end_s else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+class TelegramMediaProxy:
+    def __init__(self, bot_token: str, api_base: str = API_BASE, cache_dir: str = CACHE_DIR,
+                 max_bytes: int = CACHE_MAX_BYTES, path_ttl: float = PATH_TTL, timeout: float = 10.0):
+        self.bot_token = bot_token
+        self.api_base = api_base.rstrip("/")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.path_ttl = path_ttl
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._paths: Dict[str, Tuple[float, str, str]] = {}  # file_id -> (expires, file_path, unique_id)
+        self._lru: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "get_file": 0, "downloads": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    # ---------- lifecycle ----------
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------- disk LRU ----------
+    def _key(self, file_id: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(file_id.encode()).hexdigest())
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU from a previous run's cache dir, oldest access first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            data_path = meta_path[:-5]
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                st = os.stat(data_path)
+            except (OSError, ValueError):
+                self._unlink(meta_path, data_path)
+                continue
+            entries.append((st.st_atime, meta["file_id"],
+                            CachedFile(data_path, st.st_size, meta["content_type"], meta["etag"])))
+        for _, file_id, entry in sorted(entries, key=lambda e: e[0]):
+            self._lru[file_id] = entry
+            self._bytes += entry.size
+        self._evict()
+
+    @staticmethod
+    def _unlink(*paths: str) -> None:
+        for p in paths:
+            try:
+                os.unlink(p)
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        # Readers already holding an open handle keep their bytes after unlink
+        while self._bytes > self.max_bytes and len(self._lru) > 1:
+            _, old = self._lru.popitem(last=False)
+            self._bytes -= old.size
+            self._unlink(old.path, old.path + ".json")
+
+    def _store(self, file_id: str, tmp_path: str, content_type: str, etag: str) -> CachedFile:
+        path = self._key(file_id)
+        os.replace(tmp_path, path)
+        with open(path + ".json", "w") as f:
+            json.dump({"file_id": file_id, "content_type": content_type, "etag": etag}, f)
+        entry = CachedFile(path, os.path.getsize(path), content_type, etag)
+        old = self._lru.pop(file_id, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._lru[file_id] = entry
+        self._bytes += entry.size
+        self._evict()
+        return entry
+
+    # ---------- upstream ----------
+    async def _resolve(self, file_id: str) -> Tuple[str, str]:
+        cached = self._paths.get(file_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+        self.stats["get_file"] += 1
+        r = await self.client.get(f"{self.api_base}/bot{self.bot_token}/getFile", params={"file_id": file_id})
+        data = r.json() if r.status_code == 200 else {}
+        result = data.get("result") or {}
+        fp = result.get("file_path")
+        if not data.get("ok") or not fp:
+            raise MediaNotFound(file_id)
+        unique = result.get("file_unique_id") or hashlib.sha1(file_id.encode()).hexdigest()[:16]
+        now = time.monotonic()
+        if len(self._paths) >= PATH_CACHE_MAX:
+            self._paths = {k: v for k, v in self._paths.items() if v[0] > now}
+        self._paths[file_id] = (now + self.path_ttl, fp, unique)
+        return fp, unique
+
+    async def _download(self, file_id: str) -> CachedFile:
+        for attempt in (0, 1):
+            fp, unique = await self._resolve(file_id)
+            self.stats["downloads"] += 1
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+            try:
+                async with self.client.stream("GET", f"{self.api_base}/file/bot{self.bot_token}/{fp}") as r:
+                    if r.status_code != 200:
+                        # A stale cached path 404s; resolve it once more before giving up
+                        self._paths.pop(file_id, None)
+                        if attempt == 0 and r.status_code in (400, 404):
+                            continue
+                        raise MediaNotFound(file_id)
+                    with os.fdopen(fd, "wb") as out:
+                        fd = -1
+                        async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                            out.write(chunk)
+                    content_type = r.headers.get("content-type", "application/octet-stream")
+                if content_type.startswith("application/octet-stream"):
+                    content_type = mimetypes.guess_type(fp)[0] or content_type
+                entry = self._store(file_id, tmp_path, content_type, f'"{unique}"')
+                tmp_path = None
+                return entry
+            finally:
+                if fd != -1:
+                    os.close(fd)
+                if tmp_path:
+                    self._unlink(tmp_path)
+        raise MediaNotFound(file_id)
+
+    # ---------- public ----------
+    async def get(self, file_id: str) -> CachedFile:
+        """Return the cached file, fetching it once however many callers are waiting."""
+        entry = self._lru.get(file_id)
+        if entry is not None and os.path.exists(entry.path):
+            self._lru.move_to_end(file_id)
+            self.stats["hits"] += 1
+            return entry
+
+        fut = self._inflight.get(file_id)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        self.stats["misses"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[file_id] = fut
+        try:
+            entry = await self._download(file_id)
+        except MediaNotFound as exc:
+            fut.set_exception(exc)
+            raise
+        except httpx.RequestError as exc:
+            log.warning(f"telefile upstream error for {file_id[:16]}: {exc}")
+            fut.set_exception(MediaNotFound(file_id))
+            raise MediaNotFound(file_id) from exc
+        except asyncio.CancelledError:
+            fut.set_exception(MediaNotFound(file_id))  # waiters retry on their next request
+            raise
+        except Exception as exc:
+            fut.set_exception(exc)
+            raise
+        else:
+            fut.set_result(entry)
+            return entry
+        finally:
+            self._inflight.pop(file_id, None)
+            fut.exception()  # mark retrieved so a failure nobody waited on isn't logged
+
+def iter_file(f, start: int, length: int, chunk_size: int = CHUNK_SIZE):
+    """Yield *length* bytes of the open file *f* from *start*; closes *f*."""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
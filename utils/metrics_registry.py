@@ -0,0 +1,275 @@
+# utils/metrics_registry.py - Lock-free metrics core with Prometheus text exposition
+"""
+Counters, gauges and fixed-bucket histograms cheap enough for hot paths.
+
+Each metric family hands out pre-bound children with .labels(...): the
+label values are validated and escaped once, when the child is created,
+and the child is cached, so the hot path is a method call on an object
+the caller keeps:
+
+    RELAYED = REGISTRY.counter("relay_messages_total", "Messages relayed", ["kind"])
+    RELAYED_TEXT = RELAYED.labels(kind="text")
+    ...
+    RELAYED_TEXT.inc()
+
+Writes never take a lock. Counters and histograms keep one cell per
+writer thread (a plain list only that thread mutates); readers sum the
+cells at scrape time. On the bot's event loop that is a single cell.
+Gauges are a single slot set by assignment. A lock is only taken the
+first time a thread touches a child, and when a new child is created.
+
+Histograms use fixed bucket bounds (no sample deques); quantiles are
+estimated from the buckets by linear interpolation.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# milliseconds; covers Telegram API calls and DB queries
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+class _Cells:
+    """Per-thread accumulators of a fixed width; summed on read."""
+
+    __slots__ = ("_width", "local", "_cells", "_lock")
+
+    def __init__(self, width: int):
+        self._width = width
+        self.local = threading.local()  # .cell is this thread's list once registered
+        self._cells: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def register(self) -> List[float]:
+        """Slow path, once per thread: create and register this thread's cell."""
+        c = [0.0] * self._width
+        with self._lock:
+            self._cells.append(c)
+        self.local.cell = c
+        return c
+
+    def total(self) -> List[float]:
+        out = [0.0] * self._width
+        with self._lock:
+            cells = list(self._cells)
+        for c in cells:
+            for i, v in enumerate(c):
+                out[i] += v
+        return out
+
+class CounterChild:
+    __slots__ = ("label_str", "_cells", "_local")
+
+    def __init__(self, label_str: str):
+        self.label_str = label_str
+        self._cells = _Cells(1)
+        self._local = self._cells.local
+
+    def inc(self, value: float = 1) -> None:
+        try:
+            self._local.cell[0] += value
+        except AttributeError:
+            self._cells.register()[0] += value
+
+    @property
+    def value(self) -> float:
+        return self._cells.total()[0]
+
+class GaugeChild:
+    __slots__ = ("label_str", "value")
+
+    def __init__(self, label_str: str):
+        self.label_str = label_str
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+class HistogramChild:
+    __slots__ = ("label_str", "bounds", "_cells", "_local")
+
+    def __init__(self, label_str: str, bounds: Tuple[float, ...]):
+        self.label_str = label_str
+        self.bounds = bounds
+        self._cells = _Cells(len(bounds) + 3)  # buckets..., +Inf, sum, count
+        self._local = self._cells.local
+
+    def observe(self, value: float) -> None:
+        try:
+            c = self._local.cell
+        except AttributeError:
+            c = self._cells.register()
+        c[bisect_left(self.bounds, value)] += 1
+        c[-2] += value
+        c[-1] += 1
+
+    def snapshot(self) -> List[float]:
+        """Non-cumulative bucket counts followed by sum and count."""
+        return self._cells.total()
+
+    def quantile(self, q: float, snap: Optional[Sequence[float]] = None) -> float:
+        return bucket_quantile(self.bounds, snap if snap is not None else self.snapshot(), q)
+
+def bucket_quantile(bounds: Sequence[float], snap: Sequence[float], q: float) -> float:
+    """Estimate a quantile from a non-cumulative bucket snapshot (as from snapshot())."""
+    counts = snap[: len(bounds) + 1]
+    total = sum(counts)
+    if total <= 0:
+        return 0.0
+    rank = q * total
+    seen = 0.0
+    for i, n in enumerate(counts):
+        if n and seen + n >= rank:
+            lo = bounds[i - 1] if i > 0 else 0.0
+            if i >= len(bounds):   # +Inf bucket: best we can say is the top bound
+                return float(bounds[-1])
+            return lo + (bounds[i] - lo) * ((rank - seen) / n)
+        seen += n
+    return float(bounds[-1])
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self, label_str: str):
+        raise NotImplementedError
+
+    def labels(self, *values, **kw):
+        if kw:
+            values = tuple(kw.get(n, "") for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                label_str = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+                child = self._children[key] = self._new_child(label_str)
+        return child
+
+    def child(self, pairs: Tuple[Tuple[str, str], ...]):
+        """Child for an ad-hoc (name, value) label set; used by the dict-tags API
+        in utils.monitoring, where one metric name may be used with varying tags."""
+        child = self._children.get(pairs)
+        if child is None:
+            with self._lock:
+                child = self._children.get(pairs)
+                if child is None:
+                    label_str = ",".join(f'{n}="{_escape(v)}"' for n, v in pairs)
+                    child = self._children[pairs] = self._new_child(label_str)
+        return child
+
+    def children(self):
+        return list(self._children.items())
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self, label_str):
+        return CounterChild(label_str)
+
+    def inc(self, value: float = 1) -> None:
+        self.labels().inc(value)
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def _new_child(self, label_str):
+        return GaugeChild(label_str)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self, label_str):
+        return HistogramChild(label_str, self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+class Registry:
+    """Named metric families; get-or-create, so modules can declare the same metric twice."""
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames, **kw):
+        fam = self._families.get(name)
+        if fam is None:
+            with self._lock:
+                fam = self._families.get(name)
+                if fam is None:
+                    fam = self._families[name] = cls(name, help_text, labelnames, **kw)
+        if not isinstance(fam, cls) or fam.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered as {fam.kind}{fam.labelnames}")
+        return fam
+
+    def counter(self, name: str, help_text: str = "", labelnames: Iterable[str] = ()) -> Counter:
+        return self._get(Counter, name, help_text, tuple(labelnames))
+
+    def gauge(self, name: str, help_text: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help_text, tuple(labelnames))
+
+    def histogram(self, name: str, help_text: str = "", labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS_MS) -> Histogram:
+        return self._get(Histogram, name, help_text, tuple(labelnames), buckets=buckets)
+
+    def families(self) -> List[_Family]:
+        return list(self._families.values())
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        out: List[str] = []
+        for fam in sorted(self.families(), key=lambda f: f.name):
+            out.append(f"# HELP {fam.name} {fam.help or fam.name}")
+            out.append(f"# TYPE {fam.name} {fam.kind}")
+            for _, child in sorted(fam.children(), key=lambda kv: kv[1].label_str):
+                ls = child.label_str
+                if fam.kind == "histogram":
+                    snap = child.snapshot()
+                    acc = 0.0
+                    for bound, n in zip(child.bounds + (math.inf,), snap):
+                        acc += n
+                        le = f'le="{_fmt(bound)}"'
+                        out.append(f"{fam.name}_bucket{{{ls + ',' if ls else ''}{le}}} {_fmt(acc)}")
+                    lbl = f"{{{ls}}}" if ls else ""
+                    out.append(f"{fam.name}_sum{lbl} {_fmt(snap[-2])}")
+                    out.append(f"{fam.name}_count{lbl} {_fmt(snap[-1])}")
+                else:
+                    lbl = f"{{{ls}}}" if ls else ""
+                    out.append(f"{fam.name}{lbl} {_fmt(child.value)}")
+        out.append("")
+        return "\n".join(out)
+
+# process-wide registry; utils.monitoring.metrics writes into it too
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -1,27 +1,45 @@
 # utils/monitoring.py - Comprehensive monitoring and alerting system
 import logging
+import re
 import time
-import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from collections import defaultdict, deque
 import threading
-import psutil
+
+try:
+    import psutil
+except ImportError:  # optional: system stats are skipped without it
+    psutil = None
+
+from utils.metrics_registry import REGISTRY, bucket_quantile
 
 log = logging.getLogger(__name__)
 
+_NAME_BAD = re.compile(r"[^a-zA-Z0-9_:]")
+
+def _metric_name(name: str) -> str:
+    return _NAME_BAD.sub("_", name)
+
 class MetricsCollector:
-    """Collects and tracks application metrics for monitoring."""
+    """Collects and tracks application metrics for monitoring.
+
+    increment/gauge/timer keep their (name, tags dict) signature but write
+    into utils.metrics_registry.REGISTRY: the tags are turned into a label
+    set once per distinct (name, tags) and the bound handle is cached, so a
+    call is a dict lookup plus a lock-free update. Hot paths should bind a
+    handle from REGISTRY directly instead.
+    """
     
-    def __init__(self):
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
         self.metrics = defaultdict(list)
-        self.counters = defaultdict(int)
-        self.gauges = defaultdict(float)
-        self.timers = defaultdict(deque)  # Store last 100 measurements
+        self._handles = {}  # (kind, name, tag pairs) -> bound child
+        self._timer_windows = deque(maxlen=8)  # (ts, {(name, labels): histogram snapshot}) per minute
         self.alerts = []
         self.alert_cooldowns = {}  # Prevent spam alerts
-        self._lock = threading.Lock()
+        self._lock = threading.Lock()  # only for the event lists (errors, floodwaits)
         
         # Performance thresholds (from ChatGPT recommendations)
         self.thresholds = {
@@ -34,30 +52,38 @@ class MetricsCollector:
             "webhook_5xx_rate": 0.5         # Webhook 5xx rate > 0.5%
         }
         
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # prime: later non-blocking calls measure since the last one
+
         # Start background monitoring
         self._start_monitoring_thread()
     
+    def _handle(self, kind: str, metric_name: str, tags: Optional[Dict[str, str]]):
+        pairs = tuple(sorted((_metric_name(k), str(v)) for k, v in tags.items())) if tags else ()
+        key = (kind, metric_name, pairs)
+        h = self._handles.get(key)
+        if h is None:
+            name = _metric_name(metric_name)
+            if kind == "counter":
+                fam = self.registry.counter(name)
+            elif kind == "gauge":
+                fam = self.registry.gauge(name)
+            else:
+                fam = self.registry.histogram(name)
+            h = self._handles[key] = fam.child(pairs)
+        return h
+
     def increment(self, metric_name: str, value: int = 1, tags: Dict[str, str] = None):
         """Increment a counter metric."""
-        with self._lock:
-            key = f"{metric_name}:{json.dumps(tags or {}, sort_keys=True)}"
-            self.counters[key] += value
+        self._handle("counter", metric_name, tags).inc(value)
     
     def gauge(self, metric_name: str, value: float, tags: Dict[str, str] = None):
         """Set a gauge metric value."""
-        with self._lock:
-            key = f"{metric_name}:{json.dumps(tags or {}, sort_keys=True)}"
-            self.gauges[key] = value
+        self._handle("gauge", metric_name, tags).set(value)
     
     def timer(self, metric_name: str, duration_ms: float, tags: Dict[str, str] = None):
-        """Record a timing metric."""
-        with self._lock:
-            key = f"{metric_name}:{json.dumps(tags or {}, sort_keys=True)}"
-            self.timers[key].append((time.time(), duration_ms))
-            
-            # Keep only last 100 measurements
-            if len(self.timers[key]) > 100:
-                self.timers[key].popleft()
+        """Record a timing metric (fixed-bucket histogram, milliseconds)."""
+        self._handle("histogram", metric_name, tags).observe(duration_ms)
     
     def record_error(self, error_type: str, error_message: str, handler: str = None):
         """Record error for monitoring."""
@@ -104,38 +130,70 @@ class MetricsCollector:
             "status_code": str(status_code),
             "status_class": f"{status_code // 100}xx"
         })
+
+    def _series(self, kind: str):
+        """(display key, family, child) for every series of one kind."""
+        for fam in self.registry.families():
+            if fam.kind != kind:
+                continue
+            for _, child in fam.children():
+                yield (f"{fam.name}{{{child.label_str}}}" if child.label_str else fam.name), fam, child
+
+    def _snapshot_timers(self):
+        return {key: child.snapshot() for key, _, child in self._series("histogram")}
+
+    def _timer_stats(self, window_s: float = 300) -> Dict[str, Dict[str, float]]:
+        """count/avg/p95/p99 per timer over roughly the last window_s seconds.
+
+        Histograms are cumulative; the monitor thread keeps a per-minute
+        snapshot and the window is the difference from the oldest one that
+        is still inside it (cumulative until the first snapshot exists).
+        """
+        now = time.time()
+        base = {}
+        for ts, snap in self._timer_windows:
+            if now - ts <= window_s + 30:
+                base = snap
+                break
+        stats = {}
+        for key, fam, child in self._series("histogram"):
+            cur = child.snapshot()
+            prev = base.get(key)
+            if prev is not None:
+                cur = [a - b for a, b in zip(cur, prev)]
+            count = cur[-1]
+            if count <= 0:
+                continue
+            stats[key] = {
+                "count": int(count),
+                "avg": cur[-2] / count,
+                "p95": bucket_quantile(fam.buckets, cur, 0.95),
+                "p99": bucket_quantile(fam.buckets, cur, 0.99),
+            }
+        return stats
+
+    def _system_stats(self) -> Dict[str, float]:
+        if psutil is None:
+            return {}
+        try:
+            return {
+                "cpu_percent": psutil.cpu_percent(interval=None),  # since the previous call, no 1s block
+                "memory_percent": psutil.virtual_memory().percent,
+                "disk_percent": psutil.disk_usage("/").percent
+            }
+        except Exception as e:
+            log.debug(f"system stats unavailable: {e}")
+            return {}
     
     def get_metrics_summary(self) -> Dict[str, Any]:
         """Get current metrics summary."""
-        with self._lock:
-            now = time.time()
-            summary = {
-                "counters": dict(self.counters),
-                "gauges": dict(self.gauges),
-                "alerts_active": len([a for a in self.alerts if a.get("resolved", False) == False]),
-                "system": {
-                    "cpu_percent": psutil.cpu_percent(interval=1),
-                    "memory_percent": psutil.virtual_memory().percent,
-                    "disk_percent": psutil.disk_usage("/").percent
-                }
-            }
-            
-            # Calculate timer percentiles
-            timer_stats = {}
-            for key, measurements in self.timers.items():
-                if measurements:
-                    recent_values = [m[1] for m in measurements if now - m[0] < 300]  # Last 5 min
-                    if recent_values:
-                        recent_values.sort()
-                        timer_stats[key] = {
-                            "count": len(recent_values),
-                            "avg": sum(recent_values) / len(recent_values),
-                            "p95": recent_values[int(0.95 * len(recent_values))] if recent_values else 0,
-                            "p99": recent_values[int(0.99 * len(recent_values))] if recent_values else 0
-                        }
-            
-            summary["timers"] = timer_stats
-            return summary
+        return {
+            "counters": {key: child.value for key, _, child in self._series("counter")},
+            "gauges": {key: child.value for key, _, child in self._series("gauge")},
+            "alerts_active": len([a for a in self.alerts if a.get("resolved", False) == False]),
+            "system": self._system_stats(),
+            "timers": self._timer_stats(),
+        }
     
     def check_alerts(self):
         """Check metrics against thresholds and generate alerts."""
@@ -162,7 +220,7 @@ class MetricsCollector:
             ])
             
             total_requests = sum([
-                v for k, v in self.counters.items() 
+                child.value for k, _, child in self._series("counter")
                 if "requests_total" in k
             ]) or 1
             
@@ -175,26 +233,20 @@ class MetricsCollector:
                 )
             
             # Check database latency (p95)
-            db_query_key = next((k for k in self.timers.keys() if "db_query_duration_ms" in k), None)
-            if db_query_key:
-                recent_queries = [
-                    m[1] for m in self.timers[db_query_key] 
-                    if now - m[0] < 300
-                ]
-                if recent_queries:
-                    recent_queries.sort()
-                    p95_latency = recent_queries[int(0.95 * len(recent_queries))]
-                    
-                    if p95_latency > self.thresholds["db_latency_p95_ms"]:
-                        self._create_alert(
-                            "high_db_latency",
-                            f"DB p95 latency: {p95_latency:.1f}ms > {self.thresholds['db_latency_p95_ms']}ms",
-                            "warning"
-                        )
+            db_stats = [v for k, v in self._timer_stats().items() if k.startswith("db_query_duration_ms")]
+            if db_stats:
+                p95_latency = max(v["p95"] for v in db_stats)
+                if p95_latency > self.thresholds["db_latency_p95_ms"]:
+                    self._create_alert(
+                        "high_db_latency",
+                        f"DB p95 latency: {p95_latency:.1f}ms > {self.thresholds['db_latency_p95_ms']}ms",
+                        "warning"
+                    )
             
             # Check system resources
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory_percent = psutil.virtual_memory().percent
+            system = self._system_stats()
+            cpu_percent = system.get("cpu_percent", 0)
+            memory_percent = system.get("memory_percent", 0)
             
             if cpu_percent > self.thresholds["cpu_percent"]:
                 self._create_alert(
@@ -259,6 +311,7 @@ class MetricsCollector:
             while True:
                 try:
                     time.sleep(60)  # Check every minute
+                    self._timer_windows.append((time.time(), self._snapshot_timers()))
                     self.check_alerts()
                     
                     # Clean old metrics (keep last hour)
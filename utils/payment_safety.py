@@ -53,41 +53,6 @@ class PaymentSafetySystem:
                 return {"success": False, "error": fraud_check["reason"]}
             
             with reg._conn() as con, con.cursor() as cur:
-                # Create payments table if not exists
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS payments (
-                        id BIGSERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        amount INTEGER NOT NULL,
-                        currency TEXT NOT NULL DEFAULT 'XTR',
-                        telegram_charge_id TEXT UNIQUE NOT NULL,
-                        payment_type TEXT NOT NULL,
-                        status TEXT NOT NULL DEFAULT 'pending',
-                        created_at TIMESTAMPTZ DEFAULT NOW(),
-                        updated_at TIMESTAMPTZ DEFAULT NOW(),
-                        processed_at TIMESTAMPTZ,
-                        metadata JSONB,
-                        
-                        CONSTRAINT chk_payment_amount CHECK (amount > 0),
-                        CONSTRAINT chk_payment_status CHECK (status IN ('pending', 'processing', 'succeeded', 'failed', 'refunded', 'disputed'))
-                    );
-                """)
-                
-                # Create index for fast lookups (outside transaction)
-                con.autocommit = True
-                try:
-                    cur.execute("""
-                        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_user_status 
-                        ON payments(user_id, status);
-                    """)
-                    
-                    cur.execute("""
-                        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_telegram_charge 
-                        ON payments(telegram_charge_id);
-                    """)
-                finally:
-                    con.autocommit = False
-                
                 # Insert payment record (idempotent via unique constraint)
                 try:
                     cur.execute("""
@@ -207,7 +172,8 @@ class PaymentSafetySystem:
                 updated_at = cur.fetchone()[0]
                 
                 # If payment succeeded, grant premium benefits in same transaction
-                if new_status == PaymentStatus.SUCCEEDED and payment_type == "premium":
+                granted = new_status == PaymentStatus.SUCCEEDED and payment_type == "premium"
+                if granted:
                     grant_result = self._grant_premium_benefits(cur, user_id, amount)
                     if not grant_result["success"]:
                         # Rollback if benefit granting fails
@@ -215,6 +181,9 @@ class PaymentSafetySystem:
                         return {"success": False, "error": f"Failed to grant benefits: {grant_result['error']}"}
                 
                 con.commit()
+                if granted:
+                    # premium_flag / premium_until are snapshotted (reg.get_user_snapshot)
+                    reg.invalidate_user_snapshot(user_id)
                 
                 log.info(f"💰 Payment {payment_id} updated: {current_status} -> {new_status.value}")
                 
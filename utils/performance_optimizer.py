@@ -11,7 +11,6 @@ import logging
 import asyncio
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-import registration as reg
 
 log = logging.getLogger("luvbot.performance")
 
@@ -103,10 +102,9 @@ class MSDhoniOptimizer:
     def optimize_database_connections(self):
         """Optimize database connection usage"""
         try:
-            # Force connection pool cleanup
-            if hasattr(reg, '_pool') and reg._pool:
-                # Close idle connections
-                reg._pool.closeall()
+            # Close idle connections above the pool minimum
+            from utils import db_pool
+            if db_pool.get_pool().reap_idle(max_idle=0):
                 log.info("🔧 Database connection pool optimized")
                 self.metrics['database_errors_prevented'] += 1
         except Exception as e:
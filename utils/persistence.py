@@ -0,0 +1,329 @@
+# utils/persistence.py - Incremental SQLite persistence for the PTB Application
+"""
+Drop-in replacement for PicklePersistence.
+
+PicklePersistence rewrites the whole bot_state.pkl (every user's
+user_data) on each flush, on the event loop. With 100k+ users that is a
+multi-megabyte pickle.dump every `update_interval` seconds, and startup
+unpickles all of it before the first update is served.
+
+Here every user_data / chat_data entry is its own row in a SQLite WAL
+database, pickled on its own:
+
+  * Lazy load: get_user_data()/get_chat_data() return empty dicts at
+    startup; refresh_user_data()/refresh_chat_data() (called by PTB
+    before each handler) pull a user's row the first time that user is
+    seen in this process. An update for a user not loaded yet (a job
+    ran first) is merged with the stored row before it is queued.
+  * Dirty tracking: PTB hands update_user_data() only the ids whose
+    data was touched; their snapshot is queued, pickled in the writer
+    thread and compared with a digest of the last written bytes, so
+    entries that were read but not changed are never rewritten.
+  * Off-loop writes: queued changes are pickled and committed in one
+    transaction in a worker thread (asyncio.to_thread). Writes are
+    serialised by an asyncio.Lock so a slow flush can't reorder them.
+
+bot_data, conversations and callback_data are small and needed up
+front, so they are loaded eagerly like before.
+
+Env:
+    BOT_STATE_DB   path to the SQLite file (default bot_state.sqlite3)
+
+Existing bot_state.pkl files are imported with
+scripts/migrate_pickle_persistence.py.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+log = logging.getLogger("luvbot.persistence")
+
+DEFAULT_PATH = os.getenv("BOT_STATE_DB", "bot_state.sqlite3")
+
+# row kinds in the `state` table
+USER, CHAT, BOT, CALLBACK = "user", "chat", "bot", "callback"
+CONV_PREFIX = "conv:"
+
+_DELETE = object()  # queued in place of a value to drop the row
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID
+"""
+
+def _digest(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+def _conv_key(key: Tuple[Any, ...]) -> str:
+    return repr(tuple(key))
+
+class StateStore:
+    """The SQLite side: one connection, used from worker threads under a lock."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def get_raw(self, kind: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def scan(self, kind: str):
+        """All (key, value) rows of one kind."""
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM state WHERE kind = ?", (kind,)).fetchall()
+        return [(k, pickle.loads(v)) for k, v in rows]
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM state WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def write(self, upserts, deletes) -> None:
+        """upserts: [(kind, key, blob)], deletes: [(kind, key)] - one transaction."""
+        if not upserts and not deletes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if upserts:
+                    self._db.executemany(
+                        "INSERT INTO state (kind, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (kind, key) DO UPDATE SET value = excluded.value, "
+                        "updated_at = excluded.updated_at",
+                        [(k, key, blob, now) for k, key, blob in upserts],
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM state WHERE kind = ? AND key = ?", deletes)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            self._db.close()
+
+class SQLitePersistence(BasePersistence):
+    """BasePersistence with per-key rows, lazy loads and change-only writes."""
+
+    def __init__(self, path: str = DEFAULT_PATH, store_data: Optional[PersistenceInput] = None,
+                 update_interval: float = 60):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.store = StateStore(path)
+        self._user_data: Dict[int, Dict[Any, Any]] = {}
+        self._chat_data: Dict[int, Dict[Any, Any]] = {}
+        self._loaded: Dict[str, set] = {USER: set(), CHAT: set()}
+        self._loading: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._written: Dict[Tuple[str, str], bytes] = {}   # (kind, key) -> digest of stored bytes
+        self._pending: Dict[Tuple[str, str], Any] = {}     # (kind, key) -> object | _DELETE
+        self._write_lock = asyncio.Lock()
+        self._conversations: Dict[str, Dict[Tuple[Any, ...], object]] = {}
+
+    # ---- writer ------------------------------------------------------------
+
+    def _queue(self, kind: str, key: Any, value: Any) -> None:
+        self._pending[(kind, str(key))] = value
+
+    def _write_batch(self, batch: Dict[Tuple[str, str], Any]) -> Tuple[int, int]:
+        """Runs in a worker thread: pickle, drop unchanged rows, commit."""
+        upserts, deletes, digests = [], [], {}
+        for (kind, key), value in batch.items():
+            if value is _DELETE:
+                deletes.append((kind, key))
+                continue
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            d = _digest(blob)
+            if self._written.get((kind, key)) == d:
+                continue
+            upserts.append((kind, key, blob))
+            digests[(kind, key)] = d
+        self.store.write(upserts, deletes)
+        self._written.update(digests)
+        for k in deletes:
+            self._written.pop(k, None)
+        return len(upserts), len(deletes)
+
+    async def _drain(self) -> None:
+        async with self._write_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                written, dropped = await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                # put it back unless something newer was queued meanwhile
+                for k, v in batch.items():
+                    self._pending.setdefault(k, v)
+                log.exception("persistence write failed; %d entries kept for retry", len(batch))
+                return
+            if written or dropped:
+                log.debug("persistence: %d written, %d dropped, %d unchanged",
+                          written, dropped, len(batch) - written - dropped)
+
+    # ---- lazy user/chat data -----------------------------------------------
+
+    async def _hydrate(self, kind: str, key: int, target: Dict[Any, Any]) -> None:
+        loaded = self._loaded[kind]
+        if key in loaded:
+            # concurrent updates for the same user wait for the first load
+            pending = self._loading.get((kind, key))
+            if pending is not None:
+                await asyncio.shield(pending)
+            return
+        loaded.add(key)
+        fut = self._loading[(kind, key)] = asyncio.get_running_loop().create_future()
+        try:
+            blob = await asyncio.to_thread(self.store.get_raw, kind, str(key))
+            if blob is not None:
+                self._written[(kind, str(key))] = _digest(blob)
+                # values set before the load (e.g. by a job) win over the stored ones
+                for k, v in pickle.loads(blob).items():
+                    target.setdefault(k, v)
+        except Exception:
+            loaded.discard(key)
+            log.exception("persistence: loading %s %s failed", kind, key)
+        finally:
+            del self._loading[(kind, key)]
+            fut.set_result(None)
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self._user_data
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self._chat_data
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        await self._hydrate(USER, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        await self._hydrate(CHAT, chat_id, chat_data)
+
+    async def _update(self, kind: str, key: int, data: Dict[Any, Any]) -> None:
+        # PTB passes a deepcopy already; pickling happens in the writer thread
+        if key not in self._loaded[kind] or (kind, key) in self._loading:
+            # Not hydrated yet (e.g. a job wrote before the user's first
+            # update): *data* is only what was set since startup, so keep the
+            # stored keys it doesn't have. The live dict is still hydrated by
+            # the next refresh.
+            blob = await asyncio.to_thread(self.store.get_raw, kind, str(key))
+            if blob is not None:
+                for k, v in pickle.loads(blob).items():
+                    data.setdefault(k, v)
+        self._queue(kind, key, data)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        await self._update(USER, user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        await self._update(CHAT, chat_id, data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded[USER].discard(user_id)
+        self._queue(USER, user_id, _DELETE)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._loaded[CHAT].discard(chat_id)
+        self._queue(CHAT, chat_id, _DELETE)
+
+    # ---- eager bits --------------------------------------------------------
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        data = await asyncio.to_thread(self.store.get, BOT, "")
+        return data if data is not None else {}
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        self._queue(BOT, "", data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return await asyncio.to_thread(self.store.get, CALLBACK, "")
+
+    async def update_callback_data(self, data) -> None:
+        self._queue(CALLBACK, "", data)
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[Any, ...], object]:
+        if name not in self._conversations:
+            rows = await asyncio.to_thread(self.store.scan, CONV_PREFIX + name)
+            self._conversations[name] = {k: v for k, v in (row[1] for row in rows)}
+        return deepcopy(self._conversations[name])
+
+    async def update_conversation(self, name: str, key: Tuple[Any, ...], new_state: Optional[object]) -> None:
+        conv = self._conversations.setdefault(name, {})
+        if new_state is None:
+            if conv.pop(key, None) is not None:
+                self._queue(CONV_PREFIX + name, _conv_key(key), _DELETE)
+            return
+        if conv.get(key) == new_state:
+            return
+        conv[key] = new_state
+        # the key tuple is stored with the state so it round-trips exactly
+        self._queue(CONV_PREFIX + name, _conv_key(key), (key, new_state))
+
+    # ---- flush -------------------------------------------------------------
+
+    async def flush(self) -> None:
+        """Called by PTB every update_interval (after update_*) and on shutdown."""
+        await self._drain()
+
+    def import_state(self, data: Dict[str, Any]) -> Dict[str, int]:
+        """Write a PicklePersistence-style dict straight into the store (sync)."""
+        batch: Dict[Tuple[str, str], Any] = {}
+        for uid, ud in (data.get("user_data") or {}).items():
+            if ud:
+                batch[(USER, str(uid))] = ud
+        for cid, cd in (data.get("chat_data") or {}).items():
+            if cd:
+                batch[(CHAT, str(cid))] = cd
+        if data.get("bot_data") is not None:
+            batch[(BOT, "")] = data["bot_data"]
+        if data.get("callback_data") is not None:
+            batch[(CALLBACK, "")] = data["callback_data"]
+        for name, states in (data.get("conversations") or {}).items():
+            for key, state in states.items():
+                batch[(CONV_PREFIX + name, _conv_key(key))] = (key, state)
+        self._write_batch(batch)
+        return {
+            "user_data": sum(1 for k in batch if k[0] == USER),
+            "chat_data": sum(1 for k in batch if k[0] == CHAT),
+            "conversations": sum(1 for k in batch if k[0].startswith(CONV_PREFIX)),
+        }
+
+    def close(self) -> None:
+        self.store.close()
@@ -1,61 +1,426 @@
 # utils/rate_limiter.py - Token bucket rate limiting for Telegram bot scaling
+"""
+One rate-limiting subsystem for the bot, the API servers and abuse checks.
+
+A BucketTable holds token buckets for many keys with the same rate and
+burst. State is two floats per key (tokens, last refill) in flat
+array('d') slots per shard, with a dict from key to slot; no per-key
+objects. Tables are sharded by hash(key) and every operation holds its
+shard's lock for the lookup and the update together, so a take can never
+land in a slot that sweep() or eviction just handed to another key. The
+critical section is a dict lookup and a few float ops, and 16 shards keep
+threads (API thread, executors) from queueing on one lock. A single
+global limit is a SingleBucket rather than a one-key table.
+
+Memory is bounded: each table keeps at most `max_keys` keys. A bucket
+idle long enough to have refilled to `burst` is identical to a fresh
+one, so dropping it is lossless; sweep() does that. When a shard is
+full anyway, the next few slots under a clock hand are sampled and the
+least recently used one is evicted (approximate LRU, O(1)).
+
+RateLimiter stacks tables into hierarchical limits - global, per-user,
+per-feature (per user), per-IP - checked all-or-nothing: tokens taken
+from earlier levels are refunded if a later level refuses.
+
+    LIMITER.check(user_id=uid, feature="confession")   -> Decision
+    allow_send(uid)                                     -> bool (legacy)
+
+Front doors:
+    RateLimitMiddleware - ASGI middleware for the FastAPI apps (per IP)
+    install(app)        - PTB TypeHandler at group -90 dropping update floods
+
+Env:
+    RATE_LIMIT_MAX_KEYS  keys kept per table (default 200000)
+"""
+import os
 import time
 import logging
-from collections import defaultdict
-from typing import Dict, Any
+import threading
+from array import array
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
 
 log = logging.getLogger(__name__)
 
-# Global and per-user token buckets for rate limiting
-GLOBAL_BUCKET = {"ts": time.time(), "tokens": 40.0}
-USER_BUCKETS: Dict[int, Dict[str, float]] = defaultdict(lambda: {"ts": time.time(), "tokens": 5.0})
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "200000"))
+SHARDS = 16
+_SHARD_MASK = SHARDS - 1
+_EVICT_SAMPLE = 8
+
+class Decision(NamedTuple):
+    allowed: bool
+    scope: str = ""             # level that refused, "" when allowed
+    retry_after: float = 0.0    # seconds until enough tokens at that level
+
+_ALLOWED = Decision(True)
+
+class _Shard:
+    __slots__ = ("index", "keys", "tokens", "stamp", "free", "hand", "lock")
+
+    def __init__(self):
+        self.index: Dict[Hashable, int] = {}
+        self.keys: list = []
+        self.tokens = array("d")
+        self.stamp = array("d")
+        self.free: list = []
+        self.hand = 0
+        self.lock = threading.Lock()
+
+class BucketTable:
+    """Token buckets for many keys sharing one (rate, burst)."""
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int = MAX_KEYS,
+                 clock=time.monotonic):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._per_shard = max(1, max_keys // SHARDS)
+        self._shards = [_Shard() for _ in range(SHARDS)]
+        self._clock = clock
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return sum(len(s.index) for s in self._shards)
+
+    def _slot(self, s: _Shard, key: Hashable, now: float) -> int:
+        """Slot for key in shard s (caller holds s.lock); new keys start full."""
+        i = s.index.get(key)
+        if i is not None:
+            return i
+        if len(s.index) >= self._per_shard:
+            self._evict_one(s, now)
+        if s.free:
+            i = s.free.pop()
+            s.keys[i] = key
+            s.tokens[i] = self.burst
+            s.stamp[i] = now
+        else:
+            i = len(s.keys)
+            s.keys.append(key)
+            s.tokens.append(self.burst)
+            s.stamp.append(now)
+        s.index[key] = i
+        return i
+
+    def _release(self, s: _Shard, i: int) -> None:
+        del s.index[s.keys[i]]
+        s.keys[i] = None
+        s.free.append(i)
+
+    def _evict_one(self, s: _Shard, now: float) -> None:
+        # approximate LRU: of the next few slots under the clock hand, drop the stalest
+        n = len(s.keys)
+        keys, stamp = s.keys, s.stamp
+        victim, oldest = -1, now
+        i = s.hand
+        for _ in range(_EVICT_SAMPLE):
+            i = i + 1 if i + 1 < n else 0
+            if keys[i] is not None and stamp[i] <= oldest:
+                victim, oldest = i, stamp[i]
+        s.hand = i
+        if victim < 0:  # only free slots under the hand: fall back to any live key
+            victim = next(iter(s.index.values()))
+        self._release(s, victim)
+        self.evicted += 1
+
+    def take(self, key: Hashable, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take `cost` tokens; returns (allowed, seconds until affordable)."""
+        s = self._shards[hash(key) & _SHARD_MASK]
+        rate = self.rate
+        with s.lock:
+            now = self._clock()
+            i = s.index.get(key)
+            if i is None:
+                i = self._slot(s, key, now)
+            tokens_, stamp = s.tokens, s.stamp
+            tokens = tokens_[i] + (now - stamp[i]) * rate
+            if tokens > self.burst:
+                tokens = self.burst
+            stamp[i] = now
+            if tokens < cost:
+                tokens_[i] = tokens
+                return False, (cost - tokens) / rate if rate > 0 else float("inf")
+            tokens_[i] = tokens - cost
+        return True, 0.0
+
+    def refund(self, key: Hashable, cost: float = 1.0) -> None:
+        s = self._shards[hash(key) & _SHARD_MASK]
+        with s.lock:
+            i = s.index.get(key)
+            if i is not None:
+                s.tokens[i] = min(self.burst, s.tokens[i] + cost)
+
+    def tokens(self, key: Hashable) -> float:
+        s = self._shards[hash(key) & _SHARD_MASK]
+        with s.lock:
+            i = s.index.get(key)
+            if i is None:
+                return self.burst
+            return min(self.burst, s.tokens[i] + (self._clock() - s.stamp[i]) * self.rate)
+
+    def reset(self, key: Hashable) -> None:
+        s = self._shards[hash(key) & _SHARD_MASK]
+        with s.lock:
+            i = s.index.get(key)
+            if i is not None:
+                self._release(s, i)
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        if burst is not None:
+            self.burst = float(burst)
+
+    def sweep(self, shard: Optional[int] = None) -> int:
+        """Drop buckets that have refilled to burst (lossless); one shard or all."""
+        dropped = 0
+        for s in (self._shards if shard is None else [self._shards[shard % SHARDS]]):
+            with s.lock:
+                now = self._clock()
+                for key, i in list(s.index.items()):
+                    if s.tokens[i] + (now - s.stamp[i]) * self.rate >= self.burst:
+                        self._release(s, i)
+                        dropped += 1
+        return dropped
+
+class SingleBucket:
+    """One bucket with BucketTable's interface (the key is ignored) - for global limits."""
+
+    __slots__ = ("name", "rate", "burst", "_tokens", "_stamp", "_clock", "_lock", "evicted")
+
+    def __init__(self, name: str, rate: float, burst: float, clock=time.monotonic):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._clock = clock
+        self._stamp = clock()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return 1
+
+    def take(self, key: Hashable = None, cost: float = 1.0) -> Tuple[bool, float]:
+        with self._lock:
+            now = self._clock()
+            tokens = self._tokens + (now - self._stamp) * self.rate
+            if tokens > self.burst:
+                tokens = self.burst
+            self._stamp = now
+            if tokens < cost:
+                self._tokens = tokens
+                return False, (cost - tokens) / self.rate if self.rate > 0 else float("inf")
+            self._tokens = tokens - cost
+        return True, 0.0
+
+    def refund(self, key: Hashable = None, cost: float = 1.0) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + cost)
 
-def _refill_tokens(bucket: Dict[str, float], rate: float, burst: float) -> None:
-    """Refill tokens in bucket based on elapsed time."""
-    now = time.time()
-    elapsed = now - bucket["ts"]
-    bucket["tokens"] = min(burst, bucket["tokens"] + rate * elapsed)
-    bucket["ts"] = now
+    def tokens(self, key: Hashable = None) -> float:
+        with self._lock:
+            return min(self.burst, self._tokens + (self._clock() - self._stamp) * self.rate)
 
-def _take_token(bucket: Dict[str, float]) -> bool:
-    """Try to take one token from bucket."""
-    if bucket["tokens"] < 1.0:
-        return False
-    bucket["tokens"] -= 1.0
-    return True
+    def reset(self, key: Hashable = None) -> None:
+        with self._lock:
+            self._tokens, self._stamp = self.burst, self._clock()
+
+    set_rate = BucketTable.set_rate
+
+    def sweep(self, shard: Optional[int] = None) -> int:
+        return 0
+
+class RateLimiter:
+    """Hierarchical limits: global -> per-user -> per-feature -> per-IP."""
+
+    def __init__(self, max_keys: int = MAX_KEYS):
+        self.max_keys = max_keys
+        self.global_ = SingleBucket("global", rate=15.0, burst=60.0)
+        self.user = BucketTable("user", rate=1.5, burst=5.0, max_keys=max_keys)
+        self.ip = BucketTable("ip", rate=1.0, burst=60.0, max_keys=max_keys)
+        self.features: Dict[str, BucketTable] = {}
+        self.singles: Dict[str, SingleBucket] = {}
+        self._base_rates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._next_shard = 0
+
+    def feature(self, name: str, rate: float, burst: float) -> BucketTable:
+        """Declare (or fetch) a per-user limit for one feature."""
+        table = self.features.get(name)
+        if table is None:
+            with self._lock:
+                table = self.features.get(name)
+                if table is None:
+                    table = self.features[name] = BucketTable(name, rate, burst, self.max_keys)
+        return table
+
+    def single(self, name: str, rate: float, burst: float) -> SingleBucket:
+        """Declare (or fetch) a named limit shared by every caller (one bucket, no key)."""
+        bucket = self.singles.get(name)
+        if bucket is None:
+            with self._lock:
+                bucket = self.singles.get(name)
+                if bucket is None:
+                    bucket = self.singles[name] = SingleBucket(name, rate, burst)
+        return bucket
+
+    def check(self, user_id: Optional[int] = None, feature: Optional[str] = None,
+              ip: Optional[str] = None, cost: float = 1.0, use_global: bool = True) -> Decision:
+        if use_global:
+            ok, wait = self.global_.take(None, cost)
+            if not ok:
+                return Decision(False, "global", wait)
+        if user_id is not None:
+            ok, wait = self.user.take(user_id, cost)
+            if not ok:
+                return self._refuse(use_global, None, user_id, cost, "user", wait)
+            table = self.features.get(feature) if feature is not None else None
+            if table is not None:
+                ok, wait = table.take(user_id, cost)
+                if not ok:
+                    return self._refuse(use_global, None, user_id, cost, table.name, wait)
+        if ip is not None:
+            ok, wait = self.ip.take(ip, cost)
+            if not ok:
+                return self._refuse(use_global, self.features.get(feature), user_id, cost, "ip", wait)
+        return _ALLOWED
+
+    def _refuse(self, use_global: bool, feature_table, user_id, cost: float, scope: str, wait: float) -> Decision:
+        """Give back what the levels above the refusing one already took."""
+        if use_global:
+            self.global_.refund(None, cost)
+        if user_id is not None and scope != "user":
+            self.user.refund(user_id, cost)
+            if feature_table is not None:
+                feature_table.refund(user_id, cost)
+        return Decision(False, scope, wait)
+
+    def tables(self):
+        return [self.global_, self.user, self.ip, *self.features.values(), *self.singles.values()]
+
+    def sweep(self) -> int:
+        return sum(t.sweep() for t in self.tables())
+
+    def maybe_sweep(self, every: float = 60.0) -> None:
+        """Cheap to call per request: sweeps one shard of every table each every/SHARDS seconds."""
+        now = time.monotonic()
+        if now - self._last_sweep < every / SHARDS:
+            return
+        self._last_sweep = now
+        shard, self._next_shard = self._next_shard, (self._next_shard + 1) % SHARDS
+        for t in self.tables():
+            t.sweep(shard)
+
+    def reduce_rate_limits(self, factor: float = 0.5) -> None:
+        """Scale every refill rate by factor (incident response); restore_rate_limits() undoes it."""
+        for t in self.tables():
+            base = self._base_rates.setdefault(t.name, t.rate)
+            t.set_rate(base * factor)
+        log.warning(f"rate limits reduced to {factor:.0%} of normal")
+
+    def restore_rate_limits(self) -> None:
+        for t in self.tables():
+            if t.name in self._base_rates:
+                t.set_rate(self._base_rates.pop(t.name))
+
+LIMITER = RateLimiter()
+rate_limiter = LIMITER  # name used by utils.incident_response
 
 def allow_send(user_id: int) -> bool:
     """
     Check if user is allowed to send a message.
     Uses token bucket algorithm with global + per-user limits.
-    
+
     Global: ~15 msg/s burst 60 (prevents bot-wide flood)
     Per-user: ~1.5 msg/s burst 5 (prevents individual spam)
     """
-    # Refill global bucket (15 msg/s, burst 60)
-    _refill_tokens(GLOBAL_BUCKET, rate=15.0, burst=60.0)
-    if not _take_token(GLOBAL_BUCKET):
-        log.warning(f"Global rate limit hit for user {user_id}")
-        return False
-    
-    # Refill user bucket (1.5 msg/s, burst 5)  
-    user_bucket = USER_BUCKETS[user_id]
-    _refill_tokens(user_bucket, rate=1.5, burst=5.0)
-    if not _take_token(user_bucket):
-        log.warning(f"User rate limit hit for user {user_id}")
-        return False
-        
-    return True
+    d = LIMITER.check(user_id=user_id)
+    if not d.allowed:
+        log.warning(f"{d.scope.capitalize()} rate limit hit for user {user_id}")
+    return d.allowed
 
 def reset_user_bucket(user_id: int) -> None:
     """Reset user's rate limit bucket (e.g., for premium users)."""
-    if user_id in USER_BUCKETS:
-        USER_BUCKETS[user_id] = {"ts": time.time(), "tokens": 5.0}
+    LIMITER.user.reset(user_id)
 
 def get_stats() -> Dict[str, Any]:
     """Get rate limiting statistics for monitoring."""
     return {
-        "global_tokens": GLOBAL_BUCKET["tokens"],
-        "active_users": len(USER_BUCKETS),
-        "global_bucket_age": time.time() - GLOBAL_BUCKET["ts"]
-    }
\ No newline at end of file
+        "global_tokens": LIMITER.global_.tokens(),
+        "active_users": len(LIMITER.user),
+        "tracked_ips": len(LIMITER.ip),
+        "evicted": sum(t.evicted for t in LIMITER.tables()),
+        "max_keys_per_table": LIMITER.max_keys,
+    }
+
+# ---------- FastAPI / ASGI ----------
+class RateLimitMiddleware:
+    """
+    Pure ASGI per-IP limiter; responds 429 with Retry-After.
+
+        app.add_middleware(RateLimitMiddleware, rate=1.0, burst=60, write_rate=0.5, write_burst=30)
+
+    Reads take from the per-IP table; POST/PUT/PATCH/DELETE also take
+    from a stricter "<prefix>_write" table. Set trust_forwarded only when
+    the app sits behind a proxy that sets X-Forwarded-For.
+    """
+
+    def __init__(self, app, rate: float = 1.0, burst: float = 60.0,
+                 write_rate: Optional[float] = None, write_burst: Optional[float] = None,
+                 prefix: str = "http", trust_forwarded: bool = False, limiter: RateLimiter = None):
+        self.app = app
+        lim = limiter or LIMITER
+        self.reads = lim.feature(f"{prefix}_ip", rate, burst)
+        self.writes = lim.feature(f"{prefix}_ip_write", write_rate, write_burst) if write_rate else None
+        self.limiter = lim
+        self.trust_forwarded = trust_forwarded
+
+    def _ip(self, scope) -> str:
+        if self.trust_forwarded:
+            for k, v in scope.get("headers") or ():
+                if k == b"x-forwarded-for":
+                    return v.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ip = self._ip(scope)
+        ok, wait = self.reads.take(ip)
+        if ok and self.writes is not None and scope.get("method") in ("POST", "PUT", "PATCH", "DELETE"):
+            ok, wait = self.writes.take(ip)
+            if not ok:
+                self.reads.refund(ip)
+        self.limiter.maybe_sweep()
+        if ok:
+            return await self.app(scope, receive, send)
+        retry = str(max(1, int(wait + 0.999)))
+        await send({"type": "http.response.start", "status": 429,
+                    "headers": [(b"content-type", b"application/json"), (b"retry-after", retry.encode())]})
+        await send({"type": "http.response.body",
+                    "body": b'{"detail":"Rate limit exceeded - too many requests"}'})
+
+# ---------- PTB ----------
+UPDATE_RATE = float(os.getenv("UPDATE_RATE_PER_USER", "4"))
+UPDATE_BURST = float(os.getenv("UPDATE_BURST_PER_USER", "20"))
+
+async def _gate_update(update, context) -> None:
+    """TypeHandler at group -90: stop handler dispatch for users flooding the bot."""
+    user = getattr(update, "effective_user", None)
+    if user is None:
+        return
+    if not _UPDATES.take(user.id)[0]:
+        from telegram.ext import ApplicationHandlerStop
+        log.info(f"update flood from {user.id}: dropped")
+        raise ApplicationHandlerStop
+    LIMITER.maybe_sweep()
+
+_UPDATES = LIMITER.feature("updates", UPDATE_RATE, UPDATE_BURST)
+
+def install(app, group: int = -90) -> None:
+    """Register the per-user update gate before every feature handler."""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    app.add_handler(TypeHandler(Update, _gate_update), group=group)
@@ -0,0 +1,241 @@
+# utils/spam_fingerprint.py - Bounded exact and near-duplicate message index
+"""
+Duplicate and near-duplicate detection for spam blasts, at a constant
+cost per message.
+
+ExactIndex: a dict from an 8-byte content digest to its occurrences in
+the last `window` seconds, with an expiry ring (deque of (ts, key)) so
+old entries fall out in arrival order. Catches the same message sent by
+one user or by many, across any number of messages.
+
+NearDupIndex: MinHash signatures over character 4-shingles, computed
+with one-permutation hashing (each shingle is hashed once and kept if it
+is the minimum of its bin), banded into LSH buckets. Two messages with
+Jaccard similarity J share a band with probability 1 - (1 - J^r)^b, so
+"lightly edited" copies (a word, a link or a number changed) land in the
+same bucket while unrelated lines almost never do. Candidates are
+confirmed by signature agreement. Signatures live in a fixed ring of
+`capacity` slots; a slot's bucket entries are removed when it is reused
+or expires, and each bucket is capped, so memory and the number of
+candidates per lookup are bounded no matter how big a blast gets.
+
+Messages shorter than MIN_CHARS once normalised ("hi", "ok", "good
+night") are not indexed at all: many users send them and nobody is
+spamming, so they never count as duplicates or blasts.
+
+Hashes use the built-in hash(), salted per process; the index is
+in-memory only, so that is fine.
+
+    fp = SpamFingerprinter()
+    seen = fp.observe(user_id, text)    -> Seen(duplicates, near, users)
+
+Env:
+    SPAM_DUP_WINDOW_S   seconds a message is remembered (default 900)
+    SPAM_INDEX_SIZE     messages kept per index (default 50000)
+"""
+import os
+import re
+import time
+import hashlib
+from array import array
+from collections import deque
+from operator import eq
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+WINDOW_S = float(os.getenv("SPAM_DUP_WINDOW_S", "900"))
+INDEX_SIZE = int(os.getenv("SPAM_INDEX_SIZE", "50000"))
+
+SHINGLE = 4          # characters per shingle
+BINS = 16            # MinHash signature length
+ROWS = 4             # signature positions per LSH band -> BINS // ROWS bands
+MIN_SHINGLES = 12    # shorter texts ("hi", "kaise ho") are not duplicate checked at all
+MATCH_AGREEMENT = 0.7    # fraction of equal bins to count as a near duplicate
+BUCKET_CAP = 64      # slot ids kept per LSH bucket
+MATCH_STOP = 16      # stop confirming candidates after this many matches
+MAX_CANDIDATES = 64  # candidates confirmed per lookup, newest buckets entries first
+USERS_CAP = 32       # distinct senders remembered per duplicate / cluster
+
+_MASK = (1 << 32) - 1
+_EMPTY = _MASK + 1
+_WS_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+def normalize(text: str) -> str:
+    """Lower-case, digits folded to '0', whitespace collapsed."""
+    return _DIGITS_RE.sub("0", _WS_RE.sub(" ", text.lower())).strip()
+
+def exact_key(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.lower().encode(), digest_size=8).digest(), "big")
+
+def minhash(norm: str) -> Optional[Tuple[int, ...]]:
+    """One-permutation MinHash of the text's character shingles; None if too short."""
+    n = len(norm) - SHINGLE + 1
+    if n < MIN_SHINGLES:
+        return None
+    mins = [_EMPTY] * BINS
+    for i in range(n):
+        h = hash(norm[i:i + SHINGLE])
+        b = (h >> 32) & (BINS - 1)
+        v = h & _MASK
+        if v < mins[b]:
+            mins[b] = v
+    # densify: an empty bin borrows the next non-empty one (rotation)
+    if _EMPTY in mins:
+        for b in range(BINS):
+            if mins[b] == _EMPTY:
+                for k in range(1, BINS):
+                    v = mins[(b + k) % BINS]
+                    if v != _EMPTY:
+                        mins[b] = v + k  # offset so borrowed values don't collide across bins
+                        break
+    return tuple(mins)
+
+MIN_CHARS = SHINGLE + MIN_SHINGLES - 1   # normalised length that yields MIN_SHINGLES shingles
+
+BANDS = BINS // ROWS
+
+def _bands(sig: Tuple[int, ...]) -> List[int]:
+    return [hash((i,) + sig[i:i + ROWS]) for i in range(0, BINS, ROWS)]
+
+class Seen(NamedTuple):
+    duplicates: int     # earlier identical messages in the window
+    near: int           # earlier near-identical messages (capped at MATCH_STOP)
+    users: int          # distinct other senders among those
+
+class ExactIndex:
+    """Occurrences of each digest in the last `window` seconds, bounded to `max_entries`."""
+
+    def __init__(self, window: float = WINDOW_S, max_entries: int = INDEX_SIZE):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries: Dict[int, list] = {}   # key -> [count, users set]
+        self._ring: deque = deque()            # (ts, key), oldest first
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        ring, entries = self._ring, self._entries
+        cutoff = now - self.window
+        while ring and (ring[0][0] < cutoff or len(ring) >= self.max_entries):  # room for one add
+            _, key = ring.popleft()
+            entry = entries.get(key)
+            if entry is not None:
+                entry[0] -= 1
+                if entry[0] <= 0:
+                    del entries[key]
+
+    def add(self, key: int, user_id: int, now: float) -> Tuple[int, Set[int]]:
+        """Record one occurrence; returns (earlier occurrences, senders seen before this one)."""
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [0, set()]
+        count, users = entry[0], set(entry[1])
+        entry[0] += 1
+        if len(entry[1]) < USERS_CAP:
+            entry[1].add(user_id)
+        self._ring.append((now, key))
+        return count, users
+
+class NearDupIndex:
+    """MinHash + LSH over a fixed ring of `capacity` signatures."""
+
+    def __init__(self, window: float = WINDOW_S, capacity: int = INDEX_SIZE):
+        self.window = window
+        self.capacity = capacity
+        self._sigs = array("Q", bytes(8 * BINS * capacity))   # BINS values per slot
+        self._bands = array("q", bytes(8 * BANDS * capacity))  # bucket keys per slot
+        self._live = bytearray(capacity)
+        self._ts = array("d", bytes(8 * capacity))
+        self._users = array("q", bytes(8 * capacity))
+        self._buckets: Dict[int, List[int]] = {}
+        self._head = 0      # next slot to write
+        self._size = 0      # live slots, ending at _head
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _evict(self, slot: int) -> None:
+        if self._live[slot]:
+            for key in self._bands[slot * BANDS:(slot + 1) * BANDS]:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    try:
+                        bucket.remove(slot)
+                    except ValueError:
+                        pass  # already pushed out by BUCKET_CAP
+                    if not bucket:
+                        del self._buckets[key]
+        self._live[slot] = 0
+        self._size -= 1
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._size:
+            tail = (self._head - self._size) % self.capacity
+            if self._ts[tail] >= cutoff:
+                break
+            self._evict(tail)
+
+    def add(self, sig: Tuple[int, ...], user_id: int, now: float) -> Tuple[int, Set[int]]:
+        """Record a signature; returns (near matches before it, their senders)."""
+        self._expire(now)
+        bands = _bands(sig)
+        matches, users, checked = 0, set(), set()
+        need = MATCH_AGREEMENT * BINS
+        for key in bands:
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            for slot in reversed(bucket):
+                if slot in checked:
+                    continue
+                checked.add(slot)
+                if self._live[slot] and \
+                        sum(map(eq, sig, self._sigs[slot * BINS:(slot + 1) * BINS])) >= need:
+                    matches += 1
+                    if len(users) < USERS_CAP:
+                        users.add(self._users[slot])
+                if len(checked) >= MAX_CANDIDATES:
+                    break
+            if matches >= MATCH_STOP or len(checked) >= MAX_CANDIDATES:
+                break
+
+        if self._size == self.capacity:
+            self._evict(self._head)  # ring full: the oldest slot is the one we write
+        slot = self._head
+        self._sigs[slot * BINS:(slot + 1) * BINS] = array("Q", sig)
+        self._bands[slot * BANDS:(slot + 1) * BANDS] = array("q", bands)
+        self._live[slot] = 1
+        self._ts[slot], self._users[slot] = now, user_id
+        for key in bands:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = [slot]
+            else:
+                if len(bucket) >= BUCKET_CAP:
+                    del bucket[0]
+                bucket.append(slot)
+        self._head = (slot + 1) % self.capacity
+        self._size += 1
+        return matches, users
+
+class SpamFingerprinter:
+    """Exact + near-duplicate lookup for one message, then remembers it."""
+
+    def __init__(self, window: float = WINDOW_S, size: int = INDEX_SIZE):
+        self.exact = ExactIndex(window, size)
+        self.near = NearDupIndex(window, size)
+
+    def observe(self, user_id: int, text: str, now: Optional[float] = None) -> Seen:
+        norm = normalize(text)
+        if len(norm) < MIN_CHARS:
+            # greetings and one-word replies repeat legitimately across users
+            return Seen(0, 0, 0)
+        now = time.time() if now is None else now
+        dups, users = self.exact.add(exact_key(text), user_id, now)
+        near, near_users = self.near.add(minhash(norm), user_id, now)
+        users |= near_users
+        users.discard(user_id)
+        return Seen(dups, near, len(users))
@@ -0,0 +1,180 @@
+# utils/story_tray.py - Batched story tray for /api/stories
+"""
+Builds the story circles for one viewer with a fixed number of queries
+no matter how many followed users have stories:
+
+    1. stories   - official story + live user stories of self/followees
+    2. segments  - story_segments WHERE story_id = ANY(...)
+    3. views     - story_views    WHERE user_id = viewer AND story_id = ANY(...)
+    4. names     - users          WHERE id = ANY(...)
+
+Trays are cached per viewer for TRAY_TTL seconds. Entries remember
+which authors they were built from, so a new story only evicts the
+trays that can show it. A view or follow change evicts only the viewer's
+own tray. The cache is per process; the TTL bounds staleness across
+workers.
+
+Views recorded through record_view() are written in batches (VIEWS, see
+utils/impressions.py), which also keep stories.view_count. Until a view
+is flushed the tray treats it as seen: record_view() marks the story in
+the cached tray, and build_tray() merges views still in the buffer.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from utils.impressions import CountInto, ImpressionBuffer
+
+TRAY_TTL = float(os.environ.get("STORY_TRAY_TTL", "15"))
+TRAY_CACHE_MAX = int(os.environ.get("STORY_TRAY_CACHE_MAX", "10000"))
+
+# ---------- per-viewer cache ----------
+# viewer tg id -> (expires_at, author ids the tray covers, stories payload)
+_CACHE: Dict[int, Tuple[float, FrozenSet[int], list]] = {}
+_LOCK = threading.Lock()
+
+def cached_tray(viewer_tg_id: int) -> Optional[list]:
+    entry = _CACHE.get(viewer_tg_id)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[2]
+
+def store_tray(viewer_tg_id: int, authors: FrozenSet[int], stories: list) -> None:
+    with _LOCK:
+        if len(_CACHE) >= TRAY_CACHE_MAX:
+            now = time.monotonic()
+            for k in [k for k, v in _CACHE.items() if v[0] < now] or list(_CACHE)[: TRAY_CACHE_MAX // 10]:
+                _CACHE.pop(k, None)
+        _CACHE[viewer_tg_id] = (time.monotonic() + TRAY_TTL, authors, stories)
+
+def invalidate_viewer(viewer_tg_id: int) -> None:
+    _CACHE.pop(viewer_tg_id, None)
+
+def mark_seen(viewer_tg_id: int, story_id: int) -> None:
+    """Flip one story to seen in the viewer's cached tray, if there is one."""
+    with _LOCK:
+        entry = _CACHE.get(viewer_tg_id)
+        if entry is None:
+            return
+        stories = [dict(st, seen=True) if st["id"] == story_id else st for st in entry[2]]
+        _CACHE[viewer_tg_id] = (entry[0], entry[1], stories)
+
+def invalidate_author(author_id: int) -> None:
+    """A story by *author_id* (users.id) changed: drop every tray that includes it."""
+    with _LOCK:
+        for k in [k for k, v in _CACHE.items() if author_id in v[1]]:
+            _CACHE.pop(k, None)
+
+def invalidate_all() -> None:
+    with _LOCK:
+        _CACHE.clear()
+
+# ---------- views ----------
+VIEWS = ImpressionBuffer("story_views", ("story_id", "user_id"), tag="story_views",
+                         count_into=CountInto("stories", "id", "story_id", ("view_count",)))
+
+def record_view(story_id: int, viewer_id: int, viewer_tg_id: int) -> None:
+    """Queue a (story, users.id) view; the viewer's tray shows it seen right away."""
+    VIEWS.add(story_id, viewer_id)
+    mark_seen(viewer_tg_id, story_id)
+
+# ---------- builder ----------
+# Always returns at least one row (the followee list rides along on every
+# row so the cache knows whose new stories affect this tray).
+_STORIES_SQL = """
+    WITH f AS (
+        SELECT COALESCE(array_agg(followee_id), '{}'::bigint[]) AS ids
+          FROM user_follows WHERE follower_id = %(me)s
+    )
+    SELECT s.id, s.author_id, s.kind, s.text, s.media_id, s.created_at, f.ids
+      FROM f
+      LEFT JOIN stories s
+        ON s.kind = 'official'
+        OR (s.kind = 'user'
+            AND s.expires_at > NOW()
+            AND (s.author_id = %(me)s OR s.author_id = ANY(f.ids)))
+     ORDER BY s.created_at DESC
+"""
+
+def build_tray(cur, viewer_id: int, media_url: Callable[[str], str]) -> Tuple[List[dict], FrozenSet[int]]:
+    """
+    Story circles for *viewer_id* (users.id), in display order: the official
+    story first (only if it has content), then user stories newest first.
+    Returns (stories, author ids covered) - the latter feeds the cache.
+    """
+    cur.execute(_STORIES_SQL, {"me": viewer_id})
+    fetched = cur.fetchall()
+    followees = fetched[0][6] if fetched else []
+    rows = [r[:6] for r in fetched if r[0] is not None]
+
+    officials = [r for r in rows if r[2] == "official"]
+    official = min(officials, key=lambda r: r[0]) if officials else None
+    user_rows = [r for r in rows if r[2] == "user"]
+    user_ids = [r[0] for r in user_rows]
+    author_ids = list({r[1] for r in user_rows if r[1] is not None})
+
+    segments: Dict[int, list] = {sid: [] for sid in user_ids}
+    if user_ids:
+        cur.execute("""
+            SELECT story_id, id, segment_type, content_type, file_id, text, created_at
+              FROM story_segments
+             WHERE story_id = ANY(%s)
+             ORDER BY story_id, created_at ASC
+        """, (user_ids,))
+        for story_id, seg_id, seg_type, content_type, file_id, seg_text, seg_created in cur.fetchall():
+            segments[story_id].append({
+                "id": seg_id,
+                "segment_type": seg_type,
+                "content_type": content_type,
+                "media_url": media_url(file_id) if file_id else None,
+                "text": seg_text or "",
+                "created_at": seg_created.isoformat() if seg_created else None
+            })
+
+    seen = set()
+    all_ids = user_ids + ([official[0]] if official else [])
+    if all_ids:
+        cur.execute("SELECT story_id FROM story_views WHERE user_id = %s AND story_id = ANY(%s)",
+                    (viewer_id, all_ids))
+        seen = {sid for (sid,) in cur.fetchall()}
+        seen.update(sid for sid in all_ids if VIEWS.seen(sid, viewer_id))
+
+    names: Dict[int, str] = {}
+    if author_ids:
+        cur.execute("""
+            SELECT id, COALESCE(NULLIF(display_name, ''), NULLIF(username, ''),
+                                NULLIF(feed_username, ''), 'User' || tg_user_id)
+              FROM users WHERE id = ANY(%s)
+        """, (author_ids,))
+        names = dict(cur.fetchall())
+
+    results: List[dict] = []
+    if official and (official[3] or official[4]):  # Has content
+        results.append({
+            "id": official[0],
+            "kind": "official",
+            "author_id": None,  # Official stories have NULL author_id
+            "name": "LuvHive✨",
+            "avatar_url": "official_default",
+            "text": official[3] or "",
+            "media_url": media_url(official[4]) if official[4] else None,
+            "created_at": official[5].isoformat() if official[5] else None,
+            "seen": official[0] in seen
+        })
+    for story_id, author_id, kind, text, media_id, created_at in user_rows:
+        results.append({
+            "id": story_id,
+            "kind": kind,
+            "author_id": author_id,
+            "name": names.get(author_id, f"User{author_id}") if author_id else "Anonymous",
+            "avatar_url": None,
+            "text": text or "",
+            "media_url": media_url(media_id) if media_id else None,
+            "created_at": created_at.isoformat() if created_at else None,
+            "seen": story_id in seen,
+            "segments": segments[story_id]
+        })
+    return results, frozenset(followees or ()) | {viewer_id}
@@ -172,6 +172,58 @@ def track_confession_delivery(confession_id: int, user_id: int) -> bool:
         log.error(f"Failed to track confession delivery: {e}")
         return False
 
+def get_unseen_confessions_for_users(user_ids: List[int], per_user: int = 3,
+                                     days: int = 7) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    ROTATING POOL, set-based: recent confessions and their deliveries are
+    fetched once, the per-user anti-join happens here instead of one
+    request pair per user.
+    """
+    import random
+    from datetime import datetime, timedelta, timezone
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    try:
+        with supabase_conn() as db:
+            confs = db.table('confessions').select('id, author_id, text, system_seed') \
+                      .gte('created_at', since).execute().data or []
+            if not confs:
+                return {}
+            wanted = set(int(u) for u in user_ids)
+            seen: Dict[int, set] = {}
+            ids = [c['id'] for c in confs]
+            for i in range(0, len(ids), 200):
+                rows = db.table('confession_deliveries').select('confession_id, user_id') \
+                         .in_('confession_id', ids[i:i + 200]).execute().data or []
+                for r in rows:
+                    if int(r['user_id']) in wanted:
+                        seen.setdefault(int(r['user_id']), set()).add(r['confession_id'])
+    except Exception as e:
+        log.error(f"Failed to get unseen confessions matrix: {e}")
+        return {}
+
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    for uid in wanted:
+        mine = seen.get(uid, ())
+        avail = [c for c in confs if c['author_id'] != uid and c['id'] not in mine]
+        if not avail:
+            continue
+        random.shuffle(avail)
+        avail.sort(key=lambda c: not c.get('system_seed'))
+        out[uid] = avail[:per_user]
+    return out
+
+def track_confession_deliveries(pairs: List[tuple]) -> int:
+    """ROTATING POOL: bulk upsert of (confession_id, user_id) deliveries"""
+    try:
+        with supabase_conn() as db:
+            rows = [{'confession_id': c, 'user_id': u, 'delivered_at': 'now()'} for c, u in pairs]
+            db.table('confession_deliveries').upsert(rows, on_conflict='confession_id,user_id').execute()
+            log.info(f"📋 Tracked {len(rows)} confession deliveries in one upsert")
+            return len(rows)
+    except Exception as e:
+        log.error(f"Failed to bulk track confession deliveries: {e}")
+        return 0
+
 # ============ NOTIFICATION USERS ============
 def get_nudge_users() -> List[int]:
     """Get users who should receive notifications"""
@@ -0,0 +1,255 @@
+# utils/tracing.py - Per-update handler latency and DB-time tracing for PTB
+"""
+Attributes wall time and database work to the handlers that caused it.
+
+    tracing.install(app)   # after every handler is registered (main.py)
+
+install() adds a TypeHandler at group -100 that opens an UpdateTrace for
+each update (kept in a ContextVar), and wraps the callback of every
+registered handler - including the ones nested in ConversationHandlers -
+so each handler run records its wall time and the DB time / query count
+it caused. DB time is fed by the counting cursor in utils.db_pool (every
+reg._conn() / db_pool.connection() checkout) and by utils.db_async's
+asyncpg helpers. asyncio.to_thread copies the context, so queries run
+through run_db are attributed too.
+
+A trace is finished when the update's task ends (concurrent_updates) or
+when the next update starts on the same task (sequential processing).
+Updates that issued more than TRACE_QUERY_LIMIT queries are logged with
+their per-handler breakdown and kept for /handlerstats - N+1 loops show
+up there without anyone having to look for them.
+
+Per handler, handler_stats() gives rolling p50/p95/p99 over the last
+TRACE_WINDOW runs; the same numbers are exported as histograms on
+/metrics.
+
+Env:
+    TRACE_QUERY_LIMIT  queries per update before it is flagged (default 15)
+    TRACE_SLOW_MS      wall time per update before it is flagged (default 2000)
+    TRACE_WINDOW       samples kept per handler for percentiles (default 512)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from utils.metrics_registry import REGISTRY
+
+log = logging.getLogger("luvbot.tracing")
+
+QUERY_LIMIT = int(os.getenv("TRACE_QUERY_LIMIT", "15"))
+SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+WINDOW = int(os.getenv("TRACE_WINDOW", "512"))
+
+CURRENT: contextvars.ContextVar[Optional["UpdateTrace"]] = contextvars.ContextVar("luvbot_trace", default=None)
+
+_HANDLER_MS = REGISTRY.histogram("handler_duration_ms", "Handler wall time", ["handler"])
+_HANDLER_DB_MS = REGISTRY.histogram("handler_db_ms", "DB time inside a handler", ["handler"])
+_HANDLER_QUERIES = REGISTRY.counter("handler_queries_total", "DB queries issued by a handler", ["handler"])
+_HANDLER_ERRORS = REGISTRY.counter("handler_errors_total", "Handler runs that raised", ["handler"])
+_UPDATE_MS = REGISTRY.histogram("update_duration_ms", "Wall time per update, all handlers", ["type"])
+_UPDATE_QUERIES = REGISTRY.histogram("update_queries", "DB queries per update", ["type"],
+                                     buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+_FLAGGED = REGISTRY.counter("update_query_budget_exceeded_total",
+                            "Updates over TRACE_QUERY_LIMIT queries", ["handler"])
+
+class UpdateTrace:
+    __slots__ = ("update_type", "started", "db_ms", "queries", "handlers", "finished")
+
+    def __init__(self, update_type: str):
+        self.update_type = update_type
+        self.started = time.perf_counter()
+        self.db_ms = 0.0
+        self.queries = 0
+        self.handlers: List[tuple] = []   # (name, wall_ms, db_ms, queries, status)
+        self.finished = False
+
+    def add_query(self, ms: float, n: int = 1) -> None:
+        self.db_ms += ms
+        self.queries += n
+
+class _Window:
+    """Last WINDOW samples of one handler, for rolling percentiles."""
+
+    __slots__ = ("wall", "db", "queries", "runs", "errors")
+
+    def __init__(self):
+        self.wall = deque(maxlen=WINDOW)
+        self.db = deque(maxlen=WINDOW)
+        self.queries = deque(maxlen=WINDOW)
+        self.runs = 0
+        self.errors = 0
+
+_windows: Dict[str, _Window] = {}
+_flagged: deque = deque(maxlen=50)
+
+def add_query(ms: float, n: int = 1) -> None:
+    """Charge DB time to the current update, if one is being traced."""
+    trace = CURRENT.get()
+    if trace is not None:
+        trace.add_query(ms, n)
+
+class query_span:
+    """`with tracing.query_span(): await con.fetch(...)` - for DB calls outside db_pool."""
+
+    __slots__ = ("t0",)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_query((time.perf_counter() - self.t0) * 1000)
+        return False
+
+def _update_type(update: Any) -> str:
+    for attr in ("message", "edited_message", "callback_query", "inline_query",
+                 "pre_checkout_query", "my_chat_member", "chat_member", "poll_answer"):
+        if getattr(update, attr, None) is not None:
+            return attr
+    return type(update).__name__
+
+def _finish(trace: UpdateTrace) -> None:
+    if trace.finished:
+        return
+    trace.finished = True
+    wall = (time.perf_counter() - trace.started) * 1000
+    _UPDATE_MS.labels(trace.update_type).observe(wall)
+    _UPDATE_QUERIES.labels(trace.update_type).observe(trace.queries)
+    if trace.queries > QUERY_LIMIT or wall > SLOW_MS:
+        top = max(trace.handlers, key=lambda h: h[3], default=("-", 0, 0, 0, ""))
+        if trace.queries > QUERY_LIMIT:
+            _FLAGGED.labels(top[0]).inc()
+        breakdown = ", ".join(f"{h[0]}={h[3]}q/{h[2]:.0f}ms" for h in trace.handlers) or "no handler"
+        _flagged.append({
+            "at": time.time(), "type": trace.update_type, "wall_ms": round(wall, 1),
+            "db_ms": round(trace.db_ms, 1), "queries": trace.queries, "handlers": list(trace.handlers),
+        })
+        log.warning(f"[trace] {trace.update_type}: {trace.queries} queries, "
+                    f"{trace.db_ms:.0f}ms DB, {wall:.0f}ms total ({breakdown})")
+
+async def _begin(update, context) -> None:
+    """TypeHandler at group -100: open the trace for this update."""
+    prev = CURRENT.get()
+    if prev is not None:
+        _finish(prev)  # sequential processing: the previous update on this task is done
+    trace = UpdateTrace(_update_type(update))
+    CURRENT.set(trace)
+    # concurrent_updates: each update has its own task, finish when it ends.
+    # (A task that already carried a trace is the sequential fetcher loop;
+    #  the next _begin finishes for it, so don't pile callbacks onto it.)
+    task = asyncio.current_task()
+    if task is not None and prev is None:
+        task.add_done_callback(lambda _t, tr=trace: _finish(tr))
+
+def _handler_name(callback) -> str:
+    fn = getattr(callback, "func", callback)  # functools.partial
+    return f"{getattr(fn, '__module__', '?')}.{getattr(fn, '__qualname__', repr(fn))}"
+
+def _wrap(callback):
+    if getattr(callback, "__traced__", False):
+        return callback
+    name = _handler_name(callback)
+    wall_h, db_h = _HANDLER_MS.labels(name), _HANDLER_DB_MS.labels(name)
+    queries_c, errors_c = _HANDLER_QUERIES.labels(name), _HANDLER_ERRORS.labels(name)
+    window = _windows.setdefault(name, _Window())
+
+    @functools.wraps(callback)
+    async def traced(update, context):
+        trace = CURRENT.get()
+        if trace is None or trace.finished:
+            return await callback(update, context)
+        t0, db0, q0 = time.perf_counter(), trace.db_ms, trace.queries
+        status = "ok"
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            # ApplicationHandlerStop / ConversationHandler control flow is not an error
+            status = "stop" if type(e).__name__ == "ApplicationHandlerStop" else "error"
+            raise
+        finally:
+            wall = (time.perf_counter() - t0) * 1000
+            db, q = trace.db_ms - db0, trace.queries - q0
+            trace.handlers.append((name, round(wall, 1), round(db, 1), q, status))
+            wall_h.observe(wall)
+            db_h.observe(db)
+            if q:
+                queries_c.inc(q)
+            window.runs += 1
+            window.wall.append(wall)
+            window.db.append(db)
+            window.queries.append(q)
+            if status == "error":
+                errors_c.inc()
+                window.errors += 1
+
+    traced.__traced__ = True
+    return traced
+
+def _wrap_handler(handler) -> int:
+    wrapped = 0
+    # ConversationHandler: wrap what it dispatches to, not the container
+    nested = []
+    for attr in ("entry_points", "fallbacks"):
+        nested.extend(getattr(handler, attr, None) or [])
+    for state_handlers in (getattr(handler, "states", None) or {}).values():
+        nested.extend(state_handlers)
+    if nested:
+        for h in nested:
+            wrapped += _wrap_handler(h)
+        return wrapped
+    cb = getattr(handler, "callback", None)
+    if cb is not None and cb is not _begin:
+        handler.callback = _wrap(cb)
+        wrapped += 1
+    return wrapped
+
+def install(app) -> int:
+    """Open a trace per update and wrap every handler registered so far."""
+    from telegram.ext import TypeHandler
+    from telegram import Update
+
+    n = 0
+    for handlers in app.handlers.values():
+        for h in handlers:
+            n += _wrap_handler(h)
+    app.add_handler(TypeHandler(Update, _begin), group=-100)
+    log.info(f"tracing installed on {n} handlers (query limit {QUERY_LIMIT}/update)")
+    return n
+
+def _pct(values, q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+def handler_stats(sort: str = "p95") -> List[Dict[str, Any]]:
+    """Rolling p50/p95/p99 wall time, DB time and queries per handler run."""
+    out = []
+    for name, w in list(_windows.items()):
+        if not w.runs:
+            continue
+        wall = list(w.wall)
+        out.append({
+            "handler": name,
+            "runs": w.runs,
+            "errors": w.errors,
+            "p50": _pct(wall, 0.50),
+            "p95": _pct(wall, 0.95),
+            "p99": _pct(wall, 0.99),
+            "db_p95": _pct(list(w.db), 0.95),
+            "queries_avg": sum(w.queries) / len(w.queries) if w.queries else 0.0,
+            "queries_max": max(w.queries, default=0),
+        })
+    out.sort(key=lambda r: r.get(sort, 0), reverse=True)
+    return out
+
+def flagged_updates(limit: int = 10) -> List[Dict[str, Any]]:
+    """Most recent updates over the query or wall-time budget, newest first."""
+    return list(_flagged)[-limit:][::-1]
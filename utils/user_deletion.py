@@ -43,20 +43,6 @@ class UserDeletionSystem:
             from utils.admin_audit import admin_audit
             
             with reg._conn() as con, con.cursor() as cur:
-                # Create deletion schedule table if not exists
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS user_deletion_queue (
-                        id BIGSERIAL PRIMARY KEY,
-                        tg_user_id BIGINT NOT NULL,
-                        scheduled_by BIGINT,  -- Admin ID who scheduled
-                        reason TEXT,
-                        scheduled_at TIMESTAMPTZ DEFAULT NOW(),
-                        deletion_date TIMESTAMPTZ DEFAULT NOW() + INTERVAL '7 days',
-                        status TEXT DEFAULT 'scheduled',  -- scheduled, cancelled, completed
-                        metadata JSONB
-                    );
-                """)
-                
                 # Check if user already scheduled for deletion
                 cur.execute("""
                     SELECT id, status FROM user_deletion_queue 
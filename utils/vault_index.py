@@ -0,0 +1,207 @@
+# utils/vault_index.py - Keyset browsing and per-user revealed sets for Blur Vault
+"""
+Blur Vault category pages without NOT IN, OFFSET or COUNT(*).
+
+Pages walk the approved items of one category newest first on the key
+(created_at, id), using the partial index on
+(category_id, created_at DESC, id DESC):
+
+    WHERE category_id = %(cat)s AND approval_status = 'approved'
+      AND (created_at, id) < (%(ts)s, %(id)s)
+    ORDER BY created_at DESC, id DESC LIMIT %(n)s
+
+Items the viewer already revealed are skipped in Python against their
+RevealedSet: the revealed content ids as one sorted array('q') plus a
+per-category tally. A set is loaded once (one indexed query on
+vault_interactions) and kept in an LRU for VAULT_REVEALED_TTL_S; a
+reveal is added to it directly, so it never waits for the batched
+vault_interactions write.
+
+"Remaining for you" is vault_categories.approved_count (kept by admin
+approve / delete) minus the viewer's tally for that category.
+
+A page key travels in the callback data as "<created_at µs>.<id>".
+
+Env:
+    VAULT_REVEALED_TTL_S      seconds a loaded revealed set is reused (default 600)
+    VAULT_REVEALED_MAX_USERS  users whose sets are kept (default 20000)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from utils import db_pool
+
+PAGE_SIZE = 10
+SCAN_BATCH = 50     # rows read per round while skipping revealed items
+REVEALED_TTL_S = float(os.getenv("VAULT_REVEALED_TTL_S", "600"))
+REVEALED_MAX_USERS = int(os.getenv("VAULT_REVEALED_MAX_USERS", "20000"))
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+Key = Tuple[int, int]   # (created_at µs, content id)
+
+def encode_key(key: Key) -> str:
+    return f"{key[0]}.{key[1]}"
+
+def decode_key(s: str) -> Optional[Key]:
+    try:
+        us, cid = s.split(".")
+        return int(us), int(cid)
+    except ValueError:
+        return None
+
+def _key(created_at: datetime, cid: int) -> Key:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (created_at - _EPOCH) // _US, cid
+
+# --- revealed sets ---
+class RevealedSet:
+    """One user's revealed content ids (sorted) and how many fall in each category."""
+    __slots__ = ("ids", "per_cat", "loaded")
+
+    def __init__(self, rows=()):
+        self.ids = array("q")
+        self.per_cat: Dict[int, int] = {}
+        self.loaded = time.monotonic()
+        for cid, cat in rows:
+            self.ids.append(cid)
+            self.per_cat[cat] = self.per_cat.get(cat, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, cid: int) -> bool:
+        i = bisect_left(self.ids, cid)
+        return i < len(self.ids) and self.ids[i] == cid
+
+    def add(self, cid: int, category_id: Optional[int]) -> None:
+        i = bisect_left(self.ids, cid)
+        if i < len(self.ids) and self.ids[i] == cid:
+            return
+        self.ids.insert(i, cid)
+        if category_id is not None:
+            self.per_cat[category_id] = self.per_cat.get(category_id, 0) + 1
+
+    def in_category(self, category_id: int) -> int:
+        return self.per_cat.get(category_id, 0)
+
+_REVEALED_SQL = """
+    SELECT vi.content_id, vc.category_id
+      FROM vault_interactions vi
+      JOIN vault_content vc ON vc.id = vi.content_id
+     WHERE vi.user_id = %s AND vi.action = 'revealed'
+       AND vc.approval_status = 'approved'
+     ORDER BY vi.content_id
+"""
+
+class RevealedCache:
+    """RevealedSet per user, LRU-bounded, reloaded after `ttl` seconds."""
+
+    def __init__(self, ttl: float = REVEALED_TTL_S, max_users: int = REVEALED_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._sets: "OrderedDict[int, RevealedSet]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> RevealedSet:
+        now = time.monotonic()
+        with self._lock:
+            rs = self._sets.get(user_id)
+            if rs is not None and now - rs.loaded < self.ttl:
+                self._sets.move_to_end(user_id)
+                return rs
+        with db_pool.connection("vault_index") as con, con.cursor() as cur:
+            cur.execute(_REVEALED_SQL, (user_id,))
+            rs = RevealedSet(cur.fetchall())
+        with self._lock:
+            self._sets[user_id] = rs
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return rs
+
+    def add(self, user_id: int, cid: int, category_id: Optional[int]) -> None:
+        """Record a reveal (loads the user's set first if needed)."""
+        rs = self.get(user_id)
+        with self._lock:
+            rs.add(cid, category_id)
+
+    def invalidate_all(self) -> None:
+        """Content was deleted: tallies may include it, reload on next use."""
+        with self._lock:
+            self._sets.clear()
+
+REVEALED = RevealedCache()
+
+# --- category counts ---
+def category_counts() -> Dict[int, int]:
+    """Approved items per active category, from vault_categories.approved_count."""
+    with db_pool.connection("vault_index") as con, con.cursor() as cur:
+        cur.execute("SELECT id, approved_count FROM vault_categories WHERE active = TRUE")
+        return {cid: int(n or 0) for cid, n in cur.fetchall()}
+
+def remaining(category_id: int, approved: int, user_id: int) -> int:
+    return max(0, approved - REVEALED.get(user_id).in_category(category_id))
+
+# --- keyset pages ---
+COLUMNS = ("id", "content_text", "blurred_text", "reveal_cost", "view_count", "reveal_count",
+           "created_at", "media_type", "file_url", "thumbnail_url", "blurred_thumbnail_url")
+
+_PAGE_SQL = f"""
+    SELECT {", ".join(COLUMNS)}
+      FROM vault_content
+     WHERE category_id = %(cat)s AND approval_status = 'approved' {{keyset}}
+     ORDER BY created_at {{order}}, id {{order}}
+     LIMIT %(n)s
+"""
+_OLDER = "AND (created_at, id) < (%(ts)s, %(id)s)"
+_NEWER = "AND (created_at, id) > (%(ts)s, %(id)s)"
+
+def page(category_id: int, user_id: int, after: Optional[Key] = None, before: Optional[Key] = None,
+         limit: int = PAGE_SIZE, hide_revealed: bool = True) -> Tuple[List[dict], bool]:
+    """
+    Up to `limit` items newest first: the first page, the page older than
+    `after`, or the page newer than `before`. Returns (items, more) where
+    `more` says whether items exist beyond the page in the direction read.
+    Each item carries "key" (for the next request) and "user_revealed".
+    """
+    revealed = REVEALED.get(user_id)
+    newer = before is not None
+    key = before if newer else after
+    order = "ASC" if newer else "DESC"
+    params = {"cat": category_id, "n": SCAN_BATCH}
+    items: List[dict] = []
+    with db_pool.connection("vault_index") as con, con.cursor() as cur:
+        while len(items) <= limit:
+            keyset = ""
+            if key is not None:
+                keyset = _NEWER if newer else _OLDER
+                params["ts"], params["id"] = _EPOCH + timedelta(microseconds=key[0]), key[1]
+            cur.execute(_PAGE_SQL.format(keyset=keyset, order=order), params)
+            rows = cur.fetchall()
+            for row in rows:
+                item = dict(zip(COLUMNS, row))
+                item["key"] = key = _key(item["created_at"], item["id"])
+                item["user_revealed"] = item["id"] in revealed
+                if hide_revealed and item["user_revealed"]:
+                    continue
+                items.append(item)
+                if len(items) > limit:
+                    break
+            if len(rows) < SCAN_BATCH:
+                break
+    more = len(items) > limit
+    items = items[:limit]
+    if newer:
+        items.reverse()
+    return items, more